@@ -3,20 +3,39 @@
 import os
 import sys
 from eoss import LOGGING_PATH
+from eoss import METADATA_DB_BACKEND
 from eoss import METADATA_DB_PATH
 from eoss import METADATA_DB_TABLE
-from eoss import OBJECT_LOCK_PATH 
-from eoss import STORAGE_PATH
+from eoss import OBJECT_LOCK_PATH
+from eoss import ADMISSION_LOCK_PATH
+from eoss import PROFILER_PATH
+from eoss import storage
 from eoss.exceptions import MDSConnectException
 from eoss.exceptions import MDSExecuteException
 from eoss.exceptions import MDSCommitException
 
 
-def bootstrap_mds(mds_table):
+def bootstrap_journal(shard=0):
+    from eoss import journal
     from eoss import mds_client
 
+    # journal metadata backend starts from an empty journal file without checkpoint
+    try:
+        journal.create_journal(mds_client.get_shard_path(shard))
+    except OSError as e:
+        print(f"ERROR: failed to create metadata journal file: {e}", file=sys.stderr)
+        return False
+
+    return True
+
+
+def bootstrap_mds(mds_table, shard=0):
+    from eoss import mds_client
+    from eoss import schema
+    from eoss import usage
+
     # initial mds client
-    mds = mds_client.MDSClient()
+    mds = mds_client.MDSClient(shard)
 
     # connect mds filename
     try:
@@ -32,9 +51,9 @@ def bootstrap_mds(mds_table):
     mds.cursor()
 
     # execute SQL query to create table
-    sql_create_table = f"CREATE TABLE {mds_table} (id STRING PRIMARY KEY, filename STRING, version STRING, size INTEGER, timestamp INTEGER, state INTEGER)"
     try:
-        mds.execute(sql_create_table)
+        schema.create_mds_tables(mds)
+        usage.sync_prefixes(mds)
     except MDSExecuteException as e:
         print(
             f"ERROR: failed to execute SQL query to create the table {mds_table}: {e}",
@@ -57,7 +76,18 @@ def bootstrap_mds(mds_table):
 
 if __name__ == "__main__":
     # create directories
-    for eoss_dir in (LOGGING_PATH, os.path.dirname(METADATA_DB_PATH), STORAGE_PATH, OBJECT_LOCK_PATH):
+    eoss_dirs = [
+        LOGGING_PATH,
+        os.path.dirname(METADATA_DB_PATH),
+        OBJECT_LOCK_PATH,
+        ADMISSION_LOCK_PATH,
+        PROFILER_PATH,
+    ]
+    eoss_dirs.extend(
+        storage.get_tier_path(tier, root) for tier, root in storage.get_locations()
+    )
+
+    for eoss_dir in eoss_dirs:
         try:
             os.makedirs(eoss_dir, exist_ok=True)
         except Exception as e:
@@ -66,20 +96,28 @@ if __name__ == "__main__":
         else:
             print(f"Directory {eoss_dir} created")
 
-    # bootstrap database
-    if os.path.exists(METADATA_DB_PATH):
+    # bootstrap database, each MDS shard is a separate database file
+    from eoss import mds_client
+    from eoss import sharding
+
+    if sharding.find_shard_files():
         print(
-            f"ERROR: MDS database {METADATA_DB_PATH} exists already, please remove this file if you want to bootstrap a clean MDS database"
+            f"ERROR: MDS database {METADATA_DB_PATH} exists already, please remove this file and its shard files if you want to bootstrap a clean MDS database"
         )
         sys.exit(2)
-    else:
-        mds_bootstrap_return = bootstrap_mds(METADATA_DB_TABLE)
+
+    for shard in mds_client.get_shards():
+        shard_path = mds_client.get_shard_path(shard)
+        if METADATA_DB_BACKEND == "journal":
+            mds_bootstrap_return = bootstrap_journal(shard)
+        else:
+            mds_bootstrap_return = bootstrap_mds(METADATA_DB_TABLE, shard)
         if mds_bootstrap_return:
             print(
-                f"MDS database {METADATA_DB_PATH} bootstrapped done with table {METADATA_DB_TABLE}"
+                f"MDS database {shard_path} bootstrapped done with table {METADATA_DB_TABLE}"
             )
         else:
-            print(f"ERROR: failed to bootstrap MDS database {METADATA_DB_PATH}")
+            print(f"ERROR: failed to bootstrap MDS database {shard_path}")
             sys.exit(2)
 
     sys.exit(0)
@@ -0,0 +1,354 @@
+#!/usr/bin/env python3
+
+import argparse
+import concurrent.futures
+import hashlib
+import os
+import sys
+import time
+from eoss import BULK_IMPORT_BATCH_SIZE
+from eoss import BULK_IMPORT_WORKERS
+from eoss import METADATA_DB_TABLE
+from eoss import object_name
+from eoss import storage
+from eoss.exceptions import MDSConnectException
+from eoss.exceptions import MDSExecuteException
+from eoss.exceptions import MDSCommitException
+from eoss.exceptions import EOSSInternalException
+from eoss.exceptions import ObjectUnderLockException
+
+# maximum number of SQL parameters in one query
+SQL_PARAMETERS_LIMIT = 500
+
+# throughput report interval
+# unit: second
+REPORT_INTERVAL = 10
+
+
+class ImportStats:
+    def __init__(self):
+        self.start = time.monotonic()
+        self.last_report = self.start
+        self.imported_objects = 0
+        self.imported_bytes = 0
+        self.skipped_objects = 0
+        self.failed_objects = 0
+        self.placement_modes = {}
+
+    def report(self, force=False):
+        now = time.monotonic()
+
+        if not force and now - self.last_report < REPORT_INTERVAL:
+            return
+
+        self.last_report = now
+        elapsed = max(now - self.start, 0.001)
+        print(
+            f"{self.imported_objects} objects imported, {self.imported_bytes} bytes, {self.skipped_objects} skipped, {self.failed_objects} failed, {self.imported_objects / elapsed:.1f} objects/s, {self.imported_bytes / elapsed / 1048576:.1f} MB/s, placement: {self.placement_modes}"
+        )
+
+
+def walk_source(source_path):
+    """
+    walk source directory tree and yield relative path, absolute path and size of each regular file
+    """
+    stack = [source_path]
+
+    while stack:
+        directory = stack.pop()
+
+        try:
+            entries = list(os.scandir(directory))
+        except OSError as e:
+            print(f"ERROR: failed to scan directory {directory}: {e}", file=sys.stderr)
+            continue
+
+        for entry in sorted(entries, key=lambda entry: entry.name):
+            if entry.is_dir(follow_symlinks=False):
+                stack.append(entry.path)
+            elif entry.is_file(follow_symlinks=False):
+                yield (
+                    os.path.relpath(entry.path, source_path),
+                    entry.path,
+                    entry.stat(follow_symlinks=False).st_size,
+                )
+
+
+def get_shard_client(mds_shards, record_name):
+    """
+    return MDS client of the shard holding records of an object
+    """
+    from eoss import mds_client
+
+    return mds_shards[mds_client.get_shard(record_name)]
+
+
+def get_existing_states(mds_shards, record_names):
+    """
+    return a dict of object name and state for objects existing in MDS
+    """
+    states = {}
+    shard_record_names = {}
+
+    for record_name in record_names:
+        shard_record_names.setdefault(
+            get_shard_client(mds_shards, record_name), []
+        ).append(record_name)
+
+    for mds, record_names in shard_record_names.items():
+        for index in range(0, len(record_names), SQL_PARAMETERS_LIMIT):
+            chunk = record_names[index : index + SQL_PARAMETERS_LIMIT]
+            output = mds.execute(
+                f"SELECT id, state FROM {METADATA_DB_TABLE} WHERE id IN ({', '.join('?' * len(chunk))})",
+                tuple(chunk),
+            ).fetchall()
+            states.update(output)
+
+    return states
+
+
+def place_object(record_name, root, source_path, mode):
+    """
+    place source file as object file in given hot tier storage root
+    placed object file is read once for its SHA-256 digest, like the digest of uploaded object
+    return placement mode used, object size, digest and the number of stale files failed to be removed
+    """
+    object_temp_path = storage.get_object_temp_path(record_name, storage.TIER_HOT, root)
+    object_path = storage.get_object_path(record_name, storage.TIER_HOT, root)
+
+    placement_mode = storage.place_file(source_path, object_temp_path, mode)
+    os.rename(object_temp_path, object_path)
+
+    digest = hashlib.sha256()
+    with open(object_path, "rb") as f:
+        while True:
+            data = f.read(storage.COPY_BUFFER_SIZE)
+            if not data:
+                break
+            digest.update(data)
+
+    # remove overridden object file left in other storage location
+    flag = 0
+    for stale_path in storage.get_object_paths(record_name):
+        if stale_path != object_path and os.path.exists(stale_path):
+            try:
+                os.unlink(stale_path)
+            except OSError:
+                flag += 1
+
+    return (placement_mode, os.path.getsize(object_path), digest.hexdigest(), flag)
+
+
+def import_batch(mds_shards, executor, batch, args, stats):
+    from eoss import object_client
+
+    timestamp = int(time.time())
+    objects = {}
+    locked_clients = []
+
+    for relative_path, source_path, size in batch:
+        object_filename = relative_path.replace(os.sep, args.separator)
+        record_name = object_name.set_object_name(object_filename, args.version)
+        objects[record_name] = (object_filename, source_path, size)
+
+    roots = {record_name: storage.choose_root(record_name) for record_name in objects}
+
+    try:
+        # online import locks objects so it's not mixed up with concurrent PUT and DELETE
+        if not args.offline:
+            for record_name, (object_filename, source_path, size) in list(objects.items()):
+                eoss_object_client = object_client.ObjectClient(
+                    object_filename, object_version=args.version
+                )
+                try:
+                    eoss_object_client.set_write_lock()
+                except ObjectUnderLockException:
+                    del objects[record_name]
+                    stats.skipped_objects += 1
+                else:
+                    locked_clients.append(eoss_object_client)
+
+        # objects closed in MDS are imported already, non-closed leftovers are imported again
+        existing_states = get_existing_states(mds_shards, list(objects))
+        for record_name, state in existing_states.items():
+            if state in (0, 4) and not args.overwrite:
+                del objects[record_name]
+                stats.skipped_objects += 1
+
+        if not objects:
+            return
+
+        # state 1 phase in one transaction of each MDS shard
+        for record_name, (object_filename, source_path, size) in objects.items():
+            get_shard_client(mds_shards, record_name).execute(
+                f"INSERT OR REPLACE INTO {METADATA_DB_TABLE} (id, filename, version, size, timestamp, state, tier, compression, root) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    record_name,
+                    object_filename,
+                    args.version,
+                    None,
+                    None,
+                    1,
+                    storage.TIER_HOT,
+                    None,
+                    roots[record_name],
+                ),
+            )
+        for mds in mds_shards:
+            mds.commit()
+
+        # place object files in parallel
+        futures = {
+            record_name: executor.submit(
+                place_object, record_name, roots[record_name], source_path, args.mode
+            )
+            for record_name, (object_filename, source_path, size) in objects.items()
+        }
+
+        # all files are placed before MDS is written, so MDS shards aren't locked while files are placed
+        results = {}
+        for record_name, future in futures.items():
+            try:
+                results[record_name] = future.result()
+            except (EOSSInternalException, OSError) as e:
+                results[record_name] = e
+
+        # state 0 phase in one transaction of each MDS shard
+        for record_name, result in results.items():
+            object_filename, source_path, size = objects[record_name]
+            mds = get_shard_client(mds_shards, record_name)
+
+            if isinstance(result, Exception):
+                print(f"ERROR: failed to import {source_path}: {result}", file=sys.stderr)
+                stats.failed_objects += 1
+
+                for object_file in storage.get_object_paths(record_name):
+                    if os.path.exists(object_file):
+                        os.unlink(object_file)
+                mds.execute(
+                    f"DELETE FROM {METADATA_DB_TABLE} WHERE id = ?", (record_name,)
+                )
+                continue
+
+            placement_mode, size, digest, flag = result
+
+            if flag:
+                print(
+                    f"WARNING: stale files of object {record_name} are left in other storage location",
+                    file=sys.stderr,
+                )
+
+            mds.execute(
+                f"UPDATE {METADATA_DB_TABLE} SET size = ?, timestamp = ?, state = ?, digest = ? WHERE id = ?",
+                (size, timestamp, 0, digest, record_name),
+            )
+            object_client.record_commit(mds, record_name, "PUT")
+
+            stats.imported_objects += 1
+            stats.imported_bytes += size
+            stats.placement_modes[placement_mode] = (
+                stats.placement_modes.get(placement_mode, 0) + 1
+            )
+        for mds in mds_shards:
+            mds.commit()
+    finally:
+        for eoss_object_client in locked_clients:
+            eoss_object_client.remove_lock()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="import files in a directory tree into EOSS as objects"
+    )
+    parser.add_argument("source", help="source directory")
+    parser.add_argument(
+        "--version", default=None, help="object version of all imported objects"
+    )
+    parser.add_argument(
+        "--separator",
+        default="__",
+        help="string replacing path separator in object filename",
+    )
+    parser.add_argument(
+        "--mode",
+        default="auto",
+        choices=("auto",) + storage.PLACEMENT_MODES,
+        help="file placement mode, auto tries hardlink, reflink and copy in order",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=BULK_IMPORT_WORKERS,
+        help="number of parallel file placement workers",
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=BULK_IMPORT_BATCH_SIZE,
+        help="number of objects committed to MDS in one transaction",
+    )
+    parser.add_argument(
+        "--overwrite",
+        action="store_true",
+        help="overwrite objects which exist already",
+    )
+    parser.add_argument(
+        "--offline",
+        action="store_true",
+        help="EOSS service is stopped, skip object locking",
+    )
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.source):
+        print(f"ERROR: source directory {args.source} does not exist", file=sys.stderr)
+        sys.exit(1)
+
+    from eoss import mds_client
+
+    mds_shards = [mds_client.MDSClient(shard) for shard in mds_client.get_shards()]
+
+    for mds in mds_shards:
+        try:
+            mds.connect()
+        except MDSConnectException as e:
+            print(
+                f"ERROR: failed to connect to MDS database file {mds.db_name}: {e}",
+                file=sys.stderr,
+            )
+            sys.exit(2)
+
+        mds.cursor()
+
+    stats = ImportStats()
+    batch = []
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=args.workers) as executor:
+        try:
+            for item in walk_source(args.source):
+                batch.append(item)
+
+                if len(batch) >= args.batch_size:
+                    import_batch(mds_shards, executor, batch, args, stats)
+                    batch = []
+                    stats.report()
+
+            if batch:
+                import_batch(mds_shards, executor, batch, args, stats)
+        except (MDSExecuteException, MDSCommitException) as e:
+            print(f"ERROR: failed to update MDS: {e}", file=sys.stderr)
+            print(
+                f"ERROR: import is interrupted, run it again to resume", file=sys.stderr
+            )
+            stats.report(force=True)
+            for mds in mds_shards:
+                mds.close()
+            sys.exit(2)
+
+    for mds in mds_shards:
+        mds.close()
+    stats.report(force=True)
+
+    if stats.failed_objects:
+        sys.exit(3)
+
+    sys.exit(0)
@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+
+import argparse
+import sys
+from eoss import DEDUP_GC_BATCH_SIZE
+from eoss import METADATA_DB_BACKEND
+from eoss.exceptions import MDSConnectException
+from eoss.exceptions import MDSExecuteException
+from eoss.exceptions import MDSCommitException
+from eoss.exceptions import EOSSInternalException
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="remove chunks of deduplicated objects which are not referenced any more"
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=DEDUP_GC_BATCH_SIZE,
+        help="number of unreferenced chunks checked at once",
+    )
+    args = parser.parse_args()
+
+    from eoss import dedup
+
+    # chunk manifests are kept in SQL tables only
+    if METADATA_DB_BACKEND != "sqlite":
+        print(
+            f"ERROR: deduplication is not supported by {METADATA_DB_BACKEND} metadata backend",
+            file=sys.stderr,
+        )
+        sys.exit(2)
+
+    try:
+        removed_chunks, removed_bytes = dedup.collect_garbage(args.batch_size)
+    except (MDSConnectException, MDSExecuteException, MDSCommitException) as e:
+        print(f"ERROR: failed to access MDS: {e}", file=sys.stderr)
+        sys.exit(2)
+    except (EOSSInternalException, OSError) as e:
+        print(f"ERROR: failed to collect garbage chunks: {e}", file=sys.stderr)
+        sys.exit(3)
+
+    print(f"{removed_chunks} chunks removed, {removed_bytes} bytes reclaimed")
+
+    sys.exit(0)
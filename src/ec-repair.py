@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+
+import argparse
+import concurrent.futures
+import sys
+from eoss import ERASURE_REPAIR_WORKERS
+from eoss import METADATA_DB_TABLE
+from eoss.exceptions import MDSConnectException
+from eoss.exceptions import MDSExecuteException
+from eoss.exceptions import EOSSInternalException
+from eoss.exceptions import ObjectUnderLockException
+
+
+def get_erasure_coded_objects():
+    from eoss import erasure
+    from eoss import mds_client
+    from eoss import object_name
+
+    def query(mds):
+        return mds.execute(
+            f"SELECT id, layout FROM {METADATA_DB_TABLE} WHERE state IN (0, 4) AND layout IS NOT NULL"
+        ).fetchall()
+
+    # all MDS shards are queried in parallel, deduplicated objects have no stripes
+    # filename and version columns have numeric affinity, a numeric filename or version string
+    # is read back as a number, so both are parsed from object name
+    output = []
+    for shard_output in mds_client.map_shards(query):
+        output.extend(
+            object_name.parse_object_name(record_name)
+            for record_name, layout in shard_output
+            if erasure.load_layout(layout)["mode"] == "erasure"
+        )
+
+    return output
+
+
+def repair_object(object_filename, object_version):
+    """
+    rebuild lost stripes of an object under its read lock, so it's not overridden or deleted meanwhile
+    return a tuple of object name, the number of rebuilt stripes and error message
+    the number of rebuilt stripes is None if object is skipped
+    """
+    from eoss import erasure
+    from eoss import object_client
+
+    eoss_object_client = object_client.ObjectClient(
+        object_filename, object_version=object_version
+    )
+
+    try:
+        eoss_object_client.set_read_lock()
+    except ObjectUnderLockException:
+        return (eoss_object_client.object_name, None, "object is under lock")
+
+    try:
+        eoss_object_client.init_mds()
+        eoss_object_client.check_object_exists()
+
+        if (
+            eoss_object_client.object_state not in (0, 4)
+            or eoss_object_client.object_layout is None
+            or eoss_object_client.object_layout["mode"] != "erasure"
+        ):
+            return (eoss_object_client.object_name, None, None)
+
+        rebuilt_stripes = erasure.repair_object(
+            eoss_object_client.object_name,
+            eoss_object_client.object_layout,
+            eoss_object_client.object_size,
+        )
+    except (
+        MDSConnectException,
+        MDSExecuteException,
+        EOSSInternalException,
+        OSError,
+    ) as e:
+        return (eoss_object_client.object_name, 0, str(e))
+    finally:
+        eoss_object_client.close_mds()
+        eoss_object_client.remove_lock()
+
+    return (eoss_object_client.object_name, rebuilt_stripes, None)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="rebuild lost or truncated stripes of erasure coded objects"
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=ERASURE_REPAIR_WORKERS,
+        help="number of parallel repair processes",
+    )
+    args = parser.parse_args()
+
+    try:
+        objects = get_erasure_coded_objects()
+    except (MDSConnectException, MDSExecuteException) as e:
+        print(f"ERROR: failed to access MDS: {e}", file=sys.stderr)
+        sys.exit(2)
+
+    print(f"{len(objects)} erasure coded objects located")
+
+    repaired_objects = 0
+    rebuilt_stripes = 0
+    skipped_objects = 0
+    failed_objects = 0
+
+    # stripe decoding is CPU bound so objects are repaired in separate processes
+    with concurrent.futures.ProcessPoolExecutor(max_workers=args.workers) as executor:
+        futures = [
+            executor.submit(repair_object, object_filename, object_version)
+            for object_filename, object_version in objects
+        ]
+
+        for future in concurrent.futures.as_completed(futures):
+            record_name, count, error = future.result()
+
+            if error is not None and count is None:
+                skipped_objects += 1
+                print(f"WARNING: object {record_name} is skipped: {error}", file=sys.stderr)
+            elif error is not None:
+                failed_objects += 1
+                print(f"ERROR: failed to repair object {record_name}: {error}", file=sys.stderr)
+            elif count:
+                repaired_objects += 1
+                rebuilt_stripes += count
+                print(f"object {record_name}: {count} stripes rebuilt")
+
+    print(
+        f"{repaired_objects} objects repaired, {rebuilt_stripes} stripes rebuilt, {skipped_objects} objects skipped, {failed_objects} objects failed"
+    )
+
+    if failed_objects:
+        sys.exit(3)
+
+    sys.exit(0)
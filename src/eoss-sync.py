@@ -0,0 +1,325 @@
+#!/usr/bin/env python3
+
+import argparse
+import collections
+import concurrent.futures
+import hashlib
+import os
+import sqlite3
+import sys
+import time
+from eoss_client import EOSSClient
+from eoss_client import EOSSClientException
+
+# digest read buffer size
+# unit: byte
+DIGEST_BUFFER_SIZE = 1048576
+
+# number of manifest updates committed in one transaction
+MANIFEST_COMMIT_SIZE = 10000
+
+# number of local object filenames inserted into manifest in one batch
+LOCAL_BATCH_SIZE = 10000
+
+
+class SyncStats:
+    def __init__(self):
+        self.start = time.monotonic()
+        self.scanned_files = 0
+        self.hashed_files = 0
+        self.unchanged_files = 0
+        self.uploaded_files = 0
+        self.uploaded_bytes = 0
+        self.deleted_objects = 0
+        self.failed_files = 0
+
+    def report(self):
+        elapsed = max(time.monotonic() - self.start, 0.001)
+        print(
+            f"{self.scanned_files} files scanned, {self.hashed_files} hashed, {self.unchanged_files} unchanged, {self.uploaded_files} uploaded, {self.uploaded_bytes} bytes, {self.deleted_objects} objects deleted, {self.failed_files} failed in {elapsed:.1f} seconds"
+        )
+
+
+def get_default_manifest_path(source_path):
+    digest = hashlib.sha1(os.path.abspath(source_path).encode()).hexdigest()
+    return os.path.join(os.path.expanduser("~/.cache/eoss-sync"), f"{digest}.sql")
+
+
+def open_manifest(manifest_path):
+    """
+    open local manifest database which caches digests of local files by path, size and modification time
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(manifest_path)), exist_ok=True)
+
+    manifest = sqlite3.connect(manifest_path)
+    manifest.execute("PRAGMA journal_mode = WAL")
+    manifest.execute("PRAGMA synchronous = NORMAL")
+    manifest.execute(
+        "CREATE TABLE IF NOT EXISTS files (path STRING PRIMARY KEY, size INTEGER, mtime INTEGER, digest STRING)"
+    )
+    manifest.execute(
+        "CREATE TEMP TABLE remote (filename STRING PRIMARY KEY, size INTEGER, digest STRING)"
+    )
+    manifest.execute("CREATE TEMP TABLE local (filename STRING PRIMARY KEY)")
+
+    return manifest
+
+
+def fetch_remote(client, manifest, args):
+    """
+    load server side metadata of all objects under object filename prefix into manifest
+    """
+    batch = []
+    count = 0
+
+    for item in client.list_objects(prefix=args.prefix, version=args.version):
+        batch.append((item["filename"], item["size"], item["digest"]))
+
+        if len(batch) >= LOCAL_BATCH_SIZE:
+            manifest.executemany("INSERT INTO remote VALUES (?, ?, ?)", batch)
+            count += len(batch)
+            batch = []
+
+    manifest.executemany("INSERT INTO remote VALUES (?, ?, ?)", batch)
+    count += len(batch)
+
+    return count
+
+
+def walk_source(source_path, excluded_paths):
+    """
+    walk source directory tree and yield relative path, absolute path and stat result of each regular file
+    """
+    source_path = os.path.abspath(source_path)
+    stack = [source_path]
+
+    while stack:
+        directory = stack.pop()
+
+        try:
+            entries = list(os.scandir(directory))
+        except OSError as e:
+            print(f"ERROR: failed to scan directory {directory}: {e}", file=sys.stderr)
+            continue
+
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                stack.append(entry.path)
+            elif entry.is_file(follow_symlinks=False) and entry.path not in excluded_paths:
+                yield (
+                    os.path.relpath(entry.path, source_path),
+                    entry.path,
+                    entry.stat(follow_symlinks=False),
+                )
+
+
+def get_file_digest(path):
+    digest = hashlib.sha256()
+
+    with open(path, "rb") as f:
+        while True:
+            data = f.read(DIGEST_BUFFER_SIZE)
+            if not data:
+                break
+            digest.update(data)
+
+    return digest.hexdigest()
+
+
+def sync_file(client, args, object_filename, path, digest, remote_digest):
+    """
+    hash a local file if its digest is not cached and upload it if it's different from the object
+    return digest and a flag if the file is uploaded
+    """
+    if digest is None:
+        digest = get_file_digest(path)
+
+    if digest == remote_digest:
+        return (digest, False)
+
+    if not args.dry_run:
+        client.upload(object_filename, path, version=args.version)
+
+    return (digest, True)
+
+
+def sync_tree(client, executor, manifest, manifest_path, args, stats):
+    """
+    walk source tree, hash new or changed files and upload files whose digest differs from the object
+    manifest is only updated in the calling thread
+    """
+    pending = collections.deque()
+    local_batch = []
+    manifest_updates = 0
+    excluded_paths = {
+        os.path.abspath(manifest_path),
+        os.path.abspath(manifest_path) + "-wal",
+        os.path.abspath(manifest_path) + "-shm",
+    }
+
+    def finish(future, relative_path, st):
+        nonlocal manifest_updates
+
+        try:
+            digest, uploaded = future.result()
+        except (EOSSClientException, OSError) as e:
+            print(f"ERROR: failed to sync {relative_path}: {e}", file=sys.stderr)
+            stats.failed_files += 1
+            return
+
+        manifest.execute(
+            "INSERT OR REPLACE INTO files (path, size, mtime, digest) VALUES (?, ?, ?, ?)",
+            (relative_path, st.st_size, st.st_mtime_ns, digest),
+        )
+        manifest_updates += 1
+
+        if uploaded:
+            stats.uploaded_files += 1
+            stats.uploaded_bytes += st.st_size
+            print(f"{'would upload' if args.dry_run else 'uploaded'} {relative_path}")
+        else:
+            stats.unchanged_files += 1
+
+    for relative_path, path, st in walk_source(args.source, excluded_paths):
+        stats.scanned_files += 1
+        object_filename = args.prefix + relative_path.replace(os.sep, args.separator)
+
+        local_batch.append((object_filename,))
+        if len(local_batch) >= LOCAL_BATCH_SIZE:
+            manifest.executemany("INSERT OR IGNORE INTO local VALUES (?)", local_batch)
+            local_batch = []
+
+        cached = manifest.execute(
+            "SELECT size, mtime, digest FROM files WHERE path = ?", (relative_path,)
+        ).fetchone()
+        remote = manifest.execute(
+            "SELECT digest FROM remote WHERE filename = ?", (object_filename,)
+        ).fetchone()
+        remote_digest = remote[0] if remote is not None else None
+
+        # unchanged file is decided by its cached digest without reading it
+        if cached is not None and cached[:2] == (st.st_size, st.st_mtime_ns):
+            digest = cached[2]
+            if remote_digest is not None and digest == remote_digest:
+                stats.unchanged_files += 1
+                continue
+        else:
+            digest = None
+            stats.hashed_files += 1
+
+        future = executor.submit(
+            sync_file, client, args, object_filename, path, digest, remote_digest
+        )
+        pending.append((future, relative_path, st))
+
+        # bound the number of in-flight files
+        while len(pending) > args.workers * 4:
+            finish(*pending.popleft())
+
+        if manifest_updates >= MANIFEST_COMMIT_SIZE:
+            manifest.commit()
+            manifest_updates = 0
+
+    while pending:
+        finish(*pending.popleft())
+
+    manifest.executemany("INSERT OR IGNORE INTO local VALUES (?)", local_batch)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="synchronize a directory tree into EOSS, only new or changed files are uploaded"
+    )
+    parser.add_argument("source", help="source directory")
+    parser.add_argument(
+        "--url", default="http://localhost:4080", help="EOSS service URL"
+    )
+    parser.add_argument(
+        "--version", default=None, help="object version of all synchronized objects"
+    )
+    parser.add_argument(
+        "--prefix", default="", help="object filename prefix of all synchronized objects"
+    )
+    parser.add_argument(
+        "--separator",
+        default="__",
+        help="string replacing path separator in object filename",
+    )
+    parser.add_argument(
+        "--manifest",
+        default=None,
+        help="local manifest database path, default is under ~/.cache/eoss-sync",
+    )
+    parser.add_argument(
+        "--workers", type=int, default=8, help="number of parallel uploads"
+    )
+    parser.add_argument(
+        "--delete",
+        action="store_true",
+        help="delete objects under prefix whose local files are removed",
+    )
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="only report what would be uploaded and deleted",
+    )
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.source):
+        print(f"ERROR: source directory {args.source} does not exist", file=sys.stderr)
+        sys.exit(1)
+
+    manifest_path = args.manifest or get_default_manifest_path(args.source)
+    manifest = open_manifest(manifest_path)
+    client = EOSSClient(args.url, pool_size=args.workers, workers=args.workers)
+    stats = SyncStats()
+
+    try:
+        remote_count = fetch_remote(client, manifest, args)
+    except EOSSClientException as e:
+        print(f"ERROR: failed to list objects: {e}", file=sys.stderr)
+        client.close()
+        manifest.close()
+        sys.exit(2)
+
+    print(f"{remote_count} objects located under prefix '{args.prefix}'")
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=args.workers) as executor:
+        sync_tree(client, executor, manifest, manifest_path, args, stats)
+
+    # delete objects whose local files are removed
+    if args.delete:
+        removed = manifest.execute(
+            "SELECT filename FROM remote WHERE filename NOT IN (SELECT filename FROM local)"
+        ).fetchall()
+
+        for (object_filename,) in removed:
+            if args.dry_run:
+                print(f"would delete {object_filename}")
+                stats.deleted_objects += 1
+                continue
+
+            try:
+                client.delete(object_filename, version=args.version)
+            except EOSSClientException as e:
+                print(f"ERROR: failed to delete {object_filename}: {e}", file=sys.stderr)
+                stats.failed_files += 1
+            else:
+                print(f"deleted {object_filename}")
+                stats.deleted_objects += 1
+
+    # forget manifest entries of removed local files
+    manifest.execute(
+        "DELETE FROM files WHERE ? || replace(path, ?, ?) NOT IN (SELECT filename FROM local)",
+        (args.prefix, os.sep, args.separator),
+    )
+    manifest.commit()
+    manifest.close()
+    client.close()
+
+    stats.report()
+
+    if stats.failed_files:
+        sys.exit(3)
+
+    sys.exit(0)
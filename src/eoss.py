@@ -1,26 +1,60 @@
 #!/usr/bin/env python3
 
+import hashlib
+import hmac
+import heapq
+import io
+import itertools
 import os
 import time
+from eoss import erasure
+from eoss import admission
+from eoss import changelog
+from eoss import dedup
+from eoss import expiry
+from eoss import faults
 from eoss import logger
 from eoss import mds_client
 from eoss import object_client
+from eoss import profiling
+from eoss import query
+from eoss import replication
+from eoss import startup
+from eoss import usage
 from eoss import utils
+from eoss import writer
+from eoss import ADMISSION_CONTROL
+from eoss import ADMISSION_RETRY_AFTER
+from eoss import CHANGES_BATCH_SIZE
+from eoss import CHANGES_PAGE_SIZE
+from eoss import CHANGES_PAGE_SIZE_MAX
+from eoss import CHANGES_WAIT_MAX
+from eoss import LIST_PAGE_SIZE
+from eoss import LIST_PAGE_SIZE_MAX
 from eoss import LOGGING_PATH
+from eoss import PROFILER_INTERVAL
+from eoss import PROFILER_MAX_DURATION
+from eoss import PROFILER_TOKEN
+from eoss import QUERY_PAGE_SIZE
+from eoss import QUERY_PAGE_SIZE_MAX
+from eoss import READ_MOSTLY_MODE
 from eoss import METADATA_DB_TABLE
 from eoss import SAFEMODE
-from eoss import STORAGE_PATH
+from eoss import USAGE_PREFIXES
+from eoss.exceptions import ChangelogCursorException
 from eoss.exceptions import MDSConnectException
 from eoss.exceptions import MDSExecuteException
 from eoss.exceptions import MDSCommitException
 from eoss.exceptions import EOSSInternalException
 from eoss.exceptions import ObjectUnderLockException
+from eoss.exceptions import ObjectPreconditionException
 from flask import Flask
 from flask import g
 from flask import jsonify
 from flask import request
 from flask import send_file
 from werkzeug.serving import WSGIRequestHandler
+from werkzeug.wsgi import ClosingIterator
 
 # set up loggers
 log = logger.Logger(__name__, os.path.join(LOGGING_PATH, "eoss.log"))
@@ -31,18 +65,64 @@ WSGIRequestHandler.protocol_version = "HTTP/1.1"
 
 app = Flask(__name__)
 
+# set up admission control
+if ADMISSION_CONTROL:
+    admission_controller = admission.AdmissionController()
+else:
+    admission_controller = None
+
+
+def check_quota(eoss_object_client, added_bytes, freed_bytes=None):
+    """
+    return an error response if an object write exceeds quota of accounting prefixes, None if it's allowed
+    object state must be loaded by check_object_exists(), by default the size of closed object is freed by override
+    """
+    if freed_bytes is None:
+        freed_bytes = 0
+        if eoss_object_client.object_state in (0, 4):
+            freed_bytes = eoss_object_client.object_size or 0
+
+    try:
+        prefix = usage.check_quota(
+            eoss_object_client.object_filename, added_bytes, freed_bytes
+        )
+    except MDSConnectException as e:
+        log.error(f"failed to connect to metadata database: {e}")
+        return ("MDS Connection Failure", 520)
+    except MDSExecuteException as e:
+        log.error(f"failed to execute SQL query: {e}")
+        return ("MDS Execution Failure", 521)
+
+    if prefix is not None:
+        log.warning(
+            f"object {eoss_object_client.object_name} exceeds quota of prefix {prefix}, write rejected"
+        )
+        return ("Quota Exceeded", 507)
+
+    return None
+
 
 @app.route(
-    "/eoss/v1/object/<string:object_filename>", methods=["GET", "HEAD", "DELETE", "PUT"]
+    "/eoss/v1/object/<string:object_filename>",
+    methods=["GET", "HEAD", "DELETE", "PUT", "POST", "COPY", "MOVE"],
 )
 def process_object(object_filename):
-    if request.method not in ("GET", "HEAD", "DELETE", "PUT"):
+    if request.method not in ("GET", "HEAD", "DELETE", "PUT", "POST", "COPY", "MOVE"):
         log.warning("request method {request.method} is not allowed, ignored")
         return ("Bad Method", 405)
 
-    # check if SAFEMODE is enabled
-    if (request.method in ("DELETE", "PUT")) and SAFEMODE:
-        log.info("safemode is enabled, DELETE and PUT methods are not usable")
+    # POST method is only used by append operation
+    if request.method == "POST" and "X-EOSS-Append" not in request.headers:
+        log.warning("POST request without X-EOSS-Append header, ignored")
+        return ("Bad Method", 405)
+
+    # check if SAFEMODE is enabled, read-mostly mode implies it
+    if (request.method in ("DELETE", "PUT", "POST", "COPY", "MOVE")) and (
+        SAFEMODE or READ_MOSTLY_MODE
+    ):
+        log.info(
+            "safemode is enabled, DELETE, PUT, POST, COPY and MOVE methods are not usable"
+        )
         return ("EOSS Safemode Enabled", 525)
 
     # HTTP methods usage
@@ -50,6 +130,9 @@ def process_object(object_filename):
     # HEAD: check if object exists
     # DELETE: delete object
     # PUT: upload object
+    # POST: append data to object
+    # COPY: copy object into destination object inside storage
+    # MOVE: rename object into destination object inside storage
 
     # get object version information
     if "X-EOSS-Object-Version" in request.headers:
@@ -59,11 +142,12 @@ def process_object(object_filename):
 
     # initialize object client
     eoss_object_client = object_client.ObjectClient(
-        object_filename, object_version=object_version
+        object_filename, object_version=object_version, read_only=READ_MOSTLY_MODE
     )
     log.info(
         f"object_filename: {object_filename} object_version: {object_version} object_name: {eoss_object_client.object_name}"
     )
+    profiling.set_request_info(object_name=eoss_object_client.object_name)
 
     try:
         eoss_object_client.init_mds()
@@ -99,7 +183,16 @@ def process_object(object_filename):
         eoss_object_client.close_mds()
 
         if object_exists_flag is True:
-            return ("Object Exists", 200)
+            object_headers = {}
+            if eoss_object_client.object_size is not None:
+                object_headers["X-EOSS-Object-Size"] = str(eoss_object_client.object_size)
+            if eoss_object_client.object_digest is not None:
+                object_headers["X-EOSS-Object-Digest"] = eoss_object_client.object_digest
+            if eoss_object_client.object_expires is not None:
+                object_headers["X-EOSS-Object-Expires"] = str(
+                    eoss_object_client.object_expires
+                )
+            return ("Object Exists", 200, object_headers)
         if object_exists_flag is False:
             return ("Object Does Not Exist", 404)
         if object_exists_flag == 1:
@@ -123,11 +216,22 @@ def process_object(object_filename):
             # download object
             try:
                 eoss_object_client.remove_lock()
-                return send_file(
-                    os.path.join(STORAGE_PATH, eoss_object_client.object_name),
-                    as_attachment=True,
-                    download_name=object_filename,
-                )
+                (
+                    object_path,
+                    object_compression,
+                ) = eoss_object_client.get_object_source()
+                if object_path is not None and object_compression is None:
+                    return send_file(
+                        object_path,
+                        as_attachment=True,
+                        download_name=object_filename,
+                    )
+                else:
+                    return send_file(
+                        eoss_object_client.open_object(),
+                        as_attachment=True,
+                        download_name=object_filename,
+                    )
             except Exception as e:
                 log.error(
                     f"failed to download object {object_filename} - object_name: {eoss_object_client.object_name}: {e}"
@@ -197,8 +301,255 @@ def process_object(object_filename):
             if object_exists_flag == 3:
                 return ("Object MDS Closed Not In Local", 524)
 
+    # POST method
+    if request.method == "POST":
+        # get expected object size before append
+        expected_offset = request.headers.get("X-EOSS-Append-Offset")
+        if expected_offset is not None:
+            try:
+                expected_offset = int(expected_offset)
+            except ValueError:
+                eoss_object_client.close_mds()
+                return ("Bad Append Offset", 400)
+
+        # set write lock
+        try:
+            eoss_object_client.set_write_lock()
+        except ObjectUnderLockException as e:
+            log.info(f"object {eoss_object_client.object_name} write lock bailed")
+            eoss_object_client.close_mds()
+            return ("Object Write Conflict", 409)
+
+        # object state may be changed before lock is set
+        try:
+            object_exists_flag = eoss_object_client.check_object_exists()
+        except (MDSExecuteException, EOSSInternalException) as e:
+            log.error(f"failed to acquire object {eoss_object_client.object_name} state: {e}")
+            eoss_object_client.close_mds()
+            eoss_object_client.remove_lock()
+            return ("MDS Execution Failure", 521)
+
+        if object_exists_flag is True:
+            if not eoss_object_client.is_appendable():
+                log.info(
+                    f"object {eoss_object_client.object_name} is not stored as a plain local file, append is not possible"
+                )
+                eoss_object_client.close_mds()
+                eoss_object_client.remove_lock()
+                return ("Object Not Appendable", 400)
+
+            quota_response = check_quota(eoss_object_client, len(request.data), 0)
+            if quota_response is not None:
+                eoss_object_client.close_mds()
+                eoss_object_client.remove_lock()
+                return quota_response
+
+            # append data
+            try:
+                object_size = eoss_object_client.append_object(
+                    request.data, expected_offset
+                )
+            except ObjectPreconditionException as e:
+                eoss_object_client.close_mds()
+                eoss_object_client.remove_lock()
+                return (
+                    "Object Append Offset Mismatch",
+                    412,
+                    {"X-EOSS-Object-Size": str(eoss_object_client.object_size)},
+                )
+            except EOSSInternalException as e:
+                log.error(
+                    f"failed to append data to object {eoss_object_client.object_name}: {e}"
+                )
+                eoss_object_client.close_mds()
+                eoss_object_client.remove_lock()
+                return ("EOSS Internal Exception Failure", 523)
+            except MDSExecuteException as e:
+                log.error(
+                    f"failed to update object {eoss_object_client.object_name} after append: {e}"
+                )
+                eoss_object_client.close_mds()
+                eoss_object_client.remove_lock()
+                return ("MDS Execution Failure", 521)
+            except MDSCommitException as e:
+                log.error(
+                    f"failed to commit append on object {eoss_object_client.object_name}: {e}"
+                )
+                eoss_object_client.close_mds()
+                eoss_object_client.remove_lock()
+                return ("MDS Commit Failure", 522)
+
+            eoss_object_client.close_mds()
+            eoss_object_client.remove_lock()
+            log.info(f"data appended to object {eoss_object_client.object_name}")
+
+            return ("Object Appended", 200, {"X-EOSS-Object-Size": str(object_size)})
+        else:
+            eoss_object_client.close_mds()
+            eoss_object_client.remove_lock()
+
+            if object_exists_flag is False:
+                return ("Object Does Not Exist", 404)
+            if object_exists_flag == 1:
+                return ("Object Initialized Only", 440)
+            if object_exists_flag == 2:
+                return ("Object Saved Not Closed", 441)
+            if object_exists_flag == 3:
+                return ("Object MDS Closed Not In Local", 524)
+
+    # COPY and MOVE methods
+    if request.method in ("COPY", "MOVE"):
+        move = request.method == "MOVE"
+
+        # get destination object
+        destination_filename = request.headers.get("X-EOSS-Destination")
+        if not destination_filename:
+            eoss_object_client.close_mds()
+            return ("Bad Destination", 400)
+
+        destination_client = object_client.ObjectClient(
+            destination_filename,
+            object_version=request.headers.get("X-EOSS-Destination-Version"),
+        )
+        if destination_client.object_name == eoss_object_client.object_name:
+            eoss_object_client.close_mds()
+            return ("Bad Destination", 400)
+
+        try:
+            destination_client.init_mds()
+        except MDSConnectException as e:
+            log.error(f"failed to connect to metadata database: {str(e)}")
+            eoss_object_client.close_mds()
+            return ("MDS Connection Failure", 520)
+
+        locked_clients = []
+
+        def release_objects():
+            for client in locked_clients:
+                client.remove_lock()
+            eoss_object_client.close_mds()
+            destination_client.close_mds()
+
+        # set locks of both objects in object name order, source is only read by COPY
+        for client in sorted(
+            (eoss_object_client, destination_client), key=lambda c: c.object_name
+        ):
+            try:
+                if client is eoss_object_client and not move:
+                    client.set_read_lock()
+                else:
+                    client.set_write_lock()
+            except ObjectUnderLockException as e:
+                log.info(f"object {client.object_name} lock bailed")
+                release_objects()
+                return ("Object Write Conflict", 409)
+            locked_clients.append(client)
+
+        # object states may be changed before locks are set
+        try:
+            object_exists_flag = eoss_object_client.check_object_exists()
+            destination_exists_flag = destination_client.check_object_exists()
+        except (MDSExecuteException, EOSSInternalException) as e:
+            log.error(
+                f"failed to acquire object {eoss_object_client.object_name} and {destination_client.object_name} states: {e}"
+            )
+            release_objects()
+            return ("MDS Execution Failure", 521)
+
+        if object_exists_flag is not True:
+            release_objects()
+
+            if object_exists_flag is False:
+                return ("Object Does Not Exist", 404)
+            if object_exists_flag == 1:
+                return ("Object Initialized Only", 440)
+            if object_exists_flag == 2:
+                return ("Object Saved Not Closed", 441)
+            if object_exists_flag == 3:
+                return ("Object MDS Closed Not In Local", 524)
+
+        # object served from replica has no local file to copy
+        if eoss_object_client.object_replica is not None:
+            release_objects()
+            return ("Object MDS Closed Not In Local", 524)
+
+        if destination_exists_flag not in (True, False):
+            release_objects()
+
+            if destination_exists_flag == 1:
+                return ("Destination Object Initialized Only", 440)
+            if destination_exists_flag == 2:
+                return ("Destination Object Saved Not Closed", 441)
+            if destination_exists_flag == 3:
+                return ("Destination Object MDS Closed Not In Local", 524)
+
+        # initialize destination object metadata
+        try:
+            destination_client.set_object_copy_data(eoss_object_client)
+        except MDSExecuteException as e:
+            release_objects()
+            return ("MDS Execution Failure", 521)
+        except MDSCommitException as e:
+            release_objects()
+            return ("MDS Commit Failure", 522)
+
+        # place destination object files and commit metadata of both objects
+        try:
+            placement_mode = destination_client.copy_from(eoss_object_client, move)
+        except Exception as e:
+            log.error(
+                f"failed to {request.method} object {eoss_object_client.object_name} into {destination_client.object_name}: {e}"
+            )
+            rollback_flag = destination_client.rollback()
+            release_objects()
+
+            if rollback_flag:
+                return ("EOSS Rollback Done", 526)
+            else:
+                return ("EOSS Rollback Failed", 527)
+
+        release_objects()
+        log.info(
+            f"object {eoss_object_client.object_name} {request.method} into {destination_client.object_name} done by {placement_mode}"
+        )
+
+        if move:
+            return ("Object Moved", 201)
+        else:
+            return ("Object Copied", 201)
+
     # PUT method
     if request.method == "PUT":
+        # choose durability mode of object data, deduplication is preferred to erasure coding
+        try:
+            object_layout = dedup.choose_layout(
+                eoss_object_client.object_name,
+                request.headers.get("X-EOSS-Durability"),
+                request.content_length,
+            )
+            if object_layout is None:
+                object_layout = erasure.choose_layout(
+                    eoss_object_client.object_name,
+                    request.headers.get("X-EOSS-Durability"),
+                    request.content_length,
+                )
+        except EOSSInternalException as e:
+            log.warning(
+                f"unable to store object {eoss_object_client.object_name} in requested durability mode: {e}"
+            )
+            eoss_object_client.close_mds()
+            return ("Bad Durability Mode", 400)
+
+        # get object expiry timestamp
+        object_expires = request.headers.get("X-EOSS-Expires")
+        if object_expires is not None:
+            try:
+                object_expires = expiry.parse_expires(object_expires)
+            except ValueError as e:
+                log.warning(f"invalid X-EOSS-Expires header {object_expires}: {e}")
+                eoss_object_client.close_mds()
+                return ("Bad Expires", 400)
+
         # set write lock
         try:
             eoss_object_client.set_write_lock()
@@ -207,12 +558,29 @@ def process_object(object_filename):
             return ("Object Write Conflict", 409)
 
         if object_exists_flag is True or object_exists_flag is False:
+            # check quotas of accounting prefixes, overridden closed object is not counted any more
+            quota_response = check_quota(
+                eoss_object_client,
+                request.content_length
+                if request.content_length is not None
+                else len(request.data),
+            )
+            if quota_response is not None:
+                eoss_object_client.close_mds()
+                eoss_object_client.remove_lock()
+                return quota_response
+
             # initialize object metadata
+            # expired object is not removed yet, its record is overridden
             try:
-                if object_exists_flag is True:
-                    eoss_object_client.set_object_init_data(override=True)
+                if object_exists_flag is True or eoss_object_client.is_expired():
+                    eoss_object_client.set_object_init_data(
+                        override=True, layout=object_layout, expires=object_expires
+                    )
                 else:
-                    eoss_object_client.set_object_init_data()
+                    eoss_object_client.set_object_init_data(
+                        layout=object_layout, expires=object_expires
+                    )
             except MDSExecuteException as e:
                 log.error(
                     f"failed to set initial object data for object {eoss_object_client.object_name}"
@@ -249,16 +617,31 @@ def process_object(object_filename):
                 log.info(f"object {eoss_object_client.object_name} state initialized")
 
             # write data to temp file
+            # large object is streamed into a preallocated temp file instead of being buffered in memory
+            # deduplicated object is split into chunks while it's received, only new chunks are written
+            object_size = None
             try:
-                with open(
-                    os.path.join(
-                        STORAGE_PATH, eoss_object_client.object_name + ".temp"
-                    ),
-                    "wb",
-                ) as f:
-                    f.write(request.data)
-                    f.flush()
-                    os.fsync(f.fileno())
+                if dedup.is_dedup(object_layout):
+                    object_size, object_digest = dedup.write_object(
+                        eoss_object_client.mds_client,
+                        eoss_object_client.object_name,
+                        request.stream
+                        if request.content_length is not None
+                        else io.BytesIO(request.data),
+                    )
+                elif writer.is_large_object(request.content_length):
+                    object_digest = writer.write_stream(
+                        request.stream,
+                        eoss_object_client.object_temp_path,
+                        request.content_length,
+                    )
+                else:
+                    with open(eoss_object_client.object_temp_path, "wb") as f:
+                        f.write(request.data)
+                        f.flush()
+                        os.fsync(f.fileno())
+                    object_digest = hashlib.sha256(request.data).hexdigest()
+                faults.inject("put.state1")
             except Exception as e:
                 log.error(
                     f"failed to write object data to {eoss_object_client.object_name} temp file: {e}"
@@ -297,13 +680,23 @@ def process_object(object_filename):
                 )
 
             # rename temp file to final object name
+            # erasure coded object is split into stripe files and temp file is removed
+            # deduplicated object has no temp file
             try:
-                os.rename(
-                    os.path.join(
-                        STORAGE_PATH, eoss_object_client.object_name + ".temp"
-                    ),
-                    os.path.join(STORAGE_PATH, eoss_object_client.object_name),
-                )
+                faults.inject("put.state2")
+                if object_layout is None:
+                    os.rename(
+                        eoss_object_client.object_temp_path,
+                        eoss_object_client.object_path,
+                    )
+                elif not dedup.is_dedup(object_layout):
+                    object_size = erasure.encode_file(
+                        eoss_object_client.object_temp_path,
+                        eoss_object_client.object_name,
+                        object_layout,
+                    )
+                    os.unlink(eoss_object_client.object_temp_path)
+                faults.inject("put.renamed")
             except Exception as e:
                 log.error(
                     f"failed to rename temp file to final file for object {eoss_object_client.object_name}: {e}"
@@ -321,8 +714,11 @@ def process_object(object_filename):
                     f"renamed temp file to final file for object {eoss_object_client.object_name}"
                 )
 
+            # remove overridden object file left in other storage tier
+            eoss_object_client.remove_stale_object_files()
+
             # set up object size
-            eoss_object_client.set_object_size()
+            eoss_object_client.set_object_size(object_size, object_digest)
             log.info(f"set size for object {eoss_object_client.object_name}")
 
             # set up latest update timestamp
@@ -331,7 +727,8 @@ def process_object(object_filename):
 
             # state 0 phase
             try:
-                eoss_object_client.set_object_state(0)
+                faults.inject("put.state0")
+                eoss_object_client.set_object_state(0, operation="PUT")
             except Exception as e:
                 log.error(
                     f"failed to set object state 0 for object {eoss_object_client.object_name}: {e}"
@@ -368,77 +765,320 @@ def get_eoss_object_stats():
     if request.method != "GET":
         return ("Bad Method", 405)
 
-    output = {}
-    mds = mds_client.MDSClient()
+    def query_stats(mds):
+        # get total number of objects and total storage usage
+        # unit: byte
+        total_number_objects, total_storage_usage = mds.execute(
+            f"SELECT COUNT(id), SUM(size) FROM {METADATA_DB_TABLE}"
+        ).fetchall()[0]
 
+        # get youngest and oldest timestamps for objects
+        mds_output = mds.execute(
+            f"SELECT DISTINCT MIN(timestamp) FROM {METADATA_DB_TABLE} UNION ALL SELECT DISTINCT MAX(timestamp) FROM {METADATA_DB_TABLE}"
+        ).fetchall()
+        youngest_object_updated_timestamp = mds_output[0][0]
+        oldest_object_updated_timestamp = mds_output[1][0]
+
+        # get object state stats
+        mds_output = mds.execute(
+            f"SELECT COUNT(state) FROM {METADATA_DB_TABLE} WHERE STATE = 0 UNION ALL SELECT COUNT(state) FROM {METADATA_DB_TABLE} WHERE STATE = 1 UNION ALL SELECT COUNT(state) FROM {METADATA_DB_TABLE} WHERE STATE = 2"
+        ).fetchall()
+
+        return {
+            "total_number_objects": total_number_objects,
+            "total_storage_usage": total_storage_usage or 0,
+            "youngest_object_updated_timestamp": youngest_object_updated_timestamp,
+            "oldest_object_updated_timestamp": oldest_object_updated_timestamp,
+            "number_object_uploaded": mds_output[0][0],
+            "number_object_upload_init": mds_output[1][0],
+            "number_object_saved_in_temp_name": mds_output[2][0],
+            "replication_stats": replication.get_replication_stats(mds),
+            "number_object_expired": expiry.count_expired_objects(mds),
+        }
+
+    # all MDS shards are queried in parallel and merged
     try:
-        mds.connect()
+        shard_stats = mds_client.map_shards(query_stats)
     except MDSConnectException as e:
         log.error(f"failed to connect to metadata database: {e}")
         return ("MDS Connection Failure", 520)
+    except MDSExecuteException as e:
+        log.error(f"failed to execute SQL query: {e}")
+        return ("MDS Execution Failure", 520)
+
+    output = {}
+
+    for key in (
+        "total_number_objects",
+        "total_storage_usage",
+        "number_object_uploaded",
+        "number_object_upload_init",
+        "number_object_saved_in_temp_name",
+        "number_object_expired",
+    ):
+        output[key] = sum(stats[key] for stats in shard_stats)
+
+    timestamps = [
+        stats["youngest_object_updated_timestamp"]
+        for stats in shard_stats
+        if stats["youngest_object_updated_timestamp"] is not None
+    ]
+    output["youngest_object_updated_timestamp"] = min(timestamps, default=None)
+
+    timestamps = [
+        stats["oldest_object_updated_timestamp"]
+        for stats in shard_stats
+        if stats["oldest_object_updated_timestamp"] is not None
+    ]
+    output["oldest_object_updated_timestamp"] = max(timestamps, default=None)
+
+    # get replication stats
+    output["replication_queue_length"] = sum(
+        stats["replication_stats"][0] for stats in shard_stats
+    )
+    output["replication_lag"] = max(stats["replication_stats"][1] for stats in shard_stats)
+
+    return (jsonify(output), 200)
+
+
+@app.route("/eoss/v1/usage", methods=["GET"])
+def get_eoss_usage():
+    if request.method != "GET":
+        return ("Bad Method", 405)
+
+    prefix = request.args.get("prefix")
 
-    mds.cursor()
+    if prefix is not None and prefix not in USAGE_PREFIXES:
+        return ("Prefix Not Accounted", 404)
 
-    # get total number of objects
+    # usage rows are maintained by MDS triggers, only one row per prefix is read from each MDS shard
     try:
-        mds_output = mds.execute(
-            f"SELECT COUNT(id) FROM {METADATA_DB_TABLE}"
-        ).fetchall()
+        prefix_usage = usage.get_usage(None if prefix is None else [prefix])
+    except MDSConnectException as e:
+        log.error(f"failed to connect to metadata database: {e}")
+        return ("MDS Connection Failure", 520)
     except MDSExecuteException as e:
         log.error(f"failed to execute SQL query: {e}")
-        return ("MDS Execution Failure", 520)
-    else:
-        total_number_objects = mds_output[0][0]
-        output["total_number_objects"] = total_number_objects
+        return ("MDS Execution Failure", 521)
+
+    output = {
+        prefix: {"objects": objects, "bytes": size, "quota": USAGE_PREFIXES[prefix]}
+        for prefix, (objects, size) in prefix_usage.items()
+    }
+
+    return (jsonify(output), 200)
+
+
+@app.route("/eoss/v1/changes", methods=["GET"])
+def get_eoss_changes():
+    if request.method != "GET":
+        return ("Bad Method", 405)
 
-    # get total storage usage
-    # unit: byte
     try:
-        mds_output = mds.execute(
-            f"SELECT SUM(size) FROM {METADATA_DB_TABLE}"
-        ).fetchall()
+        limit = int(request.args.get("limit", CHANGES_PAGE_SIZE))
+        wait = float(request.args.get("wait", 0))
+    except ValueError:
+        return ("Bad Changes Parameters", 400)
+
+    if limit <= 0 or wait < 0:
+        return ("Bad Changes Parameters", 400)
+    limit = min(limit, CHANGES_PAGE_SIZE_MAX)
+    batch_size = min(limit, CHANGES_BATCH_SIZE)
+
+    since = request.args.get("since")
+
+    try:
+        # without cursor, consumer starts from the current end of changelog
+        if since is None:
+            tails = mds_client.map_shards(changelog.get_tail)
+            return (
+                app.response_class(
+                    changelog.stream_changes([[] for tail in tails], tails, 0, batch_size),
+                    mimetype="application/x-ndjson",
+                ),
+                200,
+            )
+
+        try:
+            since = changelog.parse_cursor(since)
+        except ValueError:
+            return ("Bad Cursor", 400)
+
+        # long polling: MDS shard files are watched until a change is committed or wait time is over
+        deadline = time.time() + min(wait, CHANGES_WAIT_MAX)
+
+        while True:
+            signatures = changelog.get_signatures(mds_client.get_shards())
+            first_changes = mds_client.map_shards(
+                lambda mds: changelog.read_first_changes(mds, since[mds.shard], batch_size)
+            )
+
+            if any(first_changes) or not changelog.wait_for_changes(signatures, deadline):
+                break
+    except ChangelogCursorException as e:
+        log.info(f"changes cursor {request.args.get('since')} is expired: {e}")
+        return ("Cursor Expired", 410)
+    except MDSConnectException as e:
+        log.error(f"failed to connect to metadata database: {e}")
+        return ("MDS Connection Failure", 520)
     except MDSExecuteException as e:
         log.error(f"failed to execute SQL query: {e}")
-        return ("MDS Execution Failure", 520)
+        return ("MDS Execution Failure", 521)
+
+    return (
+        app.response_class(
+            changelog.stream_changes(first_changes, since, limit, batch_size),
+            mimetype="application/x-ndjson",
+        ),
+        200,
+    )
+
+
+@app.route("/eoss/v1/profile", methods=["POST"])
+def profile_workers():
+    if request.method != "POST":
+        return ("Bad Method", 405)
+
+    # profiler is only available to administrators holding PROFILER_TOKEN
+    token = request.headers.get("X-EOSS-Admin-Token", "")
+    if PROFILER_TOKEN is None or not hmac.compare_digest(
+        token.encode(), str(PROFILER_TOKEN).encode()
+    ):
+        log.warning(f"profiling request from {request.remote_addr} is rejected")
+        return ("Forbidden", 403)
+
+    try:
+        seconds = float(request.args.get("seconds", 10))
+        interval = float(request.args.get("interval", PROFILER_INTERVAL))
+    except ValueError:
+        return ("Bad Profiling Parameters", 400)
+
+    mode = request.args.get("mode", "cpu")
+    scope = request.args.get("scope", "worker")
+
+    if (
+        not 0 < seconds <= PROFILER_MAX_DURATION
+        or interval <= 0
+        or mode not in profiling.PROFILE_MODES
+        or scope not in ("worker", "all")
+    ):
+        return ("Bad Profiling Parameters", 400)
+
+    if scope == "all":
+        try:
+            counts, workers = profiling.profile_workers(seconds, mode, interval)
+        except OSError as e:
+            log.error(f"failed to run profiling session: {e}")
+            return ("EOSS Internal Exception Failure", 523)
     else:
-        total_storage_usage = mds_output[0][0]
+        counts = profiling.profile(seconds, mode, interval)
+        workers = 1
+
+        if counts is None:
+            return ("Profiler Busy", 409)
+
+    log.info(f"{mode} profile of {workers} workers taken in {seconds} seconds")
+
+    return (
+        profiling.dump_folded(counts),
+        200,
+        {"Content-Type": "text/plain", "X-EOSS-Profiled-Workers": str(workers)},
+    )
+
 
-        if total_storage_usage is None:
-            total_storage_usage = 0
+@app.route("/eoss/v1/list", methods=["GET"])
+def list_objects():
+    if request.method != "GET":
+        return ("Bad Method", 405)
 
-        output["total_storage_usage"] = total_storage_usage
+    prefix = request.args.get("prefix", "")
+    after = request.args.get("after", "")
 
-    # get youngest and oldest timestamps for objects
     try:
-        mds_output = mds.execute(
-            f"SELECT DISTINCT MIN(timestamp) FROM {METADATA_DB_TABLE} UNION ALL SELECT DISTINCT MAX(timestamp) FROM {METADATA_DB_TABLE}"
-        ).fetchall()
-    except MDSExecuteException as e:
-        log.error(f"failed to execute SQL query: {e}")
-        return ("MDS Execution Failure", 520)
+        limit = int(request.args.get("limit", LIST_PAGE_SIZE))
+    except ValueError:
+        return ("Bad Limit", 400)
+
+    if limit <= 0:
+        return ("Bad Limit", 400)
+    limit = min(limit, LIST_PAGE_SIZE_MAX)
+
+    # object filenames of a prefix are in range [prefix, prefix with last character incremented)
+    # expired objects are hidden
+    sql_conditions = [
+        "version IS ?",
+        "state IN (0, 4)",
+        "(expires IS NULL OR expires > ?)",
+    ]
+    sql_parameters = [request.headers.get("X-EOSS-Object-Version"), int(time.time())]
+    if after and after >= prefix:
+        sql_conditions.append("filename > ?")
+        sql_parameters.append(after)
     else:
-        youngest_object_updated_timestamp = mds_output[0][0]
-        oldest_object_updated_timestamp = mds_output[1][0]
-        output["youngest_object_updated_timestamp"] = youngest_object_updated_timestamp
-        output["oldest_object_updated_timestamp"] = oldest_object_updated_timestamp
+        sql_conditions.append("filename >= ?")
+        sql_parameters.append(prefix)
+    if prefix:
+        sql_conditions.append("filename < ?")
+        sql_parameters.append(prefix[:-1] + chr(ord(prefix[-1]) + 1))
 
-    # get object state stats
+    # each MDS shard returns its first page in parallel, pages are merged by filename
     try:
-        mds_output = mds.execute(
-            f"SELECT COUNT(state) FROM {METADATA_DB_TABLE} WHERE STATE = 0 UNION ALL SELECT COUNT(state) FROM {METADATA_DB_TABLE} WHERE STATE = 1 UNION ALL SELECT COUNT(state) FROM {METADATA_DB_TABLE} WHERE STATE = 2"
-        ).fetchall()
+        shard_output = mds_client.map_shards(
+            lambda mds: mds.execute(
+                f"SELECT filename, size, timestamp, digest FROM {METADATA_DB_TABLE} WHERE {' AND '.join(sql_conditions)} ORDER BY filename LIMIT ?",
+                tuple(sql_parameters) + (limit,),
+            ).fetchall()
+        )
+    except MDSConnectException as e:
+        log.error(f"failed to connect to metadata database: {e}")
+        return ("MDS Connection Failure", 520)
     except MDSExecuteException as e:
         log.error(f"failed to execute SQL query: {e}")
-        return ("MDS Execution Failure", 520)
-    else:
-        object_uploaded = mds_output[0][0]
-        object_uploading_init = mds_output[1][0]
-        object_saved_in_temp_name = mds_output[2][0]
-        output["number_object_uploaded"] = object_uploaded
-        output["number_object_upload_init"] = object_uploading_init
-        output["number_object_saved_in_temp_name"] = object_saved_in_temp_name
+        return ("MDS Execution Failure", 521)
+
+    mds_output = list(
+        itertools.islice(heapq.merge(*shard_output, key=lambda row: row[0]), limit)
+    )
 
-    mds.close()
+    output = {
+        "objects": [
+            {"filename": filename, "size": size, "timestamp": timestamp, "digest": digest}
+            for filename, size, timestamp, digest in mds_output
+        ],
+        "next": mds_output[-1][0] if len(mds_output) == limit else None,
+    }
+
+    return (jsonify(output), 200)
+
+
+@app.route("/eoss/v1/query", methods=["GET"])
+def query_objects():
+    if request.method != "GET":
+        return ("Bad Method", 405)
+
+    try:
+        limit = int(request.args.get("limit", QUERY_PAGE_SIZE))
+    except ValueError:
+        return ("Bad Limit", 400)
+
+    if limit <= 0:
+        return ("Bad Limit", 400)
+    limit = min(limit, QUERY_PAGE_SIZE_MAX)
+
+    # each page reads an index in order and examines a bounded number of records in each MDS shard
+    try:
+        output = query.query_objects(
+            request.args.getlist("filter"), request.args.get("cursor"), limit
+        )
+    except ValueError as e:
+        log.info(f"bad query {request.query_string}: {e}")
+        return ("Bad Query", 400)
+    except MDSConnectException as e:
+        log.error(f"failed to connect to metadata database: {e}")
+        return ("MDS Connection Failure", 520)
+    except MDSExecuteException as e:
+        log.error(f"failed to execute SQL query: {e}")
+        return ("MDS Execution Failure", 521)
 
     return (jsonify(output), 200)
 
@@ -446,6 +1086,38 @@ def get_eoss_object_stats():
 @app.before_request
 def before_request():
     g.start = time.time()
+    g.admission_ticket = None
+    profiling.begin_request(request.method, request.path, g.start)
+
+    if admission_controller is None:
+        return None
+
+    # per-client rate limit
+    retry_after = admission_controller.check_client(request.remote_addr)
+    if retry_after:
+        log.warning(f"client {request.remote_addr} exceeds rate limit, request rejected")
+        return ("Too Many Requests", 429, {"Retry-After": str(int(retry_after) + 1)})
+
+    # wait in queue for a free slot of request class, time waited in front proxy is counted
+    request_class = admission.get_request_class(request.method, request.path)
+    queue_start = admission.get_queue_start(
+        request.headers.get("X-Request-Start"), g.start
+    )
+    with profiling.timed("admission"):
+        ticket = admission_controller.admit(request_class, queue_start)
+
+    if ticket is False:
+        log.warning(
+            f"{request_class} request {request.method} {request.path} is shed after waiting {time.time() - queue_start:.3f} seconds"
+        )
+        return (
+            "EOSS Overloaded",
+            503,
+            {"Retry-After": str(ADMISSION_RETRY_AFTER)},
+        )
+
+    g.admission_ticket = ticket
+    return None
 
 
 @app.after_request
@@ -463,9 +1135,42 @@ def after_request(response):
         f"{request_id} {latency} {request.remote_addr} {request.method} {request.path} {response.status_code} {request.user_agent}"
     )
 
+    # log context of slow request
+    context = profiling.end_request()
+    if context is not None:
+        profiling.log_slow_request(
+            context,
+            request_id,
+            response.status_code,
+            request.content_length or response.content_length,
+        )
+
+    # admission slot is held until response body is fully sent
+    ticket = g.get("admission_ticket")
+    if ticket is not None:
+        g.admission_ticket = None
+        release = lambda: admission_controller.release(ticket)
+        if response.direct_passthrough:
+            # file download is passed to WSGI server as is without response close callbacks,
+            # so the slot is released when WSGI server closes the file
+            response.response = ClosingIterator(response.response, release)
+        else:
+            response.call_on_close(release)
+
     return response
 
 
+@app.teardown_request
+def teardown_request(exception):
+    profiling.end_request()
+
+    # release admission slot if response is not built
+    ticket = g.get("admission_ticket")
+    if ticket is not None:
+        g.admission_ticket = None
+        admission_controller.release(ticket)
+
+
 @app.errorhandler(Exception)
 def internal_error(exception):
     if hasattr(exception, "description"):
@@ -487,3 +1192,7 @@ def internal_error(exception):
 @app.errorhandler(404)
 def return_403(error):
     return ("", 403)
+
+
+# preload in uWSGI master and warm up each forked worker
+startup.register(app)
@@ -1,4 +1,6 @@
-import yaml
+import marshal
+import os
+import sys
 
 __version__ = "0.0.4"
 
@@ -10,6 +12,8 @@ def read_config(config_file):
     config = {}
 
     try:
+        import yaml
+
         with open(config_file, "rt") as f:
             config = yaml.load(f, Loader=yaml.FullLoader)
     except:
@@ -18,17 +22,136 @@ def read_config(config_file):
     return config
 
 
-config_file_path = "/home/ericlee/Projects/git/eoss/config/eoss.yaml"
+def read_cached_config(config_file, cache_file):
+    """
+    read configuration file from its pre-parsed cache, so a worker starts without importing and running YAML parser
+    cache is keyed by path, modification time and size of configuration file and Python version,
+    a stale or broken cache is rebuilt by read_config(), cache is skipped if it can't be written
+    """
+    if not cache_file:
+        return read_config(config_file)
+
+    try:
+        stat = os.stat(config_file)
+        key = (os.path.abspath(config_file), stat.st_mtime_ns, stat.st_size, sys.version)
+    except OSError:
+        return read_config(config_file)
+
+    try:
+        with open(cache_file, "rb") as f:
+            cached_key, config = marshal.load(f)
+        if cached_key == key:
+            return config
+    except (OSError, EOFError, ValueError, TypeError):
+        pass
+
+    config = read_config(config_file)
+
+    try:
+        data = marshal.dumps((key, config))
+        temp_cache_file = f"{cache_file}.{os.getpid()}"
+        with open(temp_cache_file, "wb") as f:
+            f.write(data)
+        os.replace(temp_cache_file, cache_file)
+    except (OSError, ValueError):
+        pass
+
+    return config
+
+
+# EOSS_CONFIG environment variable overrides configuration file, e.g. for an isolated test instance
+config_file_path = os.environ.get(
+    "EOSS_CONFIG", "/home/ericlee/Projects/git/eoss/config/eoss.yaml"
+)
+
+# EOSS_CONFIG_CACHE environment variable overrides pre-parsed configuration cache, set it empty to disable cache
+config_cache_path = os.environ.get("EOSS_CONFIG_CACHE", f"{config_file_path}.cache")
 
-SETTINGS = read_config(config_file_path)
+SETTINGS = read_cached_config(config_file_path, config_cache_path)
 
 # populate eoss settings
 VERSION_SALT = SETTINGS.get("VERSION_SALT", "snoopy")
 STORAGE_PATH = SETTINGS.get("STORAGE_PATH", "/tmp")
 METADATA_DB_PATH = SETTINGS.get("METADATA_DB_PATH", "/tmp/mds.sql")
 METADATA_DB_TABLE = SETTINGS.get("METADATA_DB_TABLE", "metadata")
+METADATA_DB_SHARDS = SETTINGS.get("METADATA_DB_SHARDS", 1)
+METADATA_DB_BACKEND = SETTINGS.get("METADATA_DB_BACKEND", "sqlite")
+MDS_CONNECTION_POOL_SIZE = SETTINGS.get("MDS_CONNECTION_POOL_SIZE", 4)
+METADATA_JOURNAL_COMPACT_SIZE = SETTINGS.get("METADATA_JOURNAL_COMPACT_SIZE", 67108864)
+METADATA_JOURNAL_SYNC = SETTINGS.get("METADATA_JOURNAL_SYNC", True)
 LOGGING_PATH = SETTINGS.get("LOGGING_PATH", "/tmp")
 OBJECT_LOCK_PATH = SETTINGS.get("OBJECT_LOCK_PATH", "/tmp")
 LOG_BACKUP_COUNT = SETTINGS.get("LOG_BACKUP_COUNT", 10)
 LOG_MAX_BYTES = SETTINGS.get("LOG_MAX_BYTES", 1073741824)
 SAFEMODE = SETTINGS.get("SAFEMODE", False)
+READ_MOSTLY_MODE = SETTINGS.get("READ_MOSTLY_MODE", False)
+READ_MOSTLY_CHECK_INTERVAL = SETTINGS.get("READ_MOSTLY_CHECK_INTERVAL", 10)
+COLD_STORAGE_PATH = SETTINGS.get("COLD_STORAGE_PATH", None)
+TIER_MIGRATION_AGE = SETTINGS.get("TIER_MIGRATION_AGE", 604800)
+TIER_MIGRATION_COMPRESS = SETTINGS.get("TIER_MIGRATION_COMPRESS", False)
+TIER_MIGRATION_RATE = SETTINGS.get("TIER_MIGRATION_RATE", 52428800)
+TIER_MIGRATION_INTERVAL = SETTINGS.get("TIER_MIGRATION_INTERVAL", 3600)
+TIER_MIGRATION_BATCH_SIZE = SETTINGS.get("TIER_MIGRATION_BATCH_SIZE", 1000)
+MIRROR_STORAGE_PATHS = SETTINGS.get("MIRROR_STORAGE_PATHS", [])
+REPLICATION_WORKERS = SETTINGS.get("REPLICATION_WORKERS", 4)
+REPLICATION_BATCH_SIZE = SETTINGS.get("REPLICATION_BATCH_SIZE", 1000)
+REPLICATION_INTERVAL = SETTINGS.get("REPLICATION_INTERVAL", 1)
+REPLICATION_READ_FALLBACK = SETTINGS.get("REPLICATION_READ_FALLBACK", True)
+SNAPSHOT_WORKERS = SETTINGS.get("SNAPSHOT_WORKERS", 4)
+SNAPSHOT_PREFETCH_SIZE = SETTINGS.get("SNAPSHOT_PREFETCH_SIZE", 8388608)
+BULK_IMPORT_WORKERS = SETTINGS.get("BULK_IMPORT_WORKERS", 8)
+BULK_IMPORT_BATCH_SIZE = SETTINGS.get("BULK_IMPORT_BATCH_SIZE", 500)
+STORAGE_PATHS = SETTINGS.get("STORAGE_PATHS", [STORAGE_PATH])
+REBALANCE_RATE = SETTINGS.get("REBALANCE_RATE", 52428800)
+REBALANCE_INTERVAL = SETTINGS.get("REBALANCE_INTERVAL", 600)
+REBALANCE_BATCH_SIZE = SETTINGS.get("REBALANCE_BATCH_SIZE", 1000)
+ERASURE_CODING_DATA_STRIPES = SETTINGS.get("ERASURE_CODING_DATA_STRIPES", 4)
+ERASURE_CODING_PARITY_STRIPES = SETTINGS.get("ERASURE_CODING_PARITY_STRIPES", 2)
+ERASURE_CODING_UNIT_SIZE = SETTINGS.get("ERASURE_CODING_UNIT_SIZE", 1048576)
+ERASURE_CODING_MIN_SIZE = SETTINGS.get("ERASURE_CODING_MIN_SIZE", None)
+ERASURE_REPAIR_WORKERS = SETTINGS.get("ERASURE_REPAIR_WORKERS", 4)
+ADMISSION_CONTROL = SETTINGS.get("ADMISSION_CONTROL", False)
+ADMISSION_LIMITS = SETTINGS.get(
+    "ADMISSION_LIMITS", {"get": 6, "put": 4, "metadata": 8}
+)
+ADMISSION_QUEUE_TIMEOUT = SETTINGS.get("ADMISSION_QUEUE_TIMEOUT", 1)
+ADMISSION_RETRY_AFTER = SETTINGS.get("ADMISSION_RETRY_AFTER", 1)
+ADMISSION_LOCK_PATH = SETTINGS.get(
+    "ADMISSION_LOCK_PATH", os.path.join(OBJECT_LOCK_PATH, "admission")
+)
+CLIENT_RATE_LIMIT = SETTINGS.get("CLIENT_RATE_LIMIT", None)
+CLIENT_RATE_BURST = SETTINGS.get("CLIENT_RATE_BURST", None)
+LIST_PAGE_SIZE = SETTINGS.get("LIST_PAGE_SIZE", 1000)
+LIST_PAGE_SIZE_MAX = SETTINGS.get("LIST_PAGE_SIZE_MAX", 10000)
+EXPIRY_BATCH_SIZE = SETTINGS.get("EXPIRY_BATCH_SIZE", 500)
+EXPIRY_RATE = SETTINGS.get("EXPIRY_RATE", 100)
+EXPIRY_INTERVAL = SETTINGS.get("EXPIRY_INTERVAL", 60)
+USAGE_PREFIXES = SETTINGS.get("USAGE_PREFIXES", {})
+SLOW_REQUEST_THRESHOLD = SETTINGS.get("SLOW_REQUEST_THRESHOLD", 1)
+SLOW_REQUEST_SAMPLES = SETTINGS.get("SLOW_REQUEST_SAMPLES", 50)
+PROFILER_TOKEN = SETTINGS.get("PROFILER_TOKEN", None)
+PROFILER_INTERVAL = SETTINGS.get("PROFILER_INTERVAL", 0.005)
+PROFILER_MAX_DURATION = SETTINGS.get("PROFILER_MAX_DURATION", 60)
+PROFILER_PATH = SETTINGS.get("PROFILER_PATH", os.path.join(OBJECT_LOCK_PATH, "profiler"))
+LARGE_OBJECT_THRESHOLD = SETTINGS.get("LARGE_OBJECT_THRESHOLD", 67108864)
+LARGE_OBJECT_BUFFER_SIZE = SETTINGS.get("LARGE_OBJECT_BUFFER_SIZE", 8388608)
+LARGE_OBJECT_SYNC_SIZE = SETTINGS.get("LARGE_OBJECT_SYNC_SIZE", 33554432)
+LARGE_OBJECT_DIRECT_SIZE = SETTINGS.get("LARGE_OBJECT_DIRECT_SIZE", None)
+FAULT_INJECTION_POINTS = SETTINGS.get("FAULT_INJECTION_POINTS", {})
+FAULT_INJECTION_MODE = SETTINGS.get("FAULT_INJECTION_MODE", "error")
+CHANGELOG_RETENTION = SETTINGS.get("CHANGELOG_RETENTION", 1000000)
+CHANGES_PAGE_SIZE = SETTINGS.get("CHANGES_PAGE_SIZE", 1000)
+CHANGES_PAGE_SIZE_MAX = SETTINGS.get("CHANGES_PAGE_SIZE_MAX", 10000)
+CHANGES_BATCH_SIZE = SETTINGS.get("CHANGES_BATCH_SIZE", 500)
+CHANGES_WAIT_MAX = SETTINGS.get("CHANGES_WAIT_MAX", 30)
+CHANGES_POLL_INTERVAL = SETTINGS.get("CHANGES_POLL_INTERVAL", 0.1)
+QUERY_PAGE_SIZE = SETTINGS.get("QUERY_PAGE_SIZE", 1000)
+QUERY_PAGE_SIZE_MAX = SETTINGS.get("QUERY_PAGE_SIZE_MAX", 10000)
+QUERY_SCAN_LIMIT = SETTINGS.get("QUERY_SCAN_LIMIT", 10000)
+DEDUP_MIN_SIZE = SETTINGS.get("DEDUP_MIN_SIZE", None)
+DEDUP_CHUNK_SIZE = SETTINGS.get("DEDUP_CHUNK_SIZE", 1048576)
+DEDUP_BATCH_SIZE = SETTINGS.get("DEDUP_BATCH_SIZE", 8)
+DEDUP_READ_AHEAD = SETTINGS.get("DEDUP_READ_AHEAD", 4)
+DEDUP_GC_BATCH_SIZE = SETTINGS.get("DEDUP_GC_BATCH_SIZE", 1000)
+STARTUP_PRELOAD_SIZE = SETTINGS.get("STARTUP_PRELOAD_SIZE", 268435456)
+STARTUP_WARM_UP = SETTINGS.get("STARTUP_WARM_UP", True)
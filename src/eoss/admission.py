@@ -0,0 +1,230 @@
+import collections
+import fcntl
+import os
+import random
+import time
+from . import ADMISSION_LIMITS
+from . import ADMISSION_LOCK_PATH
+from . import ADMISSION_QUEUE_TIMEOUT
+from . import CLIENT_RATE_BURST
+from . import CLIENT_RATE_LIMIT
+
+# request classes with separate concurrency limits
+REQUEST_CLASSES = ("get", "put", "metadata")
+
+# polling interval bounds while waiting for a free slot
+# unit: second
+MIN_POLL_INTERVAL = 0.002
+MAX_POLL_INTERVAL = 0.05
+
+# maximum number of clients tracked by token buckets per worker process
+MAX_TRACKED_CLIENTS = 10000
+
+
+def get_request_class(method, path):
+    """
+    return admission class of a request
+    object download and upload(including append and copy, which may fall back to copying data)
+    have their own classes, all other requests are metadata-only
+    """
+    if path.startswith("/eoss/v1/object/"):
+        if method == "GET":
+            return "get"
+        if method in ("PUT", "POST", "COPY", "MOVE"):
+            return "put"
+
+    return "metadata"
+
+
+def get_queue_start(header_value, default):
+    """
+    return the time a request entered the queue from a X-Request-Start header set by a front proxy
+    accepted formats are "t=<unix time>" and "<unix time>" in seconds, milliseconds or microseconds
+    """
+    if not header_value:
+        return default
+
+    header_value = header_value.strip()
+    if header_value.startswith("t="):
+        header_value = header_value[2:]
+
+    try:
+        value = float(header_value)
+    except ValueError:
+        return default
+
+    # normalize milliseconds and microseconds into seconds
+    while value > 1e11:
+        value /= 1000
+
+    # ignore clock skew of front proxy
+    return min(value, default)
+
+
+class SlotPool:
+    """
+    limit concurrent requests of a class across worker processes by flock on slot files
+    each slot file can be locked by one request at a time
+    """
+
+    def __init__(self, name, limit):
+        self.name = name
+        self.limit = limit
+        self.pid = None
+        self.slot_files = []
+
+    def open_slots(self):
+        # flock is shared by forked processes, so slot files are opened in each worker process
+        if self.pid == os.getpid():
+            return
+
+        os.makedirs(ADMISSION_LOCK_PATH, exist_ok=True)
+        self.slot_files = [
+            open(os.path.join(ADMISSION_LOCK_PATH, f"{self.name}.{index}.slot"), "ab")
+            for index in range(self.limit)
+        ]
+        self.pid = os.getpid()
+
+    def try_acquire(self):
+        offset = random.randrange(self.limit)
+
+        for index in range(self.limit):
+            slot = (offset + index) % self.limit
+            try:
+                fcntl.flock(self.slot_files[slot], fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                continue
+            return slot
+
+        return None
+
+    def acquire(self, deadline):
+        """
+        wait for a free slot until deadline
+        return slot index or None if deadline is exceeded
+        """
+        self.open_slots()
+        interval = MIN_POLL_INTERVAL
+
+        while True:
+            slot = self.try_acquire()
+            if slot is not None:
+                return slot
+
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                return None
+
+            time.sleep(min(remaining, interval * random.uniform(0.5, 1.5)))
+            interval = min(interval * 2, MAX_POLL_INTERVAL)
+
+    def release(self, slot):
+        fcntl.flock(self.slot_files[slot], fcntl.LOCK_UN)
+
+
+class TokenBuckets:
+    """
+    per-client token buckets of a worker process
+    rate is divided by the number of worker processes as requests are spread across them
+    """
+
+    def __init__(self, rate, burst, processes):
+        self.rate = rate / processes
+        self.burst = max(burst / processes, 1)
+        self.buckets = collections.OrderedDict()
+
+    def consume(self, client):
+        """
+        take a token of client
+        return 0 if request is allowed, otherwise seconds until a token is available
+        """
+        now = time.monotonic()
+        tokens, updated = self.buckets.pop(client, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - updated) * self.rate)
+
+        if tokens >= 1:
+            tokens -= 1
+            wait = 0
+        else:
+            wait = (1 - tokens) / self.rate
+
+        self.buckets[client] = (tokens, now)
+
+        # forget least recently seen clients
+        while len(self.buckets) > MAX_TRACKED_CLIENTS:
+            self.buckets.popitem(last=False)
+
+        return wait
+
+
+class AdmissionController:
+    """
+    admit requests by client rate limit and per-class concurrency limits
+    """
+
+    def __init__(
+        self, limits=None, queue_timeout=None, client_rate=None, client_burst=None
+    ):
+        if limits is None:
+            limits = ADMISSION_LIMITS
+        if queue_timeout is None:
+            queue_timeout = ADMISSION_QUEUE_TIMEOUT
+        if client_rate is None:
+            client_rate = CLIENT_RATE_LIMIT
+        if client_burst is None:
+            client_burst = CLIENT_RATE_BURST
+
+        self.queue_timeout = queue_timeout
+        self.pools = {
+            request_class: SlotPool(request_class, limits[request_class])
+            for request_class in REQUEST_CLASSES
+            if limits.get(request_class)
+        }
+
+        if client_rate:
+            self.token_buckets = TokenBuckets(
+                client_rate, client_burst or client_rate, get_worker_processes()
+            )
+        else:
+            self.token_buckets = None
+
+    def check_client(self, client):
+        """
+        return 0 if client is within its rate limit, otherwise seconds to retry after
+        """
+        if self.token_buckets is None:
+            return 0
+
+        return self.token_buckets.consume(client)
+
+    def admit(self, request_class, queue_start):
+        """
+        wait for a free slot of request class until queue wait deadline
+        return a tuple of request class and slot index, None if request is not limited
+        return False if request is shed
+        """
+        pool = self.pools.get(request_class)
+        if pool is None:
+            return None
+
+        slot = pool.acquire(queue_start + self.queue_timeout)
+        if slot is None:
+            return False
+
+        return (request_class, slot)
+
+    def release(self, ticket):
+        request_class, slot = ticket
+        self.pools[request_class].release(slot)
+
+
+def get_worker_processes():
+    """
+    return the number of uWSGI worker processes, 1 if it's not running under uWSGI
+    """
+    try:
+        import uwsgi
+
+        return max(uwsgi.numproc, 1)
+    except (ImportError, AttributeError):
+        return 1
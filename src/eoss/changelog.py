@@ -0,0 +1,220 @@
+import heapq
+import itertools
+import json
+import os
+import time
+from . import logger
+from . import mds_client
+from . import object_name
+from . import CHANGELOG_RETENTION
+from . import CHANGES_POLL_INTERVAL
+from . import LOGGING_PATH
+from . import METADATA_DB_BACKEND
+from . import METADATA_DB_TABLE
+from .exceptions import ChangelogCursorException
+
+changelog_log = os.path.join(LOGGING_PATH, "changelog.log")
+log = logger.Logger(__name__, changelog_log)
+
+CHANGE_COLUMNS = ("seq", "id", "filename", "version", "operation", "size", "digest", "timestamp")
+
+
+def record(mds, object_name_string, operation, database="main"):
+    """
+    append a committed object operation(PUT or DELETE) to changelog of MDS shard holding the object
+    PUT change carries size and digest of the new object data, changelog keeps the last CHANGELOG_RETENTION changes
+    this function does not commit, it must run inside the same transaction as the object change
+    database is the alias of MDS shard holding the object
+    """
+    # changelog is kept in SQL tables only
+    if not CHANGELOG_RETENTION or METADATA_DB_BACKEND != "sqlite":
+        return
+
+    timestamp = int(time.time())
+
+    if operation == "DELETE":
+        object_filename, version_string = object_name.parse_object_name(object_name_string)
+        mds.execute(
+            f"INSERT INTO {database}.changelog (id, filename, version, operation, timestamp) VALUES (?, ?, ?, ?, ?)",
+            (object_name_string, object_filename, version_string, operation, timestamp),
+        )
+    else:
+        mds.execute(
+            f"INSERT INTO {database}.changelog (id, filename, version, operation, size, digest, timestamp) SELECT id, filename, version, ?, size, digest, ? FROM {database}.{METADATA_DB_TABLE} WHERE id = ?",
+            (operation, timestamp, object_name_string),
+        )
+
+    # sequence numbers are never reused by AUTOINCREMENT, old changes are trimmed by primary key range
+    mds.execute(
+        f"DELETE FROM {database}.changelog WHERE seq <= (SELECT MAX(seq) FROM {database}.changelog) - ?",
+        (CHANGELOG_RETENTION,),
+    )
+
+
+def get_cursor(sequences):
+    """
+    return changes cursor string of the last sequence number consumed in each MDS shard
+    """
+    return ".".join(str(sequence) for sequence in sequences)
+
+
+def parse_cursor(cursor):
+    """
+    return a list of the last sequence number consumed in each MDS shard
+    raise ValueError if cursor is malformed and ChangelogCursorException if it's taken with another number of MDS shards
+    """
+    sequences = [int(sequence) for sequence in cursor.split(".")]
+
+    if any(sequence < 0 for sequence in sequences):
+        raise ValueError(f"invalid changes cursor {cursor}")
+
+    if len(sequences) != len(mds_client.get_shards()):
+        raise ChangelogCursorException(f"changes cursor {cursor} is taken before MDS is resharded")
+
+    return sequences
+
+
+def get_tail(mds):
+    """
+    return the last sequence number assigned in changelog of a MDS shard, 0 if nothing is recorded yet
+    """
+    output = mds.execute(
+        "SELECT seq FROM sqlite_sequence WHERE name = 'changelog'"
+    ).fetchall()
+
+    return output[0][0] if output else 0
+
+
+def get_signatures(shards):
+    """
+    return modification signatures of MDS shard files, they change when a transaction is committed
+    """
+    signatures = []
+
+    for shard in shards:
+        try:
+            stat = os.stat(mds_client.get_shard_path(shard))
+        except OSError:
+            signatures.append(None)
+        else:
+            signatures.append((stat.st_mtime_ns, stat.st_size, stat.st_ino))
+
+    return signatures
+
+
+def wait_for_changes(signatures, deadline):
+    """
+    wait until a MDS shard file is modified or deadline, only file status is polled
+    return True if a MDS shard file is modified
+    """
+    shards = mds_client.get_shards()
+
+    while time.time() < deadline:
+        time.sleep(min(CHANGES_POLL_INTERVAL, max(deadline - time.time(), 0)))
+
+        if get_signatures(shards) != signatures:
+            return True
+
+    return False
+
+
+def read_changes(mds, since, limit):
+    """
+    return up to limit changes after sequence number since in a MDS shard
+    """
+    output = mds.execute(
+        f"SELECT {', '.join(CHANGE_COLUMNS)} FROM changelog WHERE seq > ? ORDER BY seq LIMIT ?",
+        (since, limit),
+    ).fetchall()
+
+    changes = []
+    for row in output:
+        change = dict(zip(CHANGE_COLUMNS, row), shard=mds.shard)
+        # filename and version columns have numeric affinity, a numeric filename or version string
+        # is read back as a number, so both are parsed from object name
+        change["filename"], change["version"] = object_name.parse_object_name(change["id"])
+        changes.append(change)
+
+    return changes
+
+
+def read_first_changes(mds, since, limit):
+    """
+    return the first batch of changes after sequence number since in a MDS shard
+    raise ChangelogCursorException if changes after since are trimmed already or since is not assigned yet
+    """
+    changes = read_changes(mds, since, limit)
+
+    if changes:
+        # sequence numbers are contiguous unless changes are trimmed
+        if changes[0]["seq"] != since + 1:
+            raise ChangelogCursorException(
+                f"changes of MDS shard {mds.shard} after {since} are trimmed"
+            )
+    elif since != get_tail(mds):
+        raise ChangelogCursorException(
+            f"sequence number {since} of MDS shard {mds.shard} is not assigned, last one is {get_tail(mds)}"
+        )
+
+    return changes
+
+
+def iter_changes(shard, since, changes, batch_size):
+    """
+    yield changes of a MDS shard starting with its first batch, following batches are read on demand
+    iteration stops early if following changes are trimmed while they are read
+    """
+    yield from changes
+
+    if len(changes) < batch_size:
+        return
+
+    mds = mds_client.new_client(shard)
+    mds.connect()
+    mds.cursor()
+
+    try:
+        while len(changes) == batch_size:
+            last = changes[-1]["seq"]
+            changes = read_changes(mds, last, batch_size)
+
+            if changes and changes[0]["seq"] != last + 1:
+                log.warning(
+                    f"changes of MDS shard {shard} after {last} are trimmed while they are read"
+                )
+                return
+
+            yield from changes
+    finally:
+        mds.close()
+
+
+def stream_changes(first_changes, since, limit, batch_size):
+    """
+    yield up to limit changes of all MDS shards as newline delimited JSON in batches, followed by the next cursor
+    changes of each MDS shard are in sequence order, MDS shards are merged by timestamp
+    first_changes is a list of the first batch of each MDS shard, see read_first_changes()
+    """
+    sequences = list(since)
+    iterators = [
+        iter_changes(shard, since[shard], changes, batch_size)
+        for shard, changes in enumerate(first_changes)
+    ]
+    lines = []
+
+    try:
+        for change in itertools.islice(
+            heapq.merge(*iterators, key=lambda change: change["timestamp"]), limit
+        ):
+            sequences[change["shard"]] = change["seq"]
+            lines.append(json.dumps(change))
+
+            if len(lines) >= batch_size:
+                yield "\n".join(lines) + "\n"
+                lines = []
+    finally:
+        for iterator in iterators:
+            iterator.close()
+
+    lines.append(json.dumps({"next": get_cursor(sequences)}))
+    yield "\n".join(lines) + "\n"
@@ -0,0 +1,523 @@
+import collections
+import fcntl
+import hashlib
+import io
+import os
+import threading
+from . import logger
+from . import mds_client
+from . import storage
+from . import DEDUP_BATCH_SIZE
+from . import DEDUP_CHUNK_SIZE
+from . import DEDUP_MIN_SIZE
+from . import DEDUP_READ_AHEAD
+from . import LOGGING_PATH
+from . import METADATA_DB_BACKEND
+from . import OBJECT_LOCK_PATH
+from .exceptions import EOSSInternalException
+
+dedup_log = os.path.join(LOGGING_PATH, "dedup.log")
+log = logger.Logger(__name__, dedup_log)
+
+# chunk store directory in each hot tier storage root
+# chunk files: <root>/.chunks/<first 2 digits of digest>/<digest>
+# temp files of chunks being written: <root>/.chunks/temp/, they are removed by pre-start.py
+# chunks being reclaimed by garbage collection: <root>/.chunks/trash/
+CHUNK_DIRECTORY = ".chunks"
+
+# content-defined chunking
+# each byte is mapped to 2 fingerprint bits, a chunk ends after a window of bytes whose fingerprint matches a fixed
+# pattern, so chunk boundaries only depend on data around them and survive insertions and deletions before them
+# window matches are found by bytes.find(), pattern of n bytes matches with probability 1 / 4^n at each position
+# fingerprint table and pattern must never change, otherwise chunks of new uploads do not match stored ones
+FINGERPRINT_BITS = 2
+FINGERPRINT_TABLE = bytes(
+    hashlib.sha256(bytes((byte,))).digest()[0] & 3 for byte in range(256)
+)
+
+CHUNK_WINDOW = max((DEDUP_CHUNK_SIZE.bit_length() - 1) // FINGERPRINT_BITS, 1)
+CHUNK_PATTERN = bytes(
+    (int.from_bytes(hashlib.sha256(b"eoss-chunk-boundary").digest(), "big") >> (2 * i)) & 3
+    for i in range(CHUNK_WINDOW)
+)
+CHUNK_MIN_SIZE = DEDUP_CHUNK_SIZE // 4
+CHUNK_MAX_SIZE = DEDUP_CHUNK_SIZE * 4
+
+GC_LOCK_FILENAME = "dedup-gc.lock"
+
+
+def is_dedup(layout):
+    return layout is not None and layout["mode"] == "dedup"
+
+
+def choose_layout(object_name, durability=None, size=None):
+    """
+    return deduplicated layout of a new object or None if it's not stored in chunk store
+    deduplication is used if it's requested by durability mode, or durability mode is not set
+    and object size reaches DEDUP_MIN_SIZE
+    raise EOSSInternalException if deduplication is requested with a metadata backend without chunk manifests
+    """
+    if durability == "dedup":
+        if METADATA_DB_BACKEND != "sqlite":
+            raise EOSSInternalException(
+                f"deduplication is not supported by {METADATA_DB_BACKEND} metadata backend"
+            )
+    elif (
+        durability is not None
+        or DEDUP_MIN_SIZE is None
+        or size is None
+        or size < DEDUP_MIN_SIZE
+        or METADATA_DB_BACKEND != "sqlite"
+    ):
+        return None
+
+    return {"mode": "dedup", "chunk": DEDUP_CHUNK_SIZE}
+
+
+def get_chunk_store_path(root, *names):
+    return os.path.join(storage.get_tier_path(storage.TIER_HOT, root), CHUNK_DIRECTORY, *names)
+
+
+def get_chunk_path(digest, root):
+    return get_chunk_store_path(root, digest[:2], digest)
+
+
+def find_chunk(digest):
+    """
+    return path of an existing chunk file, None if chunk is not stored
+    a chunk is written to the best ranked storage root when it's stored, so roots are searched in ranking order
+    """
+    for root in storage.rank_roots(digest):
+        chunk_path = get_chunk_path(digest, root)
+        if os.path.exists(chunk_path):
+            return chunk_path
+
+    return None
+
+
+def write_chunk(digest, chunk):
+    """
+    write a chunk file into its storage root, the chunk file is flushed to disk before it's renamed to final name
+    """
+    root = storage.choose_root(digest)
+    chunk_path = get_chunk_path(digest, root)
+    temp_path = get_chunk_store_path(
+        root, "temp", f"{digest}.{os.getpid()}.{threading.get_ident()}"
+    )
+
+    for directory in (os.path.dirname(chunk_path), os.path.dirname(temp_path)):
+        os.makedirs(directory, exist_ok=True)
+
+    with open(temp_path, "wb") as f:
+        f.write(chunk)
+        f.flush()
+        os.fsync(f.fileno())
+
+    os.rename(temp_path, chunk_path)
+
+
+def iter_chunks(stream):
+    """
+    split data read from stream into content-defined chunks between CHUNK_MIN_SIZE and CHUNK_MAX_SIZE
+    only the last chunk may be smaller than CHUNK_MIN_SIZE
+    """
+    data = b""
+    fingerprint = b""
+    offset = 0
+    eof = False
+
+    while True:
+        if not eof and len(data) - offset < CHUNK_MAX_SIZE:
+            block = stream.read(CHUNK_MAX_SIZE)
+            if not block:
+                eof = True
+            else:
+                data = data[offset:] + block
+                fingerprint = data.translate(FINGERPRINT_TABLE)
+                offset = 0
+            continue
+
+        if offset >= len(data):
+            return
+
+        limit = min(offset + CHUNK_MAX_SIZE, len(data))
+        position = fingerprint.find(
+            CHUNK_PATTERN, offset + max(CHUNK_MIN_SIZE - CHUNK_WINDOW, 0), limit
+        )
+        end = position + CHUNK_WINDOW if position >= 0 else limit
+
+        yield data[offset:end]
+        offset = end
+
+
+def store_chunks(mds, object_name, chunks):
+    """
+    append a batch of chunks to chunk manifest of an object and store chunks missing in chunk store
+    chunk manifest is committed before chunks are looked up, so a chunk either gets stored again
+    or is kept by garbage collection which rechecks references, see collect_garbage()
+    chunks is a list of sequence number, digest and data of each chunk
+    return the number of stored chunks and bytes
+    """
+    for seq, digest, chunk in chunks:
+        mds.execute(
+            "INSERT INTO chunk_manifest (id, seq, digest, size) VALUES (?, ?, ?, ?)",
+            (object_name, seq, digest, len(chunk)),
+        )
+    mds.commit()
+
+    stored_chunks = 0
+    stored_bytes = 0
+    found = set()
+
+    for seq, digest, chunk in chunks:
+        if digest in found or find_chunk(digest) is not None:
+            found.add(digest)
+            continue
+
+        write_chunk(digest, chunk)
+        found.add(digest)
+        stored_chunks += 1
+        stored_bytes += len(chunk)
+
+    return (stored_chunks, stored_bytes)
+
+
+def write_object(mds, object_name, stream):
+    """
+    split object data read from stream into content-defined chunks while it's received,
+    record them as chunk manifest of the object and store chunks which are not in chunk store yet
+    chunk manifest is committed in batches of DEDUP_BATCH_SIZE chunks
+    the object must be initialized in MDS and have no chunk manifest, see set_object_init_data()
+    return object size and SHA-256 digest of object data
+    """
+    object_hash = hashlib.sha256()
+    size = 0
+    chunks = 0
+    stored_chunks = 0
+    stored_bytes = 0
+    batch = []
+
+    for chunk in iter_chunks(stream):
+        object_hash.update(chunk)
+        batch.append((chunks, hashlib.sha256(chunk).hexdigest(), chunk))
+        size += len(chunk)
+        chunks += 1
+
+        if len(batch) >= DEDUP_BATCH_SIZE:
+            count, length = store_chunks(mds, object_name, batch)
+            stored_chunks += count
+            stored_bytes += length
+            batch = []
+
+    if batch:
+        count, length = store_chunks(mds, object_name, batch)
+        stored_chunks += count
+        stored_bytes += length
+
+    log.info(
+        f"object {object_name} is split into {chunks} chunks, {size} bytes, {stored_chunks} new chunks {stored_bytes} bytes stored"
+    )
+
+    return (size, object_hash.hexdigest())
+
+
+def delete_manifest(mds, object_name):
+    """
+    remove chunk manifest of an object, its chunks are dereferenced in the same transaction
+    chunk manifest is removed with its metadata record, see schema.MDS_TRIGGERS
+    """
+    mds.execute("DELETE FROM chunk_manifest WHERE id = ?", (object_name,))
+
+
+def copy_manifest(mds, source_name, object_name, source_database="main"):
+    """
+    copy chunk manifest of source object to another object, chunks are shared by both objects
+    source_database is the alias of MDS shard holding source object if it's attached to mds
+    """
+    mds.execute(
+        f"INSERT INTO main.chunk_manifest (id, seq, digest, size) SELECT ?, seq, digest, size FROM {source_database}.chunk_manifest WHERE id = ?",
+        (object_name, source_name),
+    )
+
+
+def read_manifest(object_name):
+    """
+    return a list of digest and size of chunks of an object in order
+    """
+    mds = mds_client.new_client(mds_client.get_shard(object_name))
+    mds.connect()
+    mds.cursor()
+
+    try:
+        return mds.execute(
+            "SELECT digest, size FROM chunk_manifest WHERE id = ? ORDER BY seq",
+            (object_name,),
+        ).fetchall()
+    finally:
+        mds.close()
+
+
+class DedupReader(io.RawIOBase):
+    """
+    read deduplicated object as a stream of its chunks
+    the next DEDUP_READ_AHEAD chunk files are opened in advance and the kernel is asked to read them ahead,
+    so chunks scattered in chunk store are read while former chunks are sent
+    """
+
+    def __init__(self, object_name, chunks):
+        self.object_name = object_name
+        self.chunks = chunks
+        self.index = 0
+        self.chunk_files = collections.deque()
+
+    def readable(self):
+        return True
+
+    def open_chunks(self):
+        while self.index < len(self.chunks) and len(self.chunk_files) <= DEDUP_READ_AHEAD:
+            digest, size = self.chunks[self.index]
+            chunk_path = find_chunk(digest)
+
+            if chunk_path is None:
+                raise EOSSInternalException(
+                    f"chunk {digest} of object {self.object_name} is missing"
+                )
+
+            chunk_f = open(chunk_path, "rb", buffering=0)
+
+            if os.fstat(chunk_f.fileno()).st_size != size:
+                chunk_f.close()
+                raise EOSSInternalException(
+                    f"chunk {digest} of object {self.object_name} has a wrong size"
+                )
+
+            os.posix_fadvise(chunk_f.fileno(), 0, size, os.POSIX_FADV_WILLNEED)
+            self.chunk_files.append(chunk_f)
+            self.index += 1
+
+    def readinto(self, b):
+        while True:
+            self.open_chunks()
+
+            if not self.chunk_files:
+                return 0
+
+            length = self.chunk_files[0].readinto(b)
+            if length:
+                return length
+
+            self.chunk_files.popleft().close()
+
+    def close(self):
+        while self.chunk_files:
+            self.chunk_files.popleft().close()
+        super().close()
+
+
+def open_object(object_name, size):
+    """
+    open deduplicated object for reading
+    raise EOSSInternalException if chunk manifest does not match object size
+    """
+    chunks = read_manifest(object_name)
+    manifest_size = sum(chunk_size for digest, chunk_size in chunks)
+
+    if manifest_size != size:
+        raise EOSSInternalException(
+            f"chunk manifest of object {object_name} holds {manifest_size} bytes, object size is {size}"
+        )
+
+    return io.BufferedReader(DedupReader(object_name, chunks), storage.COPY_BUFFER_SIZE)
+
+
+def clean_up_temp_files():
+    """
+    remove temp files of chunks left by interrupted uploads, EOSS service must be stopped
+    return the number of removed files
+    """
+    removed_files = 0
+
+    for root in storage.get_roots():
+        temp_directory = get_chunk_store_path(root, "temp")
+
+        if not os.path.isdir(temp_directory):
+            continue
+
+        for entry in os.scandir(temp_directory):
+            os.unlink(entry.path)
+            removed_files += 1
+
+    return removed_files
+
+
+def find_unreferenced_chunks(after, limit):
+    """
+    return up to limit digests after given digest which are not referenced in some MDS shard, ordered by digest
+    """
+
+    def query(mds):
+        return mds.execute(
+            "SELECT digest FROM chunk_refs WHERE refs = 0 AND digest > ? ORDER BY digest LIMIT ?",
+            (after, limit),
+        ).fetchall()
+
+    digests = set()
+    for output in mds_client.map_shards(query):
+        digests.update(row[0] for row in output)
+
+    return sorted(digests)[:limit]
+
+
+def find_referenced_chunks(digests):
+    """
+    return digests referenced by chunk manifests of any MDS shard among given digests
+    """
+
+    def query(mds):
+        return mds.execute(
+            f"SELECT digest FROM chunk_refs WHERE refs > 0 AND digest IN ({', '.join('?' * len(digests))})",
+            tuple(digests),
+        ).fetchall()
+
+    referenced = set()
+    for output in mds_client.map_shards(query):
+        referenced.update(row[0] for row in output)
+
+    return referenced
+
+
+def remove_unreferenced_records(digests):
+    """
+    remove reference records of unreferenced chunks in all MDS shards
+    """
+
+    def remove(mds):
+        mds.execute(
+            f"DELETE FROM chunk_refs WHERE refs = 0 AND digest IN ({', '.join('?' * len(digests))})",
+            tuple(digests),
+        )
+        mds.commit()
+
+    mds_client.map_shards(remove)
+
+
+def move_to_trash(digest):
+    """
+    move all copies of a chunk into trash directory of their storage roots
+    return a list of storage root and trash path of moved chunk files
+    """
+    moved = []
+
+    for root in storage.get_roots():
+        chunk_path = get_chunk_path(digest, root)
+        trash_path = get_chunk_store_path(root, "trash", digest)
+
+        try:
+            os.rename(chunk_path, trash_path)
+        except FileNotFoundError:
+            continue
+
+        moved.append((root, trash_path))
+
+    return moved
+
+
+def empty_trash(trash_files):
+    """
+    restore trashed chunk files which are referenced again and remove the others
+    trash_files is a dict of digest and a list of storage root and trash path of its files
+    return the number of removed chunks and bytes
+    """
+    referenced = find_referenced_chunks(list(trash_files)) if trash_files else set()
+    removed_chunks = 0
+    removed_bytes = 0
+
+    for digest, moved in trash_files.items():
+        if not moved:
+            continue
+
+        if digest in referenced:
+            # referenced while it's trashed, an upload may have stored it again with the same content
+            for root, trash_path in moved:
+                os.rename(trash_path, get_chunk_path(digest, root))
+            log.info(f"chunk {digest} is referenced again, restored")
+            continue
+
+        for root, trash_path in moved:
+            removed_bytes += os.path.getsize(trash_path)
+            os.unlink(trash_path)
+        removed_chunks += 1
+
+    return (removed_chunks, removed_bytes)
+
+
+def recover_trash():
+    """
+    empty trash left by an interrupted garbage collection
+    return the number of removed chunks and bytes
+    """
+    trash_files = {}
+
+    for root in storage.get_roots():
+        trash_directory = get_chunk_store_path(root, "trash")
+
+        if not os.path.isdir(trash_directory):
+            continue
+
+        for entry in os.scandir(trash_directory):
+            trash_files.setdefault(entry.name, []).append((root, entry.path))
+
+    return empty_trash(trash_files)
+
+
+def collect_garbage(batch_size):
+    """
+    remove chunks which no chunk manifest references any more from chunk store
+
+    chunk references are counted in each MDS shard by triggers, see schema.MDS_TRIGGERS
+    a chunk unreferenced in some MDS shard is removed if it's not referenced in any MDS shard:
+    1. chunk files are moved into trash
+    2. references are checked again, uploads commit references before they look up chunks, see store_chunks()
+    3. chunk files referenced again are restored, the others are removed along with their reference records
+
+    only one garbage collection runs at a time
+    return the number of removed chunks and bytes
+    """
+    lock_f = open(os.path.join(OBJECT_LOCK_PATH, GC_LOCK_FILENAME), "wb")
+
+    try:
+        try:
+            fcntl.flock(lock_f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            raise EOSSInternalException("another garbage collection is running")
+
+        removed_chunks, removed_bytes = recover_trash()
+        after = ""
+
+        for root in storage.get_roots():
+            os.makedirs(get_chunk_store_path(root, "trash"), exist_ok=True)
+
+        while True:
+            digests = find_unreferenced_chunks(after, batch_size)
+            if not digests:
+                break
+
+            after = digests[-1]
+            referenced = find_referenced_chunks(digests)
+            trash_files = {}
+
+            for digest in digests:
+                if digest not in referenced:
+                    trash_files[digest] = move_to_trash(digest)
+
+            count, length = empty_trash(trash_files)
+            removed_chunks += count
+            removed_bytes += length
+
+            remove_unreferenced_records(digests)
+    finally:
+        lock_f.close()
+
+    log.info(f"garbage collection done, {removed_chunks} chunks {removed_bytes} bytes removed")
+
+    return (removed_chunks, removed_bytes)
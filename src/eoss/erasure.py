@@ -0,0 +1,466 @@
+import io
+import json
+import os
+from . import logger
+from . import storage
+from . import ERASURE_CODING_DATA_STRIPES
+from . import ERASURE_CODING_MIN_SIZE
+from . import ERASURE_CODING_PARITY_STRIPES
+from . import ERASURE_CODING_UNIT_SIZE
+from . import LOGGING_PATH
+from .exceptions import EOSSInternalException
+
+erasure_log = os.path.join(LOGGING_PATH, "erasure.log")
+log = logger.Logger(__name__, erasure_log)
+
+# object durability modes
+DURABILITY_MODES = ("plain", "erasure")
+
+# Galois field GF(2^8) arithmetic with primitive polynomial x^8 + x^4 + x^3 + x^2 + 1
+GF_POLYNOMIAL = 0x11D
+
+GF_EXP = [0] * 512
+GF_LOG = [0] * 256
+
+_value = 1
+for _exponent in range(255):
+    GF_EXP[_exponent] = _value
+    GF_LOG[_value] = _exponent
+    _value <<= 1
+    if _value & 0x100:
+        _value ^= GF_POLYNOMIAL
+for _exponent in range(255, 512):
+    GF_EXP[_exponent] = GF_EXP[_exponent - 255]
+
+
+def gf_mul(a, b):
+    if a == 0 or b == 0:
+        return 0
+    return GF_EXP[GF_LOG[a] + GF_LOG[b]]
+
+
+def gf_inv(a):
+    if a == 0:
+        raise ZeroDivisionError("zero has no inverse in GF(2^8)")
+    return GF_EXP[255 - GF_LOG[a]]
+
+
+# byte translation tables to multiply a whole buffer by a constant at C speed
+# table of c maps x to GF_EXP[GF_LOG[c] + GF_LOG[x]], it's built by translating logarithms through a slice of GF_EXP
+_GF_LOG_BYTES = bytes(GF_LOG)
+_GF_EXP_BYTES = bytes(GF_EXP)
+GF_MUL_TABLES = [bytes(256)] + [
+    b"\x00" + _GF_LOG_BYTES[1:].translate(_GF_EXP_BYTES[GF_LOG[c] : GF_LOG[c] + 256])
+    for c in range(1, 256)
+]
+
+
+def gf_mul_buffer(c, buffer):
+    if c == 1:
+        return buffer
+    return buffer.translate(GF_MUL_TABLES[c])
+
+
+def xor_buffers(buffers, length):
+    """
+    xor equal length buffers by big integer arithmetic
+    """
+    value = 0
+    for buffer in buffers:
+        value ^= int.from_bytes(buffer, "little")
+    return value.to_bytes(length, "little")
+
+
+def get_parity_matrix(k, m):
+    """
+    return m x k Cauchy matrix, any k rows of identity matrix stacked on it are linearly independent
+    """
+    return [[gf_inv((i + k) ^ j) for j in range(k)] for i in range(m)]
+
+
+def invert_matrix(matrix):
+    """
+    invert a square matrix over GF(2^8) by Gauss-Jordan elimination
+    """
+    size = len(matrix)
+    work = [
+        list(row) + [1 if i == j else 0 for j in range(size)]
+        for i, row in enumerate(matrix)
+    ]
+
+    for column in range(size):
+        pivot = next(
+            (row for row in range(column, size) if work[row][column] != 0), None
+        )
+        if pivot is None:
+            raise EOSSInternalException("singular matrix")
+
+        work[column], work[pivot] = work[pivot], work[column]
+
+        inverse = gf_inv(work[column][column])
+        work[column] = [gf_mul(inverse, value) for value in work[column]]
+
+        for row in range(size):
+            if row != column and work[row][column] != 0:
+                factor = work[row][column]
+                work[row] = [
+                    value ^ gf_mul(factor, pivot_value)
+                    for value, pivot_value in zip(work[row], work[column])
+                ]
+
+    return [row[size:] for row in work]
+
+
+class Codec:
+    """
+    systematic Reed-Solomon codec with k data stripes and m parity stripes
+    """
+
+    def __init__(self, k, m):
+        self.k = k
+        self.m = m
+        self.parity_matrix = get_parity_matrix(k, m)
+        self.decode_matrices = {}
+
+    def get_generator_row(self, index):
+        if index < self.k:
+            return [1 if i == index else 0 for i in range(self.k)]
+        return self.parity_matrix[index - self.k]
+
+    def encode(self, data_units):
+        """
+        return m parity units of k equal length data units
+        """
+        length = len(data_units[0])
+
+        return [
+            xor_buffers(
+                [gf_mul_buffer(c, unit) for c, unit in zip(row, data_units) if c],
+                length,
+            )
+            for row in self.parity_matrix
+        ]
+
+    def decode(self, units):
+        """
+        return k data units from a dict of at least k available stripe index and unit
+        """
+        available = sorted(units)[: self.k]
+
+        if len(available) < self.k:
+            raise EOSSInternalException(
+                f"{len(available)} stripes available, {self.k} stripes required"
+            )
+
+        if available == list(range(self.k)):
+            return [units[index] for index in available]
+
+        key = tuple(available)
+        if key not in self.decode_matrices:
+            self.decode_matrices[key] = invert_matrix(
+                [self.get_generator_row(index) for index in available]
+            )
+        decode_matrix = self.decode_matrices[key]
+
+        length = len(units[available[0]])
+        data_units = []
+
+        for index in range(self.k):
+            if index in units:
+                data_units.append(units[index])
+            else:
+                data_units.append(
+                    xor_buffers(
+                        [
+                            gf_mul_buffer(c, units[available_index])
+                            for c, available_index in zip(
+                                decode_matrix[index], available
+                            )
+                            if c
+                        ],
+                        length,
+                    )
+                )
+
+        return data_units
+
+
+def new_layout(object_name, k, m, unit):
+    """
+    return erasure coding layout of a new object, stripes are spread over k + m distinct storage roots
+    """
+    roots = storage.rank_roots(object_name)
+
+    if len(roots) < k + m:
+        raise EOSSInternalException(
+            f"{k + m} storage roots are required for erasure coding, {len(roots)} configured"
+        )
+
+    return {"mode": "erasure", "k": k, "m": m, "unit": unit, "roots": roots[: k + m]}
+
+
+def choose_layout(object_name, durability=None, size=None):
+    """
+    return erasure coding layout of a new object or None if object is stored as a plain file
+    erasure coding is used if it's requested by durability mode, or durability mode is not set
+    and object size reaches ERASURE_CODING_MIN_SIZE while there are enough storage roots
+    """
+    k = ERASURE_CODING_DATA_STRIPES
+    m = ERASURE_CODING_PARITY_STRIPES
+
+    if durability is not None and durability not in DURABILITY_MODES:
+        raise EOSSInternalException(f"unknown durability mode {durability}")
+
+    if durability == "plain":
+        return None
+
+    if durability is None:
+        if (
+            ERASURE_CODING_MIN_SIZE is None
+            or size is None
+            or size < ERASURE_CODING_MIN_SIZE
+            or len(storage.get_roots()) < k + m
+        ):
+            return None
+
+    return new_layout(object_name, k, m, ERASURE_CODING_UNIT_SIZE)
+
+
+def dump_layout(layout):
+    if layout is None:
+        return None
+    return json.dumps(layout, sort_keys=True)
+
+
+def load_layout(layout_text):
+    if layout_text is None:
+        return None
+    return json.loads(layout_text)
+
+
+def get_stripe_path(object_name, layout, index):
+    return storage.get_stripe_path(object_name, layout["roots"][index], index)
+
+
+def get_stripe_paths(object_name, layout):
+    return [
+        get_stripe_path(object_name, layout, index)
+        for index in range(layout["k"] + layout["m"])
+    ]
+
+
+def get_stripe_size(layout, size):
+    """
+    return stripe file size of an object in given size, each stripe holds one unit per row
+    """
+    row_size = layout["k"] * layout["unit"]
+    return (size + row_size - 1) // row_size * layout["unit"]
+
+
+def get_available_stripes(object_name, layout):
+    """
+    return indexes of existing stripe files
+    """
+    return [
+        index
+        for index, stripe_path in enumerate(get_stripe_paths(object_name, layout))
+        if os.path.exists(stripe_path)
+    ]
+
+
+def encode_file(source_path, object_name, layout):
+    """
+    split source file into k data stripes and m parity stripes in storage roots of layout
+    each stripe file holds one unit of every row, the last row is padded by zeroes
+    stripe files are flushed to disk and renamed to final names
+    return the size of source file
+    """
+    k = layout["k"]
+    unit = layout["unit"]
+    codec = Codec(k, layout["m"])
+    stripe_paths = get_stripe_paths(object_name, layout)
+    stripe_files = []
+    size = 0
+
+    try:
+        for stripe_path in stripe_paths:
+            stripe_files.append(open(stripe_path + ".temp", "wb"))
+
+        with open(source_path, "rb") as source_f:
+            while True:
+                row = source_f.read(k * unit)
+                if not row:
+                    break
+
+                size += len(row)
+                row = row.ljust(k * unit, b"\0")
+                data_units = [row[i * unit : (i + 1) * unit] for i in range(k)]
+
+                for stripe_f, stripe_unit in zip(
+                    stripe_files, data_units + codec.encode(data_units)
+                ):
+                    stripe_f.write(stripe_unit)
+
+        for stripe_f in stripe_files:
+            stripe_f.flush()
+            os.fsync(stripe_f.fileno())
+    finally:
+        for stripe_f in stripe_files:
+            stripe_f.close()
+
+    for stripe_path in stripe_paths:
+        os.rename(stripe_path + ".temp", stripe_path)
+
+    log.info(
+        f"object {object_name} encoded into {len(stripe_paths)} stripes, {size} bytes"
+    )
+
+    return size
+
+
+class ErasureReader(io.RawIOBase):
+    """
+    read erasure coded object as a stream, missing stripes are reconstructed on the fly
+    """
+
+    def __init__(self, object_name, layout, size):
+        self.object_name = object_name
+        self.k = layout["k"]
+        self.unit = layout["unit"]
+        self.size = size
+        self.position = 0
+        self.buffer = b""
+        self.codec = Codec(self.k, layout["m"])
+        self.stripe_files = {}
+
+        stripe_size = get_stripe_size(layout, size)
+
+        # data stripes are preferred so no decoding is needed when they are all available
+        for index, stripe_path in enumerate(get_stripe_paths(object_name, layout)):
+            if len(self.stripe_files) >= self.k:
+                break
+            try:
+                stripe_f = open(stripe_path, "rb")
+            except OSError:
+                log.warning(f"stripe {stripe_path} of object {object_name} is missing")
+                continue
+
+            if os.fstat(stripe_f.fileno()).st_size != stripe_size:
+                log.warning(f"stripe {stripe_path} of object {object_name} has a wrong size")
+                stripe_f.close()
+                continue
+
+            self.stripe_files[index] = stripe_f
+
+        if len(self.stripe_files) < self.k:
+            self.close()
+            raise EOSSInternalException(
+                f"object {object_name} has {len(self.stripe_files)} stripes available, {self.k} stripes required"
+            )
+
+    def readable(self):
+        return True
+
+    def read_row(self):
+        units = {}
+
+        for index, stripe_f in self.stripe_files.items():
+            stripe_unit = stripe_f.read(self.unit)
+            if len(stripe_unit) != self.unit:
+                raise EOSSInternalException(
+                    f"stripe {index} of object {self.object_name} is truncated"
+                )
+            units[index] = stripe_unit
+
+        return b"".join(self.codec.decode(units))
+
+    def readinto(self, b):
+        remaining = self.size - self.position
+        if remaining <= 0:
+            return 0
+
+        if not self.buffer:
+            self.buffer = self.read_row()
+
+        length = min(len(b), len(self.buffer), remaining)
+        b[:length] = self.buffer[:length]
+        self.buffer = self.buffer[length:]
+        self.position += length
+
+        return length
+
+    def close(self):
+        for stripe_f in self.stripe_files.values():
+            stripe_f.close()
+        super().close()
+
+
+def open_object(object_name, layout, size):
+    return io.BufferedReader(
+        ErasureReader(object_name, layout, size), storage.COPY_BUFFER_SIZE
+    )
+
+
+def repair_object(object_name, layout, size):
+    """
+    rebuild missing or truncated stripe files of an erasure coded object
+    return the number of rebuilt stripes
+    """
+    k = layout["k"]
+    unit = layout["unit"]
+    codec = Codec(k, layout["m"])
+    stripe_paths = get_stripe_paths(object_name, layout)
+    stripe_size = get_stripe_size(layout, size)
+    available = []
+    missing = []
+
+    # truncated stripe file is rebuilt as well
+    for index, stripe_path in enumerate(stripe_paths):
+        try:
+            if os.path.getsize(stripe_path) == stripe_size:
+                available.append(index)
+                continue
+            log.warning(f"stripe {stripe_path} of object {object_name} has a wrong size")
+        except OSError:
+            log.warning(f"stripe {stripe_path} of object {object_name} is missing")
+        missing.append(index)
+
+    if not missing:
+        return 0
+
+    if len(available) < k:
+        raise EOSSInternalException(
+            f"object {object_name} has {len(available)} stripes available, {k} stripes required"
+        )
+    source_files = {}
+    target_files = {}
+
+    try:
+        for index in available[:k]:
+            source_files[index] = open(stripe_paths[index], "rb")
+        for index in missing:
+            target_files[index] = open(stripe_paths[index] + ".temp", "wb")
+
+        for _ in range(stripe_size // unit):
+            units = {
+                index: stripe_f.read(unit) for index, stripe_f in source_files.items()
+            }
+            data_units = codec.decode(units)
+            all_units = data_units + codec.encode(data_units)
+
+            for index, stripe_f in target_files.items():
+                stripe_f.write(all_units[index])
+
+        for stripe_f in target_files.values():
+            stripe_f.flush()
+            os.fsync(stripe_f.fileno())
+    finally:
+        for stripe_f in list(source_files.values()) + list(target_files.values()):
+            stripe_f.close()
+
+    for index in missing:
+        os.rename(stripe_paths[index] + ".temp", stripe_paths[index])
+
+    log.info(f"object {object_name} stripes {missing} rebuilt")
+
+    return len(missing)
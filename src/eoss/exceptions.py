@@ -16,3 +16,11 @@ class EOSSInternalException(Exception):
 
 class ObjectUnderLockException(Exception):
     pass
+
+
+class ObjectPreconditionException(Exception):
+    pass
+
+
+class ChangelogCursorException(Exception):
+    pass
@@ -0,0 +1,143 @@
+import os
+import re
+import time
+from . import logger
+from . import mds_client
+from . import migration
+from . import object_name
+from . import LOGGING_PATH
+from . import METADATA_DB_TABLE
+
+expiry_log = os.path.join(LOGGING_PATH, "expiry.log")
+log = logger.Logger(__name__, expiry_log)
+
+# units of relative expiry time
+# unit: second
+EXPIRES_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+EXPIRES_PATTERN = re.compile(r"^\+(\d+)([smhd]?)$")
+
+
+def parse_expires(value, now=None):
+    """
+    return expiry unix timestamp of a X-EOSS-Expires header value
+    value is either an absolute unix timestamp or a relative time prefixed by "+",
+    relative time is in seconds unless unit s, m, h or d is given, e.g. "+3600" or "+7d"
+    raise ValueError if value is not valid
+    """
+    if now is None:
+        now = int(time.time())
+
+    value = value.strip()
+    match = EXPIRES_PATTERN.match(value)
+
+    if match:
+        amount, unit = match.groups()
+        return now + int(amount) * EXPIRES_UNITS[unit or "s"]
+
+    expires = int(value)
+    if expires <= 0:
+        raise ValueError(f"invalid expiry timestamp {value}")
+
+    return expires
+
+
+def find_expired_objects(mds, now, limit, after=None):
+    """
+    return up to limit expired objects ordered by expiry timestamp and object name
+    walk metadata_expires index only, after is the (expires, id) of the last object of previous batch
+    """
+    if after is None:
+        return mds.execute(
+            f"SELECT id, expires FROM {METADATA_DB_TABLE} WHERE expires <= ? ORDER BY expires, id LIMIT ?",
+            (now, limit),
+        ).fetchall()
+
+    return mds.execute(
+        f"SELECT id, expires FROM {METADATA_DB_TABLE} WHERE expires <= ? AND (expires, id) > (?, ?) ORDER BY expires, id LIMIT ?",
+        (now, after[0], after[1], limit),
+    ).fetchall()
+
+
+def count_expired_objects(mds, now=None):
+    """
+    return the number of expired objects waiting for removal
+    """
+    if now is None:
+        now = int(time.time())
+
+    return mds.execute(
+        f"SELECT COUNT(id) FROM {METADATA_DB_TABLE} WHERE expires <= ?", (now,)
+    ).fetchall()[0][0]
+
+
+def expire_object(eoss_object_client, now):
+    """
+    delete an expired object, its files which are lost already are ignored
+    the caller must hold the write lock of the object and have its state loaded by check_object_exists()
+    return None if object is not expired any more, e.g. overridden after it's found
+    """
+    if eoss_object_client.object_state != 0 or not eoss_object_client.is_expired(now):
+        return None
+
+    eoss_object_client.delete_object(missing_ok=True)
+    log.info(
+        f"object {eoss_object_client.object_name} expired at {eoss_object_client.object_expires} is deleted"
+    )
+
+    return True
+
+
+def reap(batch_size, throttle=None):
+    """
+    delete objects expired before this pass starts in batches, MDS shards are walked one by one
+    objects under lock or failed to be deleted are skipped and retried in the next pass
+    throttle limits the number of objects deleted per second
+    return the number of deleted objects and failed objects
+    """
+    now = int(time.time())
+    deleted_objects = 0
+    failed_objects = 0
+
+    for shard in mds_client.get_shards():
+        after = None
+
+        while True:
+            mds = mds_client.MDSClient(shard)
+            mds.connect()
+            mds.cursor()
+
+            try:
+                output = find_expired_objects(mds, now, batch_size, after)
+            finally:
+                mds.close()
+
+            for record_name, expires in output:
+                # filename and version columns have numeric affinity, a numeric filename or version string
+                # is read back as a number, so both are parsed from object name
+                object_filename, object_version = object_name.parse_object_name(record_name)
+                flag = migration.run_locked(
+                    object_filename,
+                    object_version,
+                    lambda eoss_object_client: expire_object(eoss_object_client, now),
+                )
+
+                if flag:
+                    deleted_objects += 1
+                elif flag is False:
+                    failed_objects += 1
+
+                if throttle is not None:
+                    throttle.consume(1)
+
+            if len(output) < batch_size:
+                break
+
+            after = output[-1][1], output[-1][0]
+
+    if deleted_objects or failed_objects:
+        log.info(
+            f"expiry pass done: {deleted_objects} objects deleted, {failed_objects} objects failed"
+        )
+
+    return (deleted_objects, failed_objects)
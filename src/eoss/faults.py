@@ -0,0 +1,40 @@
+import os
+import random
+import signal
+from . import logger
+from . import FAULT_INJECTION_MODE
+from . import FAULT_INJECTION_POINTS
+from . import LOGGING_PATH
+from .exceptions import EOSSInternalException
+
+faults_log = os.path.join(LOGGING_PATH, "faults.log")
+log = logger.Logger(__name__, faults_log)
+
+# injection points placed in object write procedures
+# put.state1: PUT temp file is written, object is in state 1
+# put.state2: PUT object is in state 2, temp file is not renamed yet
+# put.renamed: PUT temp file is renamed to final object file, object is still in state 2
+# put.state0: PUT object size and timestamp are set, object is not closed yet
+# delete: DELETE object is marked not closed and its files are removed, its record is not removed yet
+INJECTION_POINTS = ("put.state1", "put.state2", "put.renamed", "put.state0", "delete")
+
+FAULT_MODES = ("error", "kill")
+
+
+def inject(point):
+    """
+    fail at an injection point by its probability in FAULT_INJECTION_POINTS, it's a no-op for unlisted points
+    in "error" mode EOSSInternalException is raised, so error handling and rollback of the caller run,
+    in "kill" mode this process is killed by SIGKILL like a crashed worker
+    """
+    probability = FAULT_INJECTION_POINTS.get(point)
+
+    if not probability or random.random() >= probability:
+        return
+
+    log.warning(f"fault injected at {point} in process {os.getpid()}: {FAULT_INJECTION_MODE}")
+
+    if FAULT_INJECTION_MODE == "kill":
+        os.kill(os.getpid(), signal.SIGKILL)
+
+    raise EOSSInternalException(f"fault injected at {point}")
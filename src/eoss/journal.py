@@ -0,0 +1,475 @@
+import fcntl
+import json
+import os
+import pickle
+import struct
+import threading
+import zlib
+from . import logger
+from . import mds_client
+from . import profiling
+from . import schema
+from . import LOGGING_PATH
+from . import METADATA_JOURNAL_COMPACT_SIZE
+from . import METADATA_JOURNAL_SYNC
+from .exceptions import MDSConnectException
+from .exceptions import MDSExecuteException
+from .exceptions import MDSCommitException
+
+journal_log = os.path.join(LOGGING_PATH, "journal.log")
+log = logger.Logger(__name__, journal_log)
+
+# metadata record columns, records are kept as tuples in this order
+COLUMNS = tuple(column for column, column_type in schema.METADATA_COLUMNS)
+
+# journal file header: magic and generation
+JOURNAL_MAGIC = b"EOSSJNL1"
+JOURNAL_HEADER = struct.Struct("<8sQ")
+
+# journal entry header: payload length and CRC32 of payload
+ENTRY_HEADER = struct.Struct("<II")
+
+# indexes of journal files opened in this process, shared by all clients
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_checkpoint_path(journal_path):
+    return journal_path + ".checkpoint"
+
+
+def get_lock_path(journal_path):
+    return journal_path + ".lock"
+
+
+def create_journal(journal_path, generation=0):
+    """
+    create an empty journal file of given generation, an existing journal file is replaced
+    """
+    temp_path = journal_path + ".temp"
+
+    with open(temp_path, "wb") as f:
+        f.write(JOURNAL_HEADER.pack(JOURNAL_MAGIC, generation))
+        f.flush()
+        os.fsync(f.fileno())
+
+    os.rename(temp_path, journal_path)
+    sync_directory(journal_path)
+
+
+def sync_directory(path):
+    fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def read_entries(data, offset):
+    """
+    yield end offset and changes of each complete entry in journal data from offset
+    a torn or corrupted entry left by an interrupted write ends the journal
+    """
+    while offset + ENTRY_HEADER.size <= len(data):
+        length, crc = ENTRY_HEADER.unpack_from(data, offset)
+        start = offset + ENTRY_HEADER.size
+        payload = data[start : start + length]
+
+        if len(payload) < length or zlib.crc32(payload) != crc:
+            return
+
+        offset = start + length
+        yield (offset, json.loads(payload))
+
+
+def replay_entries(fd, offset, records):
+    """
+    apply journal entries from offset to the end of journal file to records
+    return offset after the last valid entry, a torn entry and anything after it are left unapplied
+    """
+    data = os.pread(fd, os.fstat(fd).st_size - offset, offset)
+
+    end = 0
+    for end, changes in read_entries(data, 0):
+        for object_name, record in changes:
+            if record is None:
+                records.pop(object_name, None)
+            else:
+                records[object_name] = tuple(record)
+
+    return offset + end
+
+
+class JournalIndex:
+    """
+    in-memory hash index of object records stored in an append-only journal file
+
+    each committed transaction is appended to the journal as one entry holding the new record of each changed object,
+    a deleted object has a null record. the index is rebuilt from the latest checkpoint followed by the journal,
+    so only entries written since the last compaction are replayed
+
+    compaction writes all live records into a new checkpoint and starts an empty journal of the next generation,
+    other processes find the replaced journal by its inode and reload the index
+    """
+
+    def __init__(self, journal_path):
+        self.journal_path = journal_path
+        self.pid = os.getpid()
+        self.records = {}
+        self.generation = None
+        self.inode = None
+        self.offset = 0
+        self.fd = None
+        self.lock_fd = None
+        self.covered = False
+        self.lock = threading.RLock()
+
+    def open(self):
+        try:
+            self.lock_fd = os.open(get_lock_path(self.journal_path), os.O_RDWR | os.O_CREAT, 0o644)
+            self.load()
+        except (OSError, ValueError, pickle.UnpicklingError) as e:
+            log.error(f"failed to open metadata journal {self.journal_path}: {e}")
+            raise MDSConnectException(str(e))
+
+    def reopen(self):
+        """
+        reopen files of an index inherited from parent process, e.g. preloaded by uWSGI master
+        inherited records are kept if journal is not replaced since, so only entries appended since are replayed
+        """
+        try:
+            self.lock_fd = os.open(get_lock_path(self.journal_path), os.O_RDWR | os.O_CREAT, 0o644)
+            fd = os.open(self.journal_path, os.O_RDWR)
+
+            if os.fstat(fd).st_ino != self.inode:
+                os.close(fd)
+                self.load()
+                return
+
+            self.fd = fd
+            self.replay()
+        except (OSError, ValueError, pickle.UnpicklingError) as e:
+            log.error(f"failed to reopen metadata journal {self.journal_path}: {e}")
+            raise MDSConnectException(str(e))
+
+        log.info(
+            f"metadata journal {self.journal_path} generation {self.generation} inherited: {len(self.records)} records"
+        )
+
+    def load(self, locked=False):
+        """
+        rebuild index from checkpoint and journal
+        both files are read under shared journal lock, so a compaction can't replace the journal in between,
+        set locked=True if the caller holds the journal lock already
+        index is changed only once checkpoint and journal are validated, a failed load is retried by next refresh()
+        """
+        records = {}
+        checkpoint_generation = 0
+
+        if not locked:
+            fcntl.flock(self.lock_fd, fcntl.LOCK_SH)
+
+        try:
+            try:
+                with open(get_checkpoint_path(self.journal_path), "rb") as f:
+                    checkpoint = pickle.load(f)
+            except FileNotFoundError:
+                pass
+            else:
+                checkpoint_generation = checkpoint["generation"]
+                records = checkpoint["records"]
+
+            fd = os.open(self.journal_path, os.O_RDWR)
+
+            try:
+                magic, generation = JOURNAL_HEADER.unpack(
+                    os.pread(fd, JOURNAL_HEADER.size, 0)
+                )
+                if magic != JOURNAL_MAGIC:
+                    raise ValueError(f"{self.journal_path} is not a metadata journal")
+
+                if generation > checkpoint_generation:
+                    raise ValueError(
+                        f"checkpoint generation {checkpoint_generation} is older than journal generation {generation}"
+                    )
+
+                covered = generation < checkpoint_generation
+
+                if covered:
+                    # compaction is interrupted after checkpoint is written, journal is covered by checkpoint
+                    offset = os.fstat(fd).st_size
+                else:
+                    offset = replay_entries(fd, JOURNAL_HEADER.size, records)
+            except:
+                os.close(fd)
+                raise
+        finally:
+            if not locked:
+                fcntl.flock(self.lock_fd, fcntl.LOCK_UN)
+
+        if self.fd is not None:
+            os.close(self.fd)
+
+        self.fd = fd
+        self.inode = os.fstat(fd).st_ino
+        self.records = records
+        self.generation = checkpoint_generation if covered else generation
+        self.offset = offset
+        self.covered = covered
+
+        if covered:
+            log.warning(
+                f"metadata journal {self.journal_path} generation {generation} is covered by checkpoint generation {checkpoint_generation}"
+            )
+        else:
+            log.info(
+                f"metadata journal {self.journal_path} generation {generation} loaded: {len(self.records)} records"
+            )
+
+    def replay(self):
+        """
+        apply entries appended to journal since last replay
+        """
+        self.offset = replay_entries(self.fd, self.offset, self.records)
+
+    def refresh(self, locked=False):
+        """
+        catch up with entries committed by other clients and processes
+        set locked=True if the caller holds the journal lock already, see load()
+        """
+        with self.lock:
+            if self.pid != os.getpid():
+                # index inherited from parent process, its file descriptors and locks are shared with parent
+                os.close(self.fd)
+                os.close(self.lock_fd)
+                self.pid = os.getpid()
+                self.fd = None
+                self.reopen()
+                return
+
+            stat = os.stat(self.journal_path)
+
+            if stat.st_ino != self.inode:
+                self.load(locked)
+            elif stat.st_size > self.offset:
+                self.replay()
+
+    def get(self, object_name):
+        return self.records.get(object_name)
+
+    def commit(self, operations):
+        """
+        validate operations against latest records and append their changes to journal as one entry
+        operation is a tuple of "insert", object name, record and replace flag,
+        "update", object name and dict of changed columns, or "delete" and object name
+        """
+        with self.lock:
+            # index inherited from parent process is reopened before it's locked
+            self.refresh()
+            fcntl.flock(self.lock_fd, fcntl.LOCK_EX)
+
+            try:
+                self.refresh(locked=True)
+
+                # finish interrupted compaction before anything is appended to the covered journal
+                if self.covered:
+                    create_journal(self.journal_path, self.generation)
+                    self.load(locked=True)
+
+                changes = {}
+
+                for operation in operations:
+                    object_name = operation[1]
+                    record = changes.get(object_name, self.records.get(object_name))
+
+                    if operation[0] == "insert":
+                        if record is not None and not operation[3]:
+                            raise MDSCommitException(
+                                f"object {object_name} is recorded already"
+                            )
+                        changes[object_name] = operation[2]
+                    elif operation[0] == "update":
+                        # like SQL UPDATE, missing object is not an error
+                        if record is not None:
+                            record = list(record)
+                            for column, value in operation[2].items():
+                                record[COLUMNS.index(column)] = value
+                            changes[object_name] = tuple(record)
+                    elif record is not None:
+                        changes[object_name] = None
+
+                if not changes:
+                    return
+
+                payload = json.dumps(list(changes.items()), separators=(",", ":")).encode()
+                entry = ENTRY_HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+
+                # bytes of an interrupted write are dropped before they are followed by a valid entry
+                os.ftruncate(self.fd, self.offset)
+                os.pwrite(self.fd, entry, self.offset)
+                if METADATA_JOURNAL_SYNC:
+                    os.fdatasync(self.fd)
+
+                self.offset += len(entry)
+                for object_name, record in changes.items():
+                    if record is None:
+                        self.records.pop(object_name, None)
+                    else:
+                        self.records[object_name] = record
+
+                if self.offset >= METADATA_JOURNAL_COMPACT_SIZE:
+                    try:
+                        self.compact()
+                    except OSError as e:
+                        # changes are committed already, compaction is retried by the next commit
+                        log.warning(f"failed to compact metadata journal {self.journal_path}: {e}")
+            except OSError as e:
+                log.error(f"failed to append metadata journal {self.journal_path}: {e}")
+                raise MDSCommitException(str(e))
+            finally:
+                fcntl.flock(self.lock_fd, fcntl.LOCK_UN)
+
+    def compact(self):
+        """
+        write live records into a new checkpoint and start an empty journal of the next generation
+        the caller must hold the journal lock
+        """
+        generation = self.generation + 1
+        checkpoint_path = get_checkpoint_path(self.journal_path)
+        temp_path = checkpoint_path + ".temp"
+
+        with open(temp_path, "wb") as f:
+            pickle.dump(
+                {"generation": generation, "records": self.records},
+                f,
+                protocol=pickle.HIGHEST_PROTOCOL,
+            )
+            f.flush()
+            os.fsync(f.fileno())
+
+        # checkpoint is replaced first, an old journal found with a newer checkpoint is ignored, see load()
+        os.rename(temp_path, checkpoint_path)
+        create_journal(self.journal_path, generation)
+
+        log.info(
+            f"metadata journal {self.journal_path} compacted into generation {generation}: {len(self.records)} records, {self.offset} bytes dropped"
+        )
+
+        os.close(self.fd)
+        self.fd = os.open(self.journal_path, os.O_RDWR)
+        self.inode = os.fstat(self.fd).st_ino
+        self.generation = generation
+        self.offset = JOURNAL_HEADER.size
+
+
+def get_index(journal_path):
+    """
+    return the index of a journal file shared in this process
+    """
+    with _indexes_lock:
+        index = _indexes.get(journal_path)
+
+        if index is None:
+            index = JournalIndex(journal_path)
+            index.open()
+            _indexes[journal_path] = index
+        else:
+            index.refresh()
+
+    return index
+
+
+class JournalMDSClient:
+    """
+    MDS client of journal metadata backend, see MDSClient for object record operations
+    changes are buffered until commit() and uncommitted changes are dropped by close()
+    SQL is not supported, so MDS operations other than object record operations raise MDSExecuteException
+    """
+
+    def __init__(self, shard=0, db_name=None):
+        self.shard = shard
+        self.db_name = db_name or mds_client.get_shard_path(shard)
+        self.index = None
+        self.operations = []
+
+    def connect(self):
+        try:
+            self.index = get_index(self.db_name)
+        except OSError as e:
+            log.error(f"failed to open metadata journal {self.db_name} - error: {str(e)}")
+            raise MDSConnectException(str(e))
+
+    def cursor(self):
+        pass
+
+    def execute(self, sql_executable, parameters=None):
+        log.error(f"SQL executable is not supported by journal backend: {sql_executable}")
+        raise MDSExecuteException("SQL is not supported by journal metadata backend")
+
+    def fetchall(self):
+        raise MDSExecuteException("SQL is not supported by journal metadata backend")
+
+    def get_object(self, object_name):
+        try:
+            with profiling.timed("mds"):
+                self.index.refresh()
+        except (OSError, ValueError) as e:
+            log.error(f"failed to refresh metadata journal {self.db_name} - error: {str(e)}")
+            raise MDSExecuteException(str(e))
+
+        record = self.index.get(object_name)
+
+        if record is None:
+            return None
+
+        return dict(zip(COLUMNS, record))
+
+    def find_objects(self, states):
+        self.index.refresh()
+
+        return [
+            dict(zip(COLUMNS, record))
+            for record in list(self.index.records.values())
+            if record[COLUMNS.index("state")] in states
+        ]
+
+    def insert_object(self, record, replace=False):
+        self.operations.append(
+            (
+                "insert",
+                record["id"],
+                tuple(record.get(column) for column in COLUMNS),
+                replace,
+            )
+        )
+
+    def update_object(self, object_name, values):
+        self.operations.append(("update", object_name, dict(values)))
+
+    def delete_object(self, object_name, database="main"):
+        if database != "main":
+            raise MDSExecuteException("attached MDS shard is not supported by journal metadata backend")
+
+        self.operations.append(("delete", object_name))
+
+    def commit(self):
+        operations, self.operations = self.operations, []
+
+        try:
+            with profiling.timed("mds"):
+                self.index.commit(operations)
+        except (OSError, ValueError) as e:
+            log.error(f"failed to commit metadata journal {self.db_name} - error: {str(e)}")
+            raise MDSCommitException(str(e))
+
+    def attach(self, shard, alias):
+        raise MDSExecuteException("attached MDS shard is not supported by journal metadata backend")
+
+    def detach(self, alias):
+        pass
+
+    def backup(self, target_path):
+        raise MDSExecuteException("backup is not supported by journal metadata backend")
+
+    def close(self):
+        self.operations = []
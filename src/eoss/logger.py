@@ -8,10 +8,12 @@ class Logger:
     def __init__(self, name, log_filename):
         self.logger = logging.getLogger(name)
         self.logger.setLevel(logging.DEBUG)
+        # log file is opened on first record, so each forked worker opens its own file descriptor
         self.channel = logging.handlers.RotatingFileHandler(
             log_filename,
             maxBytes=LOG_MAX_BYTES,
             backupCount=LOG_BACKUP_COUNT,
+            delay=True,
         )
         self.channel.setFormatter(
             logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
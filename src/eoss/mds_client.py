@@ -1,8 +1,16 @@
+import concurrent.futures
 import os
 import sqlite3
+import threading
+import zlib
 from . import logger
+from . import profiling
+from . import schema
 from . import LOGGING_PATH
+from . import MDS_CONNECTION_POOL_SIZE
+from . import METADATA_DB_BACKEND
 from . import METADATA_DB_PATH
+from . import METADATA_DB_SHARDS
 from . import METADATA_DB_TABLE
 from .exceptions import MDSConnectException
 from .exceptions import MDSExecuteException
@@ -12,18 +20,160 @@ from .exceptions import EOSSInternalException
 mds_client_log = os.path.join(LOGGING_PATH, "mds_client.log")
 log = logger.Logger(__name__, mds_client_log)
 
+# idle SQLite connections of this process by metadata database file, see MDS_CONNECTION_POOL_SIZE
+# a connection keeps its parsed schema and prepared statements between requests
+_pool = {}
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+def get_shard_path(shard):
+    """
+    return metadata database file of a MDS shard
+    shard 0 is METADATA_DB_PATH itself so an unsharded MDS is shard 0 of a sharded one,
+    shard n is stored next to it as <name>.<n><extension>, e.g. mds.sql, mds.1.sql, mds.2.sql
+    """
+    if shard == 0:
+        return METADATA_DB_PATH
+
+    base, extension = os.path.splitext(METADATA_DB_PATH)
+    return f"{base}.{shard}{extension}"
+
+
+def get_shards():
+    """
+    return all configured MDS shards
+    """
+    return tuple(range(max(METADATA_DB_SHARDS, 1)))
+
+
+def get_shard(object_name, shards=None):
+    """
+    return the MDS shard holding records of an object
+    """
+    if shards is None:
+        shards = max(METADATA_DB_SHARDS, 1)
+
+    return zlib.crc32(object_name.encode()) % shards
+
+
+def new_client(shard=0, db_name=None):
+    """
+    return a MDS client of configured metadata backend, see METADATA_DB_BACKEND
+    sqlite: MDSClient, every MDS operation is available
+    journal: journal.JournalMDSClient, only object record operations are available
+    """
+    if METADATA_DB_BACKEND == "journal":
+        from . import journal
+
+        return journal.JournalMDSClient(shard, db_name)
+
+    return MDSClient(shard, db_name)
+
+
+def acquire_connection(db_name):
+    """
+    return an idle connection of a metadata database file from pool, None if there is none
+    connections are never shared with a forked process, and a connection of a replaced or removed file is dropped
+    """
+    global _pool, _pool_pid
+
+    if not MDS_CONNECTION_POOL_SIZE:
+        return None
+
+    with _pool_lock:
+        if _pool_pid != os.getpid():
+            _pool = {}
+            _pool_pid = os.getpid()
+
+        connections = _pool.get(db_name)
+        if not connections:
+            return None
+        db_connection, inode = connections.pop()
+
+    try:
+        stat = os.stat(db_name)
+    except OSError:
+        stat = None
+
+    if stat is None or (stat.st_dev, stat.st_ino) != inode:
+        db_connection.close()
+        return None
+
+    return db_connection
+
+
+def release_connection(db_name, db_connection):
+    """
+    return a connection to pool, it's closed if pool is full or it can't be reset
+    uncommitted changes are rolled back like a closed connection
+    """
+    try:
+        db_connection.rollback()
+        stat = os.stat(db_name)
+    except (sqlite3.Error, OSError):
+        db_connection.close()
+        return
+
+    with _pool_lock:
+        if _pool_pid == os.getpid():
+            connections = _pool.setdefault(db_name, [])
+            if len(connections) < MDS_CONNECTION_POOL_SIZE:
+                connections.append((db_connection, (stat.st_dev, stat.st_ino)))
+                return
+
+    db_connection.close()
+
+
+def map_shards(handler, shards=None):
+    """
+    run handler with a connected MDS client of each shard in parallel
+    return a list of handler results in shard order, the first exception raised by handler is re-raised
+    """
+    if shards is None:
+        shards = get_shards()
+
+    def run(shard):
+        mds = new_client(shard)
+        mds.connect()
+        mds.cursor()
+
+        try:
+            return handler(mds)
+        finally:
+            mds.close()
+
+    if len(shards) == 1:
+        return [run(shards[0])]
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=len(shards)) as executor:
+        futures = [executor.submit(run, shard) for shard in shards]
+        return [future.result() for future in futures]
+
 
 class MDSClient:
-    def __init__(self):
-        self.db_name = METADATA_DB_PATH
+    def __init__(self, shard=0, db_name=None):
+        self.shard = shard
+        self.db_name = db_name or get_shard_path(shard)
         self.db_connection = None
         self.db_cursor = None
+        self.attached = set()
         log.info(f"initialized metadata database file {self.db_name}")
 
     def connect(self):
         try:
-            self.db_connection = sqlite3.connect(self.db_name)
-        except sqlite3.OperationalError as e:
+            with profiling.timed("mds"):
+                self.db_connection = acquire_connection(self.db_name)
+                if self.db_connection is not None:
+                    return
+
+                # pooled connection is used by one thread at a time, but not always the thread opening it
+                self.db_connection = sqlite3.connect(
+                    self.db_name, check_same_thread=not MDS_CONNECTION_POOL_SIZE
+                )
+                # records replaced by INSERT OR REPLACE fire delete triggers, see schema.MDS_TRIGGERS
+                self.db_connection.execute("PRAGMA recursive_triggers = ON")
+        except (sqlite3.OperationalError, sqlite3.DatabaseError) as e:
             log.error(
                 f"failed to connect metadata database {self.db_name} - error: {str(e)}"
             )
@@ -39,7 +189,8 @@ class MDSClient:
         log.info(f"SQL executable: {sql_executable} parameters: {parameters}")
 
         try:
-            self.db_cursor.execute(sql_executable, parameters)
+            with profiling.timed("mds"):
+                self.db_cursor.execute(sql_executable, parameters)
         except (
             sqlite3.OperationalError,
             sqlite3.DatabaseError,
@@ -64,10 +215,109 @@ class MDSClient:
 
     def commit(self):
         try:
-            self.db_connection.commit()
+            with profiling.timed("mds"):
+                self.db_connection.commit()
         except sqlite3.OperationalError as e:
             log.error(f"failed to commit - error: {str(e)}")
             raise MDSCommitException(str(e))
 
+    def get_object(self, object_name):
+        """
+        return metadata record of an object as a dict of columns, None if object is not recorded
+        """
+        columns = [column for column, column_type in schema.METADATA_COLUMNS]
+        output = self.execute(
+            f"SELECT {', '.join(columns)} FROM {METADATA_DB_TABLE} WHERE id = ?",
+            (object_name,),
+        ).fetchall()
+
+        if not output:
+            return None
+
+        return dict(zip(columns, output[0]))
+
+    def find_objects(self, states):
+        """
+        return metadata records of objects in given states
+        """
+        columns = [column for column, column_type in schema.METADATA_COLUMNS]
+        output = self.execute(
+            f"SELECT {', '.join(columns)} FROM {METADATA_DB_TABLE} WHERE state IN ({', '.join('?' * len(states))})",
+            tuple(states),
+        ).fetchall()
+
+        return [dict(zip(columns, row)) for row in output]
+
+    def insert_object(self, record, replace=False):
+        """
+        insert metadata record of an object, record is a dict of columns
+        set replace=True to override existing record of the object
+        """
+        self.execute(
+            f"INSERT {'OR REPLACE ' if replace else ''}INTO {METADATA_DB_TABLE} ({', '.join(record)}) VALUES ({', '.join('?' * len(record))})",
+            tuple(record.values()),
+        )
+
+    def update_object(self, object_name, values):
+        """
+        update columns of an object record, values is a dict of columns
+        """
+        self.execute(
+            f"UPDATE {METADATA_DB_TABLE} SET {', '.join(column + ' = ?' for column in values)} WHERE id = ?",
+            tuple(values.values()) + (object_name,),
+        )
+
+    def delete_object(self, object_name, database="main"):
+        """
+        remove metadata record of an object
+        database is the alias of MDS shard holding the object if it's attached, see attach()
+        """
+        self.execute(
+            f"DELETE FROM {database}.{METADATA_DB_TABLE} WHERE id = ?", (object_name,)
+        )
+
+    def attach(self, shard, alias):
+        """
+        attach another MDS shard to this connection, so records in both shards are changed in one transaction
+        tables of attached shard are referred as <alias>.<table>
+        """
+        self.execute("ATTACH DATABASE ? AS " + alias, (get_shard_path(shard),))
+        self.attached.add(alias)
+
+    def detach(self, alias):
+        self.execute("DETACH DATABASE " + alias)
+        self.attached.discard(alias)
+
+    def backup(self, target_path):
+        """
+        copy a consistent snapshot of metadata database into target file by SQLite online backup API
+        """
+        log.info(f"backing up metadata database {self.db_name} to {target_path}")
+
+        try:
+            target_connection = sqlite3.connect(target_path)
+            try:
+                self.db_connection.backup(target_connection)
+            finally:
+                target_connection.close()
+        except sqlite3.Error as e:
+            log.error(f"failed to back up metadata database to {target_path} - error: {str(e)}")
+            raise MDSExecuteException(str(e))
+
     def close(self):
-        self.db_connection.close()
+        """
+        close connection, it's returned to pool instead if no other MDS shard is attached, see MDS_CONNECTION_POOL_SIZE
+        """
+        if self.db_connection is None:
+            return
+
+        if self.db_cursor is not None:
+            # cursor is reset so a partially read query doesn't hold a read lock in pool
+            self.db_cursor.close()
+            self.db_cursor = None
+
+        if MDS_CONNECTION_POOL_SIZE and not self.attached:
+            release_connection(self.db_name, self.db_connection)
+        else:
+            self.db_connection.close()
+        self.db_connection = None
@@ -0,0 +1,211 @@
+import os
+import time
+from . import logger
+from . import object_client
+from . import storage
+from . import LOGGING_PATH
+from .exceptions import MDSConnectException
+from .exceptions import MDSExecuteException
+from .exceptions import MDSCommitException
+from .exceptions import EOSSInternalException
+from .exceptions import ObjectUnderLockException
+
+migration_log = os.path.join(LOGGING_PATH, "migration.log")
+log = logger.Logger(__name__, migration_log)
+
+# attempts of taking object lock again during migration, readers and writers hold object locks shortly
+LOCK_ATTEMPTS = 10
+
+
+def run_locked(object_filename, object_version, handler):
+    """
+    run handler on an object under its write lock, object state is loaded before handler runs
+    return True if handler is done, None if object is skipped and False if handler is failed
+    """
+    eoss_object_client = object_client.ObjectClient(
+        object_filename, object_version=object_version
+    )
+
+    try:
+        eoss_object_client.set_write_lock()
+    except ObjectUnderLockException:
+        return None
+
+    try:
+        eoss_object_client.init_mds()
+    except MDSConnectException as e:
+        log.error(f"failed to connect to MDS: {e}")
+        eoss_object_client.remove_lock()
+        return False
+
+    try:
+        # object state may be changed before lock is set
+        eoss_object_client.check_object_exists()
+        return handler(eoss_object_client)
+    except (
+        MDSExecuteException,
+        MDSCommitException,
+        EOSSInternalException,
+    ) as e:
+        log.error(f"failed to process object {eoss_object_client.object_name}: {e}")
+        return False
+    finally:
+        eoss_object_client.close_mds()
+        eoss_object_client.remove_lock()
+
+
+def relock(eoss_object_client, shared):
+    """
+    swap the lock held on an object for a shared read lock or an exclusive write lock, retried shortly
+    raise ObjectUnderLockException if the new lock can't be set, no lock is held then
+    """
+    eoss_object_client.remove_lock()
+
+    for attempt in range(LOCK_ATTEMPTS):
+        try:
+            if shared:
+                eoss_object_client.set_read_lock()
+            else:
+                eoss_object_client.set_write_lock()
+        except ObjectUnderLockException:
+            if attempt == LOCK_ATTEMPTS - 1:
+                raise
+            time.sleep(0.1 * (attempt + 1))
+        else:
+            return
+
+
+def migrate_object(
+    eoss_object_client, tier, *, root=0, compression=None, throttle=None
+):
+    """
+    move a fully closed object into another storage tier or storage root
+    the caller must hold the write lock of the object and have its state loaded by check_object_exists(),
+    the write lock is held again when this function returns or raises
+
+    migration procedure:
+    1. set object state 4(migrating), object is still served from its current location
+    2. swap write lock for read lock, so object is still read but not written during copy
+    3. copy object data into a temp file in target location
+    4. take write lock again, copied data is dropped if object record is changed in between
+    5. rename temp file to final object name in target location
+    6. update object location in MDS
+    7. delete object file in previous location
+    8. set object state 0
+
+    if migration is interrupted, recover_object() keeps the object in its recorded location
+    if a lock can't be taken again, object is left in migrating state to recovery and EOSSInternalException is raised
+    """
+    source_path = eoss_object_client.object_path
+    source_compression = eoss_object_client.object_compression
+    target_path = storage.get_object_path(eoss_object_client.object_name, tier, root)
+    target_temp_path = storage.get_object_temp_path(
+        eoss_object_client.object_name, tier, root
+    )
+
+    if (tier, root) == (
+        eoss_object_client.object_tier,
+        eoss_object_client.object_root,
+    ):
+        raise EOSSInternalException(
+            f"object {eoss_object_client.object_name} is in tier {tier} root {root} already"
+        )
+
+    if eoss_object_client.object_layout is not None:
+        raise EOSSInternalException(
+            f"object {eoss_object_client.object_name} is stored in {eoss_object_client.object_layout['mode']} layout, migrating it is not supported"
+        )
+
+    if source_compression is not None:
+        raise EOSSInternalException(
+            f"object {eoss_object_client.object_name} is compressed, migrating compressed object is not supported"
+        )
+
+    eoss_object_client.set_object_state(4)
+    log.info(
+        f"object {eoss_object_client.object_name} migration from tier {eoss_object_client.object_tier} root {eoss_object_client.object_root} to tier {tier} root {root} started"
+    )
+
+    record = get_migration_record(eoss_object_client)
+    copy_error = None
+
+    try:
+        relock(eoss_object_client, shared=True)
+        copied_bytes = storage.copy_object(
+            source_path, target_temp_path, compression=compression, throttle=throttle
+        )
+    except ObjectUnderLockException:
+        raise EOSSInternalException(
+            f"object {eoss_object_client.object_name} is locked by another client, migration is left to recovery"
+        )
+    except Exception as e:
+        copy_error = e
+
+    try:
+        relock(eoss_object_client, shared=False)
+    except ObjectUnderLockException:
+        raise EOSSInternalException(
+            f"object {eoss_object_client.object_name} is kept locked after copy, migration is left to recovery"
+        )
+
+    # object may be overridden, deleted or recovered between the locks
+    if (
+        eoss_object_client.check_object_exists() is not True
+        or eoss_object_client.object_state != 4
+        or get_migration_record(eoss_object_client) != record
+    ):
+        if os.path.exists(target_temp_path):
+            os.unlink(target_temp_path)
+        raise EOSSInternalException(
+            f"object {eoss_object_client.object_name} is changed during migration, copied data is dropped"
+        )
+
+    try:
+        if copy_error is not None:
+            raise copy_error
+        os.rename(target_temp_path, target_path)
+    except Exception as e:
+        log.error(
+            f"failed to copy object {eoss_object_client.object_name} into tier {tier} root {root}: {e}"
+        )
+        recover_object(eoss_object_client)
+        raise EOSSInternalException(e)
+
+    eoss_object_client.set_object_location(tier, root, compression)
+    eoss_object_client.remove_stale_object_files()
+    eoss_object_client.set_object_state(0)
+
+    log.info(
+        f"object {eoss_object_client.object_name} migrated to tier {tier} root {root}, {copied_bytes} bytes copied"
+    )
+
+    return copied_bytes
+
+
+def get_migration_record(eoss_object_client):
+    return (
+        eoss_object_client.object_tier,
+        eoss_object_client.object_root,
+        eoss_object_client.object_size,
+        eoss_object_client.object_timestamp,
+        eoss_object_client.object_digest,
+    )
+
+
+def recover_object(eoss_object_client):
+    """
+    recover an object left in migrating state
+    object files in locations other than the recorded one are removed and object state is set back to 0
+    the caller must hold the write lock of the object and have its state loaded by check_object_exists()
+    """
+    flag = eoss_object_client.remove_stale_object_files()
+
+    if flag:
+        log.warning(
+            f"object {eoss_object_client.object_name} has stale files left after recovery"
+        )
+
+    eoss_object_client.set_object_state(0)
+    log.info(
+        f"object {eoss_object_client.object_name} recovered in tier {eoss_object_client.object_tier} root {eoss_object_client.object_root}"
+    )
@@ -2,29 +2,64 @@ import fcntl
 import os
 import pathlib
 import time
+from . import changelog
+from . import dedup
+from . import erasure
+from . import faults
 from . import logger
 from . import mds_client
 from . import object_name
+from . import profiling
+from . import readmostly
+from . import replication
+from . import storage
 from . import LOGGING_PATH
-from . import METADATA_DB_TABLE
 from . import OBJECT_LOCK_PATH
-from . import STORAGE_PATH
+from . import REPLICATION_READ_FALLBACK
 from .exceptions import MDSConnectException
 from .exceptions import MDSExecuteException
 from .exceptions import MDSCommitException
 from .exceptions import EOSSInternalException
 from .exceptions import ObjectUnderLockException
+from .exceptions import ObjectPreconditionException
 
 object_client_log = os.path.join(LOGGING_PATH, "object_client.log")
 log = logger.Logger(__name__, object_client_log)
 
 
+def record_commit(mds, object_name, operation, database="main"):
+    """
+    record a committed object operation(PUT or DELETE) for subsystems following object changes
+    this function does not commit, it must run inside the same transaction as the object change
+    database is the alias of MDS shard holding the object if it's attached to mds, see MDSClient.attach()
+    """
+    replication.enqueue(mds, object_name, operation, database)
+    changelog.record(mds, object_name, operation, database)
+
+
 class ObjectClient:
-    def __init__(self, object_filename, *, object_version=None):
+    def __init__(self, object_filename, *, object_version=None, read_only=False):
         self._object_filename = object_filename
         self._object_version = object_version
+        self.read_only = read_only
+        self.object_state = None
+        self.object_tier = storage.TIER_HOT
+        self.object_root = 0
+        self.object_compression = None
+        self.object_replica = None
+        self.object_layout = None
+        self.object_size = None
+        self.object_timestamp = None
+        self.object_digest = None
+        self.object_expires = None
+        self.object_lock_filename_fd = None
         log.info(self.__repr__())
-        self.mds_client = mds_client.MDSClient()
+
+        # read-only client serves object records from metadata snapshot and takes no object lock, see READ_MOSTLY_MODE
+        if read_only:
+            self.mds_client = readmostly.ReadOnlyMDSClient(mds_client.get_shard(self.object_name))
+        else:
+            self.mds_client = mds_client.new_client(mds_client.get_shard(self.object_name))
 
     def __repr__(self):
         return f"object filename: {self.object_filename}; object name: {self.object_name}; object version: {self.object_version}"
@@ -41,6 +76,31 @@ class ObjectClient:
     def object_name(self):
         return object_name.set_object_name(self.object_filename, self.object_version)
 
+    @property
+    def object_path(self):
+        return storage.get_object_path(
+            self.object_name, self.object_tier, self.object_root
+        )
+
+    @property
+    def object_temp_path(self):
+        return storage.get_object_temp_path(
+            self.object_name, storage.TIER_HOT, self.object_root
+        )
+
+    @property
+    def object_files(self):
+        """
+        return file paths holding object data in its recorded location
+        deduplicated object has no file of its own, its chunks are shared in chunk store
+        """
+        if dedup.is_dedup(self.object_layout):
+            return []
+        elif self.object_layout is not None:
+            return erasure.get_stripe_paths(self.object_name, self.object_layout)
+        else:
+            return [self.object_path]
+
     @property
     def object_lock_filename(self):
         return os.path.join(OBJECT_LOCK_PATH, self.object_name + ".lock")
@@ -58,33 +118,51 @@ class ObjectClient:
     def close_mds(self):
         self.mds_client.close()
 
-    def set_object_init_data(self, override=False):
+    def set_object_init_data(self, override=False, layout=None, expires=None):
         """
-        set initialized data for object, only id, filename, version and state would be inserted
-        only set override=True when uploading the same object
+        set initialized data for object, only id, filename, version, state and storage location would be inserted
+        only set override=True when uploading the same object, including an expired object not removed yet
+        new object is placed on a hot tier storage root chosen by storage.choose_root(),
+        overridden object stays on its storage root
+        set layout to store object as erasure coded stripes or deduplicated chunks, see erasure.choose_layout() and dedup.choose_layout()
+        chunk manifest of overridden deduplicated object is removed
+        set expires to the unix timestamp object expires at, see expiry.parse_expires()
         """
+        if not override:
+            self.object_root = storage.choose_root(self.object_name)
+
         try:
             if override:
-                self.mds_client.execute(
-                    f"UPDATE {METADATA_DB_TABLE} SET size = ?, timestamp = ?, state = ? WHERE id = ?",
-                    (
-                        None,
-                        None,
-                        1,
-                        self.object_name,
-                    ),
+                self.mds_client.update_object(
+                    self.object_name,
+                    {
+                        "size": None,
+                        "digest": None,
+                        "timestamp": None,
+                        "state": 1,
+                        "tier": storage.TIER_HOT,
+                        "compression": None,
+                        "layout": erasure.dump_layout(layout),
+                        "expires": expires,
+                    },
                 )
+                if dedup.is_dedup(self.object_layout):
+                    dedup.delete_manifest(self.mds_client, self.object_name)
             else:
-                self.mds_client.execute(
-                    f"INSERT INTO {METADATA_DB_TABLE} VALUES (?, ?, ?, ?, ?, ?)",
-                    (
-                        self.object_name,
-                        self.object_filename,
-                        self.object_version,
-                        None,
-                        None,
-                        1,
-                    ),
+                self.mds_client.insert_object(
+                    {
+                        "id": self.object_name,
+                        "filename": self.object_filename,
+                        "version": self.object_version,
+                        "size": None,
+                        "timestamp": None,
+                        "state": 1,
+                        "tier": storage.TIER_HOT,
+                        "compression": None,
+                        "root": self.object_root,
+                        "layout": erasure.dump_layout(layout),
+                        "expires": expires,
+                    }
                 )
         except MDSExecuteException as e:
             log.error(
@@ -100,25 +178,34 @@ class ObjectClient:
             )
             raise MDSCommitException(e)
 
+        # new object data is always written into hot tier
+        self.object_tier = storage.TIER_HOT
+        self.object_compression = None
+        self.object_layout = layout
+        self.object_expires = expires
+
         log.info(f"object {self.object_name} initialized done in MDS database")
 
-    def set_object_size(self):
+    def set_object_size(self, size=None, digest=None):
         """
-        update size column in MDS
+        update size and digest columns in MDS
+        size is taken from object file if it's not given
         """
-        size = None
+        if size is None:
+            try:
+                size = os.path.getsize(self.object_path)
+            except OSError as e:
+                log.warning(f"failed to get size of object {self.object_name}: {e}")
 
-        try:
-            size = os.path.getsize(os.path.join(STORAGE_PATH, self.object_name))
-        except OSError as e:
-            log.warning(f"failed to get size of object {self.object_name}: {e}")
-        else:
+        if size is not None:
             log.info(f"object {self.object_name} size: {size}")
 
+        self.object_size = size
+        self.object_digest = digest
+
         try:
-            self.mds_client.execute(
-                f"UPDATE {METADATA_DB_TABLE} SET size = ? WHERE id = ?",
-                (size, self.object_name),
+            self.mds_client.update_object(
+                self.object_name, {"size": size, "digest": digest}
             )
         except MDSExecuteException as e:
             log.warning(f"failed to update size of object {self.object_name}: {e}")
@@ -137,10 +224,7 @@ class ObjectClient:
         log.info(f"object {self.object_name} latest saved timestamp: {timestamp}")
 
         try:
-            self.mds_client.execute(
-                f"UPDATE {METADATA_DB_TABLE} SET timestamp = ? WHERE id = ?",
-                (timestamp, self.object_name),
-            )
+            self.mds_client.update_object(self.object_name, {"timestamp": timestamp})
         except MDSExecuteException as e:
             log.warning(f"failed to update timestamp of object {self.object_name}: {e}")
         else:
@@ -151,47 +235,123 @@ class ObjectClient:
                     f"failed to commit timestamp of object {self.object_name}: {e}"
                 )
 
-    def set_object_state(self, state):
+    def set_object_state(self, state, operation=None):
         """
         set object uploading state
+        if operation is set, the committed object operation is recorded in the same transaction
 
         number 1: object uploading request initialized
         number 2: object is saved in local storage w/ "object_name.temp" name
         number 0: object is renamed to "object_name" and fully closed
+        number 4: object is fully closed and being migrated to another storage tier
         """
         log.info(f"set state on object {self.object_name}: {state}")
 
         try:
-            self.mds_client.execute(
-                f"UPDATE {METADATA_DB_TABLE} SET state = ? WHERE id = ?",
-                (state, self.object_name),
-            )
+            self.mds_client.update_object(self.object_name, {"state": state})
         except MDSExecuteException as e:
             log.error(f"failed to set state on object {self.object_name}: {e}")
             raise MDSExecuteException(e)
 
+        if operation is not None:
+            try:
+                record_commit(self.mds_client, self.object_name, operation)
+            except MDSExecuteException as e:
+                log.error(
+                    f"failed to record {operation} operation of object {self.object_name}: {e}"
+                )
+                raise MDSExecuteException(e)
+
         try:
             self.mds_client.commit()
         except MDSCommitException as e:
             log.error(f"failed to commit state of object {self.object_name}: {e}")
             raise MDSCommitException(e)
 
-    def delete_object(self):
+    def set_object_location(self, tier, root, compression=None):
+        """
+        update storage tier, storage root and compression of object in MDS
+        """
+        log.info(
+            f"set location on object {self.object_name}: tier {tier} root {root} compression: {compression}"
+        )
+
+        try:
+            self.mds_client.update_object(
+                self.object_name, {"tier": tier, "root": root, "compression": compression}
+            )
+        except MDSExecuteException as e:
+            log.error(f"failed to set location on object {self.object_name}: {e}")
+            raise MDSExecuteException(e)
+
+        try:
+            self.mds_client.commit()
+        except MDSCommitException as e:
+            log.error(f"failed to commit location of object {self.object_name}: {e}")
+            raise MDSCommitException(e)
+
+        self.object_tier = tier
+        self.object_root = root
+        self.object_compression = compression
+
+    def remove_stale_object_files(self):
+        """
+        remove object files left in storage locations other than the recorded one
+        return the number of files failed to be removed
+        """
+        flag = 0
+
+        object_files = self.object_files
+
+        for object_file in storage.get_object_paths(self.object_name):
+            if object_file in object_files:
+                continue
+
+            if os.path.exists(object_file):
+                try:
+                    os.unlink(object_file)
+                except Exception as e:
+                    flag += 1
+                    log.warning(f"failed to delete stale file {object_file}: {e}")
+                else:
+                    log.info(f"stale file {object_file} is deleted")
+
+        return flag
+
+    def delete_object(self, missing_ok=False):
         """
         delete object file and remove record from MDS
         this method can only delete fully closed object
+        set missing_ok=True to remove the record even if object file is lost
+
+        object is marked not closed(state 1) before its files are removed,
+        so a deletion interrupted before its record is removed is cleaned up by pre-start.py
         """
+        self.set_object_state(1)
+
         try:
-            os.unlink(os.path.join(STORAGE_PATH, self.object_name))
-        except Exception as e:
-            log.error(f"failed to delete object file {self.object_name}: {e}")
-            raise EOSSInternalException(e)
+            if self.object_layout is not None:
+                # lost stripes are ignored as they are not needed any more
+                for stripe_path in self.object_files:
+                    try:
+                        os.unlink(stripe_path)
+                    except FileNotFoundError:
+                        log.warning(f"stripe file {stripe_path} is missing already")
+                    except Exception as e:
+                        log.error(f"failed to delete object file {self.object_name}: {e}")
+                        raise EOSSInternalException(e)
+            else:
+                self.delete_object_file(missing_ok)
+        except EOSSInternalException:
+            # object file is kept, object is closed again
+            self.set_object_state(0)
+            raise
+
+        faults.inject("delete")
 
         try:
-            self.mds_client.execute(
-                f"DELETE FROM {METADATA_DB_TABLE} WHERE id = ?",
-                (self.object_name,),
-            )
+            self.mds_client.delete_object(self.object_name)
+            record_commit(self.mds_client, self.object_name, "DELETE")
         except MDSExecuteException as e:
             log.error(f"failed to delete object record {self.object_name} in MDS: {e}")
             raise MDSExecuteException(e)
@@ -204,6 +364,232 @@ class ObjectClient:
 
         log.info(f"object {self.object_name} is deleted")
 
+    def is_appendable(self):
+        """
+        check if object data is stored as a plain uncompressed local file which can be appended
+        """
+        return (
+            self.object_replica is None
+            and self.object_layout is None
+            and self.object_compression is None
+        )
+
+    def append_object(self, data, expected_offset=None):
+        """
+        append data to a fully closed object file
+        the caller must hold the write lock of the object and have its state loaded by check_object_exists()
+
+        append procedure:
+        1. check expected offset against object size in MDS
+        2. truncate object file to object size in MDS, bytes left by an interrupted append are dropped
+        3. break hardlink of object file so data shared with other files is not modified
+        4. write data at the end of object file and flush it to disk
+        5. update size, timestamp and digest in one MDS transaction
+
+        object digest is reset as it can not be extended without reading the whole object
+        return the new object size
+        """
+        size = self.object_size
+
+        if size is None:
+            size = os.path.getsize(self.object_path)
+
+        if expected_offset is not None and expected_offset != size:
+            log.info(
+                f"object {self.object_name} append offset {expected_offset} does not match object size {size}"
+            )
+            raise ObjectPreconditionException(
+                f"expected offset {expected_offset}, object size {size}"
+            )
+
+        try:
+            if os.stat(self.object_path).st_nlink > 1:
+                temp_path = storage.get_object_temp_path(
+                    self.object_name, self.object_tier, self.object_root
+                )
+                storage.copy_object(self.object_path, temp_path)
+                os.rename(temp_path, self.object_path)
+                log.info(f"hardlink of object {self.object_name} is broken before append")
+
+            fd = os.open(self.object_path, os.O_WRONLY)
+            try:
+                os.ftruncate(fd, size)
+                os.pwrite(fd, data, size)
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+        except OSError as e:
+            log.error(f"failed to append data to object {self.object_name}: {e}")
+            raise EOSSInternalException(e)
+
+        new_size = size + len(data)
+        timestamp = int(time.time())
+
+        try:
+            self.mds_client.update_object(
+                self.object_name,
+                {"size": new_size, "timestamp": timestamp, "digest": None},
+            )
+            record_commit(self.mds_client, self.object_name, "PUT")
+            self.mds_client.commit()
+        except (MDSExecuteException, MDSCommitException) as e:
+            log.error(f"failed to commit append on object {self.object_name}: {e}")
+
+            # appended data is not visible in MDS, drop it from object file
+            try:
+                os.truncate(self.object_path, size)
+            except OSError as truncate_error:
+                log.warning(
+                    f"failed to drop appended data of object {self.object_name}: {truncate_error}"
+                )
+
+            raise
+
+        self.object_size = new_size
+        self.object_timestamp = timestamp
+        self.object_digest = None
+
+        log.info(f"{len(data)} bytes appended to object {self.object_name}, size: {new_size}")
+
+        return new_size
+
+    def set_object_copy_data(self, source):
+        """
+        set object state 2 with storage location and layout of source object before object files are copied
+        overridden object is not served any more, object is removed by rollback() if copy fails
+        """
+        try:
+            self.mds_client.insert_object(
+                {
+                    "id": self.object_name,
+                    "filename": self.object_filename,
+                    "version": self.object_version,
+                    "size": None,
+                    "timestamp": None,
+                    "state": 2,
+                    "tier": source.object_tier,
+                    "compression": source.object_compression,
+                    "root": source.object_root,
+                    "layout": erasure.dump_layout(source.object_layout),
+                },
+                replace=True,
+            )
+            self.mds_client.commit()
+        except (MDSExecuteException, MDSCommitException) as e:
+            log.error(f"failed to initialize copy of object {source.object_name}: {e}")
+            raise
+
+        self.object_state = 2
+        self.object_tier = source.object_tier
+        self.object_root = source.object_root
+        self.object_compression = source.object_compression
+        self.object_layout = source.object_layout
+
+    def copy_from(self, source, move=False):
+        """
+        create object from a fully closed source object inside storage, object data is not transferred
+        the caller must hold the write lock of this object and the read lock of source(write lock for move),
+        have states of both objects loaded by check_object_exists() and call set_object_copy_data() first
+
+        copy procedure:
+        1. place object files in the storage location of source by hardlink, reflink or copy
+        2. update object metadata, set object state 0 and remove source record on move in one MDS transaction
+        3. remove source files on move and overridden object files left in other locations
+
+        source record in another MDS shard is removed in the same transaction by attaching its shard
+        chunk manifest of deduplicated source is copied, chunks are shared by both objects
+
+        objects placed by hardlink share data until one of them is appended, see append_object()
+        return placement mode of object files
+        """
+        placement_mode = None
+
+        for source_file, object_file in zip(source.object_files, self.object_files):
+            # lost stripe of erasure coded object is rebuilt by ec-repair later
+            if self.object_layout is not None and not os.path.exists(source_file):
+                log.warning(f"stripe file {source_file} is missing, not copied")
+                continue
+
+            placement_mode = storage.place_file(source_file, object_file)
+
+        timestamp = int(time.time())
+        source_database = "main"
+
+        try:
+            if (
+                move or dedup.is_dedup(source.object_layout)
+            ) and source.mds_client.shard != self.mds_client.shard:
+                source_database = "source_shard"
+                self.mds_client.attach(source.mds_client.shard, source_database)
+
+            self.mds_client.update_object(
+                self.object_name,
+                {
+                    "size": source.object_size,
+                    "timestamp": timestamp,
+                    "digest": source.object_digest,
+                    "state": 0,
+                },
+            )
+            if dedup.is_dedup(self.object_layout):
+                dedup.copy_manifest(
+                    self.mds_client, source.object_name, self.object_name, source_database
+                )
+            record_commit(self.mds_client, self.object_name, "PUT")
+
+            if move:
+                self.mds_client.delete_object(source.object_name, source_database)
+                record_commit(
+                    self.mds_client, source.object_name, "DELETE", source_database
+                )
+
+            self.mds_client.commit()
+        except (MDSExecuteException, MDSCommitException) as e:
+            log.error(
+                f"failed to commit copy of object {source.object_name} into {self.object_name}: {e}"
+            )
+            raise
+        finally:
+            if source_database != "main":
+                try:
+                    self.mds_client.detach(source_database)
+                except MDSExecuteException as e:
+                    log.warning(f"failed to detach MDS shard of object {source.object_name}: {e}")
+
+        self.object_state = 0
+        self.object_size = source.object_size
+        self.object_timestamp = timestamp
+        self.object_digest = source.object_digest
+
+        if move:
+            for source_file in source.object_files:
+                try:
+                    os.unlink(source_file)
+                except FileNotFoundError:
+                    pass
+                except OSError as e:
+                    log.warning(f"failed to delete moved object file {source_file}: {e}")
+
+        self.remove_stale_object_files()
+
+        log.info(
+            f"object {source.object_name} {'moved' if move else 'copied'} into {self.object_name} by {placement_mode}"
+        )
+
+        return placement_mode
+
+    def delete_object_file(self, missing_ok=False):
+        try:
+            os.unlink(self.object_path)
+        except FileNotFoundError as e:
+            # object is served from replica as local object file is lost
+            if self.object_replica is None and not missing_ok:
+                log.error(f"failed to delete object file {self.object_name}: {e}")
+                raise EOSSInternalException(e)
+        except Exception as e:
+            log.error(f"failed to delete object file {self.object_name}: {e}")
+            raise EOSSInternalException(e)
+
     def rollback(self):
         """
         rollback uploading procedure
@@ -214,10 +600,7 @@ class ObjectClient:
         """
         rollback_flag = 0
 
-        for object_file in (
-            os.path.join(STORAGE_PATH, self.object_name),
-            os.path.join(STORAGE_PATH, self.object_name + ".temp"),
-        ):
+        for object_file in storage.get_object_paths(self.object_name):
             if os.path.exists(object_file):
                 try:
                     os.unlink(object_file)
@@ -226,10 +609,7 @@ class ObjectClient:
                     log.warning(f"[ROLLBACK] failed to delete file {object_file}: {e}")
 
         try:
-            self.mds_client.execute(
-                f"DELETE FROM {METADATA_DB_TABLE} WHERE id = ?",
-                (self.object_name,),
-            )
+            self.mds_client.delete_object(self.object_name)
         except MDSExecuteException as e:
             rollback_flag += 1
             log.warning(
@@ -263,52 +643,123 @@ class ObjectClient:
         number 1: object uploading request initialized
         number 2: object is saved in local storage w/ "object_name.temp" name
         number 3: object state is fully closed but object does not exist
-        """
-        output = None
 
+        object in migrating state(4) is still served from its recorded tier
+        erasure coded object exists as long as enough stripes exist to reconstruct it
+        deduplicated object exists as long as its record is closed, missing chunks fail when they are read
+        object is served from replica if object file does not exist and REPLICATION_READ_FALLBACK is enabled
+        expired object is treated as not existing until it's removed, see is_expired()
+        """
         try:
-            output = self.mds_client.execute(
-                f"SELECT state FROM {METADATA_DB_TABLE} WHERE id = ?",
-                (self.object_name,),
-            ).fetchall()
+            record = self.mds_client.get_object(self.object_name)
         except MDSExecuteException as e:
             log.error(
                 f"failed to access MDS to acquire object {self.object_name} state: {e}"
             )
             raise MDSExecuteException(e)
 
-        if output is None:
-            log.error(f"uncaught issue when acquiring object {self.object_name} state")
-            raise EOSSInternalException("uncaught non-state exception")
+        if record is None:
+            return False
         else:
-            # check if output is empty list
-            if isinstance(output, list) and len(output) == 0:
+            object_exists_flag = record["state"]
+            self.object_tier = record["tier"]
+            self.object_root = record["root"]
+            self.object_compression = record["compression"]
+            self.object_size = record["size"]
+            self.object_timestamp = record["timestamp"]
+            self.object_digest = record["digest"]
+            self.object_expires = record["expires"]
+            self.object_state = object_exists_flag
+            self.object_layout = erasure.load_layout(record["layout"])
+
+            if object_exists_flag == 4:
+                object_exists_flag = 0
+
+            if object_exists_flag == 0 and self.is_expired():
+                log.info(f"object {self.object_name} is expired at {self.object_expires}")
                 return False
 
-            object_exists_flag = output[0][0]
+            if object_exists_flag == 0:
+                if self.check_object_files():
+                    return True
+
+                if REPLICATION_READ_FALLBACK:
+                    self.object_replica = storage.find_replica(self.object_name)
+
+                if self.object_replica is not None:
+                    log.warning(
+                        f"object {self.object_name} file is missing, served from replica {self.object_replica}"
+                    )
+                    return True
 
-            if object_exists_flag == 0 and os.path.exists(
-                os.path.join(STORAGE_PATH, self.object_name)
-            ):
-                return True
-            if object_exists_flag == 0 and not os.path.exists(
-                os.path.join(STORAGE_PATH, self.object_name)
-            ):
                 return 3
             if object_exists_flag == 1:
                 return 1
             if object_exists_flag == 2:
                 return 2
 
+    def is_expired(self, now=None):
+        """
+        check if object expiry timestamp is reached
+        """
+        if self.object_expires is None:
+            return False
+
+        if now is None:
+            now = int(time.time())
+
+        return self.object_expires <= now
+
+    def check_object_files(self):
+        """
+        check if object data is readable from its recorded location
+        """
+        if dedup.is_dedup(self.object_layout):
+            return True
+        elif self.object_layout is not None:
+            return (
+                len(erasure.get_available_stripes(self.object_name, self.object_layout))
+                >= self.object_layout["k"]
+            )
+        else:
+            return os.path.exists(self.object_path)
+
+    def get_object_source(self):
+        """
+        return file path and compression method to read object data
+        file path is None for erasure coded or deduplicated object, use open_object() to read it
+        """
+        if self.object_replica is not None:
+            # replica is always stored uncompressed
+            return (self.object_replica, None)
+        elif self.object_layout is not None:
+            return (None, None)
+        else:
+            return (self.object_path, self.object_compression)
+
+    def open_object(self):
+        """
+        open object data for reading regardless of how object is stored
+        """
+        if self.object_replica is None and dedup.is_dedup(self.object_layout):
+            return dedup.open_object(self.object_name, self.object_size)
+
+        if self.object_replica is None and self.object_layout is not None:
+            return erasure.open_object(
+                self.object_name, self.object_layout, self.object_size
+            )
+
+        return storage.open_object(*self.get_object_source())
+
     def set_write_lock(self):
         """
         create an exclusive write lock
         """
-        self.object_lock_filename_fd = open(self.object_lock_filename, "wb")
-
         log.info(f"setting write lock on object {self.object_name}")
         try:
-            fcntl.flock(self.object_lock_filename_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            with profiling.timed("lock"):
+                self.object_lock_filename_fd = open(self.object_lock_filename, "wb")
+                fcntl.flock(self.object_lock_filename_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
         except BlockingIOError as e:
             log.info(f"object {self.object_name} write lock bailed")
             raise ObjectUnderLockException(e)
@@ -318,15 +769,19 @@ class ObjectClient:
     def set_read_lock(self):
         """
         create a shared read lock
+        read-only client takes no lock, object lock file is neither created nor locked
         """
-        if not os.path.exists(self.object_lock_filename):
-            pathlib.Path.touch(self.object_lock_filename, exist_ok=True)
-
-        self.object_lock_filename_fd = open(self.object_lock_filename, "rb")
+        if self.read_only:
+            return
 
         log.info(f"setting read lock on object {self.object_name}")
         try:
-            fcntl.flock(self.object_lock_filename_fd, fcntl.LOCK_SH | fcntl.LOCK_NB)
+            with profiling.timed("lock"):
+                if not os.path.exists(self.object_lock_filename):
+                    pathlib.Path.touch(self.object_lock_filename, exist_ok=True)
+
+                self.object_lock_filename_fd = open(self.object_lock_filename, "rb")
+                fcntl.flock(self.object_lock_filename_fd, fcntl.LOCK_SH | fcntl.LOCK_NB)
         except BlockingIOError as e:
             log.info(f"object {self.object_name} read lock bailed")
             raise ObjectUnderLockException(e)
@@ -337,6 +792,10 @@ class ObjectClient:
         """
         remove a lock
         """
+        if self.read_only or self.object_lock_filename_fd is None:
+            return
+
         fcntl.flock(self.object_lock_filename_fd, fcntl.LOCK_UN)
         self.object_lock_filename_fd.close()
+        self.object_lock_filename_fd = None
         log.info(f"removed lock on object lock file {self.object_lock_filename}")
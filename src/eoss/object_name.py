@@ -22,3 +22,19 @@ def decode_object_name(object_name):
     return plain text of decoded object name string
     """
     return base64.b64decode(object_name.encode()).decode()
+
+
+def parse_object_name(object_name):
+    """
+    return object filename and version string of an object name, version string is None for unversioned object
+    see set_object_name()
+    """
+    object_name_plain = decode_object_name(object_name)
+    object_filename, separator, version_string = object_name_plain.rpartition(
+        f":{VERSION_SALT}:"
+    )
+
+    if not separator:
+        return (object_name_plain, None)
+
+    return (object_filename, version_string)
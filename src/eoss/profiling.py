@@ -0,0 +1,410 @@
+import collections
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+import uuid
+from . import logger
+from . import LOGGING_PATH
+from . import PROFILER_PATH
+from . import SLOW_REQUEST_SAMPLES
+from . import SLOW_REQUEST_THRESHOLD
+
+profiling_log = os.path.join(LOGGING_PATH, "profiling.log")
+log = logger.Logger(__name__, profiling_log)
+slow_log = logger.AccessLogger("slow_log", os.path.join(LOGGING_PATH, "slow.log"))
+
+# profiling session shared by all uWSGI workers
+SESSION_FILE = "session.json"
+
+# interval of checking profiling session file
+# unit: second
+SESSION_POLL_INTERVAL = 1
+
+# number of frames kept in each traceback of tracemalloc
+TRACEMALLOC_FRAMES = 32
+
+PROFILE_MODES = ("cpu", "memory")
+
+# in-flight requests of this worker by thread ident
+_requests = {}
+_watchdog = None
+_watchdog_lock = threading.Lock()
+_sampler = None
+_sampler_lock = threading.Lock()
+
+# threads of profiler itself, they are not sampled
+_profiler_threads = set()
+
+
+def get_frame_name(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def get_folded_stack(frame):
+    """
+    return a stack in collapsed format of flame graph tools, root frame first
+    """
+    names = []
+
+    while frame is not None:
+        names.append(get_frame_name(frame))
+        frame = frame.f_back
+
+    return ";".join(reversed(names))
+
+
+def dump_folded(counts):
+    """
+    return collapsed stack counts as text, one "<stack> <count>" line per stack
+    """
+    return "".join(
+        f"{stack} {count}\n"
+        for stack, count in sorted(counts.items(), key=lambda item: -item[1])
+    )
+
+
+def load_folded(text):
+    counts = collections.Counter()
+
+    for line in text.splitlines():
+        stack, _, count = line.rpartition(" ")
+        if stack:
+            counts[stack] += int(count)
+
+    return counts
+
+
+class RequestContext:
+    def __init__(self, method, path):
+        self.start = time.time()
+        self.method = method
+        self.path = path
+        self.object_name = None
+        self.size = None
+        self.timings = collections.Counter()
+        self.samples = collections.Counter()
+
+
+def begin_request(method, path, start=None):
+    """
+    track a request served by current thread, see end_request()
+    """
+    context = RequestContext(method, path)
+
+    if start is not None:
+        context.start = start
+
+    _requests[threading.get_ident()] = context
+    start_watchdog()
+
+    return context
+
+
+def end_request():
+    """
+    stop tracking request of current thread
+    return its context, None if request is not tracked
+    """
+    return _requests.pop(threading.get_ident(), None)
+
+
+def set_request_info(**info):
+    context = _requests.get(threading.get_ident())
+
+    if context is not None:
+        for key, value in info.items():
+            setattr(context, key, value)
+
+
+def add_time(category, seconds):
+    """
+    add time spent in a category, e.g. "mds" or "lock", to request of current thread
+    """
+    context = _requests.get(threading.get_ident())
+
+    if context is not None:
+        context.timings[category] += seconds
+
+
+class timed:
+    """
+    context manager adding time spent in its block to a category, see add_time()
+    """
+
+    def __init__(self, category):
+        self.category = category
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        add_time(self.category, time.perf_counter() - self.start)
+        return False
+
+
+def log_slow_request(context, request_id, status_code, size=None):
+    """
+    write context of a request slower than SLOW_REQUEST_THRESHOLD into slow log
+    return True if request is logged
+    """
+    latency = time.time() - context.start
+
+    if SLOW_REQUEST_THRESHOLD is None or latency < SLOW_REQUEST_THRESHOLD:
+        return False
+
+    slow_log.info(
+        json.dumps(
+            {
+                "request_id": request_id,
+                "method": context.method,
+                "path": context.path,
+                "status_code": status_code,
+                "object_name": context.object_name,
+                "size": context.size if context.size is not None else size,
+                "latency": round(latency, 6),
+                "timings": {
+                    category: round(seconds, 6)
+                    for category, seconds in context.timings.items()
+                },
+                "stacks": dict(context.samples),
+            }
+        )
+    )
+
+    return True
+
+
+def watch():
+    """
+    sample stacks of requests running longer than SLOW_REQUEST_THRESHOLD and follow profiling sessions
+    stack samples of a request are taken every quarter of the threshold
+    """
+    interval = SESSION_POLL_INTERVAL
+    if SLOW_REQUEST_THRESHOLD is not None:
+        interval = min(max(SLOW_REQUEST_THRESHOLD / 4, 0.01), SESSION_POLL_INTERVAL)
+
+    last_poll = 0
+    session_id = None
+    _profiler_threads.add(threading.get_ident())
+
+    while True:
+        time.sleep(interval)
+        now = time.time()
+
+        if SLOW_REQUEST_THRESHOLD is not None:
+            frames = None
+
+            for ident, context in list(_requests.items()):
+                if now - context.start < SLOW_REQUEST_THRESHOLD:
+                    continue
+                if sum(context.samples.values()) >= SLOW_REQUEST_SAMPLES:
+                    continue
+
+                if frames is None:
+                    frames = sys._current_frames()
+
+                frame = frames.get(ident)
+                if frame is not None:
+                    context.samples[get_folded_stack(frame)] += 1
+
+        if now - last_poll >= SESSION_POLL_INTERVAL:
+            last_poll = now
+            session = read_session()
+
+            if session is not None and session["id"] != session_id:
+                session_id = session["id"]
+                if session["deadline"] > now:
+                    threading.Thread(
+                        target=run_session, args=(session,), daemon=True
+                    ).start()
+
+
+def start_watchdog():
+    """
+    start watchdog thread of this worker once, it's started again in a forked worker
+    """
+    global _watchdog
+
+    if _watchdog is not None and _watchdog[0] == os.getpid():
+        return
+
+    with _watchdog_lock:
+        if _watchdog is not None and _watchdog[0] == os.getpid():
+            return
+
+        thread = threading.Thread(target=watch, name="eoss-watchdog", daemon=True)
+        thread.start()
+        _watchdog = (os.getpid(), thread)
+
+
+class Sampler:
+    """
+    statistical profiler of all threads in this process
+    cpu mode samples stacks of all other threads every interval,
+    memory mode traces memory allocations by tracemalloc and reports allocations alive when it's stopped
+    """
+
+    def __init__(self, mode, interval):
+        self.mode = mode
+        self.interval = interval
+        self.counts = collections.Counter()
+        self.stopped = threading.Event()
+        self.thread = None
+        self.tracemalloc_started = False
+
+    def start(self):
+        if self.mode == "memory":
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(TRACEMALLOC_FRAMES)
+                self.tracemalloc_started = True
+            return
+
+        self.thread = threading.Thread(target=self.sample, name="eoss-sampler", daemon=True)
+        self.thread.start()
+
+    def sample(self):
+        _profiler_threads.add(threading.get_ident())
+
+        try:
+            while not self.stopped.wait(self.interval):
+                for thread_ident, frame in sys._current_frames().items():
+                    if thread_ident not in _profiler_threads:
+                        self.counts[get_folded_stack(frame)] += 1
+        finally:
+            _profiler_threads.discard(threading.get_ident())
+
+    def stop(self):
+        """
+        stop profiling and return collapsed stack counts, sample counts in cpu mode and bytes in memory mode
+        """
+        if self.mode == "memory":
+            snapshot = tracemalloc.take_snapshot().filter_traces(
+                (tracemalloc.Filter(False, tracemalloc.__file__),)
+            )
+            if self.tracemalloc_started:
+                tracemalloc.stop()
+
+            for statistic in snapshot.statistics("traceback"):
+                stack = ";".join(
+                    f"{os.path.basename(frame.filename)}:{frame.lineno}"
+                    for frame in statistic.traceback
+                )
+                self.counts[stack] += statistic.size
+        else:
+            self.stopped.set()
+            self.thread.join()
+
+        return self.counts
+
+
+def profile(seconds, mode, interval):
+    """
+    profile this worker for given seconds
+    return collapsed stack counts, None if another profiling is running in this worker
+    """
+    global _sampler
+
+    with _sampler_lock:
+        if _sampler is not None:
+            return None
+        _sampler = Sampler(mode, interval)
+
+    # thread waiting for profile is not sampled
+    _profiler_threads.add(threading.get_ident())
+
+    try:
+        _sampler.start()
+        time.sleep(max(seconds, 0))
+        return _sampler.stop()
+    finally:
+        _profiler_threads.discard(threading.get_ident())
+        _sampler = None
+
+
+def read_session():
+    try:
+        with open(os.path.join(PROFILER_PATH, SESSION_FILE), "rt") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def run_session(session):
+    """
+    profile this worker until session deadline and save its profile into session directory
+    """
+    seconds = session["deadline"] - time.time()
+    counts = profile(seconds, session["mode"], session["interval"])
+
+    if counts is None:
+        log.warning(f"profiling session {session['id']} skipped, another profiling is running")
+        return
+
+    profile_path = os.path.join(PROFILER_PATH, session["id"], f"{os.getpid()}.folded")
+
+    try:
+        with open(profile_path + ".temp", "wt") as f:
+            f.write(dump_folded(counts))
+        os.rename(profile_path + ".temp", profile_path)
+    except OSError as e:
+        log.error(f"failed to save profile of session {session['id']}: {e}")
+    else:
+        log.info(f"profile of session {session['id']} saved in {profile_path}")
+
+
+def profile_workers(seconds, mode, interval):
+    """
+    profile all uWSGI workers which served a request since start for given seconds
+    a session file is picked up by the watchdog thread of each worker, profiles saved by workers are merged
+    return merged collapsed stack counts and the number of profiled workers
+    """
+    session = {
+        "id": uuid.uuid4().hex,
+        "deadline": time.time() + seconds + SESSION_POLL_INTERVAL,
+        "mode": mode,
+        "interval": interval,
+    }
+    session_path = os.path.join(PROFILER_PATH, session["id"])
+    session_file = os.path.join(PROFILER_PATH, SESSION_FILE)
+
+    os.makedirs(session_path)
+    with open(session_file + ".temp", "wt") as f:
+        json.dump(session, f)
+    os.rename(session_file + ".temp", session_file)
+
+    log.info(f"profiling session {session['id']} started for {seconds} seconds in {mode} mode")
+
+    # workers save their profiles right after deadline
+    _profiler_threads.add(threading.get_ident())
+    try:
+        time.sleep(max(session["deadline"] - time.time(), 0) + SESSION_POLL_INTERVAL)
+    finally:
+        _profiler_threads.discard(threading.get_ident())
+
+    counts = collections.Counter()
+    workers = 0
+
+    for filename in os.listdir(session_path):
+        path = os.path.join(session_path, filename)
+
+        if filename.endswith(".folded"):
+            with open(path, "rt") as f:
+                counts.update(load_folded(f.read()))
+            workers += 1
+
+        os.unlink(path)
+
+    try:
+        os.rmdir(session_path)
+    except OSError as e:
+        # profile of a late worker is saved after merge
+        log.warning(f"failed to remove profiling session directory {session_path}: {e}")
+
+    log.info(f"profiling session {session['id']} done: {workers} workers profiled")
+
+    return (counts, workers)
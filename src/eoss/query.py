@@ -0,0 +1,293 @@
+import base64
+import heapq
+import json
+import os
+import re
+import time
+import zlib
+from . import logger
+from . import mds_client
+from . import object_name
+from . import LOGGING_PATH
+from . import METADATA_DB_TABLE
+from . import QUERY_SCAN_LIMIT
+
+query_log = os.path.join(LOGGING_PATH, "query.log")
+log = logger.Logger(__name__, query_log)
+
+# filter term: <field><operator><value>
+TERM_PATTERN = re.compile(r"^(\w+)(\^=|<=|>=|=|<|>)(.*)$")
+SIZE_PATTERN = re.compile(r"^(\d+)([KMGT]?)$")
+TIME_PATTERN = re.compile(r"^now(?:-(\d+)([smhd]))?$")
+
+SIZE_UNITS = {"": 1, "K": 1024, "M": 1048576, "G": 1073741824, "T": 1099511627776}
+TIME_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+# operators accepted by each filter field
+FIELD_OPERATORS = {
+    "filename": ("=", "^="),
+    "version": ("=",),
+    "size": ("=", "<", "<=", ">", ">="),
+    "timestamp": ("=", "<", "<=", ">", ">="),
+    "state": ("=",),
+}
+
+# closed objects are queried unless state is filtered
+DEFAULT_STATES = (0, 4)
+
+RESULT_COLUMNS = ("id", "filename", "version", "size", "timestamp", "state", "digest")
+
+# query plans in order of preference: index, columns ordering results which is the key of cursor,
+# and filter fields served by the index
+# results are read in index order, so a page never sorts and its cost is bounded by QUERY_SCAN_LIMIT
+PLANS = (
+    ("metadata_version_filename", ("filename",), ("version", "filename")),
+    ("metadata_filename", ("filename", "id"), ("filename",)),
+    ("metadata_size", ("size", "id"), ("size",)),
+    ("metadata_timestamp", ("timestamp", "id"), ("timestamp",)),
+    ("metadata_state", ("id",), ("state",)),
+    (None, ("id",), ()),
+)
+
+
+def parse_value(field, value):
+    if field == "filename":
+        return value
+
+    if field == "version":
+        return None if value == "null" else value
+
+    if field == "size":
+        match = SIZE_PATTERN.match(value)
+        if match is None:
+            raise ValueError(f"invalid size {value}")
+        return int(match.group(1)) * SIZE_UNITS[match.group(2)]
+
+    if field == "timestamp":
+        match = TIME_PATTERN.match(value)
+        if match is None:
+            return int(value)
+        if match.group(1) is None:
+            return int(time.time())
+        return int(time.time()) - int(match.group(1)) * TIME_UNITS[match.group(2)]
+
+    return tuple(int(state) for state in value.split("|"))
+
+
+def parse_filter(filter_terms):
+    """
+    parse filter terms into a list of field, operator and value tuples
+    a term is <field><operator><value>, e.g. size>=1G, timestamp<now-90d, filename^=logs/, version=null or state=1|2
+    size accepts K, M, G and T units, timestamp accepts unix timestamp, now and now-<n><s|m|h|d>
+    raise ValueError if a term is invalid
+    """
+    terms = []
+
+    for filter_term in filter_terms:
+        match = TERM_PATTERN.match(filter_term)
+        if match is None:
+            raise ValueError(f"invalid filter term {filter_term}")
+
+        field, operator, value = match.groups()
+        if operator not in FIELD_OPERATORS.get(field, ()):
+            raise ValueError(f"invalid filter term {filter_term}")
+
+        terms.append((field, operator, parse_value(field, value)))
+
+    return terms
+
+
+def get_condition(term):
+    """
+    return SQL condition and parameters of a filter term
+    """
+    field, operator, value = term
+
+    if field == "filename" and operator == "^=":
+        if not value:
+            return ("1", ())
+        # filenames of a prefix are in range [prefix, prefix with last character incremented)
+        return (
+            "filename >= ? AND filename < ?",
+            (value, value[:-1] + chr(ord(value[-1]) + 1)),
+        )
+
+    if field == "version":
+        return ("version IS ?", (value,))
+
+    if field == "state":
+        return (f"state IN ({', '.join('?' * len(value))})", value)
+
+    return (f"{field} {operator} ?", (value,))
+
+
+def choose_plan(terms):
+    """
+    return the first query plan whose index serves a filter term
+    state plan only serves one state, its key is object id
+    """
+    fields = [term[0] for term in terms]
+
+    for plan in PLANS:
+        index, key_columns, index_fields = plan
+
+        if not index_fields:
+            return plan
+        if index_fields[0] not in fields:
+            continue
+        if index == "metadata_state" and not any(
+            field == "state" and len(value) == 1 for field, operator, value in terms
+        ):
+            continue
+
+        return plan
+
+
+def get_sort_key(values):
+    """
+    return a key sorting values in SQLite order, integers stored in columns of numeric affinity sort before text
+    """
+    return tuple(
+        (0, 0) if value is None else (1, value) if isinstance(value, (int, float)) else (2, value)
+        for value in values
+    )
+
+
+def encode_cursor(key, filter_terms):
+    cursor = {"key": list(key), "filter": zlib.crc32(repr(filter_terms).encode())}
+    return base64.urlsafe_b64encode(json.dumps(cursor).encode()).decode()
+
+
+def decode_cursor(cursor, filter_terms):
+    """
+    return key of a cursor
+    raise ValueError if cursor is malformed or taken with another filter
+    """
+    try:
+        cursor = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        key = cursor["key"]
+        checksum = cursor["filter"]
+    except (ValueError, TypeError, KeyError) as e:
+        raise ValueError(f"invalid query cursor: {e}")
+
+    if checksum != zlib.crc32(repr(filter_terms).encode()):
+        raise ValueError("query cursor is taken with another filter")
+
+    return tuple(key)
+
+
+def scan_shard(mds, plan, terms, key, limit):
+    """
+    read objects after key in plan order from a MDS shard, up to QUERY_SCAN_LIMIT records are examined
+    filter terms not served by plan index are evaluated in the same query for each examined record
+    return matched rows, key of the last examined record and whether the shard is exhausted
+    """
+    index, key_columns, index_fields = plan
+    index_conditions = []
+    index_parameters = []
+    conditions = []
+    parameters = []
+
+    for term in terms:
+        condition, condition_parameters = get_condition(term)
+
+        if term[0] in index_fields and not (
+            term[0] == "state" and len(term[2]) != 1
+        ):
+            index_conditions.append(condition)
+            index_parameters.extend(condition_parameters)
+        else:
+            conditions.append(condition)
+            parameters.extend(condition_parameters)
+
+    if not any(term[0] == "state" for term in terms):
+        conditions.append(f"state IN ({', '.join('?' * len(DEFAULT_STATES))})")
+        parameters.extend(DEFAULT_STATES)
+
+    if key is not None:
+        index_conditions.append(
+            f"({', '.join(key_columns)}) > ({', '.join('?' * len(key_columns))})"
+        )
+        index_parameters.extend(key)
+
+    db_cursor = mds.execute(
+        f"SELECT {', '.join(RESULT_COLUMNS)}, {' AND '.join(conditions) or '1'} FROM {METADATA_DB_TABLE}{f' INDEXED BY {index}' if index else ''} WHERE {' AND '.join(index_conditions) or '1'} ORDER BY {', '.join(key_columns)} LIMIT ?",
+        tuple(parameters) + tuple(index_parameters) + (QUERY_SCAN_LIMIT,),
+    )
+
+    key_positions = [RESULT_COLUMNS.index(column) for column in key_columns]
+    rows = []
+    last_key = None
+    scanned = 0
+
+    for row in db_cursor:
+        scanned += 1
+        last_key = tuple(row[position] for position in key_positions)
+
+        if row[-1]:
+            rows.append(row[:-1])
+            if len(rows) == limit:
+                break
+
+    return (rows, last_key, scanned < QUERY_SCAN_LIMIT and len(rows) < limit)
+
+
+def query_objects(filter_terms, cursor, limit):
+    """
+    query objects matching all filter terms in all MDS shards, see parse_filter()
+    a page examines up to QUERY_SCAN_LIMIT records in each MDS shard, so a page of a selective filter over unindexed
+    fields may hold less objects than limit, even none, with a cursor to continue from
+    return a dict of objects, next cursor which is None after the last page, and the index used
+    raise ValueError if a filter term or cursor is invalid
+    """
+    terms = parse_filter(filter_terms)
+    plan = choose_plan(terms)
+    index, key_columns, index_fields = plan
+    key = decode_cursor(cursor, filter_terms) if cursor else None
+
+    shard_output = mds_client.map_shards(
+        lambda mds: scan_shard(mds, plan, terms, key, limit)
+    )
+
+    key_positions = [RESULT_COLUMNS.index(column) for column in key_columns]
+
+    def get_row_key(row):
+        return get_sort_key(row[position] for position in key_positions)
+
+    # objects are returned up to the least key examined among shards not exhausted,
+    # objects of other shards after it are read again by the next page
+    bound = None
+    for rows, last_key, exhausted in shard_output:
+        if not exhausted and (bound is None or get_sort_key(last_key) < get_sort_key(bound)):
+            bound = last_key
+
+    rows = []
+    for row in heapq.merge(*[output[0] for output in shard_output], key=get_row_key):
+        if bound is not None and get_row_key(row) > get_sort_key(bound):
+            break
+        rows.append(row)
+        if len(rows) == limit:
+            break
+
+    if len(rows) == limit:
+        next_key = tuple(rows[-1][position] for position in key_positions)
+    else:
+        next_key = bound
+
+    log.info(
+        f"query {filter_terms} by index {index}: {len(rows)} objects, {'more' if next_key is not None else 'done'}"
+    )
+
+    objects = []
+    for row in rows:
+        entry = dict(zip(RESULT_COLUMNS[1:], row[1:]))
+        # filename and version columns have numeric affinity, a numeric filename or version string
+        # is read back as a number, so both are parsed from object name
+        entry["filename"], entry["version"] = object_name.parse_object_name(row[0])
+        objects.append(entry)
+
+    return {
+        "objects": objects,
+        "next": encode_cursor(next_key, filter_terms) if next_key is not None else None,
+        "index": index,
+    }
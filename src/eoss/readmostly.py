@@ -0,0 +1,247 @@
+import os
+import sqlite3
+import threading
+import time
+import urllib.parse
+from . import changelog
+from . import logger
+from . import mds_client
+from . import profiling
+from . import schema
+from . import LOGGING_PATH
+from . import METADATA_DB_TABLE
+from . import READ_MOSTLY_CHECK_INTERVAL
+from .exceptions import MDSConnectException
+from .exceptions import MDSExecuteException
+
+readmostly_log = os.path.join(LOGGING_PATH, "readmostly.log")
+log = logger.Logger(__name__, readmostly_log)
+
+METADATA_COLUMN_NAMES = tuple(column for column, column_type in schema.METADATA_COLUMNS)
+
+# snapshots of this process by MDS shard
+_snapshots = {}
+_snapshots_lock = threading.Lock()
+
+
+class MetadataSnapshot:
+    """
+    in-memory snapshot of metadata table of a MDS shard, object records are looked up without SQLite
+
+    snapshot is read through a long-lived read-only connection shared by all clients of this process,
+    its file signature is checked at most every READ_MOSTLY_CHECK_INTERVAL seconds and the whole table is
+    reloaded once it's changed, e.g. by a maintenance job or a sync from the primary, a failed reload keeps the
+    stale snapshot.
+    if the interval is null, metadata database file is treated as immutable: it's opened with immutable=1,
+    so SQLite takes no file lock, and snapshot is never reloaded
+    """
+
+    def __init__(self, shard):
+        self.shard = shard
+        self.path = mds_client.get_shard_path(shard)
+        self.pid = os.getpid()
+        self.db_connection = None
+        self.records = None
+        self.signature = None
+        self.checked = 0
+        self.lock = threading.RLock()
+
+    def connect(self):
+        with self.lock:
+            if self.db_connection is not None and self.pid == os.getpid():
+                return self.db_connection
+
+            # connection inherited from parent process is dropped, SQLite connections must not be used across fork
+            self.pid = os.getpid()
+            self.db_connection = None
+
+            mode = "mode=ro" if READ_MOSTLY_CHECK_INTERVAL is not None else "immutable=1"
+            try:
+                self.db_connection = sqlite3.connect(
+                    f"file:{urllib.parse.quote(self.path)}?{mode}",
+                    uri=True,
+                    check_same_thread=False,
+                )
+            except sqlite3.Error as e:
+                log.error(f"failed to open metadata database {self.path} read-only - error: {str(e)}")
+                raise MDSConnectException(str(e))
+
+            return self.db_connection
+
+    def load(self):
+        """
+        read the whole metadata table into memory
+        file signature is taken before table is read, so a change committed meanwhile triggers another reload
+        """
+        start = time.time()
+
+        signature = changelog.get_signatures([self.shard])[0]
+
+        # connection keeps reading a replaced file, e.g. after resharding or snapshot restore
+        if signature is None or self.signature is None or signature[2] != self.signature[2]:
+            self.close()
+
+        try:
+            rows = (
+                self.connect()
+                .execute(f"SELECT {', '.join(METADATA_COLUMN_NAMES)} FROM {METADATA_DB_TABLE}")
+                .fetchall()
+            )
+        except sqlite3.Error as e:
+            log.error(f"failed to load metadata snapshot of MDS shard {self.shard} - error: {str(e)}")
+            raise MDSConnectException(str(e))
+
+        self.records = {row[0]: row for row in rows}
+        self.signature = signature
+
+        log.info(
+            f"metadata snapshot of MDS shard {self.shard} loaded: {len(rows)} records in {time.time() - start:.3f} seconds"
+        )
+
+    def refresh(self):
+        """
+        load snapshot if it's not loaded yet or its metadata database file is changed
+        """
+        if self.records is not None:
+            if READ_MOSTLY_CHECK_INTERVAL is None:
+                return
+            if time.monotonic() - self.checked < READ_MOSTLY_CHECK_INTERVAL:
+                return
+
+        with self.lock:
+            if self.records is not None:
+                if READ_MOSTLY_CHECK_INTERVAL is None:
+                    return
+                if time.monotonic() - self.checked < READ_MOSTLY_CHECK_INTERVAL:
+                    return
+
+                if changelog.get_signatures([self.shard])[0] == self.signature:
+                    self.checked = time.monotonic()
+                    return
+
+            try:
+                self.load()
+            except MDSConnectException:
+                if self.records is None:
+                    raise
+                log.warning(f"stale metadata snapshot of MDS shard {self.shard} is served")
+
+            self.checked = time.monotonic()
+
+    def get(self, object_name):
+        return self.records.get(object_name)
+
+    def close(self):
+        if self.db_connection is not None and self.pid == os.getpid():
+            self.db_connection.close()
+        self.db_connection = None
+
+
+def get_snapshot(shard):
+    """
+    return the metadata snapshot of a MDS shard shared in this process, refreshed if needed
+    """
+    with _snapshots_lock:
+        snapshot = _snapshots.get(shard)
+
+        if snapshot is None:
+            snapshot = MetadataSnapshot(shard)
+            _snapshots[shard] = snapshot
+
+    with profiling.timed("mds"):
+        snapshot.refresh()
+
+    return snapshot
+
+
+def preload():
+    """
+    load metadata snapshot of all MDS shards in the process forking workers, so workers start with it
+    read-only connections are closed afterwards, each worker opens its own one on the first reload
+    """
+    for shard in mds_client.get_shards():
+        snapshot = get_snapshot(shard)
+        snapshot.close()
+
+
+class ReadOnlyMDSClient:
+    """
+    MDS client of read-mostly mode, see READ_MOSTLY_MODE and MDSClient
+    object records are read from the metadata snapshot of this process, SQL is executed by its read-only connection
+    MDS changes raise MDSExecuteException
+    """
+
+    def __init__(self, shard=0, db_name=None):
+        self.shard = shard
+        self.db_name = db_name or mds_client.get_shard_path(shard)
+        self.snapshot = None
+        self.db_cursor = None
+
+    def connect(self):
+        self.snapshot = get_snapshot(self.shard)
+
+    def cursor(self):
+        self.db_cursor = None
+
+    def execute(self, sql_executable, parameters=None):
+        if parameters is None:
+            parameters = ()
+
+        log.info(f"SQL executable: {sql_executable} parameters: {parameters}")
+
+        try:
+            with profiling.timed("mds"):
+                self.db_cursor = self.snapshot.connect().execute(sql_executable, parameters)
+        except sqlite3.Error as e:
+            log.error(f"failed to execute {sql_executable} - error: {str(e)}")
+            raise MDSExecuteException(str(e))
+
+        return self.db_cursor
+
+    def fetchall(self):
+        try:
+            return self.db_cursor.fetchall()
+        except sqlite3.Error as e:
+            log.error(f"failed to execute fetchall() call - error: {str(e)}")
+            raise MDSExecuteException(str(e))
+
+    def get_object(self, object_name):
+        row = self.snapshot.get(object_name)
+
+        if row is None:
+            return None
+
+        return dict(zip(METADATA_COLUMN_NAMES, row))
+
+    def find_objects(self, states):
+        return [
+            dict(zip(METADATA_COLUMN_NAMES, row))
+            for row in list(self.snapshot.records.values())
+            if row[METADATA_COLUMN_NAMES.index("state")] in states
+        ]
+
+    def insert_object(self, record, replace=False):
+        raise MDSExecuteException("MDS is read-only in read-mostly mode")
+
+    def update_object(self, object_name, values):
+        raise MDSExecuteException("MDS is read-only in read-mostly mode")
+
+    def delete_object(self, object_name, database="main"):
+        raise MDSExecuteException("MDS is read-only in read-mostly mode")
+
+    def commit(self):
+        pass
+
+    def attach(self, shard, alias):
+        raise MDSExecuteException("attached MDS shard is not supported in read-mostly mode")
+
+    def detach(self, alias):
+        pass
+
+    def backup(self, target_path):
+        raise MDSExecuteException("backup is not supported in read-mostly mode")
+
+    def close(self):
+        if self.db_cursor is not None:
+            self.db_cursor.close()
+            self.db_cursor = None
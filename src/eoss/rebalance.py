@@ -0,0 +1,172 @@
+import os
+import time
+from . import logger
+from . import mds_client
+from . import migration
+from . import object_name
+from . import storage
+from . import LOGGING_PATH
+from . import METADATA_DB_TABLE
+from . import REBALANCE_BATCH_SIZE
+from . import STORAGE_PATHS
+
+rebalance_log = os.path.join(LOGGING_PATH, "rebalance.log")
+log = logger.Logger(__name__, rebalance_log)
+
+
+def register_roots(mds):
+    """
+    record configured hot tier storage roots in MDS
+    a newly added storage root is recorded as not rebalanced
+    return a list of newly added storage roots
+    this function does not commit
+    """
+    known_roots = dict(mds.execute("SELECT root, path FROM storage_roots").fetchall())
+    new_roots = []
+
+    for root in storage.get_roots():
+        path = STORAGE_PATHS[root]
+
+        if root not in known_roots:
+            # storage root 0 holds all existing objects when roots are registered for the first time
+            rebalanced = 1 if not known_roots and root == 0 else 0
+            mds.execute(
+                "INSERT INTO storage_roots (root, path, timestamp, rebalanced) VALUES (?, ?, ?, ?)",
+                (root, path, int(time.time()), rebalanced),
+            )
+            new_roots.append(root)
+            log.info(f"storage root {root} {path} registered")
+        elif known_roots[root] != path:
+            log.warning(
+                f"storage root {root} is changed from {known_roots[root]} to {path}, storage roots must not be reordered"
+            )
+            mds.execute(
+                "UPDATE storage_roots SET path = ? WHERE root = ?", (path, root)
+            )
+
+    return new_roots
+
+
+def find_hot_objects(batch_size):
+    """
+    yield id, filename, version and root of closed plain objects in hot tier, MDS shards are walked one by one
+    objects are fetched in batches ordered by object name, MDS is not kept open while a batch is moved
+    """
+    for shard in mds_client.get_shards():
+        after = ""
+
+        while True:
+            mds = mds_client.MDSClient(shard)
+            mds.connect()
+            mds.cursor()
+
+            try:
+                output = mds.execute(
+                    f"SELECT id, root FROM {METADATA_DB_TABLE} WHERE state = 0 AND tier = ? AND layout IS NULL AND id > ? ORDER BY id LIMIT ?",
+                    (storage.TIER_HOT, after, batch_size),
+                ).fetchall()
+            finally:
+                mds.close()
+
+            # filename and version columns have numeric affinity, a numeric filename or version string
+            # is read back as a number, so both are parsed from object name
+            for record_name, root in output:
+                yield (record_name, *object_name.parse_object_name(record_name), root)
+
+            if len(output) < batch_size:
+                break
+
+            after = output[-1][0]
+
+
+def rebalance(throttle=None):
+    """
+    move objects onto storage roots which are not rebalanced yet
+    only objects whose chosen root is a new storage root are moved, objects are never moved between existing roots
+    free space of storage roots is sampled once per pass so placement decisions stay stable during the pass
+    return the number of moved objects and moved bytes
+    """
+    moved_objects = 0
+    moved_bytes = 0
+    failed_objects = 0
+
+    mds = mds_client.MDSClient()
+    mds.connect()
+    mds.cursor()
+
+    try:
+        register_roots(mds)
+        mds.commit()
+
+        new_roots = [
+            row[0]
+            for row in mds.execute(
+                "SELECT root FROM storage_roots WHERE rebalanced = 0"
+            ).fetchall()
+            if row[0] in storage.get_roots()
+        ]
+
+        if not new_roots:
+            return (moved_objects, moved_bytes)
+
+        log.info(f"rebalance onto storage roots {new_roots} started")
+
+        weights = {root: storage.get_free_space(root) for root in storage.get_roots()}
+    finally:
+        mds.close()
+
+    # storage roots are recorded in MDS shard 0, objects are queried in all shards
+    for record_name, object_filename, object_version, root in find_hot_objects(
+        REBALANCE_BATCH_SIZE
+    ):
+        target_root = storage.choose_root(record_name, weights=weights)
+
+        if target_root == root or target_root not in new_roots:
+            continue
+
+        def handler(eoss_object_client):
+            nonlocal moved_bytes
+
+            if (
+                eoss_object_client.object_state != 0
+                or eoss_object_client.object_tier != storage.TIER_HOT
+                or eoss_object_client.object_root == target_root
+                or eoss_object_client.object_layout is not None
+            ):
+                return None
+
+            moved_bytes += migration.migrate_object(
+                eoss_object_client,
+                storage.TIER_HOT,
+                root=target_root,
+                throttle=throttle,
+            )
+            return True
+
+        flag = migration.run_locked(object_filename, object_version, handler)
+
+        if flag:
+            moved_objects += 1
+        elif flag is False:
+            failed_objects += 1
+
+    # failed objects are retried in the next pass
+    if not failed_objects:
+        mds = mds_client.MDSClient()
+        mds.connect()
+        mds.cursor()
+
+        try:
+            for root in new_roots:
+                mds.execute(
+                    "UPDATE storage_roots SET rebalanced = 1 WHERE root = ?", (root,)
+                )
+            mds.commit()
+        finally:
+            mds.close()
+
+    log.info(
+        f"rebalance onto storage roots {new_roots} done: {moved_objects} objects moved, {moved_bytes} bytes copied, {failed_objects} objects failed"
+    )
+
+    return (moved_objects, moved_bytes)
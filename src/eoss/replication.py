@@ -0,0 +1,220 @@
+import concurrent.futures
+import os
+import time
+from . import logger
+from . import mds_client
+from . import object_name
+from . import storage
+from . import LOGGING_PATH
+from . import METADATA_DB_TABLE
+from . import MIRROR_STORAGE_PATHS
+from .exceptions import MDSConnectException
+from .exceptions import MDSExecuteException
+from .exceptions import EOSSInternalException
+from .exceptions import ObjectUnderLockException
+
+replication_log = os.path.join(LOGGING_PATH, "replication.log")
+log = logger.Logger(__name__, replication_log)
+
+
+def enqueue(mds, object_name, operation, database="main"):
+    """
+    record a committed object operation(PUT or DELETE) in replication queue for each mirror
+    this function does not commit, it must run inside the same transaction as the object change
+    database is the alias of MDS shard holding the object
+    """
+    timestamp = int(time.time())
+
+    for mirror in MIRROR_STORAGE_PATHS:
+        mds.execute(
+            f"INSERT INTO {database}.replication_queue (id, operation, mirror, timestamp) VALUES (?, ?, ?, ?)",
+            (object_name, operation, mirror, timestamp),
+        )
+
+
+def get_replication_stats(mds):
+    """
+    return number of pending replication operations and replication lag in seconds
+    """
+    output = mds.execute(
+        "SELECT COUNT(seq), MIN(timestamp) FROM replication_queue"
+    ).fetchall()
+
+    queue_length, oldest_timestamp = output[0]
+
+    if oldest_timestamp is None:
+        lag = 0
+    else:
+        lag = max(int(time.time()) - oldest_timestamp, 0)
+
+    return (queue_length, lag)
+
+
+def replicate_object(record_name, mirror):
+    """
+    copy object data into mirror storage root
+    return True if object is replicated or does not need replication, False if it should be retried
+    """
+    from . import object_client
+
+    replica_path = storage.get_replica_path(record_name, mirror)
+    replica_temp_path = replica_path + ".temp"
+
+    # filename and version columns have numeric affinity, a numeric filename or version string
+    # is read back as a number, so both are parsed from object name
+    object_filename, object_version = object_name.parse_object_name(record_name)
+    eoss_object_client = object_client.ObjectClient(
+        object_filename, object_version=object_version
+    )
+
+    try:
+        eoss_object_client.set_read_lock()
+    except ObjectUnderLockException:
+        log.info(f"object {record_name} is under lock, replication postponed")
+        return False
+
+    # read lock is only held until source file is opened
+    # opened file stays readable even if object is overridden later
+    try:
+        eoss_object_client.init_mds()
+        object_exists_flag = eoss_object_client.check_object_exists()
+
+        if object_exists_flag is not True:
+            log.warning(
+                f"object {record_name} is not ready for replication: {object_exists_flag}"
+            )
+            return object_exists_flag is False
+
+        source_f = eoss_object_client.open_object()
+    except (MDSConnectException, MDSExecuteException, EOSSInternalException, OSError) as e:
+        log.error(f"failed to open object {record_name} for replication: {e}")
+        return False
+    finally:
+        eoss_object_client.close_mds()
+        eoss_object_client.remove_lock()
+
+    try:
+        with source_f, open(replica_temp_path, "wb") as target_f:
+            copied_bytes = storage.copy_file_data(source_f, target_f)
+            target_f.flush()
+            os.fsync(target_f.fileno())
+        os.rename(replica_temp_path, replica_path)
+    except (EOSSInternalException, OSError) as e:
+        log.error(f"failed to replicate object {record_name} to mirror {mirror}: {e}")
+        return False
+
+    log.info(
+        f"object {record_name} replicated to mirror {mirror}, {copied_bytes} bytes copied"
+    )
+
+    return True
+
+
+def delete_replica(object_name, mirror):
+    """
+    delete object replica from mirror storage root
+    """
+    replica_path = storage.get_replica_path(object_name, mirror)
+
+    try:
+        os.unlink(replica_path)
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        log.error(f"failed to delete replica {replica_path}: {e}")
+        return False
+
+    log.info(f"object {object_name} replica deleted from mirror {mirror}")
+
+    return True
+
+
+class Replicator:
+    def __init__(self, workers, batch_size):
+        self.batch_size = batch_size
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=workers)
+
+    def run_once(self):
+        """
+        process one batch of queued operations of each MDS shard
+        return the number of applied queue records
+        """
+        applied = 0
+
+        for shard in mds_client.get_shards():
+            applied += self.run_shard(shard)
+
+        return applied
+
+    def run_shard(self, shard):
+        """
+        process one batch of queued operations of a MDS shard
+        an object and its queued operations are always in the same shard, so operations keep their order
+        only the latest operation of each object on each mirror is applied
+        operations failed more often are taken last, so a permanently failing one can't block the queue
+        MDS is only written after all operations of the batch are done, so object requests don't wait for copies
+        return the number of applied queue records
+        """
+        applied = 0
+
+        mds = mds_client.MDSClient(shard)
+        mds.connect()
+        mds.cursor()
+
+        try:
+            output = mds.execute(
+                f"SELECT q.seq, q.id, q.operation, q.mirror, m.id IS NOT NULL FROM replication_queue q LEFT JOIN {METADATA_DB_TABLE} m ON q.id = m.id ORDER BY q.attempts, q.seq LIMIT ?",
+                (self.batch_size,),
+            ).fetchall()
+
+            # coalesce operations on the same object and mirror, the latest one wins
+            operations = {}
+            for seq, object_name, operation, mirror, object_exists in output:
+                if seq < operations.get((object_name, mirror), (0,))[0]:
+                    continue
+                operations[(object_name, mirror)] = (seq, operation, object_exists)
+
+            futures = {}
+            for (object_name, mirror), (seq, operation, object_exists) in operations.items():
+                if mirror not in MIRROR_STORAGE_PATHS:
+                    # mirror is removed from configuration
+                    future = None
+                elif operation == "DELETE":
+                    future = self.executor.submit(delete_replica, object_name, mirror)
+                elif not object_exists:
+                    # object is deleted after this operation is queued, the DELETE operation is queued later
+                    future = None
+                else:
+                    future = self.executor.submit(replicate_object, object_name, mirror)
+                futures[(object_name, mirror, seq)] = future
+
+            results = {
+                key: future is None or future.result() for key, future in futures.items()
+            }
+
+            for (object_name, mirror, seq), result in results.items():
+                if result:
+                    applied += mds.execute(
+                        "DELETE FROM replication_queue WHERE id = ? AND mirror = ? AND seq <= ?",
+                        (object_name, mirror, seq),
+                    ).rowcount
+                else:
+                    mds.execute(
+                        "UPDATE replication_queue SET attempts = attempts + 1 WHERE id = ? AND mirror = ? AND seq <= ?",
+                        (object_name, mirror, seq),
+                    )
+
+            mds.commit()
+
+            queue_length, lag = get_replication_stats(mds)
+        finally:
+            mds.close()
+
+        log.info(
+            f"MDS shard {shard}: {applied} queued operations applied, {queue_length} pending, replication lag {lag} seconds"
+        )
+
+        return applied
+
+    def close(self):
+        self.executor.shutdown()
@@ -0,0 +1,136 @@
+from . import METADATA_DB_TABLE
+from .exceptions import MDSExecuteException
+
+# metadata table columns
+# new columns must be appended at the end so existing MDS can be upgraded by ALTER TABLE
+METADATA_COLUMNS = (
+    ("id", "STRING PRIMARY KEY"),
+    ("filename", "STRING"),
+    ("version", "STRING"),
+    ("size", "INTEGER"),
+    ("timestamp", "INTEGER"),
+    ("state", "INTEGER"),
+    ("tier", "INTEGER DEFAULT 0"),
+    ("compression", "STRING"),
+    ("root", "INTEGER DEFAULT 0"),
+    ("layout", "STRING"),
+    ("digest", "STRING"),
+    ("expires", "INTEGER"),
+)
+
+# auxiliary tables, created if missing
+MDS_TABLES = {
+    "replication_queue": "CREATE TABLE replication_queue (seq INTEGER PRIMARY KEY AUTOINCREMENT, id STRING, operation STRING, mirror STRING, timestamp INTEGER, attempts INTEGER DEFAULT 0)",
+    "storage_roots": "CREATE TABLE storage_roots (root INTEGER PRIMARY KEY, path STRING, timestamp INTEGER, rebalanced INTEGER DEFAULT 0)",
+    "usage": "CREATE TABLE usage (prefix STRING PRIMARY KEY, objects INTEGER DEFAULT 0, bytes INTEGER DEFAULT 0)",
+    "changelog": "CREATE TABLE changelog (seq INTEGER PRIMARY KEY AUTOINCREMENT, id STRING, filename STRING, version STRING, operation STRING, size INTEGER, digest STRING, timestamp INTEGER)",
+    "chunk_manifest": "CREATE TABLE chunk_manifest (id STRING, seq INTEGER, digest STRING, size INTEGER, PRIMARY KEY (id, seq)) WITHOUT ROWID",
+    "chunk_refs": "CREATE TABLE chunk_refs (digest STRING PRIMARY KEY, refs INTEGER DEFAULT 0) WITHOUT ROWID",
+}
+
+# tables partitioned across MDS shards by object id column, see mds_client.get_shard()
+# other auxiliary tables are only used in shard 0
+# value is a tuple of object id column and sequence column which is not copied when records are moved between shards
+# chunk manifests are moved before metadata records, as removing a metadata record removes its chunk manifest
+SHARDED_TABLES = {
+    "chunk_manifest": ("id", None),
+    METADATA_DB_TABLE: ("id", None),
+    "replication_queue": ("id", "seq"),
+    "changelog": ("id", "seq"),
+}
+
+# indexes, created if missing
+MDS_INDEXES = {
+    "metadata_version_filename": f"CREATE INDEX metadata_version_filename ON {METADATA_DB_TABLE} (version, filename)",
+    "metadata_expires": f"CREATE INDEX metadata_expires ON {METADATA_DB_TABLE} (expires, id) WHERE expires IS NOT NULL",
+    # query plans, see query.py
+    "metadata_filename": f"CREATE INDEX metadata_filename ON {METADATA_DB_TABLE} (filename, id)",
+    "metadata_size": f"CREATE INDEX metadata_size ON {METADATA_DB_TABLE} (size, id)",
+    "metadata_timestamp": f"CREATE INDEX metadata_timestamp ON {METADATA_DB_TABLE} (timestamp, id)",
+    "metadata_state": f"CREATE INDEX metadata_state ON {METADATA_DB_TABLE} (state, id)",
+    # replication batches, operations failed more often are taken last, see replication.py
+    "replication_queue_attempts": "CREATE INDEX replication_queue_attempts ON replication_queue (attempts, seq)",
+    # garbage collection candidates, see dedup.py
+    "chunk_refs_unreferenced": "CREATE INDEX chunk_refs_unreferenced ON chunk_refs (digest) WHERE refs = 0",
+}
+
+
+# usage of an object is counted in usage rows of all prefixes of its filename while it's closed(state 0 or 4)
+USAGE_ADD = "UPDATE usage SET objects = objects + 1, bytes = bytes + IFNULL(NEW.size, 0) WHERE substr(NEW.filename, 1, length(prefix)) = prefix"
+USAGE_SUBTRACT = "UPDATE usage SET objects = objects - 1, bytes = bytes - IFNULL(OLD.size, 0) WHERE substr(OLD.filename, 1, length(prefix)) = prefix"
+
+# triggers, created if missing
+# usage is updated in the same transaction as every change of metadata table, see usage.py
+MDS_TRIGGERS = {
+    "metadata_usage_insert": f"CREATE TRIGGER metadata_usage_insert AFTER INSERT ON {METADATA_DB_TABLE} WHEN NEW.state IN (0, 4) BEGIN {USAGE_ADD}; END",
+    "metadata_usage_delete": f"CREATE TRIGGER metadata_usage_delete AFTER DELETE ON {METADATA_DB_TABLE} WHEN OLD.state IN (0, 4) BEGIN {USAGE_SUBTRACT}; END",
+    "metadata_usage_update": f"CREATE TRIGGER metadata_usage_update AFTER UPDATE OF filename, size, state ON {METADATA_DB_TABLE} WHEN OLD.state IN (0, 4) OR NEW.state IN (0, 4) BEGIN {USAGE_SUBTRACT} AND OLD.state IN (0, 4); {USAGE_ADD} AND NEW.state IN (0, 4); END",
+    # chunk references of a MDS shard are counted in the same transaction as every change of chunk manifests, see dedup.py
+    "metadata_chunk_manifest_delete": f"CREATE TRIGGER metadata_chunk_manifest_delete AFTER DELETE ON {METADATA_DB_TABLE} BEGIN DELETE FROM chunk_manifest WHERE id = OLD.id; END",
+    "chunk_refs_insert": "CREATE TRIGGER chunk_refs_insert AFTER INSERT ON chunk_manifest BEGIN INSERT INTO chunk_refs (digest, refs) VALUES (NEW.digest, 1) ON CONFLICT (digest) DO UPDATE SET refs = refs + 1; END",
+    "chunk_refs_delete": "CREATE TRIGGER chunk_refs_delete AFTER DELETE ON chunk_manifest BEGIN UPDATE chunk_refs SET refs = refs - 1 WHERE digest = OLD.digest; END",
+}
+
+
+def create_mds_tables(mds):
+    """
+    create metadata table and auxiliary tables from scratch
+    """
+    columns = ", ".join(" ".join(column) for column in METADATA_COLUMNS)
+    mds.execute(f"CREATE TABLE {METADATA_DB_TABLE} ({columns})")
+
+    for sql_create in MDS_TABLES.values():
+        mds.execute(sql_create)
+
+    for sql_create in MDS_INDEXES.values():
+        mds.execute(sql_create)
+
+    for sql_create in MDS_TRIGGERS.values():
+        mds.execute(sql_create)
+
+
+def upgrade_mds_tables(mds):
+    """
+    add missing columns to an existing metadata table and create missing auxiliary tables
+    return a list of applied changes
+    """
+    changes = []
+
+    existing_columns = [
+        row[1]
+        for row in mds.execute(f"PRAGMA table_info({METADATA_DB_TABLE})").fetchall()
+    ]
+
+    if not existing_columns:
+        raise MDSExecuteException(f"table {METADATA_DB_TABLE} does not exist")
+
+    for column_name, column_type in METADATA_COLUMNS:
+        if column_name not in existing_columns:
+            mds.execute(
+                f"ALTER TABLE {METADATA_DB_TABLE} ADD COLUMN {column_name} {column_type}"
+            )
+            changes.append(f"column {column_name} added")
+
+    existing_objects = [
+        row[0]
+        for row in mds.execute(
+            "SELECT name FROM sqlite_master WHERE type IN ('table', 'index', 'trigger')"
+        ).fetchall()
+    ]
+
+    for table_name, sql_create in MDS_TABLES.items():
+        if table_name not in existing_objects:
+            mds.execute(sql_create)
+            changes.append(f"table {table_name} created")
+
+    for index_name, sql_create in MDS_INDEXES.items():
+        if index_name not in existing_objects:
+            mds.execute(sql_create)
+            changes.append(f"index {index_name} created")
+
+    for trigger_name, sql_create in MDS_TRIGGERS.items():
+        if trigger_name not in existing_objects:
+            mds.execute(sql_create)
+            changes.append(f"trigger {trigger_name} created")
+
+    return changes
@@ -0,0 +1,200 @@
+import glob
+import os
+import re
+import sqlite3
+from . import logger
+from . import mds_client
+from . import schema
+from . import usage
+from . import LOGGING_PATH
+from . import METADATA_DB_PATH
+from .exceptions import MDSExecuteException
+
+sharding_log = os.path.join(LOGGING_PATH, "sharding.log")
+log = logger.Logger(__name__, sharding_log)
+
+
+def find_shard_files():
+    """
+    return MDS shards whose metadata database file exists
+    """
+    shards = []
+
+    if os.path.exists(METADATA_DB_PATH):
+        shards.append(0)
+
+    base, extension = os.path.splitext(METADATA_DB_PATH)
+    pattern = re.compile(re.escape(base) + r"\.(\d+)" + re.escape(extension) + "$")
+
+    for path in glob.glob(glob.escape(base) + ".*" + glob.escape(extension)):
+        match = pattern.match(path)
+        if match and int(match.group(1)) > 0:
+            shards.append(int(match.group(1)))
+
+    return sorted(shards)
+
+
+def create_shard(shard):
+    """
+    create metadata database file of a MDS shard from scratch
+    """
+    mds = mds_client.MDSClient(shard)
+    mds.connect()
+    mds.cursor()
+
+    try:
+        schema.create_mds_tables(mds)
+        usage.sync_prefixes(mds)
+        mds.commit()
+    finally:
+        mds.close()
+
+    log.info(f"MDS shard {shard} created in {mds.db_name}")
+
+
+def get_copied_columns(mds, table, database="main"):
+    """
+    return columns of a sharded table copied when records are moved between shards
+    mds is a MDS client or a sqlite3 connection
+    """
+    sequence_column = schema.SHARDED_TABLES[table][1]
+
+    return ", ".join(
+        row[1]
+        for row in mds.execute(f"PRAGMA {database}.table_info({table})").fetchall()
+        if row[1] != sequence_column
+    )
+
+
+def reshard(shards):
+    """
+    move records of all existing MDS shards into the shards they are routed to among given number of shards
+    records moved between a pair of shards are committed in one transaction, so an interrupted run can be run again
+    missing shards are created and shards beyond given number of shards are removed once they are drained
+    EOSS service and all daemons must be stopped
+    return a dict of sharded table and the number of moved records
+    """
+    moved_records = {table: 0 for table in schema.SHARDED_TABLES}
+    existing_shards = find_shard_files()
+    all_shards = sorted(set(existing_shards) | set(range(shards)))
+
+    # shards must have the same schema before records are moved
+    for shard in all_shards:
+        if shard not in existing_shards:
+            create_shard(shard)
+            continue
+
+        mds = mds_client.MDSClient(shard)
+        mds.connect()
+        mds.cursor()
+
+        try:
+            for change in schema.upgrade_mds_tables(mds):
+                log.info(f"MDS shard {shard} schema upgraded: {change}")
+            usage.sync_prefixes(mds)
+            mds.commit()
+        finally:
+            mds.close()
+
+    for source in all_shards:
+        mds = mds_client.MDSClient(source)
+        mds.connect()
+        mds.cursor()
+        mds.db_connection.create_function(
+            "eoss_shard",
+            1,
+            lambda object_name: mds_client.get_shard(object_name, shards),
+            deterministic=True,
+        )
+
+        try:
+            for target in range(shards):
+                if target == source:
+                    continue
+
+                mds.attach(target, "target_shard")
+
+                try:
+                    for table, (id_column, sequence_column) in schema.SHARDED_TABLES.items():
+                        columns = get_copied_columns(mds, table)
+                        count = mds.execute(
+                            f"INSERT INTO target_shard.{table} ({columns}) SELECT {columns} FROM main.{table} WHERE eoss_shard({id_column}) = ? ORDER BY {sequence_column or id_column}",
+                            (target,),
+                        ).rowcount
+                        mds.execute(
+                            f"DELETE FROM main.{table} WHERE eoss_shard({id_column}) = ?",
+                            (target,),
+                        )
+                        moved_records[table] += count
+
+                        if count:
+                            log.info(
+                                f"{count} records of table {table} moved from MDS shard {source} to shard {target}"
+                            )
+                    mds.commit()
+                finally:
+                    mds.detach("target_shard")
+        finally:
+            mds.close()
+
+        if source >= shards:
+            os.unlink(mds_client.get_shard_path(source))
+            log.info(f"MDS shard {source} is drained and removed")
+
+    return moved_records
+
+
+def merge_shards(target_path):
+    """
+    copy all configured MDS shards into one metadata database file
+    a read transaction is taken on every shard before any shard is copied and held until all shards are copied,
+    so a transaction across shards, e.g. MOVE, is copied entirely or not at all, and writers wait meanwhile
+    shard 0 is copied by SQLite online backup API and records of sharded tables in other shards are appended
+    """
+    sources = []
+
+    try:
+        for shard in mds_client.get_shards():
+            source = sqlite3.connect(mds_client.get_shard_path(shard), isolation_level=None)
+            sources.append(source)
+            source.execute("BEGIN")
+            source.execute("SELECT COUNT(*) FROM sqlite_master").fetchall()
+
+        target = sqlite3.connect(target_path)
+
+        try:
+            sources[0].backup(target)
+
+            for source in sources[1:]:
+                for table, (id_column, sequence_column) in schema.SHARDED_TABLES.items():
+                    columns = get_copied_columns(target, table)
+                    placeholders = ", ".join("?" for column in columns.split(", "))
+                    target.executemany(
+                        f"INSERT INTO {table} ({columns}) VALUES ({placeholders})",
+                        source.execute(
+                            f"SELECT {columns} FROM {table} ORDER BY {sequence_column or id_column}"
+                        ),
+                    )
+
+                target.commit()
+        finally:
+            target.close()
+    except sqlite3.Error as e:
+        log.error(f"failed to merge MDS shards into {target_path}: {e}")
+        raise MDSExecuteException(str(e))
+    finally:
+        # read transactions end with their connections
+        for source in sources:
+            source.close()
+
+    log.info(f"{len(mds_client.get_shards())} MDS shards merged into {target_path}")
+
+
+def remove_shard_files():
+    """
+    remove metadata database files of all MDS shards except shard 0
+    """
+    for shard in find_shard_files():
+        if shard:
+            os.unlink(mds_client.get_shard_path(shard))
+            log.info(f"MDS shard {shard} removed")
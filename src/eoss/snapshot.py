@@ -0,0 +1,456 @@
+import collections
+import concurrent.futures
+import io
+import json
+import os
+import shutil
+import sqlite3
+import tarfile
+import tempfile
+import time
+from . import dedup
+from . import erasure
+from . import logger
+from . import mds_client
+from . import object_client
+from . import object_name
+from . import sharding
+from . import storage
+from . import LOGGING_PATH
+from . import METADATA_DB_PATH
+from . import METADATA_DB_TABLE
+from .exceptions import MDSConnectException
+from .exceptions import MDSExecuteException
+from .exceptions import EOSSInternalException
+from .exceptions import ObjectUnderLockException
+
+snapshot_log = os.path.join(LOGGING_PATH, "snapshot.log")
+log = logger.Logger(__name__, snapshot_log)
+
+SNAPSHOT_FORMAT_VERSION = 1
+
+# incremental snapshot starts this many seconds before the previous snapshot
+# it covers objects which got their timestamp right before the previous snapshot but were closed after it
+INCREMENTAL_OVERLAP = 60
+
+# attempts to acquire read lock of an object under writing
+LOCK_ATTEMPTS = 10
+
+
+def read_object(object_filename, object_version, record, prefetch_size):
+    """
+    open object data for exporting
+    record is the size, timestamp and digest of object in metadata database copy, object changed since the copy
+    is taken is skipped, so archived data always matches archived record
+    uncompressed object larger than prefetch_size is returned as an open file, others are prefetched
+    return a tuple of file object, size and modification timestamp
+    return None if object does not exist any more, it's changed or it's kept locked
+    """
+    eoss_object_client = object_client.ObjectClient(
+        object_filename, object_version=object_version
+    )
+
+    for attempt in range(LOCK_ATTEMPTS):
+        try:
+            eoss_object_client.set_read_lock()
+        except ObjectUnderLockException:
+            time.sleep(0.1 * (attempt + 1))
+        else:
+            break
+    else:
+        log.warning(f"object {eoss_object_client.object_name} is kept locked, skipped")
+        return None
+
+    # read lock is only held until object file is opened
+    try:
+        eoss_object_client.init_mds()
+        object_exists_flag = eoss_object_client.check_object_exists()
+
+        if object_exists_flag is not True:
+            log.warning(
+                f"object {eoss_object_client.object_name} is not available: {object_exists_flag}, skipped"
+            )
+            return None
+
+        if (
+            eoss_object_client.object_size,
+            eoss_object_client.object_timestamp,
+            eoss_object_client.object_digest,
+        ) != record:
+            log.warning(
+                f"object {eoss_object_client.object_name} is changed after metadata database is copied, skipped"
+            )
+            return None
+
+        object_path, object_compression = eoss_object_client.get_object_source()
+        source_f = eoss_object_client.open_object()
+
+        if object_path is not None:
+            mtime = int(os.stat(object_path).st_mtime)
+        else:
+            mtime = eoss_object_client.object_timestamp
+    except (MDSConnectException, MDSExecuteException, EOSSInternalException, OSError) as e:
+        log.error(f"failed to open object {eoss_object_client.object_name}: {e}")
+        return None
+    finally:
+        eoss_object_client.close_mds()
+        eoss_object_client.remove_lock()
+
+    if object_path is not None and object_compression is None:
+        size = os.fstat(source_f.fileno()).st_size
+        if size > prefetch_size:
+            if record[0] is not None and size != record[0]:
+                source_f.close()
+                log.warning(
+                    f"object {eoss_object_client.object_name} file size {size} does not match record, skipped"
+                )
+                return None
+            return (source_f, size, mtime)
+
+    # prefetch object data so archive writer only writes sequentially
+    spool_f = tempfile.SpooledTemporaryFile(max_size=prefetch_size)
+    with source_f:
+        shutil.copyfileobj(source_f, spool_f, storage.COPY_BUFFER_SIZE)
+    size = spool_f.tell()
+    spool_f.seek(0)
+
+    if record[0] is not None and size != record[0]:
+        spool_f.close()
+        log.warning(
+            f"object {eoss_object_client.object_name} data size {size} does not match record, skipped"
+        )
+        return None
+
+    return (spool_f, size, mtime)
+
+
+def add_json_member(tar, name, data, mtime):
+    content = json.dumps(data, sort_keys=True).encode()
+    tarinfo = tarfile.TarInfo(name)
+    tarinfo.size = len(content)
+    tarinfo.mtime = mtime
+    tar.addfile(tarinfo, io.BytesIO(content))
+
+
+def read_snapshot_info(input_path):
+    """
+    return snapshot information stored in an existing snapshot archive
+    """
+    with tarfile.open(input_path, "r|*") as tar:
+        tarinfo = tar.next()
+        if tarinfo is None or tarinfo.name != "snapshot.json":
+            raise EOSSInternalException(f"{input_path} is not an EOSS snapshot")
+        return json.load(tar.extractfile(tarinfo))
+
+
+def export_snapshot(output_f, *, since=None, workers=4, prefetch_size=8388608, compress=False):
+    """
+    stream a consistent snapshot of MDS and objects into a tar archive
+
+    1. metadata database is copied by SQLite online backup API, MDS shards are merged into one copy
+    2. fully closed objects in the copy are read in parallel and written into archive sequentially
+    3. if since is set, only objects updated at or after since timestamp are exported
+    4. objects deleted, changed or kept locked since the copy are skipped and listed at the end of archive,
+       their records are dropped on restore
+
+    archive layout:
+    snapshot.json: snapshot information
+    mds.sql: metadata database copy
+    objects/<object_name>: object data, uncompressed
+    skipped.json: names of objects recorded in mds.sql without data in archive
+    """
+    snapshot_timestamp = int(time.time())
+    exported_objects = 0
+    exported_bytes = 0
+    skipped_objects = []
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        mds_copy_path = os.path.join(temp_dir, "mds.sql")
+
+        sharding.merge_shards(mds_copy_path)
+
+        log.info(f"metadata database copied at {snapshot_timestamp}")
+
+        mds_copy = sqlite3.connect(mds_copy_path)
+        try:
+            if since is None:
+                output = mds_copy.execute(
+                    f"SELECT id, size, timestamp, digest FROM {METADATA_DB_TABLE} WHERE state IN (0, 4) ORDER BY id"
+                ).fetchall()
+            else:
+                output = mds_copy.execute(
+                    f"SELECT id, size, timestamp, digest FROM {METADATA_DB_TABLE} WHERE state IN (0, 4) AND timestamp >= ? ORDER BY id",
+                    (since,),
+                ).fetchall()
+        finally:
+            mds_copy.close()
+
+        tar = tarfile.open(fileobj=output_f, mode="w|gz" if compress else "w|")
+
+        add_json_member(
+            tar,
+            "snapshot.json",
+            {
+                "format_version": SNAPSHOT_FORMAT_VERSION,
+                "snapshot_timestamp": snapshot_timestamp,
+                "since": since,
+                "number_objects": len(output),
+            },
+            snapshot_timestamp,
+        )
+        tar.add(mds_copy_path, arcname="mds.sql")
+
+        def write_object(record_name, future):
+            nonlocal exported_objects, exported_bytes
+
+            object_data = future.result()
+            if object_data is None:
+                skipped_objects.append(record_name)
+                return
+
+            source_f, size, mtime = object_data
+            tarinfo = tarfile.TarInfo("objects/" + record_name)
+            tarinfo.size = size
+            tarinfo.mtime = mtime
+
+            with source_f:
+                tar.addfile(tarinfo, source_f)
+
+            exported_objects += 1
+            exported_bytes += size
+
+        # bounded read-ahead window keeps memory usage and open files limited
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+            pending = collections.deque()
+
+            for record_name, size, timestamp, digest in output:
+                # filename and version columns have numeric affinity, a numeric filename or version string
+                # is read back as a number, so both are parsed from object name
+                object_filename, object_version = object_name.parse_object_name(record_name)
+                pending.append(
+                    (
+                        record_name,
+                        executor.submit(
+                            read_object,
+                            object_filename,
+                            object_version,
+                            (size, timestamp, digest),
+                            prefetch_size,
+                        ),
+                    )
+                )
+
+                if len(pending) >= workers * 2:
+                    write_object(*pending.popleft())
+
+            while pending:
+                write_object(*pending.popleft())
+
+        add_json_member(tar, "skipped.json", skipped_objects, snapshot_timestamp)
+        tar.close()
+
+    log.info(
+        f"snapshot {snapshot_timestamp} exported: {exported_objects} objects, {exported_bytes} bytes, {len(skipped_objects)} objects skipped"
+    )
+
+    return {
+        "snapshot_timestamp": snapshot_timestamp,
+        "exported_objects": exported_objects,
+        "exported_bytes": exported_bytes,
+        "skipped_objects": len(skipped_objects),
+    }
+
+
+def remove_object_files(record_name):
+    """
+    remove files of an object in all storage locations
+    """
+    for object_file in storage.get_object_paths(record_name):
+        if os.path.exists(object_file):
+            os.unlink(object_file)
+
+
+def drop_skipped_objects(mds_copy, skipped_objects):
+    """
+    remove records of objects skipped by export from a restored metadata database copy
+    their files left by a former restore hold older data than their records, so they are removed too
+    """
+    for record_name in skipped_objects:
+        mds_copy.execute(f"DELETE FROM {METADATA_DB_TABLE} WHERE id = ?", (record_name,))
+        remove_object_files(record_name)
+        log.warning(f"object {record_name} is skipped by snapshot export, dropped")
+
+
+def remove_deleted_objects(mds_copy):
+    """
+    remove files of objects recorded in current MDS but not in a restored metadata database copy,
+    i.e. objects deleted since the snapshot an incremental snapshot is based on
+    return the number of removed objects
+    """
+    restored_names = set(
+        row[0] for row in mds_copy.execute(f"SELECT id FROM {METADATA_DB_TABLE}")
+    )
+    removed_objects = 0
+
+    for shard in mds_client.get_shards():
+        shard_path = mds_client.get_shard_path(shard)
+        if not os.path.exists(shard_path):
+            continue
+
+        mds = sqlite3.connect(shard_path)
+        try:
+            output = mds.execute(f"SELECT id FROM {METADATA_DB_TABLE}").fetchall()
+        except sqlite3.Error as e:
+            # current MDS is damaged or not bootstrapped, nothing to compare with
+            log.warning(f"failed to read objects of MDS shard {shard}: {e}")
+            continue
+        finally:
+            mds.close()
+
+        for (record_name,) in output:
+            if record_name not in restored_names:
+                remove_object_files(record_name)
+                removed_objects += 1
+
+    return removed_objects
+
+
+def relocate_objects(mds_copy):
+    """
+    fix storage location of objects in a restored metadata database copy
+    object recorded in a location where it's not restored is searched across all storage locations
+    chunk manifest of deduplicated object restored as plain file is removed
+    record of object not restored in any storage location is removed
+    return the number of relocated objects and missing objects
+    """
+    relocated_objects = 0
+    missing_objects = 0
+
+    output = mds_copy.execute(
+        f"SELECT id, tier, root, compression, layout FROM {METADATA_DB_TABLE} WHERE state IN (0, 4)"
+    ).fetchall()
+
+    for record_name, tier, root, compression, layout in output:
+        try:
+            if compression is None and layout is None and os.path.exists(
+                storage.get_object_path(record_name, tier, root)
+            ):
+                continue
+        except EOSSInternalException:
+            # recorded storage location is not configured any more
+            pass
+
+        for location in storage.get_locations():
+            if location[0] == storage.TIER_HOT and os.path.exists(
+                storage.get_object_path(record_name, *location)
+            ):
+                mds_copy.execute(
+                    f"UPDATE {METADATA_DB_TABLE} SET tier = ?, root = ?, compression = ?, layout = ? WHERE id = ?",
+                    (location[0], location[1], None, None, record_name),
+                )
+                if dedup.is_dedup(erasure.load_layout(layout)):
+                    dedup.delete_manifest(mds_copy, record_name)
+                relocated_objects += 1
+                break
+        else:
+            mds_copy.execute(f"DELETE FROM {METADATA_DB_TABLE} WHERE id = ?", (record_name,))
+            missing_objects += 1
+            log.warning(f"object {record_name} is not restored in any storage location, dropped")
+
+    return (relocated_objects, missing_objects)
+
+
+def restore_snapshot(input_f):
+    """
+    restore a snapshot archive into storage layer and MDS, EOSS service must be stopped
+    incremental snapshots must be restored in order after the full snapshot they are based on
+    restored objects are placed uncompressed in hot tier, on their recorded storage root if it exists
+    erasure coded and deduplicated objects are restored as plain files
+    records of objects without restored data are dropped, files of objects missing in the snapshot are removed
+    records are distributed into configured MDS shards regardless of MDS shards snapshot is exported from
+    """
+    snapshot_info = None
+    skipped_objects = []
+    restored_objects = 0
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        mds_copy_path = None
+        object_roots = {}
+
+        with tarfile.open(fileobj=input_f, mode="r|*") as tar:
+            for tarinfo in tar:
+                if tarinfo.name == "snapshot.json":
+                    snapshot_info = json.load(tar.extractfile(tarinfo))
+                elif tarinfo.name == "skipped.json":
+                    skipped_objects = json.load(tar.extractfile(tarinfo))
+                elif tarinfo.name == "mds.sql":
+                    mds_copy_path = os.path.join(temp_dir, "mds.sql")
+                    with open(mds_copy_path, "wb") as f:
+                        shutil.copyfileobj(tar.extractfile(tarinfo), f)
+
+                    mds_copy = sqlite3.connect(mds_copy_path)
+                    try:
+                        object_roots = dict(
+                            mds_copy.execute(
+                                f"SELECT id, root FROM {METADATA_DB_TABLE}"
+                            ).fetchall()
+                        )
+                    finally:
+                        mds_copy.close()
+                elif tarinfo.name.startswith("objects/") and tarinfo.isfile():
+                    record_name = tarinfo.name[len("objects/") :]
+                    root = object_roots.get(record_name)
+                    if root not in storage.get_roots():
+                        root = storage.choose_root(record_name)
+
+                    object_temp_path = storage.get_object_temp_path(
+                        record_name, storage.TIER_HOT, root
+                    )
+
+                    with open(object_temp_path, "wb") as f:
+                        shutil.copyfileobj(tar.extractfile(tarinfo), f)
+                        f.flush()
+                        os.fsync(f.fileno())
+
+                    os.rename(
+                        object_temp_path,
+                        storage.get_object_path(record_name, storage.TIER_HOT, root),
+                    )
+                    restored_objects += 1
+
+        if snapshot_info is None or mds_copy_path is None:
+            raise EOSSInternalException("archive is not an EOSS snapshot")
+
+        # metadata database is replaced at last, so an interrupted restore can be retried
+        mds_copy = sqlite3.connect(mds_copy_path)
+        try:
+            removed_objects = remove_deleted_objects(mds_copy)
+            drop_skipped_objects(mds_copy, skipped_objects)
+            relocated_objects, missing_objects = relocate_objects(mds_copy)
+            mds_copy.commit()
+
+            sharding.remove_shard_files()
+
+            mds_target = sqlite3.connect(METADATA_DB_PATH)
+            try:
+                mds_copy.backup(mds_target)
+            finally:
+                mds_target.close()
+        except sqlite3.Error as e:
+            raise MDSExecuteException(str(e))
+        finally:
+            mds_copy.close()
+
+        sharding.reshard(len(mds_client.get_shards()))
+
+    log.info(
+        f"snapshot {snapshot_info['snapshot_timestamp']} restored: {restored_objects} objects, {relocated_objects} objects relocated, {len(skipped_objects)} skipped objects and {missing_objects} missing objects dropped, {removed_objects} deleted objects removed"
+    )
+
+    return {
+        "snapshot_timestamp": snapshot_info["snapshot_timestamp"],
+        "restored_objects": restored_objects,
+        "skipped_objects": len(skipped_objects),
+        "missing_objects": missing_objects,
+        "removed_objects": removed_objects,
+    }
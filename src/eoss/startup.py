@@ -0,0 +1,157 @@
+import gc
+import mimetypes
+import os
+import time
+from . import logger
+from . import mds_client
+from . import readmostly
+from . import LOGGING_PATH
+from . import METADATA_DB_BACKEND
+from . import READ_MOSTLY_MODE
+from . import STARTUP_PRELOAD_SIZE
+from . import STARTUP_WARM_UP
+from .exceptions import MDSConnectException
+from .exceptions import MDSExecuteException
+
+startup_log = os.path.join(LOGGING_PATH, "startup.log")
+log = logger.Logger(__name__, startup_log)
+
+# object looked up by warm-up, it's never stored
+WARM_UP_OBJECT_FILENAME = "eoss-warm-up"
+WARM_UP_USER_AGENT = "eoss-warm-up"
+
+
+def preload_mds():
+    """
+    read ahead up to STARTUP_PRELOAD_SIZE bytes of each MDS shard file into page cache
+    pages are read asynchronously by kernel and shared by all workers
+    """
+    if not STARTUP_PRELOAD_SIZE:
+        return
+
+    for shard in mds_client.get_shards():
+        path = mds_client.get_shard_path(shard)
+
+        try:
+            fd = os.open(path, os.O_RDONLY)
+        except OSError as e:
+            log.warning(f"failed to preload MDS shard {shard} {path}: {e}")
+            continue
+
+        try:
+            size = min(os.fstat(fd).st_size, STARTUP_PRELOAD_SIZE)
+            os.posix_fadvise(fd, 0, size, os.POSIX_FADV_WILLNEED)
+        finally:
+            os.close(fd)
+
+        log.info(f"MDS shard {shard} {path}: {size} bytes read ahead")
+
+
+def preload_journal():
+    """
+    load journal index of all MDS shards, workers inherit the records and only replay entries appended since
+    """
+    from . import journal
+
+    for shard in mds_client.get_shards():
+        try:
+            journal.get_index(mds_client.get_shard_path(shard))
+        except MDSConnectException as e:
+            log.warning(f"failed to preload metadata journal of MDS shard {shard}: {e}")
+
+
+def preload(app):
+    """
+    load state shared by all workers in the process forking them, i.e. uWSGI master
+    system MIME types of downloads and URL rules are loaded once, MDS pages are read ahead
+    journal index of journal backend is loaded, and in read-mostly mode metadata snapshot is loaded too,
+    see readmostly.preload()
+    no SQLite connection is left open here, SQLite connections must not be inherited by forked workers
+    preloaded objects are frozen out of garbage collection, so collections in workers don't copy their pages
+    """
+    start = time.time()
+
+    mimetypes.init()
+    app.url_map.update()
+    preload_mds()
+
+    if METADATA_DB_BACKEND == "journal":
+        preload_journal()
+
+    if READ_MOSTLY_MODE:
+        try:
+            readmostly.preload()
+        except MDSConnectException as e:
+            log.error(f"failed to preload metadata snapshot, it's loaded by each worker: {e}")
+
+    gc.freeze()
+
+    log.info(f"process {os.getpid()} preloaded in {time.time() - start:.3f} seconds")
+
+
+def warm_up(app):
+    """
+    warm up a worker before it takes requests
+    a connection of each MDS shard is opened into pool with its schema and hot statement prepared,
+    then a HEAD request of an absent object runs through the whole request path, e.g. log files and watchdog thread
+    failures are logged only, worker serves requests anyway
+    """
+    start = time.time()
+
+    for shard in mds_client.get_shards():
+        mds = mds_client.new_client(shard)
+
+        try:
+            mds.connect()
+            mds.cursor()
+
+            try:
+                mds.get_object(WARM_UP_OBJECT_FILENAME)
+            finally:
+                mds.close()
+        except (MDSConnectException, MDSExecuteException) as e:
+            log.warning(f"failed to warm up MDS shard {shard}: {e}")
+
+    try:
+        response = app.test_client().head(
+            f"/eoss/v1/object/{WARM_UP_OBJECT_FILENAME}",
+            headers={"User-Agent": WARM_UP_USER_AGENT},
+        )
+    except Exception as e:
+        log.warning(f"failed to run warm-up request: {e}")
+    else:
+        log.info(f"warm-up request returns {response.status_code}")
+
+    log.info(f"worker {os.getpid()} warmed up in {time.time() - start:.3f} seconds")
+
+
+def register(app):
+    """
+    preload in this process and warm up each worker forked from it, see STARTUP_WARM_UP
+    application loaded by uWSGI master is warmed up by post-fork hook of each worker,
+    otherwise it's loaded by the serving process itself, e.g. uWSGI lazy-apps, and it's warmed up at once
+    """
+    preload(app)
+
+    if not STARTUP_WARM_UP:
+        return
+
+    try:
+        import uwsgi
+
+        forking = uwsgi.worker_id() == 0
+    except (ImportError, AttributeError):
+        forking = False
+
+    if not forking:
+        warm_up(app)
+        return
+
+    previous_hook = getattr(uwsgi, "post_fork_hook", None)
+
+    def post_fork_hook():
+        if previous_hook is not None:
+            previous_hook()
+        warm_up(app)
+
+    uwsgi.post_fork_hook = post_fork_hook
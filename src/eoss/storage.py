@@ -0,0 +1,327 @@
+import fcntl
+import gzip
+import hashlib
+import io
+import math
+import os
+import time
+from . import COLD_STORAGE_PATH
+from . import ERASURE_CODING_DATA_STRIPES
+from . import ERASURE_CODING_PARITY_STRIPES
+from . import MIRROR_STORAGE_PATHS
+from . import STORAGE_PATHS
+from .exceptions import EOSSInternalException
+
+# storage tiers
+TIER_HOT = 0
+TIER_COLD = 1
+
+# copy buffer size
+# unit: byte
+COPY_BUFFER_SIZE = 1048576
+
+# ioctl request number to clone a file by reflink
+FICLONE = 0x40049409
+
+# file placement modes in preference order
+PLACEMENT_MODES = ("hardlink", "reflink", "copy")
+
+# free space of storage roots is cached for placement
+# unit: second
+FREE_SPACE_CACHE_TTL = 10
+
+_free_space_cache = {}
+
+
+def get_tier_path(tier, root=0):
+    """
+    return storage root directory of given tier
+    hot tier may have multiple storage roots, cold tier has only one
+    """
+    if tier == TIER_HOT:
+        try:
+            return STORAGE_PATHS[root]
+        except (IndexError, TypeError):
+            raise EOSSInternalException(f"unknown storage root {root}")
+    if tier == TIER_COLD:
+        if not COLD_STORAGE_PATH:
+            raise EOSSInternalException("cold storage tier is not configured")
+        return COLD_STORAGE_PATH
+
+    raise EOSSInternalException(f"unknown storage tier {tier}")
+
+
+def get_roots():
+    """
+    return all configured storage roots of hot tier
+    """
+    return tuple(range(len(STORAGE_PATHS)))
+
+
+def get_locations():
+    """
+    return all storage locations as (tier, root) tuples
+    """
+    locations = [(TIER_HOT, root) for root in get_roots()]
+
+    if COLD_STORAGE_PATH:
+        locations.append((TIER_COLD, 0))
+
+    return locations
+
+
+def get_object_path(object_name, tier=TIER_HOT, root=0):
+    """
+    return object file path in given tier and storage root
+    """
+    return os.path.join(get_tier_path(tier, root), object_name)
+
+
+def get_object_temp_path(object_name, tier=TIER_HOT, root=0):
+    """
+    return object temp file path in given tier and storage root
+    """
+    return get_object_path(object_name, tier, root) + ".temp"
+
+
+def get_stripe_path(object_name, root, index):
+    """
+    return erasure coded stripe file path in given hot tier storage root
+    """
+    return get_object_path(object_name, TIER_HOT, root) + f".ec{index}"
+
+
+def get_object_paths(object_name):
+    """
+    return all possible object file paths including temp ones across tiers and storage roots
+    erasure coded stripe files are included if there are enough storage roots for erasure coding
+    """
+    paths = []
+
+    for tier, root in get_locations():
+        paths.append(get_object_path(object_name, tier, root))
+        paths.append(get_object_temp_path(object_name, tier, root))
+
+    stripes = ERASURE_CODING_DATA_STRIPES + ERASURE_CODING_PARITY_STRIPES
+
+    if len(get_roots()) >= stripes:
+        for root in get_roots():
+            for index in range(stripes):
+                stripe_path = get_stripe_path(object_name, root, index)
+                paths.append(stripe_path)
+                paths.append(stripe_path + ".temp")
+
+    return paths
+
+
+def get_free_space(root):
+    """
+    return free space in bytes of a hot tier storage root, the value is cached shortly
+    """
+    now = time.monotonic()
+    cached = _free_space_cache.get(root)
+
+    if cached is not None and now - cached[0] < FREE_SPACE_CACHE_TTL:
+        return cached[1]
+
+    try:
+        statvfs = os.statvfs(get_tier_path(TIER_HOT, root))
+        free_space = statvfs.f_bavail * statvfs.f_frsize
+    except OSError:
+        free_space = 0
+
+    _free_space_cache[root] = (now, free_space)
+
+    return free_space
+
+
+def rank_roots(object_name, roots=None, weights=None):
+    """
+    rank hot tier storage roots for object by weighted rendezvous hashing, the best root comes first
+    storage roots are weighted by free space by default, roots without free space are ranked last
+    the same object always gets the same ranking as long as roots and weights do not change,
+    adding a root only takes objects from existing roots to the new one
+    """
+    if roots is None:
+        roots = get_roots()
+
+    if len(roots) == 1:
+        return list(roots)
+
+    scores = {}
+
+    for root in roots:
+        if weights is None:
+            weight = get_free_space(root)
+        else:
+            weight = weights[root]
+
+        if weight <= 0:
+            scores[root] = 0
+            continue
+
+        digest = hashlib.blake2b(f"{root}:{object_name}".encode(), digest_size=8).digest()
+        # map hash into (0, 1)
+        hash_value = (int.from_bytes(digest, "big") + 1) / (2**64 + 2)
+        scores[root] = weight / -math.log(hash_value)
+
+    return sorted(roots, key=lambda root: scores[root], reverse=True)
+
+
+def choose_root(object_name, roots=None, weights=None):
+    """
+    choose a hot tier storage root for object, see rank_roots()
+    """
+    return rank_roots(object_name, roots, weights)[0]
+
+
+def get_replica_path(object_name, mirror):
+    """
+    return object replica file path in given mirror storage root
+    """
+    return os.path.join(mirror, object_name)
+
+
+def find_replica(object_name):
+    """
+    return the first existing object replica file path across mirror storage roots
+    return None if no replica exists
+    """
+    for mirror in MIRROR_STORAGE_PATHS:
+        replica_path = get_replica_path(object_name, mirror)
+        if os.path.exists(replica_path):
+            return replica_path
+
+    return None
+
+
+def open_object(object_path, compression=None):
+    """
+    open object file for reading, compressed object is decompressed transparently
+    """
+    if compression is None:
+        return open(object_path, "rb")
+    if compression == "gzip":
+        return gzip.open(object_path, "rb")
+
+    raise EOSSInternalException(f"unknown object compression {compression}")
+
+
+def copy_object(source_path, target_path, *, compression=None, throttle=None):
+    """
+    copy object file data into target path and flush it to disk
+    compression is applied on target file if it's set
+    return the number of bytes read from source file
+    """
+    copied_bytes = 0
+
+    with open(source_path, "rb") as source_f, open(target_path, "wb") as target_f:
+        if compression == "gzip":
+            output_f = gzip.GzipFile(fileobj=target_f, mode="wb", mtime=0)
+        elif compression is None:
+            output_f = target_f
+        else:
+            raise EOSSInternalException(f"unknown object compression {compression}")
+
+        while True:
+            data = source_f.read(COPY_BUFFER_SIZE)
+            if not data:
+                break
+
+            output_f.write(data)
+            copied_bytes += len(data)
+
+            if throttle is not None:
+                throttle.consume(len(data))
+
+        if output_f is not target_f:
+            output_f.close()
+
+        target_f.flush()
+        os.fsync(target_f.fileno())
+
+    return copied_bytes
+
+
+def copy_file_data(source_f, target_f, *, throttle=None):
+    """
+    copy all remaining data of source file object into target file object
+    copy_file_range() is used to copy data inside kernel, it falls back to userspace copy if it's not supported
+    return the number of copied bytes
+    """
+    copied_bytes = 0
+
+    # decompressed stream can not be copied inside kernel
+    if hasattr(os, "copy_file_range") and isinstance(source_f, io.BufferedReader):
+        try:
+            source_fd = source_f.fileno()
+            target_fd = target_f.fileno()
+            target_f.flush()
+
+            while True:
+                count = os.copy_file_range(source_fd, target_fd, COPY_BUFFER_SIZE)
+                if count == 0:
+                    return copied_bytes
+
+                copied_bytes += count
+
+                if throttle is not None:
+                    throttle.consume(count)
+        except OSError as e:
+            # copy_file_range() may not be supported by filesystem or kernel
+            if copied_bytes:
+                raise EOSSInternalException(e)
+
+    while True:
+        data = source_f.read(COPY_BUFFER_SIZE)
+        if not data:
+            break
+
+        target_f.write(data)
+        copied_bytes += len(data)
+
+        if throttle is not None:
+            throttle.consume(len(data))
+
+    return copied_bytes
+
+
+def place_file(source_path, target_path, mode="auto"):
+    """
+    place source file data at target path by hardlink, reflink or copy
+    auto mode tries hardlink, reflink and copy in order
+    target file is flushed to disk, return the placement mode used
+    """
+    if mode == "auto":
+        modes = PLACEMENT_MODES
+    elif mode in PLACEMENT_MODES:
+        modes = (mode,)
+    else:
+        raise EOSSInternalException(f"unknown placement mode {mode}")
+
+    if os.path.lexists(target_path):
+        os.unlink(target_path)
+
+    for placement_mode in modes:
+        try:
+            if placement_mode == "hardlink":
+                os.link(source_path, target_path)
+                return placement_mode
+
+            with open(source_path, "rb") as source_f, open(target_path, "wb") as target_f:
+                if placement_mode == "reflink":
+                    fcntl.ioctl(target_f.fileno(), FICLONE, source_f.fileno())
+                else:
+                    copy_file_data(source_f, target_f)
+                    target_f.flush()
+                os.fsync(target_f.fileno())
+
+            return placement_mode
+        except OSError as e:
+            if os.path.lexists(target_path):
+                os.unlink(target_path)
+
+            if placement_mode == modes[-1]:
+                raise EOSSInternalException(e)
+
+    raise EOSSInternalException(f"unable to place file {source_path}")
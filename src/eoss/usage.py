@@ -0,0 +1,97 @@
+import os
+from . import logger
+from . import mds_client
+from . import LOGGING_PATH
+from . import METADATA_DB_TABLE
+from . import USAGE_PREFIXES
+
+usage_log = os.path.join(LOGGING_PATH, "usage.log")
+log = logger.Logger(__name__, usage_log)
+
+
+def sync_prefixes(mds):
+    """
+    add usage rows of newly configured prefixes and remove rows of prefixes not configured any more
+    totals of an added prefix are counted by one scan of metadata table, later changes are counted by triggers,
+    see schema.MDS_TRIGGERS
+    this function does not commit
+    return a list of applied changes
+    """
+    changes = []
+
+    existing_prefixes = [
+        row[0] for row in mds.execute("SELECT prefix FROM usage").fetchall()
+    ]
+
+    for prefix in existing_prefixes:
+        if prefix not in USAGE_PREFIXES:
+            mds.execute("DELETE FROM usage WHERE prefix = ?", (prefix,))
+            changes.append(f"usage prefix {prefix} removed")
+
+    for prefix in USAGE_PREFIXES:
+        if prefix not in existing_prefixes:
+            mds.execute(
+                f"INSERT INTO usage (prefix, objects, bytes) SELECT ?, COUNT(id), IFNULL(SUM(size), 0) FROM {METADATA_DB_TABLE} WHERE state IN (0, 4) AND substr(filename, 1, length(?)) = ?",
+                (prefix, prefix, prefix),
+            )
+            changes.append(f"usage prefix {prefix} added")
+
+    for change in changes:
+        log.info(f"MDS shard {mds.shard}: {change}")
+
+    return changes
+
+
+def get_usage(prefixes=None):
+    """
+    return a dict of prefix and a tuple of number of objects and bytes summed over all MDS shards
+    only given prefixes are read if prefixes is set
+    """
+    if prefixes is None:
+        prefixes = list(USAGE_PREFIXES)
+
+    prefixes = list(prefixes)
+    usage = {prefix: (0, 0) for prefix in prefixes}
+
+    if not prefixes:
+        return usage
+
+    shard_output = mds_client.map_shards(
+        lambda mds: mds.execute(
+            f"SELECT prefix, objects, bytes FROM usage WHERE prefix IN ({', '.join('?' * len(prefixes))})",
+            tuple(prefixes),
+        ).fetchall()
+    )
+
+    for output in shard_output:
+        for prefix, objects, size in output:
+            usage[prefix] = (usage[prefix][0] + objects, usage[prefix][1] + size)
+
+    return usage
+
+
+def check_quota(object_filename, added_bytes, freed_bytes=0):
+    """
+    check if quotas of all prefixes of an object filename allow adding given bytes
+    freed_bytes is the size of overridden object counted in the same prefixes
+    quota is checked against committed usage, concurrent uploads may exceed it together
+    return the first exceeded prefix, None if no quota is exceeded
+    """
+    prefixes = [
+        prefix
+        for prefix, quota in USAGE_PREFIXES.items()
+        if quota is not None and object_filename.startswith(prefix)
+    ]
+
+    # objects out of prefixes with quota cost no MDS query
+    if not prefixes:
+        return None
+
+    for prefix, (objects, size) in get_usage(prefixes).items():
+        if size - freed_bytes + added_bytes > USAGE_PREFIXES[prefix]:
+            log.info(
+                f"object {object_filename} of {added_bytes} bytes exceeds quota {USAGE_PREFIXES[prefix]} of prefix {prefix}, {size} bytes used"
+            )
+            return prefix
+
+    return None
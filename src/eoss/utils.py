@@ -1,3 +1,4 @@
+import time
 import uuid
 
 
@@ -6,3 +7,32 @@ def set_request_id():
     generate a unique request id for incoming request
     """
     return str(uuid.uuid4())
+
+
+class Throttle:
+    """
+    limit the throughput of a long running operation to a rate per second
+    rate 0 or None means unlimited
+    """
+
+    def __init__(self, rate):
+        self.rate = rate
+        self.reset()
+
+    def reset(self):
+        self.start = time.monotonic()
+        self.amount = 0
+
+    def consume(self, amount):
+        if not self.rate:
+            return
+
+        self.amount += amount
+        expected = self.amount / self.rate
+        elapsed = time.monotonic() - self.start
+
+        if expected > elapsed:
+            time.sleep(expected - elapsed)
+        elif elapsed - expected > 1:
+            # do not let an idle period turn into a burst
+            self.reset()
@@ -0,0 +1,230 @@
+import ctypes
+import ctypes.util
+import errno
+import hashlib
+import mmap
+import os
+import threading
+from . import logger
+from . import LARGE_OBJECT_BUFFER_SIZE
+from . import LARGE_OBJECT_DIRECT_SIZE
+from . import LARGE_OBJECT_SYNC_SIZE
+from . import LARGE_OBJECT_THRESHOLD
+from . import LOGGING_PATH
+from .exceptions import EOSSInternalException
+
+writer_log = os.path.join(LOGGING_PATH, "writer.log")
+log = logger.Logger(__name__, writer_log)
+
+# O_DIRECT offsets, lengths and buffers must be aligned to logical block size of storage
+# unit: byte
+DIRECT_IO_ALIGNMENT = 4096
+
+# sync_file_range() flags, see sync_file_range(2)
+SYNC_FILE_RANGE_WAIT_BEFORE = 1
+SYNC_FILE_RANGE_WRITE = 2
+SYNC_FILE_RANGE_WAIT_AFTER = 4
+
+# write buffer of each thread is reused by all large object writes of the thread
+_buffers = threading.local()
+
+
+def load_sync_file_range():
+    """
+    return sync_file_range() of libc, None if it's not available
+    """
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        function = libc.sync_file_range
+    except (OSError, AttributeError, TypeError):
+        return None
+
+    function.argtypes = (ctypes.c_int, ctypes.c_int64, ctypes.c_int64, ctypes.c_uint)
+    function.restype = ctypes.c_int
+
+    return function
+
+
+_sync_file_range = load_sync_file_range()
+
+
+def sync_range(fd, offset, length, flags):
+    """
+    write back dirty pages of a file range by sync_file_range(), fall back to fdatasync() if it's not available
+    """
+    if _sync_file_range is not None:
+        if _sync_file_range(fd, offset, length, flags) == 0:
+            return
+
+        error = ctypes.get_errno()
+        if error not in (errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP):
+            raise OSError(error, os.strerror(error))
+
+    if flags & SYNC_FILE_RANGE_WAIT_AFTER:
+        os.fdatasync(fd)
+
+
+def is_large_object(size):
+    """
+    check if object data of given size is written by large object write path
+    """
+    return (
+        LARGE_OBJECT_THRESHOLD is not None
+        and size is not None
+        and size >= LARGE_OBJECT_THRESHOLD
+    )
+
+
+def get_buffer():
+    """
+    return the page aligned write buffer of current thread
+    """
+    buffer = getattr(_buffers, "buffer", None)
+
+    if buffer is None:
+        size = max(
+            LARGE_OBJECT_BUFFER_SIZE // DIRECT_IO_ALIGNMENT * DIRECT_IO_ALIGNMENT,
+            DIRECT_IO_ALIGNMENT,
+        )
+        # anonymous mmap is page aligned as required by O_DIRECT
+        buffer = mmap.mmap(-1, size)
+        _buffers.buffer = buffer
+
+    return buffer
+
+
+def fill_buffer(stream, view):
+    """
+    read from stream until view is full or stream ends
+    return the number of bytes read
+    """
+    filled = 0
+
+    while filled < len(view):
+        if hasattr(stream, "readinto"):
+            count = stream.readinto(view[filled:])
+        else:
+            data = stream.read(len(view) - filled)
+            count = len(data)
+            view[filled : filled + count] = data
+
+        if not count:
+            break
+
+        filled += count
+
+    return filled
+
+
+def open_temp_file(path, direct):
+    """
+    open temp file for writing, O_DIRECT is dropped if filesystem does not support it
+    return file descriptor and whether O_DIRECT is used
+    """
+    flags = os.O_WRONLY | os.O_CREAT | os.O_TRUNC
+
+    if direct and hasattr(os, "O_DIRECT"):
+        try:
+            return (os.open(path, flags | os.O_DIRECT, 0o644), True)
+        except OSError as e:
+            if e.errno != errno.EINVAL:
+                raise
+            log.warning(f"O_DIRECT is not supported on {path}, buffered IO is used")
+
+    return (os.open(path, flags, 0o644), False)
+
+
+def write_all(fd, view, offset):
+    while len(view):
+        count = os.pwrite(fd, view, offset)
+        view = view[count:]
+        offset += count
+
+
+def write_stream(stream, path, size):
+    """
+    write size bytes of a stream into a new file and return SHA-256 hex digest of data
+
+    write procedure:
+    1. preallocate the whole file by fallocate() so it's laid out contiguously
+    2. read stream into a reusable page aligned buffer and write it in full buffers
+    3. with buffered IO, start writeback of every LARGE_OBJECT_SYNC_SIZE bytes by sync_file_range(),
+       wait for the previous range and drop it from page cache, so dirty and cached pages of the upload stay bounded
+    4. with O_DIRECT for objects not smaller than LARGE_OBJECT_DIRECT_SIZE, page cache is bypassed,
+       the last partial block is padded and the file is truncated to its size
+    5. fsync file at the end
+
+    raise EOSSInternalException if stream ends before size bytes are read
+    """
+    direct = LARGE_OBJECT_DIRECT_SIZE is not None and size >= LARGE_OBJECT_DIRECT_SIZE
+    fd, direct = open_temp_file(path, direct)
+
+    digest = hashlib.sha256()
+    buffer = get_buffer()
+    view = memoryview(buffer)
+    offset = 0
+    synced = 0
+    previous = None
+
+    try:
+        if size:
+            try:
+                os.posix_fallocate(fd, 0, size)
+            except OSError as e:
+                if e.errno not in (errno.EOPNOTSUPP, errno.EINVAL):
+                    raise
+                log.warning(f"fallocate() is not supported on {path}")
+
+        while offset < size:
+            count = fill_buffer(stream, view[: min(len(view), size - offset)])
+
+            if not count:
+                raise EOSSInternalException(
+                    f"upload ends at {offset} bytes, {size} bytes expected"
+                )
+
+            digest.update(view[:count])
+
+            if direct and count % DIRECT_IO_ALIGNMENT:
+                # only the last block can be partial
+                padded = -(-count // DIRECT_IO_ALIGNMENT) * DIRECT_IO_ALIGNMENT
+                view[count:padded] = bytes(padded - count)
+                write_all(fd, view[:padded], offset)
+            else:
+                write_all(fd, view[:count], offset)
+
+            offset += count
+
+            if not direct and offset - synced >= LARGE_OBJECT_SYNC_SIZE:
+                sync_range(fd, synced, offset - synced, SYNC_FILE_RANGE_WRITE)
+
+                if previous is not None:
+                    sync_range(
+                        fd,
+                        previous[0],
+                        previous[1],
+                        SYNC_FILE_RANGE_WAIT_BEFORE
+                        | SYNC_FILE_RANGE_WRITE
+                        | SYNC_FILE_RANGE_WAIT_AFTER,
+                    )
+                    os.posix_fadvise(
+                        fd, previous[0], previous[1], os.POSIX_FADV_DONTNEED
+                    )
+
+                previous = (synced, offset - synced)
+                synced = offset
+
+        if direct:
+            os.ftruncate(fd, size)
+
+        os.fsync(fd)
+
+        if not direct:
+            os.posix_fadvise(fd, 0, size, os.POSIX_FADV_DONTNEED)
+    finally:
+        view.release()
+        os.close(fd)
+
+    log.info(f"{size} bytes written into {path}{' by O_DIRECT' if direct else ''}")
+
+    return digest.hexdigest()
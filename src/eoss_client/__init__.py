@@ -0,0 +1,6 @@
+from .client import EOSSClient
+from .exceptions import EOSSClientException
+from .exceptions import ObjectNotFoundException
+from .exceptions import RetryExhaustedException
+
+__version__ = "0.0.1"
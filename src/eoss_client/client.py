@@ -0,0 +1,547 @@
+import concurrent.futures
+import http.client
+import json
+import os
+import random
+import time
+import urllib.parse
+from .exceptions import EOSSClientException
+from .exceptions import ObjectNotFoundException
+from .exceptions import RetryExhaustedException
+from .pool import ConnectionPool
+
+# HTTP response codes which are retried
+# 409: object is locked by another request
+# 429/503: request is rejected by admission control
+# 440/441: object is being uploaded
+# 520-522: MDS failures
+# 526: upload is rolled back cleanly
+RETRY_STATUSES = (409, 429, 440, 441, 503, 520, 521, 522, 526)
+
+# read buffer size of response body
+# unit: byte
+READ_BUFFER_SIZE = 1048576
+
+# default segment size of segmented download
+# unit: byte
+SEGMENT_SIZE = 16777216
+
+
+class ObjectChangedException(EOSSClientException):
+    pass
+
+
+class EOSSClient:
+    """
+    EOSS HTTP client with keep-alive connection pooling, retries and parallel transfers
+    it's safe to share one client between threads
+    """
+
+    def __init__(
+        self,
+        url="http://localhost:4080",
+        *,
+        pool_size=8,
+        timeout=60,
+        max_retries=5,
+        backoff=0.1,
+        max_backoff=5,
+        workers=8,
+    ):
+        self.pool = ConnectionPool(url, size=pool_size, timeout=timeout)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.workers = workers
+        self._executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    @property
+    def executor(self):
+        if self._executor is None:
+            self._executor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=self.workers
+            )
+        return self._executor
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+        self.pool.close()
+
+    def get_backoff(self, attempt, retry_after=None):
+        """
+        return seconds to wait before next attempt by exponential backoff with full jitter
+        Retry-After header from server is honored as the lower bound
+        """
+        delay = random.uniform(0, min(self.max_backoff, self.backoff * 2**attempt))
+
+        if retry_after:
+            try:
+                delay = max(delay, float(retry_after))
+            except ValueError:
+                pass
+
+        return delay
+
+    def request(
+        self, method, path, *, headers=None, body=None, handler=None, idempotent=True
+    ):
+        """
+        send a request and retry it on retryable response codes and connection failures
+        connection failures are not retried for non-idempotent requests as they may be applied already
+        handler reads response body, by default the whole body is returned as bytes
+        return a tuple of response code and handler result
+        """
+        if headers is None:
+            headers = {}
+
+        if handler is None:
+            handler = lambda response: response.read()
+
+        # file body is rewound on each attempt
+        body_position = body.tell() if hasattr(body, "seek") else None
+        last_error = None
+
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                time.sleep(self.get_backoff(attempt - 1, retry_after))
+
+            retry_after = None
+            connection = self.pool.get_connection()
+
+            try:
+                if body_position is not None:
+                    body.seek(body_position)
+
+                connection.request(method, path, body=body, headers=headers)
+                response = connection.getresponse()
+
+                if response.status in RETRY_STATUSES:
+                    retry_after = response.getheader("Retry-After")
+                    last_error = EOSSClientException(
+                        f"{method} {path}: {response.status} {response.read().decode(errors='replace')}",
+                        response.status,
+                    )
+                    result = None
+                else:
+                    result = handler(response)
+            except (OSError, http.client.HTTPException) as e:
+                self.pool.discard_connection(connection)
+                if not idempotent:
+                    raise EOSSClientException(f"{method} {path}: {e}")
+                last_error = e
+                continue
+            except Exception:
+                self.pool.discard_connection(connection)
+                raise
+
+            if response.will_close:
+                self.pool.discard_connection(connection)
+            else:
+                self.pool.put_connection(connection)
+
+            if response.status not in RETRY_STATUSES:
+                return (response.status, result)
+
+        raise RetryExhaustedException(
+            f"{method} {path} failed after {self.max_retries + 1} attempts: {last_error}",
+            getattr(last_error, "status", None),
+        )
+
+    def get_object_path(self, object_filename):
+        return "/eoss/v1/object/" + urllib.parse.quote(object_filename, safe="")
+
+    def get_object_headers(self, version=None, headers=None):
+        object_headers = {}
+
+        if version is not None:
+            object_headers["X-EOSS-Object-Version"] = version
+        if headers:
+            object_headers.update(headers)
+
+        return object_headers
+
+    def raise_for_status(self, method, object_filename, status, body):
+        message = f"{method} {object_filename}: {status}"
+
+        if isinstance(body, bytes):
+            message += f" {body.decode(errors='replace')}"
+
+        if status == 404:
+            raise ObjectNotFoundException(message, status)
+
+        raise EOSSClientException(message, status)
+
+    def exists(self, object_filename, *, version=None):
+        """
+        return True if object exists and fully closed
+        """
+        status, body = self.request(
+            "HEAD",
+            self.get_object_path(object_filename),
+            headers=self.get_object_headers(version),
+        )
+
+        if status == 200:
+            return True
+        if status == 404:
+            return False
+
+        self.raise_for_status("HEAD", object_filename, status, body)
+
+    def get(self, object_filename, *, version=None):
+        """
+        return object data as bytes
+        """
+        status, body = self.request(
+            "GET",
+            self.get_object_path(object_filename),
+            headers=self.get_object_headers(version),
+        )
+
+        if status != 200:
+            self.raise_for_status("GET", object_filename, status, body)
+
+        return body
+
+    def put(
+        self, object_filename, data, *, version=None, durability=None, expires=None
+    ):
+        """
+        upload object from bytes or a seekable binary file object
+        expires is an absolute unix timestamp or a relative time like "+7d"
+        """
+        headers = {"Content-Type": "application/octet-stream"}
+
+        if durability is not None:
+            headers["X-EOSS-Durability"] = durability
+        if expires is not None:
+            headers["X-EOSS-Expires"] = str(expires)
+
+        if hasattr(data, "read"):
+            # body is rewound on retries, so a stream which is not seekable can't be sent
+            if not (hasattr(data, "seekable") and data.seekable()):
+                raise EOSSClientException(
+                    f"PUT {object_filename}: data must be bytes or a seekable binary file object"
+                )
+
+            position = data.tell()
+            headers["Content-Length"] = str(data.seek(0, os.SEEK_END) - position)
+            data.seek(position)
+
+        status, body = self.request(
+            "PUT",
+            self.get_object_path(object_filename),
+            headers=self.get_object_headers(version, headers),
+            body=data,
+        )
+
+        if status not in (200, 201):
+            self.raise_for_status("PUT", object_filename, status, body)
+
+    def append(self, object_filename, data, *, version=None, offset=None):
+        """
+        append bytes to an existing object, return the new object size
+        if offset is set, append only succeeds if object size equals offset, otherwise
+        EOSSClientException with status 412 is raised
+        append with offset is retried on connection failures, it can not be applied twice
+        """
+        headers = {"Content-Type": "application/octet-stream", "X-EOSS-Append": "1"}
+
+        if offset is not None:
+            headers["X-EOSS-Append-Offset"] = str(offset)
+
+        def handler(response):
+            response.read()
+            return response.getheader("X-EOSS-Object-Size")
+
+        status, size = self.request(
+            "POST",
+            self.get_object_path(object_filename),
+            headers=self.get_object_headers(version, headers),
+            body=data,
+            handler=handler,
+            idempotent=offset is not None,
+        )
+
+        if status != 200:
+            self.raise_for_status("POST", object_filename, status, None)
+
+        return int(size)
+
+    def copy(
+        self,
+        object_filename,
+        destination_filename,
+        *,
+        version=None,
+        destination_version=None,
+        move=False,
+    ):
+        """
+        copy object into destination object inside storage, destination is overridden if it exists
+        set move=True to remove source object, move is not retried on connection failures
+        """
+        method = "MOVE" if move else "COPY"
+        headers = {"X-EOSS-Destination": destination_filename}
+
+        if destination_version is not None:
+            headers["X-EOSS-Destination-Version"] = destination_version
+
+        status, body = self.request(
+            method,
+            self.get_object_path(object_filename),
+            headers=self.get_object_headers(version, headers),
+            idempotent=not move,
+        )
+
+        if status != 201:
+            self.raise_for_status(method, object_filename, status, body)
+
+    def move(self, object_filename, destination_filename, **kwargs):
+        """
+        rename object into destination object inside storage
+        """
+        self.copy(object_filename, destination_filename, move=True, **kwargs)
+
+    def upload(
+        self,
+        object_filename,
+        source_path,
+        *,
+        version=None,
+        durability=None,
+        expires=None,
+    ):
+        """
+        upload object from a local file
+        """
+        with open(source_path, "rb") as f:
+            self.put(
+                object_filename,
+                f,
+                version=version,
+                durability=durability,
+                expires=expires,
+            )
+
+    def delete(self, object_filename, *, version=None):
+        """
+        delete object, return False if object does not exist
+        """
+        status, body = self.request(
+            "DELETE",
+            self.get_object_path(object_filename),
+            headers=self.get_object_headers(version),
+        )
+
+        if status == 200:
+            return True
+        if status == 404:
+            return False
+
+        self.raise_for_status("DELETE", object_filename, status, body)
+
+    def stats(self):
+        """
+        return EOSS service statistics
+        """
+        status, body = self.request("GET", "/eoss/v1/stats")
+
+        if status != 200:
+            raise EOSSClientException(f"GET stats: {status}", status)
+
+        return json.loads(body)
+
+    def list_objects(self, *, prefix="", version=None, page_size=None):
+        """
+        yield fully closed objects of one object version ordered by object filename
+        each object is a dict of filename, size, timestamp and digest
+        """
+        after = ""
+
+        while True:
+            query = {"prefix": prefix, "after": after}
+            if page_size:
+                query["limit"] = page_size
+
+            status, body = self.request(
+                "GET",
+                "/eoss/v1/list?" + urllib.parse.urlencode(query),
+                headers=self.get_object_headers(version),
+            )
+
+            if status != 200:
+                raise EOSSClientException(f"GET list: {status}", status)
+
+            output = json.loads(body)
+            yield from output["objects"]
+
+            if output["next"] is None:
+                return
+            after = output["next"]
+
+    def download(
+        self, object_filename, target_path, *, version=None, segment_size=SEGMENT_SIZE
+    ):
+        """
+        download object into a local file, return object size
+        object larger than segment_size is downloaded by parallel range requests if server supports ranges
+        data is written into a temp file which is renamed to target path when download is done
+        set segment_size to 0 or None to download object by one request
+        """
+        temp_path = target_path + ".eoss-part"
+
+        try:
+            with open(temp_path, "wb") as f:
+                try:
+                    size = self.download_segmented(
+                        object_filename, f, version, segment_size
+                    )
+                except ObjectChangedException:
+                    # object is overridden during segmented download, start over in one request
+                    f.seek(0)
+                    f.truncate()
+                    size = self.download_segmented(object_filename, f, version, None)
+            os.rename(temp_path, target_path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+            raise
+
+        return size
+
+    def download_segmented(self, object_filename, f, version, segment_size):
+        path = self.get_object_path(object_filename)
+        headers = self.get_object_headers(version)
+        fd = f.fileno()
+
+        def write_response(response, offset):
+            size = 0
+            while True:
+                data = response.read(READ_BUFFER_SIZE)
+                if not data:
+                    return size
+                os.pwrite(fd, data, offset + size)
+                size += len(data)
+
+        # the first segment tells whether server supports ranges and object size
+        if segment_size:
+            first_headers = dict(headers, Range=f"bytes=0-{segment_size - 1}")
+        else:
+            first_headers = headers
+
+        def first_handler(response):
+            if response.status not in (200, 206):
+                return response.read()
+
+            return (
+                write_response(response, 0),
+                response.getheader("Content-Range"),
+                response.getheader("ETag") or response.getheader("Last-Modified"),
+            )
+
+        status, result = self.request(
+            "GET", path, headers=first_headers, handler=first_handler
+        )
+
+        # empty object has no satisfiable range
+        if status == 416 and segment_size:
+            return self.download_segmented(object_filename, f, version, None)
+
+        if status not in (200, 206):
+            self.raise_for_status("GET", object_filename, status, result)
+
+        size, content_range, validator = result
+
+        if status == 200 or content_range is None:
+            return size
+
+        total_size = int(content_range.rsplit("/", 1)[1])
+
+        if total_size <= size:
+            return size
+
+        if validator is None:
+            raise ObjectChangedException("object has no validator for range requests")
+
+        def download_range(start, end):
+            range_headers = dict(
+                headers, Range=f"bytes={start}-{end}", **{"If-Range": validator}
+            )
+
+            def range_handler(response):
+                if response.status != 206:
+                    response.read()
+                    return None
+                return write_response(response, start)
+
+            range_status, range_size = self.request(
+                "GET", path, headers=range_headers, handler=range_handler
+            )
+
+            # full object is returned if it's changed since the first segment
+            if range_status != 206 or range_size != end - start + 1:
+                raise ObjectChangedException(f"object {object_filename} is changed")
+
+        os.ftruncate(fd, total_size)
+
+        futures = [
+            self.executor.submit(
+                download_range, start, min(start + segment_size, total_size) - 1
+            )
+            for start in range(size, total_size, segment_size)
+        ]
+
+        for future in futures:
+            future.result()
+
+        return total_size
+
+    def run_parallel(self, function, items):
+        """
+        run function on each item in thread pool
+        return a dict of item and its result or exception
+        """
+        futures = {self.executor.submit(function, *item): item for item in items}
+        results = {}
+
+        for future in concurrent.futures.as_completed(futures):
+            try:
+                results[futures[future]] = future.result()
+            except Exception as e:
+                results[futures[future]] = e
+
+        return results
+
+    def upload_many(self, items, *, version=None, durability=None):
+        """
+        upload many objects in parallel, items are tuples of object filename and local file path
+        return a dict of item and None or exception
+        """
+        return self.run_parallel(
+            lambda object_filename, source_path: self.upload(
+                object_filename, source_path, version=version, durability=durability
+            ),
+            items,
+        )
+
+    def download_many(self, items, *, version=None):
+        """
+        download many objects in parallel, items are tuples of object filename and local file path
+        each object is downloaded by one request as objects are transferred in parallel already
+        return a dict of item and object size or exception
+        """
+        return self.run_parallel(
+            lambda object_filename, target_path: self.download(
+                object_filename, target_path, version=version, segment_size=None
+            ),
+            items,
+        )
@@ -0,0 +1,12 @@
+class EOSSClientException(Exception):
+    def __init__(self, message, status=None):
+        super().__init__(message)
+        self.status = status
+
+
+class ObjectNotFoundException(EOSSClientException):
+    pass
+
+
+class RetryExhaustedException(EOSSClientException):
+    pass
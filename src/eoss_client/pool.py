@@ -0,0 +1,69 @@
+import http.client
+import queue
+import urllib.parse
+
+# socket send block size of request body
+# unit: byte
+SEND_BLOCK_SIZE = 1048576
+
+
+class ConnectionPool:
+    """
+    thread safe pool of keep-alive HTTP connections to one EOSS server
+    idle connections are reused in LIFO order so the warmest connection is taken first
+    """
+
+    def __init__(self, url, *, size=8, timeout=60):
+        parsed_url = urllib.parse.urlsplit(url)
+
+        if parsed_url.scheme == "https":
+            self.connection_class = http.client.HTTPSConnection
+        elif parsed_url.scheme == "http":
+            self.connection_class = http.client.HTTPConnection
+        else:
+            raise ValueError(f"unsupported URL scheme {parsed_url.scheme}")
+
+        self.host = parsed_url.hostname
+        self.port = parsed_url.port
+        self.timeout = timeout
+        self.idle_connections = queue.LifoQueue(maxsize=size)
+        self.closed = False
+
+    def get_connection(self):
+        try:
+            return self.idle_connections.get_nowait()
+        except queue.Empty:
+            return self.connection_class(
+                self.host,
+                self.port,
+                timeout=self.timeout,
+                blocksize=SEND_BLOCK_SIZE,
+            )
+
+    def put_connection(self, connection):
+        """
+        return a connection whose response is fully read to the pool
+        """
+        if self.closed:
+            connection.close()
+            return
+
+        try:
+            self.idle_connections.put_nowait(connection)
+        except queue.Full:
+            connection.close()
+
+    def discard_connection(self, connection):
+        """
+        close a connection in unknown state instead of returning it to the pool
+        """
+        connection.close()
+
+    def close(self):
+        self.closed = True
+
+        while True:
+            try:
+                self.idle_connections.get_nowait().close()
+            except queue.Empty:
+                break
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from eoss import storage
+from eoss.exceptions import MDSConnectException
+from eoss.exceptions import MDSExecuteException
+from eoss.exceptions import MDSCommitException
+
+BACKENDS = ("sqlite", "journal")
+
+
+def create_client(backend, db_name):
+    from eoss import journal
+    from eoss import mds_client
+
+    if backend == "journal":
+        return journal.JournalMDSClient(0, db_name)
+
+    return mds_client.MDSClient(0, db_name)
+
+
+def bootstrap(backend, db_name):
+    from eoss import journal
+    from eoss import schema
+
+    if backend == "journal":
+        journal.create_journal(db_name)
+        return
+
+    mds = create_client(backend, db_name)
+    mds.connect()
+    mds.cursor()
+    schema.create_mds_tables(mds)
+    mds.commit()
+    mds.close()
+
+
+def put_metadata(backend, db_name, object_name):
+    """
+    MDS calls of HTTP PUT on a new object, see ObjectClient
+    """
+    mds = create_client(backend, db_name)
+    mds.connect()
+    mds.cursor()
+
+    mds.insert_object(
+        {
+            "id": object_name,
+            "filename": object_name,
+            "version": None,
+            "size": None,
+            "timestamp": None,
+            "state": 1,
+            "tier": storage.TIER_HOT,
+            "compression": None,
+            "root": 0,
+            "layout": None,
+            "expires": None,
+        }
+    )
+    mds.commit()
+    mds.update_object(object_name, {"size": 4096, "digest": "0" * 64})
+    mds.commit()
+    mds.update_object(object_name, {"timestamp": int(time.time())})
+    mds.commit()
+    mds.update_object(object_name, {"state": 0})
+    mds.commit()
+
+    mds.close()
+
+
+def head_metadata(backend, db_name, object_name):
+    """
+    MDS calls of HTTP HEAD, see ObjectClient.check_object_exists()
+    """
+    mds = create_client(backend, db_name)
+    mds.connect()
+    mds.cursor()
+    record = mds.get_object(object_name)
+    mds.close()
+
+    return record
+
+
+def run(handler, backend, db_name, object_names):
+    """
+    run handler on each object and return operations per second and latency percentiles in microseconds
+    """
+    latencies = []
+    start = time.perf_counter()
+
+    for object_name in object_names:
+        operation_start = time.perf_counter()
+        handler(backend, db_name, object_name)
+        latencies.append(time.perf_counter() - operation_start)
+
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+
+    return (
+        len(object_names) / elapsed,
+        latencies[len(latencies) // 2] * 1000000,
+        latencies[min(len(latencies) * 99 // 100, len(latencies) - 1)] * 1000000,
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="benchmark HEAD and PUT metadata path of MDS backends"
+    )
+    parser.add_argument(
+        "--objects", type=int, default=10000, help="number of objects to put and head"
+    )
+    parser.add_argument(
+        "--backend",
+        choices=BACKENDS,
+        action="append",
+        help="backend to benchmark, all backends by default",
+    )
+    parser.add_argument(
+        "--directory",
+        default=None,
+        help="directory of benchmark database files, it should be on the same filesystem as METADATA_DB_PATH",
+    )
+    args = parser.parse_args()
+
+    object_names = [f"benchmark-{index:08d}" for index in range(args.objects)]
+
+    with tempfile.TemporaryDirectory(dir=args.directory) as directory:
+        for backend in args.backend or BACKENDS:
+            db_name = os.path.join(directory, f"mds.{backend}")
+
+            try:
+                bootstrap(backend, db_name)
+                put = run(put_metadata, backend, db_name, object_names)
+                head = run(head_metadata, backend, db_name, object_names)
+            except (
+                OSError,
+                MDSConnectException,
+                MDSExecuteException,
+                MDSCommitException,
+            ) as e:
+                print(f"ERROR: {backend} benchmark failed: {e}", file=sys.stderr)
+                sys.exit(2)
+
+            for name, (rate, p50, p99) in (("PUT", put), ("HEAD", head)):
+                print(
+                    f"{backend:8} {name:5} {rate:10.1f} ops/s  p50 {p50:8.1f} us  p99 {p99:8.1f} us"
+                )
+
+    sys.exit(0)
@@ -2,20 +2,20 @@
 
 import os
 import sys
-from eoss import METADATA_DB_PATH
-from eoss import METADATA_DB_TABLE
-from eoss import STORAGE_PATH
+from eoss import METADATA_DB_BACKEND
+from eoss import MIRROR_STORAGE_PATHS
+from eoss import USAGE_PREFIXES
+from eoss import storage
 from eoss.exceptions import MDSConnectException
 from eoss.exceptions import MDSExecuteException
 from eoss.exceptions import MDSCommitException
+from eoss.exceptions import EOSSInternalException
 
 
 def clean_up_storage(record_name):
-    object_name = os.path.join(STORAGE_PATH, record_name)
-    object_temp_name = os.path.join(STORAGE_PATH, record_name + ".temp")
     flag = 0
 
-    for filename in (object_name, object_temp_name):
+    for filename in storage.get_object_paths(record_name):
         if os.path.exists(filename):
             try:
                 os.unlink(filename)
@@ -26,54 +26,85 @@ def clean_up_storage(record_name):
                 print(f"file {filename} is removed")
 
 
-def clean_up_eoss():
-    from eoss import mds_client
-
-    # initial mds client
-    mds = mds_client.MDSClient()
+def recover_migrations(mds):
+    from eoss import migration
+    from eoss import object_client
 
-    # connect mds filename
     try:
-        mds.connect()
-    except MDSConnectException as e:
+        output = mds.find_objects((4,))
+    except MDSExecuteException as e:
         print(
-            f"ERROR: failed to connect to MDS database file {mds.db_name}: {e}",
+            f"ERROR: failed to query migrating records: {e}",
             file=sys.stderr,
         )
         return False
+    else:
+        print(f"{len(output)} migrating records located")
+
+    for record in output:
+        eoss_object_client = object_client.ObjectClient(
+            record["filename"], object_version=record["version"]
+        )
+
+        try:
+            eoss_object_client.init_mds()
+            eoss_object_client.check_object_exists()
+            migration.recover_object(eoss_object_client)
+        except (
+            MDSConnectException,
+            MDSExecuteException,
+            MDSCommitException,
+            EOSSInternalException,
+        ) as e:
+            print(
+                f"ERROR: failed to recover migrating object {eoss_object_client.object_name}: {e}",
+                file=sys.stderr,
+            )
+            return False
+        else:
+            print(f"migrating object {eoss_object_client.object_name} is recovered")
+        finally:
+            eoss_object_client.close_mds()
+
+    return True
 
-    # initialize database cursor
-    mds.cursor()
 
-    # execute SQL query to populate non-0(non-closed) object name(s)
-    sql_query_table = f"SELECT id FROM {METADATA_DB_TABLE} WHERE state != 0"
+def clean_up_shard(mds):
+    """
+    recover migrating objects and remove non-closed objects recorded in a MDS shard
+    """
+    # recover object(s) left in migrating state
+    if not recover_migrations(mds):
+        return False
+
+    # populate non-closed object name(s)
     try:
-        output = mds.execute(sql_query_table).fetchall()
+        output = mds.find_objects((1, 2))
     except MDSExecuteException as e:
         print(
-            f"ERROR: failed to execute SQL query: {e}",
+            f"ERROR: failed to query non-closed records: {e}",
             file=sys.stderr,
         )
         return False
     else:
-        print(f"{len(output)} records located")
+        print(f"{len(output)} records located in MDS shard {mds.shard}")
 
     if output is None:
         print(f"uncaught issue when acquiring object state", file=sys.stderr)
         return False
     else:
         if isinstance(output, list) and len(output) == 0:
-            print(f"no non-closed record exists")
+            print(f"no non-closed record exists in MDS shard {mds.shard}")
             return True
         if output:
             # clean up storage path
-            for item in output:
-                clean_up_storage(item[0])
+            for record in output:
+                clean_up_storage(record["id"])
 
-    # delete record
-    sql_delete_record = f"DELETE FROM {METADATA_DB_TABLE} WHERE state != 0"
+    # delete record(s) in one transaction
     try:
-        mds.execute(sql_delete_record)
+        for record in output:
+            mds.delete_object(record["id"])
     except MDSExecuteException as e:
         print(
             f"ERROR: failed to delete non-closed object record from metadata database: {e}",
@@ -93,6 +124,110 @@ def clean_up_eoss():
     return True
 
 
+def clean_up_eoss():
+    from eoss import dedup
+    from eoss import mds_client
+    from eoss import rebalance
+    from eoss import schema
+    from eoss import sharding
+    from eoss import usage
+
+    # journal metadata backend only serves object record operations, see journal.JournalMDSClient
+    if METADATA_DB_BACKEND == "journal" and (
+        len(mds_client.get_shards()) > 1 or MIRROR_STORAGE_PATHS or USAGE_PREFIXES
+    ):
+        print(
+            f"ERROR: journal metadata backend supports neither sharded MDS, mirror storage roots nor usage accounting",
+            file=sys.stderr,
+        )
+        return False
+
+    # all configured MDS shards must exist and no record may be left in other shards
+    existing_shards = sharding.find_shard_files()
+    if tuple(existing_shards) != mds_client.get_shards():
+        print(
+            f"ERROR: MDS shards {existing_shards} exist but {len(mds_client.get_shards())} shards are configured, run split-mds.py to reshard MDS",
+            file=sys.stderr,
+        )
+        return False
+
+    # journal has no schema and storage roots are only registered for rebalancer.py
+    sql_shards = mds_client.get_shards() if METADATA_DB_BACKEND == "sqlite" else ()
+
+    for shard in sql_shards:
+        # initial mds client
+        mds = mds_client.MDSClient(shard)
+
+        # connect mds filename
+        try:
+            mds.connect()
+        except MDSConnectException as e:
+            print(
+                f"ERROR: failed to connect to MDS database file {mds.db_name}: {e}",
+                file=sys.stderr,
+            )
+            return False
+
+        # initialize database cursor
+        mds.cursor()
+
+        # upgrade metadata table schema
+        try:
+            for change in schema.upgrade_mds_tables(mds):
+                print(f"MDS shard {shard} schema upgraded: {change}")
+            mds.commit()
+        except (MDSExecuteException, MDSCommitException) as e:
+            print(
+                f"ERROR: failed to upgrade metadata database schema: {e}",
+                file=sys.stderr,
+            )
+            return False
+
+        # count usage of newly configured accounting prefix(es)
+        try:
+            for change in usage.sync_prefixes(mds):
+                print(f"MDS shard {shard}: {change}")
+            mds.commit()
+        except (MDSExecuteException, MDSCommitException) as e:
+            print(
+                f"ERROR: failed to update usage accounting prefixes: {e}",
+                file=sys.stderr,
+            )
+            return False
+
+        # register newly added storage root(s) in shard 0, objects are moved onto them by rebalancer.py
+        if shard == 0:
+            try:
+                for root in rebalance.register_roots(mds):
+                    print(f"storage root {root} registered")
+                mds.commit()
+            except (MDSExecuteException, MDSCommitException) as e:
+                print(
+                    f"ERROR: failed to register storage roots: {e}",
+                    file=sys.stderr,
+                )
+                return False
+
+        mds.close()
+
+    # remove temp files of chunks written by interrupted uploads
+    try:
+        removed_files = dedup.clean_up_temp_files()
+    except OSError as e:
+        print(f"ERROR: failed to remove chunk temp files: {e}", file=sys.stderr)
+        return False
+    else:
+        if removed_files:
+            print(f"{removed_files} chunk temp files removed")
+
+    # MDS shards are cleaned up in parallel
+    try:
+        return all(mds_client.map_shards(clean_up_shard))
+    except MDSConnectException as e:
+        print(f"ERROR: failed to connect to MDS database: {e}", file=sys.stderr)
+        return False
+
+
 if __name__ == "__main__":
     flag = clean_up_eoss()
 
@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+
+import argparse
+import sys
+import time
+from eoss import EXPIRY_BATCH_SIZE
+from eoss import EXPIRY_INTERVAL
+from eoss import EXPIRY_RATE
+from eoss import expiry
+from eoss import utils
+from eoss.exceptions import MDSConnectException
+from eoss.exceptions import MDSExecuteException
+from eoss.exceptions import MDSCommitException
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="delete expired objects and their MDS records"
+    )
+    parser.add_argument(
+        "--once", action="store_true", help="run one expiry pass and exit"
+    )
+    args = parser.parse_args()
+
+    throttle = utils.Throttle(EXPIRY_RATE)
+
+    while True:
+        throttle.reset()
+
+        try:
+            deleted_objects, failed_objects = expiry.reap(EXPIRY_BATCH_SIZE, throttle)
+        except (MDSConnectException, MDSExecuteException, MDSCommitException) as e:
+            print(f"ERROR: failed to access MDS: {e}", file=sys.stderr)
+            if args.once:
+                sys.exit(2)
+        else:
+            if deleted_objects or failed_objects:
+                print(
+                    f"{deleted_objects} expired objects deleted, {failed_objects} objects failed"
+                )
+
+            if args.once and failed_objects:
+                sys.exit(3)
+
+        if args.once:
+            break
+
+        time.sleep(EXPIRY_INTERVAL)
+
+    sys.exit(0)
@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+
+import argparse
+import sys
+import time
+from eoss import REBALANCE_INTERVAL
+from eoss import REBALANCE_RATE
+from eoss import rebalance
+from eoss import utils
+from eoss.exceptions import MDSConnectException
+from eoss.exceptions import MDSExecuteException
+from eoss.exceptions import MDSCommitException
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="move objects onto newly added storage roots"
+    )
+    parser.add_argument(
+        "--once", action="store_true", help="run one rebalance pass and exit"
+    )
+    args = parser.parse_args()
+
+    throttle = utils.Throttle(REBALANCE_RATE)
+
+    while True:
+        try:
+            moved_objects, moved_bytes = rebalance.rebalance(throttle)
+        except (MDSConnectException, MDSExecuteException, MDSCommitException) as e:
+            print(f"ERROR: failed to access MDS: {e}", file=sys.stderr)
+            if args.once:
+                sys.exit(2)
+        else:
+            if moved_objects:
+                print(f"{moved_objects} objects moved, {moved_bytes} bytes copied")
+
+        if args.once:
+            break
+
+        time.sleep(REBALANCE_INTERVAL)
+
+    sys.exit(0)
@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+
+import argparse
+import sys
+import time
+from eoss import MIRROR_STORAGE_PATHS
+from eoss import REPLICATION_BATCH_SIZE
+from eoss import REPLICATION_INTERVAL
+from eoss import REPLICATION_WORKERS
+from eoss import replication
+from eoss.exceptions import MDSConnectException
+from eoss.exceptions import MDSExecuteException
+from eoss.exceptions import MDSCommitException
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="replicate committed object operations to mirror storage roots"
+    )
+    parser.add_argument(
+        "--once",
+        action="store_true",
+        help="process replication queue until no more queued operation can be applied and exit",
+    )
+    args = parser.parse_args()
+
+    if not MIRROR_STORAGE_PATHS:
+        print(f"ERROR: MIRROR_STORAGE_PATHS is not configured", file=sys.stderr)
+        sys.exit(1)
+
+    replicator = replication.Replicator(REPLICATION_WORKERS, REPLICATION_BATCH_SIZE)
+
+    while True:
+        try:
+            applied = replicator.run_once()
+        except (MDSConnectException, MDSExecuteException, MDSCommitException) as e:
+            print(f"ERROR: failed to process replication queue: {e}", file=sys.stderr)
+            if args.once:
+                replicator.close()
+                sys.exit(2)
+            applied = 0
+
+        if args.once and applied == 0:
+            break
+
+        # keep draining the queue while there is backlog
+        if applied < REPLICATION_BATCH_SIZE:
+            time.sleep(REPLICATION_INTERVAL)
+
+    replicator.close()
+    sys.exit(0)
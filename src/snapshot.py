@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+
+import argparse
+import sys
+from eoss import SNAPSHOT_PREFETCH_SIZE
+from eoss import SNAPSHOT_WORKERS
+from eoss import snapshot
+from eoss.exceptions import MDSConnectException
+from eoss.exceptions import MDSExecuteException
+from eoss.exceptions import MDSCommitException
+from eoss.exceptions import EOSSInternalException
+
+
+def export_command(args):
+    since = args.since
+
+    # incremental snapshot based on a previous snapshot archive
+    if args.base:
+        try:
+            snapshot_info = snapshot.read_snapshot_info(args.base)
+        except Exception as e:
+            print(f"ERROR: failed to read base snapshot {args.base}: {e}", file=sys.stderr)
+            return False
+
+        since = snapshot_info["snapshot_timestamp"] - snapshot.INCREMENTAL_OVERLAP
+
+    if args.output == "-":
+        output_f = sys.stdout.buffer
+    else:
+        output_f = open(args.output, "wb")
+
+    try:
+        summary = snapshot.export_snapshot(
+            output_f,
+            since=since,
+            workers=args.workers,
+            prefetch_size=SNAPSHOT_PREFETCH_SIZE,
+            compress=args.compress,
+        )
+    except (MDSConnectException, MDSExecuteException, EOSSInternalException, OSError) as e:
+        print(f"ERROR: failed to export snapshot: {e}", file=sys.stderr)
+        return False
+    finally:
+        if output_f is not sys.stdout.buffer:
+            output_f.close()
+
+    print(
+        f"snapshot {summary['snapshot_timestamp']} exported: {summary['exported_objects']} objects, {summary['exported_bytes']} bytes, {summary['skipped_objects']} objects skipped",
+        file=sys.stderr,
+    )
+
+    return True
+
+
+def restore_command(args):
+    if args.input == "-":
+        input_f = sys.stdin.buffer
+    else:
+        input_f = open(args.input, "rb")
+
+    try:
+        summary = snapshot.restore_snapshot(input_f)
+    except (
+        MDSConnectException,
+        MDSExecuteException,
+        MDSCommitException,
+        EOSSInternalException,
+        OSError,
+    ) as e:
+        print(f"ERROR: failed to restore snapshot: {e}", file=sys.stderr)
+        return False
+    finally:
+        if input_f is not sys.stdin.buffer:
+            input_f.close()
+
+    print(
+        f"snapshot {summary['snapshot_timestamp']} restored: {summary['restored_objects']} objects, "
+        f"{summary['skipped_objects'] + summary['missing_objects']} records without data dropped, "
+        f"{summary['removed_objects']} deleted objects removed"
+    )
+
+    return True
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="export an online consistent snapshot of EOSS or restore it"
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = subparsers.add_parser("export", help="export a snapshot archive")
+    export_parser.add_argument(
+        "-o", "--output", default="-", help="snapshot archive path, - for stdout"
+    )
+    export_parser.add_argument(
+        "--since",
+        type=int,
+        help="only export objects updated at or after this unix timestamp",
+    )
+    export_parser.add_argument(
+        "--base",
+        help="previous snapshot archive path to export an incremental snapshot",
+    )
+    export_parser.add_argument(
+        "--workers",
+        type=int,
+        default=SNAPSHOT_WORKERS,
+        help="number of parallel object readers",
+    )
+    export_parser.add_argument(
+        "--compress", action="store_true", help="compress snapshot archive by gzip"
+    )
+
+    restore_parser = subparsers.add_parser(
+        "restore", help="restore a snapshot archive, EOSS service must be stopped"
+    )
+    restore_parser.add_argument("input", help="snapshot archive path, - for stdin")
+
+    args = parser.parse_args()
+
+    if args.command == "export":
+        flag = export_command(args)
+    else:
+        flag = restore_command(args)
+
+    if not flag:
+        sys.exit(2)
+
+    sys.exit(0)
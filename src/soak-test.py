@@ -0,0 +1,562 @@
+#!/usr/bin/env python3
+
+import argparse
+import configparser
+import hashlib
+import http.client
+import json
+import os
+import random
+import re
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+import yaml
+
+SRC_PATH = os.path.dirname(os.path.abspath(__file__))
+UWSGI_CONFIG_PATH = os.path.join(SRC_PATH, "..", "config", "eoss-uwsgi.ini")
+
+# fault injection points, see eoss.faults.INJECTION_POINTS
+FAULT_POINTS = ("put.state1", "put.state2", "put.renamed", "put.state0", "delete")
+FAULT_MODES = ("error", "kill")
+
+# time to wait for uWSGI to serve requests
+# unit: second
+START_TIMEOUT = 30
+
+# HTTP response codes with a known outcome, any other response leaves the outcome unknown
+# "stored" and "removed" change the object, "unchanged" does not
+UNCHANGED_OUTCOMES = {409: "unchanged", 440: "unchanged", 441: "unchanged", 524: "unchanged"}
+PUT_OUTCOMES = {201: "stored", 526: "removed", **UNCHANGED_OUTCOMES}
+DELETE_OUTCOMES = {200: "removed", 404: "removed", **UNCHANGED_OUTCOMES}
+
+
+class Instance:
+    """
+    isolated EOSS instance served by uWSGI, configuration, MDS, storage, locks and logs are kept in a work directory
+    """
+
+    def __init__(self, work_path, settings, port, processes, uwsgi):
+        self.work_path = work_path
+        self.settings = dict(settings)
+        self.port = port
+        self.processes = processes
+        self.uwsgi = uwsgi
+        self.config_path = os.path.join(work_path, "eoss.yaml")
+        self.env = dict(os.environ, EOSS_CONFIG=self.config_path)
+        self.process = None
+
+        storage_path = os.path.join(work_path, "storage")
+        lock_path = os.path.join(work_path, "lock")
+        self.settings.update(
+            {
+                "STORAGE_PATH": storage_path,
+                "STORAGE_PATHS": [storage_path],
+                "COLD_STORAGE_PATH": None,
+                "MIRROR_STORAGE_PATHS": [],
+                "METADATA_DB_PATH": os.path.join(work_path, "mds", "mds.sql"),
+                "LOGGING_PATH": os.path.join(work_path, "log"),
+                "OBJECT_LOCK_PATH": lock_path,
+                "ADMISSION_LOCK_PATH": os.path.join(lock_path, "admission"),
+                "PROFILER_PATH": os.path.join(lock_path, "profiler"),
+                "SAFEMODE": False,
+            }
+        )
+
+    def configure(self, fault_points=None, fault_mode="error"):
+        settings = dict(self.settings)
+        settings["FAULT_INJECTION_POINTS"] = fault_points or {}
+        settings["FAULT_INJECTION_MODE"] = fault_mode
+
+        with open(self.config_path, "wt") as f:
+            yaml.safe_dump(settings, f)
+
+    def run_script(self, script, *args):
+        """
+        run an EOSS script against this instance
+        return elapsed seconds and completed process
+        """
+        start = time.monotonic()
+        process = subprocess.run(
+            [sys.executable, os.path.join(SRC_PATH, script), *args],
+            cwd=SRC_PATH,
+            env=self.env,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True,
+        )
+
+        return (time.monotonic() - start, process)
+
+    def write_uwsgi_config(self):
+        uwsgi_config = configparser.ConfigParser(interpolation=None, strict=False)
+        uwsgi_config.read(UWSGI_CONFIG_PATH)
+
+        if not uwsgi_config.has_section("uwsgi"):
+            uwsgi_config.add_section("uwsgi")
+
+        section = uwsgi_config["uwsgi"]
+        section.pop("stats", None)
+        section["http-socket"] = f"127.0.0.1:{self.port}"
+        section["chdir"] = SRC_PATH
+        section["processes"] = str(self.processes)
+        # killed workers are respawned by master
+        section["master"] = "true"
+        section["enable-threads"] = "true"
+
+        uwsgi_config_path = os.path.join(self.work_path, "eoss-uwsgi.ini")
+        with open(uwsgi_config_path, "wt") as f:
+            uwsgi_config.write(f)
+
+        return uwsgi_config_path
+
+    def start(self):
+        uwsgi_config_path = self.write_uwsgi_config()
+
+        with open(os.path.join(self.work_path, "uwsgi.log"), "at") as f:
+            self.process = subprocess.Popen(
+                [self.uwsgi, "--ini", uwsgi_config_path],
+                cwd=SRC_PATH,
+                env=self.env,
+                stdout=f,
+                stderr=subprocess.STDOUT,
+                start_new_session=True,
+            )
+
+        deadline = time.monotonic() + START_TIMEOUT
+
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(
+                    f"uWSGI exited with code {self.process.returncode}, see {self.work_path}/uwsgi.log"
+                )
+
+            try:
+                connection = http.client.HTTPConnection("127.0.0.1", self.port, timeout=5)
+                connection.request("HEAD", "/eoss/v1/object/soak-test-ready")
+                connection.getresponse().read()
+                connection.close()
+                return
+            except (OSError, http.client.HTTPException):
+                time.sleep(0.1)
+
+        self.kill()
+        raise RuntimeError(f"uWSGI is not ready in {START_TIMEOUT} seconds")
+
+    def kill(self):
+        """
+        kill uWSGI master and all workers at once like a host crash
+        """
+        if self.process is None:
+            return
+
+        try:
+            os.killpg(self.process.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+
+        self.process.wait()
+        self.process = None
+
+
+class Workload:
+    """
+    concurrent PUT and DELETE load, each object is only written by one thread
+    expected data of each object is tracked as the last acknowledged SHA-256 digest(None if it does not exist)
+    and digests of requests with unknown outcome sent after it
+    """
+
+    def __init__(self, port, object_count, concurrency, max_size, delete_ratio):
+        self.port = port
+        self.concurrency = concurrency
+        self.max_size = max_size
+        self.delete_ratio = delete_ratio
+        self.names = [f"soak-{index:08d}" for index in range(object_count)]
+        self.expected = {name: {"acked": None, "pending": []} for name in self.names}
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.requests = 0
+        self.unknown = 0
+        self.errors = []
+
+    def send(self, connection, method, name, data=None):
+        path = "/eoss/v1/object/" + urllib.parse.quote(name)
+        connection.request(method, path, body=data)
+        response = connection.getresponse()
+        response.read()
+
+        return response.status
+
+    def write(self, connection, method, name, data=None):
+        """
+        send a PUT or DELETE request and update expected data of the object by its outcome
+        return False if connection is broken
+        """
+        value = hashlib.sha256(data).hexdigest() if method == "PUT" else None
+        expected = self.expected[name]
+        expected["pending"].append(value)
+
+        with self.lock:
+            self.in_flight += 1
+            self.requests += 1
+
+        try:
+            status = self.send(connection, method, name, data)
+        except (OSError, http.client.HTTPException):
+            # worker is killed, outcome is unknown
+            status = None
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+
+        outcome = (PUT_OUTCOMES if method == "PUT" else DELETE_OUTCOMES).get(status)
+
+        if outcome is None:
+            with self.lock:
+                self.unknown += 1
+        else:
+            expected["pending"].pop()
+            if outcome == "stored":
+                expected["acked"] = value
+            elif outcome == "removed":
+                expected["acked"] = None
+            # outcome of an earlier request is known once object is written again
+            if outcome != "unchanged":
+                expected["pending"] = []
+
+        return status is not None
+
+    def preload(self, size):
+        """
+        store all objects once, faults must not be injected
+        """
+        def run_client(index):
+            connection = http.client.HTTPConnection("127.0.0.1", self.port)
+            for name in self.names[index :: self.concurrency]:
+                self.write(connection, "PUT", name, os.urandom(size))
+                if self.expected[name]["acked"] is None:
+                    with self.lock:
+                        self.errors.append(f"failed to preload object {name}")
+            connection.close()
+
+        self.run_threads(run_client)
+
+    def run(self, stopped):
+        def run_client(index):
+            names = self.names[index :: self.concurrency]
+            connection = None
+
+            while names and not stopped.is_set():
+                if connection is None:
+                    connection = http.client.HTTPConnection("127.0.0.1", self.port, timeout=60)
+
+                name = random.choice(names)
+                if random.random() < self.delete_ratio:
+                    broken = not self.write(connection, "DELETE", name)
+                else:
+                    data = os.urandom(random.randint(1, self.max_size))
+                    broken = not self.write(connection, "PUT", name, data)
+
+                if broken:
+                    connection.close()
+                    connection = None
+                    # worker is respawned by uWSGI master
+                    time.sleep(0.05)
+
+        return self.run_threads(run_client, wait=False)
+
+    def run_threads(self, target, wait=True):
+        threads = [
+            threading.Thread(target=target, args=(index,), daemon=True)
+            for index in range(self.concurrency)
+        ]
+        for thread in threads:
+            thread.start()
+
+        if wait:
+            for thread in threads:
+                thread.join()
+
+        return threads
+
+
+def verify(expected_path):
+    """
+    check MDS and storage of the instance in EOSS_CONFIG against expected data written by the workload
+    print a JSON report
+    """
+    from eoss import mds_client
+    from eoss import object_client
+    from eoss import storage
+
+    with open(expected_path, "rt") as f:
+        expected = json.load(f)
+
+    problems = []
+    lost = 0
+    object_files = set()
+    records = {}
+
+    for output in mds_client.map_shards(lambda mds: mds.find_objects((0, 1, 2, 4))):
+        for record in output:
+            records[record["filename"]] = record
+
+    for filename, record in records.items():
+        if record["state"] != 0:
+            problems.append(f"object {filename} is left in state {record['state']}")
+            continue
+
+        eoss_object_client = object_client.ObjectClient(
+            filename, object_version=record["version"]
+        )
+        eoss_object_client.init_mds()
+        try:
+            object_exists_flag = eoss_object_client.check_object_exists()
+        finally:
+            eoss_object_client.close_mds()
+
+        if object_exists_flag is not True:
+            problems.append(f"object {filename} is closed but not readable: {object_exists_flag}")
+            continue
+
+        object_files.update(eoss_object_client.object_files)
+
+        # objects stored without digest are not checked
+        if record["digest"] is None:
+            continue
+
+        if record["layout"] is None and record["compression"] is None:
+            digest = hashlib.sha256()
+            with open(eoss_object_client.object_path, "rb") as f:
+                for chunk in iter(lambda: f.read(1048576), b""):
+                    digest.update(chunk)
+            if digest.hexdigest() != record["digest"]:
+                problems.append(f"object {filename} data does not match its digest in MDS")
+
+        expected_object = expected.get(filename)
+        if expected_object is not None and record["digest"] not in (
+            [expected_object["acked"]] + expected_object["pending"]
+        ):
+            problems.append(f"object {filename} holds data which is neither acknowledged nor in flight")
+
+    for filename, expected_object in expected.items():
+        if filename in records or expected_object["acked"] is None:
+            continue
+
+        if None in expected_object["pending"]:
+            # object is deleted by a DELETE request with unknown outcome
+            continue
+
+        if expected_object["pending"]:
+            # failed overriding PUT rolls back the previous object as well
+            lost += 1
+        else:
+            problems.append(f"acknowledged object {filename} is lost")
+
+    for tier, root in storage.get_locations():
+        for entry in os.scandir(storage.get_tier_path(tier, root)):
+            if entry.is_file() and entry.path not in object_files:
+                problems.append(f"orphan file {entry.path} is left in storage")
+
+    print(
+        json.dumps(
+            {"objects": len(records), "lost": lost, "problems": problems}
+        )
+    )
+
+
+def run_round(args, settings, object_count):
+    """
+    preload objects, run faulty load, crash the instance and measure recovery
+    return a dict of results
+    """
+    work_path = tempfile.mkdtemp(prefix="eoss-soak-", dir=args.directory)
+    instance = Instance(work_path, settings, args.port, args.processes, args.uwsgi)
+    workload = Workload(
+        args.port, object_count, args.concurrency, args.max_size, args.delete_ratio
+    )
+
+    try:
+        instance.configure()
+        seconds, process = instance.run_script("bootstrap-env.py")
+        if process.returncode != 0:
+            raise RuntimeError(f"bootstrap failed: {process.stdout}{process.stderr}")
+
+        instance.start()
+        try:
+            workload.preload(args.preload_size)
+        finally:
+            instance.kill()
+
+        if workload.errors:
+            raise RuntimeError(f"preload failed: {workload.errors[0]}")
+
+        instance.configure(
+            {point: args.fault_rate for point in args.point or FAULT_POINTS},
+            args.mode,
+        )
+        instance.start()
+
+        stopped = threading.Event()
+        threads = workload.run(stopped)
+        time.sleep(args.duration)
+
+        with workload.lock:
+            in_flight = workload.in_flight
+        instance.kill()
+        stopped.set()
+        for thread in threads:
+            thread.join()
+
+        # recovery
+        recovery_seconds, process = instance.run_script("pre-start.py")
+        leftover_records = sum(
+            int(count)
+            for count in re.findall(r"^(\d+) (?:migrating )?records located", process.stdout, re.M)
+        )
+
+        problems = []
+        if process.returncode != 0:
+            problems.append(f"pre-start.py failed: {process.stderr.strip()}")
+
+        expected_path = os.path.join(work_path, "expected.json")
+        with open(expected_path, "wt") as f:
+            json.dump(workload.expected, f)
+
+        seconds, process = instance.run_script("soak-test.py", "--verify", expected_path)
+        if process.returncode != 0:
+            raise RuntimeError(f"verification failed: {process.stderr}")
+
+        report = json.loads(process.stdout.strip().splitlines()[-1])
+        problems.extend(report["problems"])
+
+        return {
+            "objects": object_count,
+            "requests": workload.requests,
+            "unknown": workload.unknown,
+            "in_flight": in_flight,
+            "leftover_records": leftover_records,
+            "recovery_seconds": round(recovery_seconds, 3),
+            "closed_objects": report["objects"],
+            "lost_by_rollback": report["lost"],
+            "problems": problems,
+            "work_path": work_path,
+        }
+    finally:
+        instance.kill()
+        if not args.keep:
+            shutil.rmtree(work_path, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="crash-injection soak test of PUT/DELETE rollback and pre-start.py recovery on an isolated EOSS instance"
+    )
+    parser.add_argument(
+        "--objects",
+        default="1000,10000",
+        help="comma separated object counts, one round is run for each count",
+    )
+    parser.add_argument(
+        "--concurrency", type=int, default=16, help="number of concurrent clients"
+    )
+    parser.add_argument(
+        "--duration", type=float, default=30, help="seconds of faulty load in each round"
+    )
+    parser.add_argument(
+        "--mode",
+        choices=FAULT_MODES,
+        default="kill",
+        help="kill workers by SIGKILL or raise errors at fault injection points",
+    )
+    parser.add_argument(
+        "--point",
+        choices=FAULT_POINTS,
+        action="append",
+        help="fault injection point, all points by default",
+    )
+    parser.add_argument(
+        "--fault-rate",
+        type=float,
+        default=0.01,
+        help="probability of injecting a fault at each point",
+    )
+    parser.add_argument(
+        "--delete-ratio", type=float, default=0.3, help="ratio of DELETE requests"
+    )
+    parser.add_argument(
+        "--max-size", type=int, default=65536, help="maximum object size in bytes"
+    )
+    parser.add_argument(
+        "--preload-size", type=int, default=1024, help="size in bytes of preloaded objects"
+    )
+    parser.add_argument(
+        "--processes", type=int, default=4, help="number of uWSGI worker processes"
+    )
+    parser.add_argument("--port", type=int, default=4090, help="HTTP port of test instance")
+    parser.add_argument("--uwsgi", default="uwsgi", help="uWSGI executable")
+    parser.add_argument(
+        "--config",
+        default=None,
+        help="base EOSS configuration file, paths are replaced by work directory",
+    )
+    parser.add_argument(
+        "--directory", default=None, help="parent directory of work directories"
+    )
+    parser.add_argument(
+        "--keep", action="store_true", help="keep work directories for inspection"
+    )
+    parser.add_argument("--json", action="store_true", help="print results in JSON")
+    parser.add_argument("--verify", default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    # verification runs in a subprocess of each round against the instance in EOSS_CONFIG
+    if args.verify:
+        verify(args.verify)
+        sys.exit(0)
+
+    settings = {}
+    if args.config:
+        try:
+            with open(args.config, "rt") as f:
+                settings = yaml.safe_load(f) or {}
+        except (OSError, yaml.YAMLError) as e:
+            print(f"ERROR: failed to read configuration file {args.config}: {e}", file=sys.stderr)
+            sys.exit(1)
+
+    try:
+        object_counts = [int(count) for count in args.objects.split(",")]
+    except ValueError:
+        print(f"ERROR: invalid object counts {args.objects}", file=sys.stderr)
+        sys.exit(1)
+
+    results = []
+
+    for object_count in object_counts:
+        try:
+            result = run_round(args, settings, object_count)
+        except (OSError, RuntimeError, ValueError) as e:
+            print(f"ERROR: soak test round of {object_count} objects failed: {e}", file=sys.stderr)
+            sys.exit(2)
+
+        results.append(result)
+
+        if not args.json:
+            print(
+                f"objects {result['objects']:8}  requests {result['requests']:7}  unknown {result['unknown']:5}  in-flight {result['in_flight']:4}  leftover {result['leftover_records']:5}  recovery {result['recovery_seconds']:8.3f} s  lost {result['lost_by_rollback']:4}  problems {len(result['problems'])}"
+            )
+            for problem in result["problems"]:
+                print(f"  {problem}")
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+
+    if any(result["problems"] for result in results):
+        sys.exit(3)
+
+    sys.exit(0)
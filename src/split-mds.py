@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+
+import argparse
+import sys
+from eoss import METADATA_DB_SHARDS
+from eoss import mds_client
+from eoss import sharding
+from eoss.exceptions import MDSConnectException
+from eoss.exceptions import MDSExecuteException
+from eoss.exceptions import MDSCommitException
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="split MDS into shards or change the number of MDS shards, EOSS service and all daemons must be stopped"
+    )
+    parser.add_argument(
+        "--shards",
+        type=int,
+        default=METADATA_DB_SHARDS,
+        help="number of MDS shards, default is METADATA_DB_SHARDS",
+    )
+    args = parser.parse_args()
+
+    if args.shards < 1:
+        print(f"ERROR: number of MDS shards must be at least 1", file=sys.stderr)
+        sys.exit(1)
+
+    if args.shards != METADATA_DB_SHARDS:
+        print(
+            f"WARNING: METADATA_DB_SHARDS is {METADATA_DB_SHARDS}, update it to {args.shards} before EOSS service is started",
+            file=sys.stderr,
+        )
+
+    existing_shards = sharding.find_shard_files()
+    if 0 not in existing_shards:
+        print(
+            f"ERROR: MDS database {mds_client.get_shard_path(0)} does not exist",
+            file=sys.stderr,
+        )
+        sys.exit(1)
+
+    print(f"MDS shards {existing_shards} located, resharding into {args.shards} shards")
+
+    try:
+        moved_records = sharding.reshard(args.shards)
+    except (MDSConnectException, MDSExecuteException, MDSCommitException) as e:
+        print(f"ERROR: failed to reshard MDS: {e}", file=sys.stderr)
+        print(f"ERROR: resharding is interrupted, run it again to resume", file=sys.stderr)
+        sys.exit(2)
+
+    for table, count in moved_records.items():
+        print(f"{count} records of table {table} moved")
+
+    for shard in range(args.shards):
+        print(f"MDS shard {shard}: {mds_client.get_shard_path(shard)}")
+
+    sys.exit(0)
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+
+import argparse
+import os
+import sys
+import time
+from eoss import COLD_STORAGE_PATH
+from eoss import METADATA_DB_TABLE
+from eoss import TIER_MIGRATION_AGE
+from eoss import TIER_MIGRATION_BATCH_SIZE
+from eoss import TIER_MIGRATION_COMPRESS
+from eoss import TIER_MIGRATION_INTERVAL
+from eoss import TIER_MIGRATION_RATE
+from eoss import storage
+from eoss import utils
+from eoss.exceptions import MDSConnectException
+from eoss.exceptions import MDSExecuteException
+
+
+def get_candidates(state, tier=None, timestamp=None):
+    """
+    yield filename and version of matching objects, MDS shards are walked one by one
+    objects are fetched in batches of TIER_MIGRATION_BATCH_SIZE ordered by object name,
+    MDS is not kept open while a batch is migrated
+    """
+    from eoss import mds_client
+    from eoss import object_name
+
+    def query(mds, after):
+        if tier is None:
+            return mds.execute(
+                f"SELECT id FROM {METADATA_DB_TABLE} WHERE state = ? AND id > ? ORDER BY id LIMIT ?",
+                (state, after, TIER_MIGRATION_BATCH_SIZE),
+            ).fetchall()
+        else:
+            return mds.execute(
+                f"SELECT id FROM {METADATA_DB_TABLE} WHERE state = ? AND tier = ? AND timestamp < ? AND layout IS NULL AND id > ? ORDER BY id LIMIT ?",
+                (state, tier, timestamp, after, TIER_MIGRATION_BATCH_SIZE),
+            ).fetchall()
+
+    for shard in mds_client.get_shards():
+        after = ""
+
+        while True:
+            mds = mds_client.new_client(shard)
+            mds.connect()
+            mds.cursor()
+
+            try:
+                output = query(mds, after)
+            finally:
+                mds.close()
+
+            # filename and version columns have numeric affinity, a numeric filename or version string
+            # is read back as a number, so both are parsed from object name
+            for (record_name,) in output:
+                yield object_name.parse_object_name(record_name)
+
+            if len(output) < TIER_MIGRATION_BATCH_SIZE:
+                break
+
+            after = output[-1][0]
+
+
+def recover_migrations():
+    from eoss import migration
+
+    def handler(eoss_object_client):
+        if eoss_object_client.object_state != 4:
+            return None
+
+        migration.recover_object(eoss_object_client)
+        return True
+
+    flag = True
+
+    for object_filename, object_version in get_candidates(4):
+        if migration.run_locked(object_filename, object_version, handler) is False:
+            flag = False
+
+    return flag
+
+
+def move_cold_objects(age, compress, throttle):
+    from eoss import migration
+
+    now = time.time()
+    compression = "gzip" if compress else None
+    moved_objects = 0
+    moved_bytes = 0
+
+    def handler(eoss_object_client):
+        nonlocal moved_bytes
+
+        if (
+            eoss_object_client.object_state != 0
+            or eoss_object_client.object_tier != storage.TIER_HOT
+            or eoss_object_client.object_layout is not None
+        ):
+            return None
+
+        # skip object which is still read recently
+        try:
+            if os.stat(eoss_object_client.object_path).st_atime > now - age:
+                return None
+        except OSError:
+            return None
+
+        moved_bytes += migration.migrate_object(
+            eoss_object_client,
+            storage.TIER_COLD,
+            root=eoss_object_client.object_root,
+            compression=compression,
+            throttle=throttle,
+        )
+        return True
+
+    for object_filename, object_version in get_candidates(
+        0, storage.TIER_HOT, int(now - age)
+    ):
+        if migration.run_locked(object_filename, object_version, handler):
+            moved_objects += 1
+
+    print(f"{moved_objects} objects moved to cold tier, {moved_bytes} bytes copied")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="move objects not updated or read recently to cold storage tier"
+    )
+    parser.add_argument(
+        "--once", action="store_true", help="run one migration pass and exit"
+    )
+    args = parser.parse_args()
+
+    if not COLD_STORAGE_PATH:
+        print(f"ERROR: COLD_STORAGE_PATH is not configured", file=sys.stderr)
+        sys.exit(1)
+
+    throttle = utils.Throttle(TIER_MIGRATION_RATE)
+
+    while True:
+        try:
+            if not recover_migrations():
+                print(f"ERROR: unable to recover interrupted migrations", file=sys.stderr)
+            move_cold_objects(TIER_MIGRATION_AGE, TIER_MIGRATION_COMPRESS, throttle)
+        except (MDSConnectException, MDSExecuteException) as e:
+            print(f"ERROR: failed to access MDS: {e}", file=sys.stderr)
+            if args.once:
+                sys.exit(2)
+
+        if args.once:
+            break
+
+        time.sleep(TIER_MIGRATION_INTERVAL)
+
+    sys.exit(0)
@@ -0,0 +1,130 @@
+import importlib.util
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import pytest
+import yaml
+
+# eoss reads its configuration at import time, so an isolated instance is configured before any test imports it
+TEST_ROOT = tempfile.mkdtemp(prefix="eoss-test-")
+SRC_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+
+# 6 hot tier storage roots for erasure coding with 4 data and 2 parity stripes, a mirror and 2 MDS shards
+STORAGE_PATHS = [os.path.join(TEST_ROOT, f"data{root}") for root in range(6)]
+MIRROR_STORAGE_PATH = os.path.join(TEST_ROOT, "mirror")
+PROFILER_TOKEN = "test-token"
+
+for directory in ("log", "lock", "mds", "cold", "mirror"):
+    os.makedirs(os.path.join(TEST_ROOT, directory))
+
+config_path = os.path.join(TEST_ROOT, "eoss.yaml")
+with open(config_path, "wt") as f:
+    yaml.dump(
+        {
+            "STORAGE_PATH": STORAGE_PATHS[0],
+            "STORAGE_PATHS": STORAGE_PATHS,
+            "COLD_STORAGE_PATH": os.path.join(TEST_ROOT, "cold"),
+            "MIRROR_STORAGE_PATHS": [MIRROR_STORAGE_PATH],
+            "METADATA_DB_PATH": os.path.join(TEST_ROOT, "mds", "mds.sql"),
+            "METADATA_DB_SHARDS": 2,
+            "LOGGING_PATH": os.path.join(TEST_ROOT, "log"),
+            "OBJECT_LOCK_PATH": os.path.join(TEST_ROOT, "lock"),
+            "METADATA_JOURNAL_SYNC": False,
+            "ERASURE_CODING_UNIT_SIZE": 4096,
+            "DEDUP_CHUNK_SIZE": 4096,
+            "USAGE_PREFIXES": {"usage-quota__": 100, "usage-free__": None},
+            "PROFILER_TOKEN": PROFILER_TOKEN,
+            "PROFILER_MAX_DURATION": 5,
+            "STARTUP_PRELOAD_SIZE": 0,
+        },
+        f,
+    )
+
+os.environ["EOSS_CONFIG"] = config_path
+os.environ["EOSS_CONFIG_CACHE"] = ""
+
+sys.path.insert(0, SRC_PATH)
+
+
+@pytest.fixture(scope="session")
+def instance():
+    """
+    bootstrap the isolated instance by bootstrap-env.py and pre-start.py, as start.sh does
+    objects are kept across tests, so each test uses its own object filenames
+    """
+    for script in ("bootstrap-env.py", "pre-start.py"):
+        subprocess.run(
+            [sys.executable, script], cwd=SRC_PATH, check=True, stdout=subprocess.DEVNULL
+        )
+
+    return TEST_ROOT
+
+
+@pytest.fixture(scope="session")
+def app(instance):
+    """
+    EOSS service application, src/eoss.py is loaded by path since its module name is taken by eoss package
+    """
+    pytest.importorskip("flask")
+
+    spec = importlib.util.spec_from_file_location("eoss_service", os.path.join(SRC_PATH, "eoss.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+
+    return module
+
+
+@pytest.fixture
+def client(app):
+    return app.app.test_client()
+
+
+@pytest.fixture(scope="session")
+def server(app):
+    """
+    serve EOSS service application over HTTP for the client SDK and scripts using it
+    """
+    from werkzeug.serving import make_server
+
+    http_server = make_server("127.0.0.1", 0, app.app, threaded=True)
+    thread = threading.Thread(target=http_server.serve_forever)
+    thread.start()
+
+    yield f"http://127.0.0.1:{http_server.server_port}"
+
+    http_server.shutdown()
+    thread.join()
+
+
+@pytest.fixture(scope="session")
+def load_script(instance):
+    """
+    return a loader of scripts in src, their filenames are not valid module names
+    """
+    scripts = {}
+
+    def load(script):
+        if script not in scripts:
+            spec = importlib.util.spec_from_file_location(
+                script.replace("-", "_").replace(".py", ""), os.path.join(SRC_PATH, script)
+            )
+            scripts[script] = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(scripts[script])
+        return scripts[script]
+
+    return load
+
+
+def find_filename(prefix, shard):
+    """
+    return an object filename starting with prefix whose record is held by MDS shard
+    """
+    from eoss import mds_client
+    from eoss import object_name
+
+    for i in range(100):
+        filename = f"{prefix}-{i}"
+        if mds_client.get_shard(object_name.set_object_name(filename, None)) == shard:
+            return filename
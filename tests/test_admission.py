@@ -0,0 +1,66 @@
+import time
+from eoss import admission
+
+
+def test_request_classes():
+    assert admission.get_request_class("GET", "/eoss/v1/object/a") == "get"
+    for method in ("PUT", "POST", "COPY", "MOVE"):
+        assert admission.get_request_class(method, "/eoss/v1/object/a") == "put"
+    assert admission.get_request_class("HEAD", "/eoss/v1/object/a") == "metadata"
+    assert admission.get_request_class("GET", "/eoss/v1/stats") == "metadata"
+
+
+def test_queue_start():
+    now = time.time()
+
+    assert admission.get_queue_start(None, now) == now
+    assert admission.get_queue_start("garbage", now) == now
+    assert admission.get_queue_start(f"t={now - 2}", now) == now - 2
+    assert abs(admission.get_queue_start(str(int((now - 2) * 1000000)), now) - (now - 2)) < 0.001
+    # clock skew of front proxy is ignored
+    assert admission.get_queue_start(f"t={now + 10}", now) == now
+
+
+def test_shed_with_retry_after(client, app, monkeypatch):
+    monkeypatch.setattr(
+        app,
+        "admission_controller",
+        admission.AdmissionController(limits={"get": 1}, queue_timeout=0.05),
+    )
+    assert client.put("/eoss/v1/object/admission-shed", data=b"data").status_code == 201
+
+    # the only get slot is taken by another worker
+    other_worker = admission.SlotPool("get", 1)
+    slot = other_worker.acquire(time.time())
+    assert slot == 0
+
+    try:
+        response = client.get("/eoss/v1/object/admission-shed")
+        assert response.status_code == 503
+        assert response.headers["Retry-After"] == "1"
+
+        # other classes are not limited
+        assert client.head("/eoss/v1/object/admission-shed").status_code == 200
+    finally:
+        other_worker.release(slot)
+
+    response = client.get("/eoss/v1/object/admission-shed")
+    assert response.data == b"data"
+    response.close()
+
+    # slot is released once the response is sent
+    assert other_worker.acquire(time.time()) == 0
+    other_worker.release(0)
+
+
+def test_client_rate_limit(client, app, monkeypatch):
+    monkeypatch.setattr(
+        app,
+        "admission_controller",
+        admission.AdmissionController(limits={}, client_rate=0.5, client_burst=1),
+    )
+
+    assert client.head("/eoss/v1/object/admission-rate").status_code == 404
+    response = client.head("/eoss/v1/object/admission-rate")
+    assert response.status_code == 429
+    assert int(response.headers["Retry-After"]) >= 1
@@ -0,0 +1,71 @@
+import os
+
+APPEND_HEADERS = {"X-EOSS-Append": "1"}
+
+
+def append(client, object_filename, data, offset=None):
+    headers = dict(APPEND_HEADERS)
+    if offset is not None:
+        headers["X-EOSS-Append-Offset"] = str(offset)
+    return client.post(f"/eoss/v1/object/{object_filename}", data=data, headers=headers)
+
+
+def test_append(client):
+    assert client.put("/eoss/v1/object/append-log", data=b"line 1\n").status_code == 201
+
+    response = append(client, "append-log", b"line 2\n")
+    assert response.status_code == 200
+    assert response.headers["X-EOSS-Object-Size"] == "14"
+
+    response = append(client, "append-log", b"line 3\n", offset=14)
+    assert response.status_code == 200
+    assert response.headers["X-EOSS-Object-Size"] == "21"
+
+    assert client.get("/eoss/v1/object/append-log").data == b"line 1\nline 2\nline 3\n"
+
+    # digest of appended object is cleared
+    response = client.head("/eoss/v1/object/append-log")
+    assert response.headers["X-EOSS-Object-Size"] == "21"
+    assert "X-EOSS-Object-Digest" not in response.headers
+
+
+def test_append_offset_mismatch(client):
+    assert client.put("/eoss/v1/object/append-offset", data=b"12345").status_code == 201
+
+    # concurrent appender expected the old size, nothing is appended
+    for offset in (0, 4, 6):
+        response = append(client, "append-offset", b"678", offset=offset)
+        assert response.status_code == 412
+        assert response.headers["X-EOSS-Object-Size"] == "5"
+
+    assert append(client, "append-offset", b"678", offset="x").status_code == 400
+    assert client.get("/eoss/v1/object/append-offset").data == b"12345"
+
+
+def test_append_rejected(client):
+    assert append(client, "append-missing", b"data").status_code == 404
+
+    assert client.put("/eoss/v1/object/append-plain", data=b"data").status_code == 201
+    assert client.post("/eoss/v1/object/append-plain", data=b"data").status_code == 405
+
+    response = client.put(
+        "/eoss/v1/object/append-erasure",
+        data=os.urandom(4096),
+        headers={"X-EOSS-Durability": "erasure"},
+    )
+    assert response.status_code == 201
+    assert append(client, "append-erasure", b"data").status_code == 400
+
+
+def test_append_breaks_hardlink(client):
+    assert client.put("/eoss/v1/object/append-source", data=b"shared").status_code == 201
+    response = client.open(
+        "/eoss/v1/object/append-source",
+        method="COPY",
+        headers={"X-EOSS-Destination": "append-copy"},
+    )
+    assert response.status_code == 201
+
+    assert append(client, "append-copy", b" appended").status_code == 200
+    assert client.get("/eoss/v1/object/append-copy").data == b"shared appended"
+    assert client.get("/eoss/v1/object/append-source").data == b"shared"
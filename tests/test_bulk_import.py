@@ -0,0 +1,92 @@
+import hashlib
+import os
+import subprocess
+import sys
+from conftest import SRC_PATH
+from eoss import object_client
+from eoss import storage
+
+
+def bulk_import(*args):
+    return subprocess.run(
+        [sys.executable, "bulk-import.py", *args],
+        cwd=SRC_PATH,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        text=True,
+    )
+
+
+def get_record(object_filename):
+    eoss_object_client = object_client.ObjectClient(object_filename)
+    eoss_object_client.init_mds()
+    try:
+        assert eoss_object_client.check_object_exists() is True
+    finally:
+        eoss_object_client.close_mds()
+    return eoss_object_client
+
+
+def test_bulk_import(client, tmp_path):
+    source = tmp_path / "source"
+    (source / "import-dir" / "nested").mkdir(parents=True)
+    (source / "import-dir" / "a.txt").write_bytes(b"first")
+    (source / "import-dir" / "nested" / "b.txt").write_bytes(b"second")
+
+    result = bulk_import(str(source), "--mode", "copy")
+    assert result.returncode == 0, result.stderr
+
+    # relative path separators are replaced by "__"
+    assert client.get("/eoss/v1/object/import-dir__a.txt").data == b"first"
+    assert client.get("/eoss/v1/object/import-dir__nested__b.txt").data == b"second"
+
+    eoss_object_client = get_record("import-dir__nested__b.txt")
+    assert eoss_object_client.object_state == 0
+    assert eoss_object_client.object_tier == storage.TIER_HOT
+    assert eoss_object_client.object_digest == hashlib.sha256(b"second").hexdigest()
+
+    # copied object doesn't share data with its source file
+    assert not os.path.samefile(
+        eoss_object_client.object_path, source / "import-dir" / "nested" / "b.txt"
+    )
+
+
+def test_bulk_import_resume_and_overwrite(client, tmp_path):
+    source = tmp_path / "source"
+    (source / "import-resume").mkdir(parents=True)
+    (source / "import-resume" / "c.txt").write_bytes(b"old")
+
+    assert bulk_import(str(source), "--mode", "copy").returncode == 0
+    (source / "import-resume" / "c.txt").write_bytes(b"new")
+
+    # closed objects are skipped by the next run
+    result = bulk_import(str(source), "--mode", "copy")
+    assert result.returncode == 0, result.stderr
+    assert "0 objects imported" in result.stdout
+    assert client.get("/eoss/v1/object/import-resume__c.txt").data == b"old"
+
+    result = bulk_import(str(source), "--mode", "copy", "--overwrite")
+    assert result.returncode == 0, result.stderr
+    assert client.get("/eoss/v1/object/import-resume__c.txt").data == b"new"
+    assert get_record("import-resume__c.txt").object_digest == hashlib.sha256(b"new").hexdigest()
+
+
+def test_bulk_import_versioned(client, tmp_path):
+    source = tmp_path / "source"
+    source.mkdir()
+    (source / "import-versioned.txt").write_bytes(b"versioned")
+
+    assert bulk_import(str(source), "--version", "ver1.0", "--mode", "copy").returncode == 0
+
+    response = client.get(
+        "/eoss/v1/object/import-versioned.txt", headers={"X-EOSS-Object-Version": "ver1.0"}
+    )
+    assert response.data == b"versioned"
+    assert client.get("/eoss/v1/object/import-versioned.txt").status_code == 404
+
+
+def test_bulk_import_missing_source(tmp_path):
+    result = bulk_import(str(tmp_path / "missing"))
+
+    assert result.returncode == 1
+    assert result.stderr.startswith("ERROR:")
@@ -0,0 +1,134 @@
+import hashlib
+import json
+import threading
+import time
+from conftest import find_filename
+from eoss import changelog
+
+CHANGES_URL = "/eoss/v1/changes"
+
+
+def get_changes(client, **args):
+    response = client.get(CHANGES_URL, query_string=args)
+    assert response.status_code == 200
+    assert response.mimetype == "application/x-ndjson"
+    lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    return (lines[:-1], lines[-1]["next"])
+
+
+def get_cursor(client):
+    changes, cursor = get_changes(client)
+    assert changes == []
+    return cursor
+
+
+def test_changes(client):
+    cursor = get_cursor(client)
+    assert len(cursor.split(".")) == 2
+
+    filenames = [find_filename("changes-object", shard) for shard in (0, 1)]
+    for filename in filenames:
+        assert client.put(f"/eoss/v1/object/{filename}", data=filename.encode()).status_code == 201
+    assert client.delete(f"/eoss/v1/object/{filenames[0]}").status_code == 200
+
+    # changes of a MDS shard are in sequence order, MDS shards are merged by timestamp
+    changes, next_cursor = get_changes(client, since=cursor)
+    shard_changes = [[change for change in changes if change["shard"] == shard] for shard in (0, 1)]
+    assert [(change["filename"], change["operation"]) for change in shard_changes[0]] == [
+        (filenames[0], "PUT"),
+        (filenames[0], "DELETE"),
+    ]
+    assert [(change["filename"], change["operation"]) for change in shard_changes[1]] == [
+        (filenames[1], "PUT")
+    ]
+    assert shard_changes[0][1]["seq"] == shard_changes[0][0]["seq"] + 1
+    assert shard_changes[0][0]["size"] == len(filenames[0])
+    assert shard_changes[0][0]["digest"] == hashlib.sha256(filenames[0].encode()).hexdigest()
+    assert shard_changes[0][1]["size"] is None and shard_changes[0][1]["digest"] is None
+    assert next_cursor == changelog.get_cursor(
+        [changes_of_shard[-1]["seq"] for changes_of_shard in shard_changes]
+    )
+
+    # nothing is left after the next cursor
+    assert get_changes(client, since=next_cursor) == ([], next_cursor)
+    assert get_cursor(client) == next_cursor
+
+    # consumer pages through changes with limit
+    paged = []
+    while True:
+        page, cursor = get_changes(client, since=cursor, limit=1)
+        if not page:
+            break
+        assert len(page) == 1
+        paged.extend(page)
+    assert paged == changes
+    assert cursor == next_cursor
+
+
+def test_changes_numeric_names(client):
+    cursor = get_cursor(client)
+    headers = {"X-EOSS-Object-Version": "2"}
+    assert client.put("/eoss/v1/object/0018", data=b"data", headers=headers).status_code == 201
+    assert client.delete("/eoss/v1/object/0018", headers=headers).status_code == 200
+
+    # numeric filename and version are not read back as numbers from MDS
+    changes, next_cursor = get_changes(client, since=cursor)
+    assert [
+        (change["filename"], change["version"], change["operation"]) for change in changes
+    ] == [("0018", "2", "PUT"), ("0018", "2", "DELETE")]
+
+
+def test_changes_wait(client, app):
+    cursor = get_cursor(client)
+
+    # wait time is over without changes
+    start = time.time()
+    assert get_changes(client, since=cursor, wait=0.3) == ([], cursor)
+    assert time.time() - start >= 0.3
+
+    # change committed while the consumer waits is returned at once
+    timer = threading.Timer(
+        0.2, lambda: app.app.test_client().put("/eoss/v1/object/changes-waited", data=b"data")
+    )
+    timer.start()
+    try:
+        changes, next_cursor = get_changes(client, since=cursor, wait=10)
+    finally:
+        timer.join()
+    assert [(change["filename"], change["operation"]) for change in changes] == [
+        ("changes-waited", "PUT")
+    ]
+    assert next_cursor != cursor
+
+
+def test_changes_expired_cursor(client, monkeypatch):
+    cursor = get_cursor(client)
+    sequences = [int(sequence) for sequence in cursor.split(".")]
+
+    # cursor taken with another number of MDS shards
+    assert client.get(CHANGES_URL, query_string={"since": "0"}).status_code == 410
+    assert client.get(CHANGES_URL, query_string={"since": "0.0.0"}).status_code == 410
+
+    # sequence number is not assigned yet
+    since = changelog.get_cursor([sequences[0] + 10, sequences[1]])
+    assert client.get(CHANGES_URL, query_string={"since": since}).status_code == 410
+
+    # changes after cursor are trimmed
+    monkeypatch.setattr(changelog, "CHANGELOG_RETENTION", 1)
+    for i in range(3):
+        filename = find_filename(f"changes-trimmed-{i}", 0)
+        assert client.put(f"/eoss/v1/object/{filename}", data=b"data").status_code == 201
+    assert client.get(CHANGES_URL, query_string={"since": cursor}).status_code == 410
+
+    # consumer starts over from the current end of changelog
+    assert get_changes(client, since=get_cursor(client))[0] == []
+
+
+def test_bad_changes_parameters(client):
+    cursor = get_cursor(client)
+
+    for args in ({"limit": 0}, {"limit": -1}, {"limit": "x"}, {"wait": -1}, {"wait": "x"}):
+        assert client.get(CHANGES_URL, query_string=dict(args, since=cursor)).status_code == 400
+    for since in ("x", "1.x", "-1.0", ""):
+        assert client.get(CHANGES_URL, query_string={"since": since}).status_code == 400
+    assert client.post(CHANGES_URL).status_code == 405
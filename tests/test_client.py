@@ -0,0 +1,127 @@
+import io
+import os
+import threading
+import pytest
+from eoss import object_client
+from eoss_client import EOSSClient
+from eoss_client import EOSSClientException
+from eoss_client import ObjectNotFoundException
+from eoss_client import RetryExhaustedException
+
+
+@pytest.fixture
+def eoss(server):
+    with EOSSClient(server, pool_size=2, max_retries=2, backoff=0.01, workers=4) as eoss:
+        yield eoss
+
+
+def test_object_operations(eoss):
+    eoss.put("client-object", b"data", version="ver1.0")
+    assert eoss.exists("client-object", version="ver1.0")
+    assert not eoss.exists("client-object")
+    assert eoss.get("client-object", version="ver1.0") == b"data"
+
+    # file object is sent from its current position
+    data = io.BytesIO(b"skipped:file data")
+    data.seek(8)
+    eoss.put("client-file", data)
+    assert eoss.get("client-file") == b"file data"
+
+    assert eoss.append("client-file", b"!", offset=9) == 10
+    with pytest.raises(EOSSClientException) as e:
+        eoss.append("client-file", b"!", offset=9)
+    assert e.value.status == 412
+
+    eoss.copy("client-file", "client-copy")
+    eoss.move("client-copy", "client-moved")
+    assert eoss.get("client-moved") == b"file data!"
+    assert not eoss.exists("client-copy")
+
+    assert eoss.delete("client-moved")
+    assert not eoss.delete("client-moved")
+    with pytest.raises(ObjectNotFoundException):
+        eoss.get("client-moved")
+
+
+def test_non_seekable_data_rejected(eoss):
+    read_fd, write_fd = os.pipe()
+    os.close(write_fd)
+
+    with open(read_fd, "rb", buffering=0) as f:
+        with pytest.raises(EOSSClientException, match="seekable"):
+            eoss.put("client-pipe", f)
+
+    assert not eoss.exists("client-pipe")
+
+
+def test_segmented_download(eoss, tmp_path):
+    data = os.urandom(10000)
+    eoss.put("client-segmented", data)
+
+    size = eoss.download("client-segmented", str(tmp_path / "segmented"), segment_size=3000)
+    assert size == len(data)
+    assert (tmp_path / "segmented").read_bytes() == data
+
+    # empty object has no satisfiable range
+    eoss.put("client-empty", b"")
+    assert eoss.download("client-empty", str(tmp_path / "empty"), segment_size=3000) == 0
+    assert (tmp_path / "empty").read_bytes() == b""
+
+
+def test_parallel_transfers(eoss, tmp_path):
+    items = []
+    for i in range(4):
+        (tmp_path / f"source-{i}").write_bytes(os.urandom(100 + i))
+        items.append((f"client-many-{i}", str(tmp_path / f"source-{i}")))
+
+    assert eoss.upload_many(items) == {item: None for item in items}
+
+    targets = [(filename, str(tmp_path / f"target-{i}")) for i, (filename, source_path) in enumerate(items)]
+    targets.append(("client-many-missing", str(tmp_path / "missing")))
+    results = eoss.download_many(targets)
+
+    for i, item in enumerate(targets[:-1]):
+        assert results[item] == 100 + i
+        assert (tmp_path / f"target-{i}").read_bytes() == (tmp_path / f"source-{i}").read_bytes()
+    assert isinstance(results[targets[-1]], ObjectNotFoundException)
+    assert not os.path.exists(tmp_path / "missing.eoss-part")
+
+
+def test_list_objects_paged(eoss):
+    filenames = [f"client-list-{i}" for i in range(5)]
+    for filename in filenames:
+        eoss.put(filename, b"data")
+
+    objects = list(eoss.list_objects(prefix="client-list-", page_size=2))
+    assert [output["filename"] for output in objects] == filenames
+
+
+def test_retry_on_locked_object(eoss):
+    eoss.put("client-locked", b"old")
+
+    eoss_object_client = object_client.ObjectClient("client-locked")
+    eoss_object_client.set_write_lock()
+    try:
+        with pytest.raises(RetryExhaustedException) as e:
+            eoss.put("client-locked", io.BytesIO(b"new"))
+        assert e.value.status == 409
+
+        # lock is released while the client backs off
+        timer = threading.Timer(0.05, eoss_object_client.remove_lock)
+        timer.start()
+        eoss.max_retries = 50
+        eoss.put("client-locked", io.BytesIO(b"new"))
+        timer.join()
+    finally:
+        eoss_object_client.remove_lock()
+
+    assert eoss.get("client-locked") == b"new"
+
+
+def test_backoff(eoss):
+    for attempt in range(10):
+        assert 0 <= eoss.get_backoff(attempt) <= eoss.max_backoff
+
+    # Retry-After header is the lower bound
+    assert eoss.get_backoff(0, "2") >= 2
+    assert eoss.get_backoff(0, "garbage") <= eoss.backoff
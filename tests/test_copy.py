@@ -0,0 +1,146 @@
+import os
+from conftest import find_filename
+from eoss import dedup
+from eoss import mds_client
+from eoss import object_client
+from eoss import object_name
+
+
+def copy(client, object_filename, destination_filename, move=False, headers=None):
+    return client.open(
+        f"/eoss/v1/object/{object_filename}",
+        method="MOVE" if move else "COPY",
+        headers=dict(headers or {}, **{"X-EOSS-Destination": destination_filename}),
+    )
+
+
+def get_record(object_filename, object_version=None):
+    eoss_object_client = object_client.ObjectClient(object_filename, object_version=object_version)
+    eoss_object_client.init_mds()
+    try:
+        eoss_object_client.check_object_exists()
+    finally:
+        eoss_object_client.close_mds()
+    return eoss_object_client
+
+
+def get_chunk_refs(digests):
+    refs = {}
+    for shard_output in mds_client.map_shards(
+        lambda mds: mds.execute(
+            f"SELECT digest, refs FROM chunk_refs WHERE digest IN ({', '.join('?' * len(digests))})",
+            tuple(digests),
+        ).fetchall()
+    ):
+        for digest, count in shard_output:
+            refs[digest] = refs.get(digest, 0) + count
+    return refs
+
+
+def test_copy(client):
+    assert client.put("/eoss/v1/object/copy-source", data=b"artifact").status_code == 201
+
+    response = copy(
+        client, "copy-source", "copy-source", headers={"X-EOSS-Destination-Version": "release"}
+    )
+    assert response.status_code == 201
+
+    response = client.get("/eoss/v1/object/copy-source", headers={"X-EOSS-Object-Version": "release"})
+    assert response.data == b"artifact"
+    assert client.get("/eoss/v1/object/copy-source").data == b"artifact"
+
+    # destination shares data with source and has its digest
+    source = get_record("copy-source")
+    destination = get_record("copy-source", "release")
+    assert os.path.samefile(source.object_path, destination.object_path)
+    assert destination.object_digest == source.object_digest
+
+
+def test_copy_overrides_destination(client):
+    assert client.put("/eoss/v1/object/copy-new", data=b"new").status_code == 201
+    assert client.put("/eoss/v1/object/copy-old", data=b"old data").status_code == 201
+
+    assert copy(client, "copy-new", "copy-old").status_code == 201
+    assert client.get("/eoss/v1/object/copy-old").data == b"new"
+    assert client.head("/eoss/v1/object/copy-old").headers["X-EOSS-Object-Size"] == "3"
+
+
+def test_move_across_shards(client):
+    source = find_filename("move-source", 0)
+    destination = find_filename("move-destination", 1)
+    assert client.put(f"/eoss/v1/object/{source}", data=b"moved").status_code == 201
+
+    assert copy(client, source, destination, move=True).status_code == 201
+    assert client.get(f"/eoss/v1/object/{destination}").data == b"moved"
+    assert client.head(f"/eoss/v1/object/{source}").status_code == 404
+
+    # source record is removed from its own shard in the same transaction
+    source_name = object_name.set_object_name(source, None)
+    mds = mds_client.MDSClient(mds_client.get_shard(source_name))
+    mds.connect()
+    mds.cursor()
+    try:
+        assert mds.get_object(source_name) is None
+    finally:
+        mds.close()
+
+
+def test_copy_erasure_coded(client):
+    data = os.urandom(4096 * 5)
+    response = client.put(
+        "/eoss/v1/object/copy-erasure", data=data, headers={"X-EOSS-Durability": "erasure"}
+    )
+    assert response.status_code == 201
+
+    assert copy(client, "copy-erasure", "copy-erasure-copy").status_code == 201
+    assert get_record("copy-erasure-copy").object_layout["mode"] == "erasure"
+    assert client.get("/eoss/v1/object/copy-erasure-copy").data == data
+
+
+def test_copy_dedup_across_shards(client):
+    source = find_filename("copy-dedup", 0)
+    destination = find_filename("copy-dedup-copy", 1)
+    moved = find_filename("copy-dedup-moved", 0)
+    data = os.urandom(4096 * 8)
+
+    response = client.put(
+        f"/eoss/v1/object/{source}", data=data, headers={"X-EOSS-Durability": "dedup"}
+    )
+    assert response.status_code == 201
+    digests = [digest for digest, size in dedup.read_manifest(get_record(source).object_name)]
+    refs = get_chunk_refs(digests)
+
+    # chunks are shared by copy, its manifest is in the shard of destination
+    assert copy(client, source, destination).status_code == 201
+    assert dedup.is_dedup(get_record(destination).object_layout)
+    assert client.get(f"/eoss/v1/object/{destination}").data == data
+    assert get_chunk_refs(digests) == {digest: count + digests.count(digest) for digest, count in refs.items()}
+
+    # moved back into the shard of source, references of moved manifest are kept
+    assert copy(client, destination, moved, move=True).status_code == 201
+    assert client.get(f"/eoss/v1/object/{moved}").data == data
+    assert get_chunk_refs(digests) == {digest: count + digests.count(digest) for digest, count in refs.items()}
+
+    # plain object overrides deduplicated one, its chunks are dereferenced
+    assert client.put("/eoss/v1/object/copy-dedup-plain", data=b"plain").status_code == 201
+    assert copy(client, "copy-dedup-plain", moved).status_code == 201
+    assert get_record(moved).object_layout is None
+    assert client.get(f"/eoss/v1/object/{moved}").data == b"plain"
+    assert get_chunk_refs(digests) == refs
+
+
+def test_copy_rejected(client):
+    assert client.put("/eoss/v1/object/copy-rejected", data=b"data").status_code == 201
+
+    assert client.open("/eoss/v1/object/copy-rejected", method="COPY").status_code == 400
+    assert copy(client, "copy-rejected", "copy-rejected").status_code == 400
+    assert copy(client, "copy-missing", "copy-missing-copy").status_code == 404
+
+    # destination is being written
+    destination = object_client.ObjectClient("copy-locked")
+    destination.set_write_lock()
+    try:
+        assert copy(client, "copy-rejected", "copy-locked", move=True).status_code == 409
+    finally:
+        destination.remove_lock()
+    assert client.get("/eoss/v1/object/copy-rejected").data == b"data"
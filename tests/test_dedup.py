@@ -0,0 +1,151 @@
+import fcntl
+import hashlib
+import io
+import os
+import subprocess
+import sys
+import pytest
+from conftest import SRC_PATH
+from eoss import dedup
+from eoss import mds_client
+from eoss import object_client
+from eoss import OBJECT_LOCK_PATH
+from eoss.exceptions import EOSSInternalException
+
+
+def put_dedup(client, object_filename, data, headers=None):
+    return client.put(
+        f"/eoss/v1/object/{object_filename}",
+        data=data,
+        headers=dict(headers or {}, **{"X-EOSS-Durability": "dedup"}),
+    )
+
+
+def get_record(object_filename, object_version=None):
+    eoss_object_client = object_client.ObjectClient(object_filename, object_version=object_version)
+    eoss_object_client.init_mds()
+    try:
+        eoss_object_client.check_object_exists()
+    finally:
+        eoss_object_client.close_mds()
+    return eoss_object_client
+
+
+def get_digests(object_filename, object_version=None):
+    return [
+        digest
+        for digest, size in dedup.read_manifest(get_record(object_filename, object_version).object_name)
+    ]
+
+
+def get_chunk_refs(digests):
+    refs = {}
+    for shard_output in mds_client.map_shards(
+        lambda mds: mds.execute(
+            f"SELECT digest, refs FROM chunk_refs WHERE digest IN ({', '.join('?' * len(digests))})",
+            tuple(digests),
+        ).fetchall()
+    ):
+        for digest, count in shard_output:
+            refs[digest] = refs.get(digest, 0) + count
+    return refs
+
+
+def test_iter_chunks():
+    data = os.urandom(4096 * 32)
+    chunks = list(dedup.iter_chunks(io.BytesIO(data)))
+
+    assert b"".join(chunks) == data
+    assert all(dedup.CHUNK_MIN_SIZE <= len(chunk) <= dedup.CHUNK_MAX_SIZE for chunk in chunks[:-1])
+
+    # chunk boundaries only depend on nearby data, an insertion only changes chunks around it
+    inserted = list(dedup.iter_chunks(io.BytesIO(data[:1000] + b"inserted" + data[1000:])))
+    assert len(set(chunks) & set(inserted)) >= len(chunks) - 2
+
+    assert list(dedup.iter_chunks(io.BytesIO(b""))) == []
+
+
+def test_dedup_object(client):
+    data = os.urandom(4096 * 16)
+
+    assert put_dedup(client, "dedup-object", data).status_code == 201
+    assert dedup.is_dedup(get_record("dedup-object").object_layout)
+    assert client.get("/eoss/v1/object/dedup-object").data == data
+    response = client.head("/eoss/v1/object/dedup-object")
+    assert response.headers["X-EOSS-Object-Digest"] == hashlib.sha256(data).hexdigest()
+
+    # each unique chunk is stored once and referenced by the manifest
+    digests = get_digests("dedup-object")
+    assert all(dedup.find_chunk(digest) is not None for digest in digests)
+    assert get_chunk_refs(digests) == {digest: digests.count(digest) for digest in digests}
+
+    # another version shares unchanged chunks with the first one
+    changed = data[:4096 * 8] + b"changed" + data[4096 * 8:]
+    response = put_dedup(
+        client, "dedup-object", changed, headers={"X-EOSS-Object-Version": "2"}
+    )
+    assert response.status_code == 201
+    response = client.get("/eoss/v1/object/dedup-object", headers={"X-EOSS-Object-Version": "2"})
+    assert response.data == changed
+    changed_digests = get_digests("dedup-object", "2")
+    shared = set(digests) & set(changed_digests)
+    assert len(shared) >= len(set(digests)) - 2
+    assert all(get_chunk_refs(list(shared))[digest] == 2 for digest in shared)
+
+    # deduplicated object can not be appended
+    response = client.post(
+        "/eoss/v1/object/dedup-object", data=b"data", headers={"X-EOSS-Append": "1"}
+    )
+    assert response.status_code == 400
+
+    # chunks are dereferenced with the object
+    assert client.delete("/eoss/v1/object/dedup-object").status_code == 200
+    refs = get_chunk_refs(digests)
+    assert all(refs[digest] == (1 if digest in shared else 0) for digest in digests)
+
+
+def test_collect_garbage(client):
+    data = os.urandom(4096 * 16)
+    kept = data[:4096 * 8] + os.urandom(4096 * 8)
+
+    assert put_dedup(client, "dedup-collected", data).status_code == 201
+    assert put_dedup(client, "dedup-kept", kept).status_code == 201
+    digests = get_digests("dedup-collected")
+    kept_digests = set(get_digests("dedup-kept"))
+    assert client.delete("/eoss/v1/object/dedup-collected").status_code == 200
+
+    # a referenced chunk left in trash by an interrupted garbage collection is restored
+    trashed = sorted(kept_digests)[0]
+    chunk_path = dedup.find_chunk(trashed)
+    trash_path = os.path.join(os.path.dirname(os.path.dirname(chunk_path)), "trash", trashed)
+    os.makedirs(os.path.dirname(trash_path), exist_ok=True)
+    os.rename(chunk_path, trash_path)
+
+    removed_chunks, removed_bytes = dedup.collect_garbage(2)
+    unreferenced = set(digests) - kept_digests
+    assert removed_chunks >= len(unreferenced)
+    assert removed_bytes >= len(data) - len(kept)
+    assert all(dedup.find_chunk(digest) is None for digest in unreferenced)
+    assert all(dedup.find_chunk(digest) is not None for digest in kept_digests)
+    assert get_chunk_refs(list(unreferenced)) == {}
+    assert client.get("/eoss/v1/object/dedup-kept").data == kept
+
+    # nothing is left to collect
+    result = subprocess.run(
+        [sys.executable, "dedup-gc.py"], cwd=SRC_PATH, check=True, stdout=subprocess.PIPE, text=True
+    )
+    assert result.stdout == "0 chunks removed, 0 bytes reclaimed\n"
+
+
+def test_collect_garbage_locked():
+    with open(os.path.join(OBJECT_LOCK_PATH, dedup.GC_LOCK_FILENAME), "wb") as lock_f:
+        fcntl.flock(lock_f, fcntl.LOCK_EX)
+
+        with pytest.raises(EOSSInternalException, match="another garbage collection"):
+            dedup.collect_garbage(10)
+
+        result = subprocess.run(
+            [sys.executable, "dedup-gc.py"], cwd=SRC_PATH, stderr=subprocess.PIPE, text=True
+        )
+        assert result.returncode == 3
+        assert result.stderr.startswith("ERROR:")
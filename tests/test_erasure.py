@@ -0,0 +1,139 @@
+import itertools
+import os
+import subprocess
+import sys
+from conftest import SRC_PATH
+from eoss import erasure
+from eoss import object_client
+
+# 4 data and 2 parity stripes of 4096 bytes units in test instance
+DATA = os.urandom(4 * 4096 * 2 + 1000)
+
+
+def get_record(object_filename):
+    eoss_object_client = object_client.ObjectClient(object_filename)
+    eoss_object_client.init_mds()
+    try:
+        eoss_object_client.check_object_exists()
+    finally:
+        eoss_object_client.close_mds()
+    return eoss_object_client
+
+
+def put_erasure(client, object_filename):
+    response = client.put(
+        f"/eoss/v1/object/{object_filename}", data=DATA, headers={"X-EOSS-Durability": "erasure"}
+    )
+    assert response.status_code == 201
+
+    eoss_object_client = get_record(object_filename)
+    assert eoss_object_client.object_layout["mode"] == "erasure"
+    return eoss_object_client
+
+
+def test_codec_decodes_any_k_stripes():
+    codec = erasure.Codec(4, 2)
+    data_units = [os.urandom(16) for _ in range(4)]
+    units = dict(enumerate(data_units + codec.encode(data_units)))
+
+    for lost in itertools.combinations(range(6), 2):
+        available = {index: unit for index, unit in units.items() if index not in lost}
+        assert codec.decode(available) == data_units, lost
+
+
+def test_erasure_put_and_get(client):
+    eoss_object_client = put_erasure(client, "erasure-object")
+    layout = eoss_object_client.object_layout
+
+    # stripes are spread over distinct storage roots, each holds one unit per row
+    assert len(set(layout["roots"])) == 6
+    for stripe_path in erasure.get_stripe_paths(eoss_object_client.object_name, layout):
+        assert os.path.getsize(stripe_path) == 3 * 4096
+
+    assert client.get("/eoss/v1/object/erasure-object").data == DATA
+    assert client.head("/eoss/v1/object/erasure-object").status_code == 200
+
+
+def test_erasure_reconstruction(client):
+    eoss_object_client = put_erasure(client, "erasure-degraded")
+    stripe_paths = erasure.get_stripe_paths(
+        eoss_object_client.object_name, eoss_object_client.object_layout
+    )
+
+    # a lost data stripe and a truncated one are reconstructed from parity stripes
+    os.unlink(stripe_paths[0])
+    with open(stripe_paths[2], "r+b") as f:
+        f.truncate(100)
+    assert client.get("/eoss/v1/object/erasure-degraded").data == DATA
+
+    # less than k stripes are readable, the stripe is put back for ec-repair afterwards
+    os.rename(stripe_paths[5], stripe_paths[5] + ".lost")
+    try:
+        assert client.get("/eoss/v1/object/erasure-degraded").status_code == 523
+    finally:
+        os.rename(stripe_paths[5] + ".lost", stripe_paths[5])
+
+    os.unlink(stripe_paths[2])
+    os.rename(stripe_paths[5], stripe_paths[5] + ".lost")
+    try:
+        assert client.get("/eoss/v1/object/erasure-degraded").status_code == 524
+    finally:
+        os.rename(stripe_paths[5] + ".lost", stripe_paths[5])
+
+
+def test_bad_durability(client):
+    response = client.put(
+        "/eoss/v1/object/erasure-bad", data=b"data", headers={"X-EOSS-Durability": "raid"}
+    )
+    assert response.status_code == 400
+
+
+def test_ec_repair(client, load_script):
+    ec_repair = load_script("ec-repair.py")
+    eoss_object_client = put_erasure(client, "erasure-repaired")
+    stripe_paths = erasure.get_stripe_paths(
+        eoss_object_client.object_name, eoss_object_client.object_layout
+    )
+    with open(stripe_paths[1], "rb") as f:
+        data_stripe = f.read()
+    with open(stripe_paths[4], "rb") as f:
+        parity_stripe = f.read()
+
+    os.unlink(stripe_paths[1])
+    with open(stripe_paths[4], "r+b") as f:
+        f.truncate(10)
+
+    # numeric filename and version are not read back as numbers from MDS
+    response = client.put(
+        "/eoss/v1/object/0015",
+        data=DATA,
+        headers={"X-EOSS-Durability": "erasure", "X-EOSS-Object-Version": "2"},
+    )
+    assert response.status_code == 201
+
+    objects = ec_repair.get_erasure_coded_objects()
+    assert ("erasure-repaired", None) in objects
+    assert ("0015", "2") in objects
+    assert ec_repair.repair_object("erasure-repaired", None) == (
+        eoss_object_client.object_name,
+        2,
+        None,
+    )
+    with open(stripe_paths[1], "rb") as f:
+        assert f.read() == data_stripe
+    with open(stripe_paths[4], "rb") as f:
+        assert f.read() == parity_stripe
+
+    # nothing is left to repair, plain objects are not repaired
+    assert client.put("/eoss/v1/object/erasure-plain", data=b"plain").status_code == 201
+    assert ec_repair.repair_object("erasure-repaired", None)[1:] == (0, None)
+    assert ec_repair.repair_object("erasure-plain", None)[1:] == (None, None)
+
+    result = subprocess.run(
+        [sys.executable, "ec-repair.py", "--workers", "1"],
+        cwd=SRC_PATH,
+        stdout=subprocess.PIPE,
+        text=True,
+    )
+    assert result.returncode == 0
+    assert "0 objects failed" in result.stdout
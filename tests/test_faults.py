@@ -0,0 +1,117 @@
+import json
+import os
+import subprocess
+import sys
+import pytest
+import yaml
+from conftest import SRC_PATH
+from eoss import faults
+from eoss import object_client
+from eoss import storage
+from eoss.exceptions import EOSSInternalException
+
+
+def get_record(object_filename):
+    eoss_object_client = object_client.ObjectClient(object_filename)
+    eoss_object_client.init_mds()
+    try:
+        object_exists_flag = eoss_object_client.check_object_exists()
+    finally:
+        eoss_object_client.close_mds()
+    return (object_exists_flag, eoss_object_client)
+
+
+def get_object_files(record_name):
+    return [path for path in storage.get_object_paths(record_name) if os.path.exists(path)]
+
+
+@pytest.mark.parametrize("point", ["put.state1", "put.state2", "put.renamed", "put.state0"])
+def test_put_fault_rolled_back(client, monkeypatch, point):
+    monkeypatch.setattr(faults, "FAULT_INJECTION_POINTS", {point: 1.0})
+    object_filename = f"fault-{point}"
+
+    assert client.put(f"/eoss/v1/object/{object_filename}", data=b"data").status_code == 526
+
+    # nothing is left of the new object
+    object_exists_flag, eoss_object_client = get_record(object_filename)
+    assert object_exists_flag is False
+    assert get_object_files(eoss_object_client.object_name) == []
+    assert not os.path.exists(eoss_object_client.object_temp_path)
+
+
+def test_delete_fault_recovered(client, monkeypatch, instance):
+    assert client.put("/eoss/v1/object/fault-delete", data=b"data").status_code == 201
+    monkeypatch.setattr(faults, "FAULT_INJECTION_POINTS", {"delete": 1.0})
+
+    assert client.delete("/eoss/v1/object/fault-delete").status_code == 523
+
+    # object is left not closed without files, pre-start.py removes its record
+    object_exists_flag, eoss_object_client = get_record("fault-delete")
+    assert object_exists_flag == 1
+    assert get_object_files(eoss_object_client.object_name) == []
+
+    subprocess.run(
+        [sys.executable, "pre-start.py"], cwd=SRC_PATH, check=True, stdout=subprocess.DEVNULL
+    )
+    assert get_record("fault-delete")[0] is False
+
+
+def test_inject_probability(monkeypatch):
+    monkeypatch.setattr(faults, "FAULT_INJECTION_POINTS", {"put.state1": 0.0})
+    faults.inject("put.state1")
+    faults.inject("delete")
+
+    monkeypatch.setattr(faults, "FAULT_INJECTION_POINTS", {"put.state1": 1.0})
+    with pytest.raises(EOSSInternalException, match="put.state1"):
+        faults.inject("put.state1")
+
+
+def test_soak_verify(instance, tmp_path):
+    # verification runs against a fresh instance, objects of other tests are not checked
+    with open(os.environ["EOSS_CONFIG"]) as f:
+        settings = yaml.safe_load(f)
+    for key in ("STORAGE_PATH", "COLD_STORAGE_PATH", "LOGGING_PATH", "OBJECT_LOCK_PATH"):
+        settings[key] = str(tmp_path / key.lower())
+        os.makedirs(settings[key])
+    settings["STORAGE_PATHS"] = [settings["STORAGE_PATH"]]
+    settings["MIRROR_STORAGE_PATHS"] = []
+    settings["METADATA_DB_PATH"] = str(tmp_path / "mds.sql")
+    settings["METADATA_DB_SHARDS"] = 1
+    with open(tmp_path / "eoss.yaml", "wt") as f:
+        yaml.dump(settings, f)
+    env = dict(os.environ, EOSS_CONFIG=str(tmp_path / "eoss.yaml"))
+
+    for script in ("bootstrap-env.py", "pre-start.py"):
+        subprocess.run(
+            [sys.executable, script], cwd=SRC_PATH, env=env, check=True, stdout=subprocess.DEVNULL
+        )
+
+    # an acknowledged object is lost, a failed override lost another one and an orphan file is left
+    with open(tmp_path / "expected.json", "wt") as f:
+        json.dump(
+            {
+                "acked": {"acked": "digest", "pending": []},
+                "overridden": {"acked": "digest", "pending": ["other digest"]},
+                "deleted": {"acked": "digest", "pending": [None]},
+            },
+            f,
+        )
+    with open(os.path.join(settings["STORAGE_PATH"], "orphan"), "wb") as f:
+        f.write(b"orphan")
+
+    result = subprocess.run(
+        [sys.executable, "soak-test.py", "--verify", str(tmp_path / "expected.json")],
+        cwd=SRC_PATH,
+        env=env,
+        check=True,
+        stdout=subprocess.PIPE,
+        text=True,
+    )
+    report = json.loads(result.stdout)
+
+    assert report["objects"] == 0
+    assert report["lost"] == 1
+    assert sorted(report["problems"]) == [
+        "acknowledged object acked is lost",
+        f"orphan file {os.path.join(settings['STORAGE_PATH'], 'orphan')} is left in storage",
+    ]
@@ -0,0 +1,167 @@
+import fcntl
+import os
+import pickle
+import threading
+import pytest
+from eoss import journal
+
+
+def make_record(object_name, size=0):
+    return tuple(
+        object_name if column == "id" else size if column == "size" else 0 if column == "state" else None
+        for column in journal.COLUMNS
+    )
+
+
+def insert(index, object_name, size=0):
+    index.commit([("insert", object_name, make_record(object_name, size), False)])
+
+
+def compact(index):
+    with index.lock:
+        fcntl.flock(index.lock_fd, fcntl.LOCK_EX)
+        try:
+            index.refresh(locked=True)
+            index.compact()
+        finally:
+            fcntl.flock(index.lock_fd, fcntl.LOCK_UN)
+
+
+def open_index(journal_path):
+    index = journal.JournalIndex(journal_path)
+    index.open()
+    return index
+
+
+@pytest.fixture
+def journal_path(tmp_path):
+    path = str(tmp_path / "mds.sql")
+    journal.create_journal(path)
+    return path
+
+
+def test_replay(journal_path):
+    writer = open_index(journal_path)
+    reader = open_index(journal_path)
+
+    insert(writer, "a", 1)
+    insert(writer, "b", 2)
+    writer.commit([("update", "a", {"size": 10}), ("delete", "b")])
+
+    reader.refresh()
+    assert reader.get("a")[journal.COLUMNS.index("size")] == 10
+    assert reader.get("b") is None
+    assert open_index(journal_path).records == writer.records
+
+
+def test_torn_tail(journal_path):
+    writer = open_index(journal_path)
+    insert(writer, "a")
+    size = os.path.getsize(journal_path)
+
+    # an interrupted write leaves a partial entry at the end of journal
+    with open(journal_path, "ab") as f:
+        f.write(journal.ENTRY_HEADER.pack(100, 0) + b'[["b"')
+
+    index = open_index(journal_path)
+    assert index.get("a") is not None
+    assert index.get("b") is None
+    assert index.offset == size
+
+    # the next commit overwrites the torn entry
+    insert(index, "c")
+    assert set(open_index(journal_path).records) == {"a", "c"}
+
+
+def test_compaction(journal_path):
+    writer = open_index(journal_path)
+    reader = open_index(journal_path)
+
+    for i in range(10):
+        insert(writer, f"object-{i}")
+    writer.commit([("delete", "object-0")])
+    compact(writer)
+    insert(writer, "after")
+
+    assert writer.generation == 1
+    with open(journal.get_checkpoint_path(journal_path), "rb") as f:
+        assert len(pickle.load(f)["records"]) == 9
+
+    # a stale reader finds the replaced journal by its inode
+    reader.refresh()
+    assert reader.generation == 1
+    assert set(reader.records) == set(writer.records)
+    assert "object-0" not in reader.records and "after" in reader.records
+
+
+def test_cross_process_reload(journal_path):
+    index = journal.get_index(journal_path)
+    insert(index, "parent")
+
+    pid = os.fork()
+    if pid == 0:
+        # the inherited index is reopened by the child before it's used
+        status = 1
+        try:
+            child_index = journal.get_index(journal_path)
+            insert(child_index, "child")
+            compact(child_index)
+            insert(child_index, "child-after-compaction")
+            status = 0
+        finally:
+            os._exit(status)
+    assert os.waitpid(pid, 0)[1] == 0
+
+    index = journal.get_index(journal_path)
+    assert {"parent", "child", "child-after-compaction"} <= set(index.records)
+    assert index.generation == 1
+
+
+def test_reload_racing_compaction(journal_path, monkeypatch):
+    writer = open_index(journal_path)
+    reader = open_index(journal_path)
+    insert(writer, "a")
+    insert(writer, "b")
+    compact(writer)
+
+    # another compaction starts right after reader has read the checkpoint of the previous one
+    racer = []
+    pickle_load = pickle.load
+
+    def racing_load(f):
+        data = pickle_load(f)
+        if not racer:
+            racer.append(threading.Thread(target=lambda: (insert(writer, "c"), compact(writer))))
+            racer[0].start()
+            racer[0].join(0.5)
+        return data
+
+    monkeypatch.setattr(journal.pickle, "load", racing_load)
+    reader.refresh()
+    monkeypatch.undo()
+    racer[0].join()
+
+    reader.refresh()
+    assert reader.generation == 2
+    assert set(reader.records) == {"a", "b", "c"}
+
+
+def test_inherited_index(journal_path, monkeypatch):
+    index = journal.get_index(journal_path)
+    insert(index, "preloaded")
+
+    pid = os.fork()
+    if pid == 0:
+        status = 1
+        try:
+            # records loaded by parent are kept, only entries appended since are replayed
+            monkeypatch.setattr(journal.JournalIndex, "load", None)
+            child_index = journal.get_index(journal_path)
+            insert(child_index, "worker")
+            if child_index is index and set(child_index.records) == {"preloaded", "worker"}:
+                status = 0
+        finally:
+            os._exit(status)
+    assert os.waitpid(pid, 0)[1] == 0
+
+    assert set(journal.get_index(journal_path).records) == {"preloaded", "worker"}
@@ -0,0 +1,101 @@
+import hashlib
+import os
+import subprocess
+import sys
+from conftest import SRC_PATH
+
+LIST_URL = "/eoss/v1/list"
+
+
+def sync(source, server, manifest, *args):
+    return subprocess.run(
+        [sys.executable, "eoss-sync.py", str(source), "--url", server, "--manifest", str(manifest), *args],
+        cwd=SRC_PATH,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        text=True,
+    )
+
+
+def test_head_size_and_digest(client):
+    assert client.put("/eoss/v1/object/list-head", data=b"hello").status_code == 201
+
+    response = client.head("/eoss/v1/object/list-head")
+    assert response.headers["X-EOSS-Object-Size"] == "5"
+    assert response.headers["X-EOSS-Object-Digest"] == hashlib.sha256(b"hello").hexdigest()
+
+
+def test_list_paged(client):
+    # objects are spread over both MDS shards and merged by filename
+    filenames = [f"list-paged__{i}" for i in range(5)]
+    for filename in filenames:
+        assert client.put(f"/eoss/v1/object/{filename}", data=filename.encode()).status_code == 201
+    assert client.put("/eoss/v1/object/list-paged_", data=b"outside prefix").status_code == 201
+    response = client.put(
+        "/eoss/v1/object/list-paged__versioned", data=b"data", headers={"X-EOSS-Object-Version": "v2"}
+    )
+    assert response.status_code == 201
+
+    listed = []
+    after = ""
+    while after is not None:
+        output = client.get(f"{LIST_URL}?prefix=list-paged__&limit=2&after={after}").get_json()
+        assert len(output["objects"]) <= 2
+        listed.extend(output["objects"])
+        after = output["next"]
+
+    assert [item["filename"] for item in listed] == filenames
+    assert listed[0]["size"] == len(filenames[0])
+    assert listed[0]["digest"] == hashlib.sha256(filenames[0].encode()).hexdigest()
+
+    output = client.get(
+        f"{LIST_URL}?prefix=list-paged__", headers={"X-EOSS-Object-Version": "v2"}
+    ).get_json()
+    assert [item["filename"] for item in output["objects"]] == ["list-paged__versioned"]
+    assert output["next"] is None
+
+
+def test_list_bad_limit(client):
+    for limit in ("0", "-1", "x"):
+        assert client.get(f"{LIST_URL}?limit={limit}").status_code == 400
+    assert client.post(LIST_URL).status_code == 405
+
+
+def test_sync(client, server, tmp_path):
+    source = tmp_path / "source"
+    (source / "dir").mkdir(parents=True)
+    (source / "a.txt").write_bytes(b"a")
+    (source / "dir" / "b.txt").write_bytes(b"b")
+    manifest = tmp_path / "manifest.sql"
+
+    result = sync(source, server, manifest, "--prefix", "sync__")
+    assert result.returncode == 0, result.stderr
+    assert "2 uploaded" in result.stdout
+    assert client.get("/eoss/v1/object/sync__dir__b.txt").data == b"b"
+
+    # unchanged files are neither hashed nor uploaded again
+    result = sync(source, server, manifest, "--prefix", "sync__")
+    assert result.returncode == 0, result.stderr
+    assert "0 hashed, 2 unchanged, 0 uploaded" in result.stdout
+
+    (source / "a.txt").write_bytes(b"changed")
+    os.utime(source / "a.txt", (1, 1))
+    os.unlink(source / "dir" / "b.txt")
+
+    result = sync(source, server, manifest, "--prefix", "sync__", "--delete", "--dry-run")
+    assert result.returncode == 0, result.stderr
+    assert "1 uploaded" in result.stdout and "1 objects deleted" in result.stdout
+    assert client.get("/eoss/v1/object/sync__a.txt").data == b"a"
+    assert client.head("/eoss/v1/object/sync__dir__b.txt").status_code == 200
+
+    result = sync(source, server, manifest, "--prefix", "sync__", "--delete")
+    assert result.returncode == 0, result.stderr
+    assert client.get("/eoss/v1/object/sync__a.txt").data == b"changed"
+    assert client.head("/eoss/v1/object/sync__dir__b.txt").status_code == 404
+
+
+def test_sync_missing_source(server, tmp_path):
+    result = sync(tmp_path / "missing", server, tmp_path / "manifest.sql")
+
+    assert result.returncode == 1
+    assert result.stderr.startswith("ERROR:")
@@ -0,0 +1,44 @@
+from conftest import PROFILER_TOKEN
+
+PROFILE_URL = "/eoss/v1/profile"
+
+
+def test_profile_worker(client):
+    response = client.post(
+        f"{PROFILE_URL}?seconds=0.2&interval=0.01",
+        headers={"X-EOSS-Admin-Token": PROFILER_TOKEN},
+    )
+
+    assert response.status_code == 200
+    assert response.headers["X-EOSS-Profiled-Workers"] == "1"
+    for line in response.get_data(as_text=True).splitlines():
+        stack, count = line.rsplit(" ", 1)
+        assert stack and int(count) > 0
+
+
+def test_profile_memory(client):
+    response = client.post(
+        f"{PROFILE_URL}?seconds=0.1&mode=memory",
+        headers={"X-EOSS-Admin-Token": PROFILER_TOKEN},
+    )
+
+    assert response.status_code == 200
+
+
+def test_profile_rejected(client):
+    assert client.post(f"{PROFILE_URL}?seconds=0.1").status_code == 403
+    assert (
+        client.post(
+            f"{PROFILE_URL}?seconds=0.1", headers={"X-EOSS-Admin-Token": "wrong"}
+        ).status_code
+        == 403
+    )
+
+    # PROFILER_MAX_DURATION is 5 seconds in test instance
+    for query in ("seconds=0", "seconds=6", "seconds=x", "interval=0", "mode=io", "scope=one"):
+        response = client.post(
+            f"{PROFILE_URL}?{query}", headers={"X-EOSS-Admin-Token": PROFILER_TOKEN}
+        )
+        assert response.status_code == 400, query
+
+    assert client.get(PROFILE_URL).status_code == 405
@@ -0,0 +1,157 @@
+import time
+import pytest
+from conftest import find_filename
+from eoss import query
+
+QUERY_URL = "/eoss/v1/query"
+
+
+def get_query(client, filter_terms, **args):
+    response = client.get(QUERY_URL, query_string=dict(args, filter=filter_terms))
+    assert response.status_code == 200
+    return response.get_json()
+
+
+def query_all(client, filter_terms, limit):
+    """
+    return filenames of all pages and the number of pages
+    """
+    filenames = []
+    cursor = None
+    pages = 0
+
+    while True:
+        args = {"limit": limit}
+        if cursor:
+            args["cursor"] = cursor
+        output = get_query(client, filter_terms, **args)
+        assert len(output["objects"]) <= limit
+        filenames.extend(entry["filename"] for entry in output["objects"])
+        pages += 1
+        cursor = output["next"]
+        if cursor is None:
+            return (filenames, pages)
+
+
+def test_parse_filter():
+    now = int(time.time())
+
+    assert query.parse_filter(["filename^=logs/", "version=null", "size>=2K", "state=1|2"]) == [
+        ("filename", "^=", "logs/"),
+        ("version", "=", None),
+        ("size", ">=", 2048),
+        ("state", "=", (1, 2)),
+    ]
+    assert query.parse_filter(["size<3G"]) == [("size", "<", 3 * 1073741824)]
+    assert query.parse_filter(["timestamp<1700000000"]) == [("timestamp", "<", 1700000000)]
+    (field, operator, value), = query.parse_filter(["timestamp<now-90d"])
+    assert abs(value - (now - 90 * 86400)) <= 1
+    (field, operator, value), = query.parse_filter(["timestamp>=now"])
+    assert abs(value - now) <= 1
+
+    for filter_term in (
+        "size", "owner=me", "version^=v", "state<1", "size>=1X", "timestamp<yesterday", "state=a"
+    ):
+        with pytest.raises(ValueError):
+            query.parse_filter([filter_term])
+
+
+def test_choose_plan():
+    def get_index(filter_terms):
+        return query.choose_plan(query.parse_filter(filter_terms))[0]
+
+    assert get_index(["version=v1", "filename^=a"]) == "metadata_version_filename"
+    assert get_index(["filename^=a", "size>1K"]) == "metadata_filename"
+    assert get_index(["size>1K", "timestamp<now"]) == "metadata_size"
+    assert get_index(["timestamp<now", "state=1"]) == "metadata_timestamp"
+    assert get_index(["state=1"]) == "metadata_state"
+    assert get_index(["state=1|2"]) is None
+    assert get_index([]) is None
+
+
+def test_query(client):
+    filenames = sorted(
+        [find_filename(f"query-object__{shard}{i}", shard) for shard in (0, 1) for i in range(3)]
+    )
+    for i, filename in enumerate(filenames):
+        assert client.put(f"/eoss/v1/object/{filename}", data=b"x" * (100 + i)).status_code == 201
+    response = client.put(
+        f"/eoss/v1/object/{filenames[0]}", data=b"data", headers={"X-EOSS-Object-Version": "v1"}
+    )
+    assert response.status_code == 201
+
+    # objects of all MDS shards are merged in filename order over pages
+    output = get_query(client, "filename^=query-object__")
+    assert output["index"] == "metadata_filename"
+    assert output["next"] is None
+    assert [entry["filename"] for entry in output["objects"]] == [filenames[0]] + filenames
+    assert {entry["version"] for entry in output["objects"]} == {None, "v1"}
+    assert query_all(client, "filename^=query-object__", 2) == ([filenames[0]] + filenames, 4)
+
+    output = get_query(client, ["filename^=query-object__", "version=null", "size>=103"])
+    assert [(entry["filename"], entry["size"], entry["state"]) for entry in output["objects"]] == [
+        (filename, 100 + i, 0) for i, filename in enumerate(filenames) if i >= 3
+    ]
+    assert output["objects"][0]["digest"] is not None
+
+    output = get_query(client, ["version=v1", "filename^=query-object__"])
+    assert output["index"] == "metadata_version_filename"
+    assert [(entry["filename"], entry["size"]) for entry in output["objects"]] == [(filenames[0], 4)]
+
+    output = get_query(client, ["filename=" + filenames[1], "timestamp>=now-1h"])
+    assert [entry["filename"] for entry in output["objects"]] == [filenames[1]]
+    assert get_query(client, ["filename=" + filenames[1], "timestamp<now-1h"])["objects"] == []
+
+    # objects being written are only returned if state is filtered
+    assert get_query(client, ["filename^=query-object__", "state=1|2"])["objects"] == []
+
+
+def test_query_numeric_names(client):
+    response = client.put(
+        "/eoss/v1/object/0019", data=b"x" * 12346, headers={"X-EOSS-Object-Version": "2"}
+    )
+    assert response.status_code == 201
+
+    # numeric filename and version are not read back as numbers from MDS
+    output = get_query(client, ["size=12346", "version=2"])
+    assert [(entry["filename"], entry["version"]) for entry in output["objects"]] == [("0019", "2")]
+
+
+def test_query_scan_limit(client, monkeypatch):
+    start = int(time.time())
+    filenames = sorted(find_filename(f"query-scan__{i}", i % 2) for i in range(6))
+    for filename in filenames:
+        assert client.put(f"/eoss/v1/object/{filename}", data=b"x" * 12345).status_code == 201
+    filter_terms = ["size>=12345", f"timestamp>={start}"]
+
+    # filter term not served by index is evaluated on a bounded number of records,
+    # pages may hold less objects than limit
+    monkeypatch.setattr(query, "QUERY_SCAN_LIMIT", 2)
+    output = get_query(client, filter_terms, limit=100)
+    assert output["index"] == "metadata_size"
+    assert output["next"] is not None
+
+    found, pages = query_all(client, filter_terms, 100)
+    assert len(found) == len(set(found))
+    assert sorted(filename for filename in found if filename.startswith("query-scan__")) == filenames
+    assert pages > 1
+
+    found, pages = query_all(client, ["filename^=query-scan__"], 100)
+    assert found == filenames
+    assert pages > 1
+
+
+def test_bad_query(client):
+    output = get_query(client, "filename^=query-", limit=1)
+    assert output["next"] is not None
+
+    for args in ({"limit": 0}, {"limit": "x"}):
+        assert client.get(QUERY_URL, query_string=args).status_code == 400
+    for filter_term in ("size>big", "owner=me", "filename"):
+        assert client.get(QUERY_URL, query_string={"filter": filter_term}).status_code == 400
+
+    # cursor is malformed or taken with another filter
+    for filter_term, cursor in (("filename^=query-", "x"), ("filename^=other-", output["next"])):
+        response = client.get(QUERY_URL, query_string={"filter": filter_term, "cursor": cursor})
+        assert response.status_code == 400
+    assert client.post(QUERY_URL).status_code == 405
@@ -0,0 +1,149 @@
+import os
+import pytest
+from conftest import find_filename
+from eoss import mds_client
+from eoss import object_client
+from eoss import readmostly
+from eoss.exceptions import MDSConnectException
+from eoss.exceptions import MDSExecuteException
+
+
+@pytest.fixture
+def empty_snapshots(monkeypatch):
+    monkeypatch.setattr(readmostly, "_snapshots", {})
+    yield
+    for snapshot in readmostly._snapshots.values():
+        snapshot.close()
+
+
+def get_record(object_filename):
+    eoss_object_client = object_client.ObjectClient(object_filename, read_only=True)
+    eoss_object_client.init_mds()
+    try:
+        object_exists_flag = eoss_object_client.check_object_exists()
+    finally:
+        eoss_object_client.close_mds()
+    return (object_exists_flag, eoss_object_client)
+
+
+def test_snapshot_refresh(client, empty_snapshots, monkeypatch):
+    first, second = [find_filename(f"read-mostly-refresh__{i}", 0) for i in range(2)]
+    assert client.put(f"/eoss/v1/object/{first}", data=b"data").status_code == 201
+    monkeypatch.setattr(readmostly, "READ_MOSTLY_CHECK_INTERVAL", 3600)
+    snapshot = readmostly.get_snapshot(0)
+    record_name = get_record(first)[1].object_name
+    assert snapshot.get(record_name)[0] == record_name
+
+    # change is not visible until the check interval is over
+    assert client.put(f"/eoss/v1/object/{second}", data=b"data").status_code == 201
+    record_name = get_record(second)[1].object_name
+    assert readmostly.get_snapshot(0).get(record_name) is None
+
+    monkeypatch.setattr(readmostly, "READ_MOSTLY_CHECK_INTERVAL", 0)
+    assert readmostly.get_snapshot(0) is snapshot
+    assert snapshot.get(record_name)[0] == record_name
+
+    # failed reload keeps the stale snapshot
+    def load():
+        raise MDSConnectException("failed")
+
+    monkeypatch.setattr(snapshot, "load", load)
+    assert client.delete(f"/eoss/v1/object/{second}").status_code == 200
+    assert readmostly.get_snapshot(0).get(record_name)[0] == record_name
+
+    # snapshot not loaded yet is not served
+    monkeypatch.setattr(snapshot, "records", None)
+    with pytest.raises(MDSConnectException):
+        snapshot.refresh()
+
+
+def test_snapshot_immutable(client, empty_snapshots, monkeypatch):
+    monkeypatch.setattr(readmostly, "READ_MOSTLY_CHECK_INTERVAL", None)
+    snapshot = readmostly.get_snapshot(1)
+    db_connection = snapshot.db_connection
+
+    # snapshot is never reloaded
+    filename = find_filename("read-mostly-immutable", 1)
+    assert client.put(f"/eoss/v1/object/{filename}", data=b"data").status_code == 201
+    assert readmostly.get_snapshot(1).db_connection is db_connection
+    assert get_record(filename)[0] is False
+
+    # connection inherited from parent process is dropped
+    snapshot.pid = -1
+    assert snapshot.connect() is not db_connection
+
+
+def test_preload(instance, empty_snapshots):
+    readmostly.preload()
+
+    # workers start with the snapshot of each MDS shard and open their own connection
+    for shard in mds_client.get_shards():
+        assert readmostly._snapshots[shard].records is not None
+        assert readmostly._snapshots[shard].db_connection is None
+
+
+def test_read_only_mds_client(client, empty_snapshots):
+    filename = find_filename("read-mostly-client", 0)
+    assert client.put(f"/eoss/v1/object/{filename}", data=b"data").status_code == 201
+    object_exists_flag, eoss_object_client = get_record(filename)
+    assert object_exists_flag is True
+    assert eoss_object_client.object_size == 4
+
+    mds = readmostly.ReadOnlyMDSClient(0)
+    mds.connect()
+    mds.cursor()
+    record = mds.get_object(eoss_object_client.object_name)
+    assert record["id"] == eoss_object_client.object_name and record["size"] == 4
+    assert mds.get_object("read-mostly-missing") is None
+    assert eoss_object_client.object_name in [record["id"] for record in mds.find_objects((0,))]
+    mds.execute("SELECT id FROM metadata WHERE id = ?", (eoss_object_client.object_name,))
+    assert mds.fetchall() == [(eoss_object_client.object_name,)]
+
+    # MDS changes are refused
+    for call in (
+        lambda: mds.insert_object(record),
+        lambda: mds.update_object(record["id"], {"size": 5}),
+        lambda: mds.delete_object(record["id"]),
+        lambda: mds.attach(1, "shard1"),
+        lambda: mds.backup("/tmp/read-mostly-backup"),
+        lambda: mds.execute("DELETE FROM metadata WHERE id = ?", (record["id"],)),
+    ):
+        with pytest.raises(MDSExecuteException):
+            call()
+    mds.close()
+    assert get_record(filename)[0] is True
+
+
+def test_read_only_lock(client, empty_snapshots):
+    filename = find_filename("read-mostly-lock", 0)
+    assert client.put(f"/eoss/v1/object/{filename}", data=b"data").status_code == 201
+    eoss_object_client = get_record(filename)[1]
+    if os.path.exists(eoss_object_client.object_lock_filename):
+        os.unlink(eoss_object_client.object_lock_filename)
+
+    # read-only client takes no lock
+    eoss_object_client.set_read_lock()
+    assert not os.path.exists(eoss_object_client.object_lock_filename)
+    eoss_object_client.remove_lock()
+
+
+def test_read_mostly_mode(app, client, empty_snapshots, monkeypatch):
+    filename = find_filename("read-mostly-mode", 1)
+    assert client.put(f"/eoss/v1/object/{filename}", data=b"data").status_code == 201
+    monkeypatch.setattr(app, "READ_MOSTLY_MODE", True)
+
+    # WRITE operations are refused as in safe mode
+    assert client.put(f"/eoss/v1/object/{filename}", data=b"other").status_code == 525
+    response = client.post(
+        f"/eoss/v1/object/{filename}", data=b"other", headers={"X-EOSS-Append": "1"}
+    )
+    assert response.status_code == 525
+    assert client.delete(f"/eoss/v1/object/{filename}").status_code == 525
+
+    # READ operations are served from the metadata snapshot
+    response = client.get(f"/eoss/v1/object/{filename}")
+    assert response.status_code == 200
+    assert response.data == b"data"
+    assert client.head(f"/eoss/v1/object/{filename}").status_code == 200
+    assert client.head("/eoss/v1/object/read-mostly-missing").status_code == 404
+    assert 1 in readmostly._snapshots
@@ -0,0 +1,115 @@
+import os
+from conftest import MIRROR_STORAGE_PATH
+from conftest import find_filename
+from eoss import mds_client
+from eoss import object_client
+from eoss import object_name
+from eoss import replication
+from eoss import storage
+
+
+def drain(batch_size=100):
+    replicator = replication.Replicator(2, batch_size)
+    try:
+        while replicator.run_once():
+            pass
+    finally:
+        replicator.close()
+
+
+def get_replica_path(object_filename):
+    return storage.get_replica_path(object_name.set_object_name(object_filename, None), MIRROR_STORAGE_PATH)
+
+
+def get_queue(object_filename):
+    record_name = object_name.set_object_name(object_filename, None)
+    mds = mds_client.MDSClient(mds_client.get_shard(record_name))
+    mds.connect()
+    mds.cursor()
+    try:
+        return mds.execute(
+            "SELECT operation, attempts FROM replication_queue WHERE id = ? ORDER BY seq", (record_name,)
+        ).fetchall()
+    finally:
+        mds.close()
+
+
+def test_replicate_and_delete(client):
+    assert client.put("/eoss/v1/object/replication-object", data=b"first").status_code == 201
+    assert client.put("/eoss/v1/object/replication-object", data=b"second").status_code == 201
+    assert get_queue("replication-object") == [("PUT", 0), ("PUT", 0)]
+
+    # only the latest operation is applied
+    drain()
+    assert get_queue("replication-object") == []
+    with open(get_replica_path("replication-object"), "rb") as f:
+        assert f.read() == b"second"
+
+    assert client.delete("/eoss/v1/object/replication-object").status_code == 200
+    drain()
+    assert get_queue("replication-object") == []
+    assert not os.path.exists(get_replica_path("replication-object"))
+
+
+def test_failing_operation_does_not_block_queue(client):
+    stuck = find_filename("replication-stuck", 0)
+    normal = find_filename("replication-normal", 0)
+    drain()
+
+    # object left in writing state can't be replicated
+    eoss_object_client = object_client.ObjectClient(stuck)
+    eoss_object_client.init_mds()
+    eoss_object_client.set_object_init_data()
+    replication.enqueue(eoss_object_client.mds_client, eoss_object_client.object_name, "PUT")
+    eoss_object_client.mds_client.commit()
+    eoss_object_client.close_mds()
+    assert client.put(f"/eoss/v1/object/{normal}", data=b"data").status_code == 201
+
+    replicator = replication.Replicator(1, 1)
+    try:
+        assert replicator.run_shard(0) == 0
+        assert get_queue(stuck) == [("PUT", 1)]
+        assert replicator.run_shard(0) == 1
+    finally:
+        replicator.close()
+
+    assert get_queue(normal) == []
+    assert os.path.exists(get_replica_path(normal))
+
+
+def test_read_fallback(client):
+    assert client.put("/eoss/v1/object/replication-fallback", data=b"data").status_code == 201
+    drain()
+
+    eoss_object_client = object_client.ObjectClient("replication-fallback")
+    eoss_object_client.init_mds()
+    eoss_object_client.check_object_exists()
+    eoss_object_client.close_mds()
+    os.unlink(eoss_object_client.object_path)
+
+    assert client.get("/eoss/v1/object/replication-fallback").data == b"data"
+
+    os.unlink(get_replica_path("replication-fallback"))
+    assert client.get("/eoss/v1/object/replication-fallback").status_code == 524
+
+
+def test_stats(client):
+    drain()
+    assert client.put("/eoss/v1/object/replication-stats", data=b"data").status_code == 201
+
+    stats = client.get("/eoss/v1/stats").get_json()
+    assert stats["replication_queue_length"] >= 1
+    assert stats["replication_lag"] >= 0
+
+
+def test_replicate_numeric_version(client):
+    response = client.put(
+        "/eoss/v1/object/0012", data=b"numeric", headers={"X-EOSS-Object-Version": "2"}
+    )
+    assert response.status_code == 201
+
+    # numeric filename and version are not read back as numbers from MDS
+    drain()
+    record_name = object_name.set_object_name("0012", "2")
+    with open(storage.get_replica_path(record_name, MIRROR_STORAGE_PATH), "rb") as f:
+        assert f.read() == b"numeric"
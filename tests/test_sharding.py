@@ -0,0 +1,168 @@
+import os
+import sqlite3
+import subprocess
+import sys
+import zlib
+import pytest
+import yaml
+from conftest import find_filename
+from conftest import SRC_PATH
+from eoss import mds_client
+from eoss import sharding
+from eoss import METADATA_DB_TABLE
+
+
+def read_filenames(path, prefix):
+    connection = sqlite3.connect(path)
+    try:
+        return sorted(
+            row[0]
+            for row in connection.execute(
+                f"SELECT filename FROM {METADATA_DB_TABLE} WHERE filename LIKE ?", (prefix + "%",)
+            )
+        )
+    finally:
+        connection.close()
+
+
+def copy_instance(tmp_path, shards):
+    """
+    copy MDS shards of test instance into tmp_path, return environment of scripts using the copy
+    """
+    with open(os.environ["EOSS_CONFIG"]) as f:
+        settings = yaml.safe_load(f)
+
+    settings["METADATA_DB_PATH"] = str(tmp_path / "mds.sql")
+    settings["METADATA_DB_SHARDS"] = shards
+    settings["LOGGING_PATH"] = str(tmp_path)
+    with open(tmp_path / "eoss.yaml", "wt") as f:
+        yaml.dump(settings, f)
+
+    for shard in mds_client.get_shards():
+        source = sqlite3.connect(mds_client.get_shard_path(shard))
+        target = sqlite3.connect(tmp_path / ("mds.sql" if shard == 0 else f"mds.{shard}.sql"))
+        source.backup(target)
+        source.close()
+        target.close()
+
+    return dict(os.environ, EOSS_CONFIG=str(tmp_path / "eoss.yaml"))
+
+
+def run_script(script, env, *args):
+    return subprocess.run(
+        [sys.executable, script, *args],
+        cwd=SRC_PATH,
+        env=env,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        text=True,
+    )
+
+
+def read_shard(path):
+    connection = sqlite3.connect(path)
+    try:
+        return (
+            connection.execute(f"SELECT id FROM {METADATA_DB_TABLE}").fetchall(),
+            connection.execute("SELECT prefix, objects, bytes FROM usage").fetchall(),
+        )
+    finally:
+        connection.close()
+
+
+def test_shard_routing():
+    assert mds_client.get_shards() == (0, 1)
+    assert mds_client.get_shard_path(0).endswith("mds.sql")
+    assert mds_client.get_shard_path(1).endswith("mds.1.sql")
+    assert mds_client.get_shard("object") == zlib.crc32(b"object") % 2
+    assert mds_client.get_shard("object", 1) == 0
+
+
+def test_reshard(client, tmp_path):
+    for i in range(6):
+        assert client.put(f"/eoss/v1/object/usage-free__reshard-{i}", data=b"data").status_code == 201
+
+    env = copy_instance(tmp_path, 3)
+    records = []
+    usage_rows = {}
+    for shard in mds_client.get_shards():
+        shard_records, shard_usage = read_shard(mds_client.get_shard_path(shard))
+        records.extend(shard_records)
+        for prefix, objects, size in shard_usage:
+            usage_rows[prefix] = tuple(a + b for a, b in zip(usage_rows.get(prefix, (0, 0)), (objects, size)))
+
+    # MDS shard files must match METADATA_DB_SHARDS
+    result = run_script("pre-start.py", env)
+    assert result.returncode != 0
+    assert "run split-mds.py" in result.stderr
+
+    for shards, paths in ((3, ["mds.sql", "mds.1.sql", "mds.2.sql"]), (1, ["mds.sql"])):
+        result = run_script("split-mds.py", env, "--shards", str(shards))
+        assert result.returncode == 0, result.stderr
+        assert sorted(path.name for path in tmp_path.glob("mds*.sql")) == sorted(paths)
+
+        # each record is moved into the shard it is routed to, usage is moved with records
+        resharded_records = []
+        resharded_usage = {}
+        for shard, path in enumerate(paths):
+            shard_records, shard_usage = read_shard(tmp_path / path)
+            assert all(mds_client.get_shard(record_name, shards) == shard for record_name, in shard_records)
+            resharded_records.extend(shard_records)
+            for prefix, objects, size in shard_usage:
+                resharded_usage[prefix] = tuple(
+                    a + b for a, b in zip(resharded_usage.get(prefix, (0, 0)), (objects, size))
+                )
+        assert sorted(resharded_records) == sorted(records)
+        assert resharded_usage == usage_rows
+
+    result = run_script("split-mds.py", env, "--shards", "0")
+    assert result.returncode == 1
+    assert result.stderr.startswith("ERROR:")
+
+
+def test_merge_after_move_across_shards(client, tmp_path):
+    source = find_filename("merge-source", 1)
+    destination = find_filename("merge-destination", 0)
+    kept = find_filename("merge-kept", 1)
+
+    assert client.put(f"/eoss/v1/object/{source}", data=b"moved").status_code == 201
+    assert client.put(f"/eoss/v1/object/{kept}", data=b"kept").status_code == 201
+    response = client.open(
+        f"/eoss/v1/object/{source}", method="MOVE", headers={"X-EOSS-Destination": destination}
+    )
+    assert response.status_code == 201
+
+    sharding.merge_shards(str(tmp_path / "merged.sql"))
+
+    assert read_filenames(str(tmp_path / "merged.sql"), "merge-") == sorted([destination, kept])
+
+
+def test_merge_blocks_writers(client, tmp_path, monkeypatch):
+    filename = find_filename("merge-blocked", 1)
+    assert client.put(f"/eoss/v1/object/{filename}", data=b"data").status_code == 201
+
+    get_copied_columns = sharding.get_copied_columns
+    blocked = []
+
+    def writing_get_copied_columns(mds, table, database="main"):
+        # all shards are read locked once copying starts, a write of any shard can't commit
+        if not blocked:
+            for shard in mds_client.get_shards():
+                writer = sqlite3.connect(mds_client.get_shard_path(shard), timeout=0.1)
+                try:
+                    writer.execute(
+                        f"UPDATE {METADATA_DB_TABLE} SET timestamp = timestamp + 1 WHERE filename = ?",
+                        (filename,),
+                    )
+                    with pytest.raises(sqlite3.OperationalError, match="locked"):
+                        writer.commit()
+                finally:
+                    writer.close()
+                blocked.append(shard)
+        return get_copied_columns(mds, table, database)
+
+    monkeypatch.setattr(sharding, "get_copied_columns", writing_get_copied_columns)
+    sharding.merge_shards(str(tmp_path / "merged.sql"))
+
+    assert blocked == list(mds_client.get_shards())
+    assert filename in read_filenames(str(tmp_path / "merged.sql"), "merge-blocked")
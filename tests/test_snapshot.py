@@ -0,0 +1,104 @@
+import json
+import os
+import tarfile
+from eoss import object_name
+from eoss import snapshot
+from eoss import storage
+
+
+def export(path, **kwargs):
+    with open(path, "wb") as f:
+        return snapshot.export_snapshot(f, workers=2, prefetch_size=1024, **kwargs)
+
+
+def restore(path):
+    with open(path, "rb") as f:
+        return snapshot.restore_snapshot(f)
+
+
+def get_object_files(object_filename):
+    return [
+        path
+        for path in storage.get_object_paths(object_name.set_object_name(object_filename, None))
+        if os.path.exists(path)
+    ]
+
+
+def test_export_and_restore(client, tmp_path):
+    large = os.urandom(4096)
+    assert client.put("/eoss/v1/object/snapshot-kept", data=b"kept").status_code == 201
+    assert client.put("/eoss/v1/object/snapshot-large", data=large).status_code == 201
+    assert client.put("/eoss/v1/object/snapshot-erasure", data=large, headers={"X-EOSS-Durability": "erasure"}).status_code == 201
+    # numeric filename and version are not read back as numbers from MDS
+    response = client.put(
+        "/eoss/v1/object/0013", data=b"numeric", headers={"X-EOSS-Object-Version": "2"}
+    )
+    assert response.status_code == 201
+
+    summary = export(str(tmp_path / "full.tar"))
+    assert summary["exported_objects"] >= 3
+    with tarfile.open(str(tmp_path / "full.tar")) as tar:
+        names = tar.getnames()
+        assert names[:2] == ["snapshot.json", "mds.sql"]
+        assert names[-1] == "skipped.json"
+        assert tar.extractfile("objects/" + object_name.set_object_name("snapshot-large", None)).read() == large
+        assert tar.extractfile("objects/" + object_name.set_object_name("0013", "2")).read() == b"numeric"
+
+    assert client.put("/eoss/v1/object/snapshot-kept", data=b"changed").status_code == 201
+    assert client.delete("/eoss/v1/object/snapshot-large").status_code == 200
+
+    summary = restore(str(tmp_path / "full.tar"))
+    assert summary["missing_objects"] == 0
+    assert client.get("/eoss/v1/object/snapshot-kept").data == b"kept"
+    assert client.get("/eoss/v1/object/snapshot-large").data == large
+    # erasure coded object is restored as a plain file
+    assert client.get("/eoss/v1/object/snapshot-erasure").data == large
+
+
+def test_changed_object_is_skipped(client, tmp_path, monkeypatch):
+    assert client.put("/eoss/v1/object/snapshot-changed", data=b"before").status_code == 201
+
+    read_object = snapshot.read_object
+
+    def overriding_read_object(object_filename, object_version, record, prefetch_size):
+        # object is overridden after metadata database is copied
+        if object_filename == "snapshot-changed":
+            assert client.put("/eoss/v1/object/snapshot-changed", data=b"after!").status_code == 201
+        return read_object(object_filename, object_version, record, prefetch_size)
+
+    monkeypatch.setattr(snapshot, "read_object", overriding_read_object)
+    summary = export(str(tmp_path / "full.tar"))
+    monkeypatch.undo()
+
+    record_name = object_name.set_object_name("snapshot-changed", None)
+    assert summary["skipped_objects"] >= 1
+    with tarfile.open(str(tmp_path / "full.tar")) as tar:
+        assert record_name in json.load(tar.extractfile("skipped.json"))
+        assert "objects/" + record_name not in tar.getnames()
+
+    # record without data is dropped instead of pointing to newer data
+    summary = restore(str(tmp_path / "full.tar"))
+    assert summary["skipped_objects"] >= 1
+    assert client.head("/eoss/v1/object/snapshot-changed").status_code == 404
+    assert get_object_files("snapshot-changed") == []
+
+
+def test_incremental_restore_removes_deleted_objects(client, tmp_path):
+    assert client.put("/eoss/v1/object/snapshot-deleted", data=b"deleted").status_code == 201
+    summary = export(str(tmp_path / "full.tar"))
+
+    assert client.delete("/eoss/v1/object/snapshot-deleted").status_code == 200
+    assert client.put("/eoss/v1/object/snapshot-added", data=b"added").status_code == 201
+    export(
+        str(tmp_path / "incremental.tar"),
+        since=summary["snapshot_timestamp"] - snapshot.INCREMENTAL_OVERLAP,
+    )
+
+    restore(str(tmp_path / "full.tar"))
+    assert client.get("/eoss/v1/object/snapshot-deleted").data == b"deleted"
+
+    summary = restore(str(tmp_path / "incremental.tar"))
+    assert summary["removed_objects"] >= 1
+    assert client.head("/eoss/v1/object/snapshot-deleted").status_code == 404
+    assert get_object_files("snapshot-deleted") == []
+    assert client.get("/eoss/v1/object/snapshot-added").data == b"added"
@@ -0,0 +1,164 @@
+import os
+import sqlite3
+import sys
+import types
+import pytest
+import yaml
+import eoss
+from eoss import erasure
+from eoss import mds_client
+from eoss import startup
+
+
+@pytest.fixture
+def empty_pool(monkeypatch):
+    monkeypatch.setattr(mds_client, "_pool", {})
+    monkeypatch.setattr(mds_client, "_pool_pid", None)
+
+
+def connect(shard=0, db_name=None):
+    mds = mds_client.MDSClient(shard, db_name)
+    mds.connect()
+    mds.cursor()
+    return mds
+
+
+def test_read_cached_config(tmp_path, monkeypatch):
+    config_file = tmp_path / "eoss.yaml"
+    cache_file = tmp_path / "eoss.yaml.cache"
+    config_file.write_text(yaml.dump({"LOGGING_PATH": "/tmp/first"}))
+
+    assert eoss.read_cached_config(str(config_file), str(cache_file)) == {"LOGGING_PATH": "/tmp/first"}
+    assert cache_file.exists()
+
+    # cached configuration is read without YAML parser
+    def read_config(config_file):
+        raise AssertionError("configuration file is parsed again")
+
+    monkeypatch.setattr(eoss, "read_config", read_config)
+    assert eoss.read_cached_config(str(config_file), str(cache_file)) == {"LOGGING_PATH": "/tmp/first"}
+    monkeypatch.undo()
+
+    # changed configuration file and broken cache are parsed again
+    config_file.write_text(yaml.dump({"LOGGING_PATH": "/tmp/second"}))
+    assert eoss.read_cached_config(str(config_file), str(cache_file)) == {"LOGGING_PATH": "/tmp/second"}
+    cache_file.write_bytes(b"broken")
+    assert eoss.read_cached_config(str(config_file), str(cache_file)) == {"LOGGING_PATH": "/tmp/second"}
+    assert eoss.read_cached_config(str(config_file), str(cache_file)) == {"LOGGING_PATH": "/tmp/second"}
+
+    # cache is disabled
+    os.unlink(cache_file)
+    assert eoss.read_cached_config(str(config_file), "") == {"LOGGING_PATH": "/tmp/second"}
+    assert not cache_file.exists()
+    assert eoss.read_cached_config(str(tmp_path / "missing.yaml"), str(cache_file)) == {}
+
+
+def test_gf_mul_tables():
+    for c in range(256):
+        assert erasure.GF_MUL_TABLES[c] == bytes(erasure.gf_mul(c, x) for x in range(256))
+
+
+def test_connection_pool(instance, empty_pool):
+    mds = connect()
+    db_connection = mds.db_connection
+    mds.close()
+
+    # idle connection is reused, its uncommitted changes are rolled back
+    mds = connect()
+    assert mds.db_connection is db_connection
+    mds.execute("INSERT INTO usage (prefix) VALUES (?)", ("startup-pool__",))
+    mds.close()
+
+    mds = connect()
+    assert mds.db_connection is db_connection
+    assert mds.execute("SELECT prefix FROM usage WHERE prefix = ?", ("startup-pool__",)).fetchall() == []
+
+    # connection with another MDS shard attached is closed
+    mds.attach(1, "shard1")
+    mds.close()
+    mds = connect()
+    assert mds.db_connection is not db_connection
+    db_connection = mds.db_connection
+    mds.close()
+
+    # connections are not inherited by a forked process
+    mds_client._pool_pid = -1
+    mds = connect()
+    assert mds.db_connection is not db_connection
+    mds.close()
+
+
+def test_connection_pool_size(tmp_path, empty_pool, monkeypatch):
+    db_name = str(tmp_path / "pool.sql")
+    sqlite3.connect(db_name).close()
+    monkeypatch.setattr(mds_client, "MDS_CONNECTION_POOL_SIZE", 1)
+
+    first = connect(db_name=db_name)
+    second = connect(db_name=db_name)
+    first.close()
+    second.close()
+    assert len(mds_client._pool[db_name]) == 1
+
+    # connection of a replaced metadata database file is dropped
+    sqlite3.connect(str(tmp_path / "new.sql")).close()
+    os.replace(str(tmp_path / "new.sql"), db_name)
+    mds = connect(db_name=db_name)
+    assert mds_client._pool[db_name] == []
+    mds.close()
+    assert len(mds_client._pool[db_name]) == 1
+
+    # pool is disabled
+    monkeypatch.setattr(mds_client, "MDS_CONNECTION_POOL_SIZE", 0)
+    mds = connect(db_name=db_name)
+    mds.close()
+    assert len(mds_client._pool[db_name]) == 1
+
+
+def test_warm_up(app, client, empty_pool):
+    startup.warm_up(app.app)
+
+    # a connection of each MDS shard is left in pool and the warm-up object is never stored
+    for shard in mds_client.get_shards():
+        assert len(mds_client._pool[mds_client.get_shard_path(shard)]) >= 1
+    assert client.head(f"/eoss/v1/object/{startup.WARM_UP_OBJECT_FILENAME}").status_code == 404
+
+
+def test_preload_mds(instance, monkeypatch):
+    advised = []
+    monkeypatch.setattr(startup, "STARTUP_PRELOAD_SIZE", 4096)
+    monkeypatch.setattr(os, "posix_fadvise", lambda fd, offset, size, advice: advised.append(size))
+
+    # missing MDS shard file is skipped
+    monkeypatch.setattr(startup.mds_client, "get_shards", lambda: (0, 1, 5))
+    startup.preload_mds()
+    assert len(advised) == 2
+    assert all(0 < size <= 4096 for size in advised)
+
+    monkeypatch.setattr(startup, "STARTUP_PRELOAD_SIZE", 0)
+    startup.preload_mds()
+    assert len(advised) == 2
+
+
+def test_register(app, monkeypatch):
+    calls = []
+    monkeypatch.setattr(startup, "preload", lambda app: calls.append("preload"))
+    monkeypatch.setattr(startup, "warm_up", lambda app: calls.append("warm_up"))
+
+    # application is loaded by the serving process itself
+    startup.register(app.app)
+    assert calls == ["preload", "warm_up"]
+
+    monkeypatch.setattr(startup, "STARTUP_WARM_UP", False)
+    calls.clear()
+    startup.register(app.app)
+    assert calls == ["preload"]
+
+    # application is loaded by uWSGI master, each forked worker is warmed up after former post-fork hook
+    uwsgi = types.SimpleNamespace(worker_id=lambda: 0, post_fork_hook=lambda: calls.append("hook"))
+    monkeypatch.setitem(sys.modules, "uwsgi", uwsgi)
+    monkeypatch.setattr(startup, "STARTUP_WARM_UP", True)
+    calls.clear()
+    startup.register(app.app)
+    assert calls == ["preload"]
+    uwsgi.post_fork_hook()
+    assert calls == ["preload", "hook", "warm_up"]
@@ -0,0 +1,163 @@
+import gzip
+import os
+import threading
+import time
+from eoss import migration
+from eoss import object_client
+from eoss import storage
+
+
+class BlockingThrottle:
+    """
+    throttle holding the copy of migration until the test releases it
+    """
+
+    def __init__(self):
+        self.copying = threading.Event()
+        self.released = threading.Event()
+
+    def consume(self, amount):
+        self.copying.set()
+        assert self.released.wait(10)
+
+
+def move_to_cold(object_filename, throttle=None, compression=None):
+    def handler(eoss_object_client):
+        return migration.migrate_object(
+            eoss_object_client,
+            storage.TIER_COLD,
+            root=eoss_object_client.object_root,
+            compression=compression,
+            throttle=throttle,
+        )
+
+    return migration.run_locked(object_filename, None, handler)
+
+
+def get_record(object_filename):
+    eoss_object_client = object_client.ObjectClient(object_filename)
+    eoss_object_client.init_mds()
+    try:
+        eoss_object_client.check_object_exists()
+    finally:
+        eoss_object_client.close_mds()
+    return eoss_object_client
+
+
+def test_migration_keeps_object_readable(client):
+    data = os.urandom(4096)
+    assert client.put("/eoss/v1/object/tier-readable", data=data).status_code == 201
+
+    throttle = BlockingThrottle()
+    result = []
+    mover = threading.Thread(target=lambda: result.append(move_to_cold("tier-readable", throttle)))
+    mover.start()
+
+    try:
+        assert throttle.copying.wait(10)
+
+        # object is read from hot tier during copy, writes are rejected
+        assert client.head("/eoss/v1/object/tier-readable").status_code == 200
+        assert client.get("/eoss/v1/object/tier-readable").data == data
+        assert client.put("/eoss/v1/object/tier-readable", data=b"new").status_code == 409
+    finally:
+        throttle.released.set()
+        mover.join()
+
+    assert result == [len(data)]
+
+    eoss_object_client = get_record("tier-readable")
+    assert eoss_object_client.object_tier == storage.TIER_COLD
+    assert eoss_object_client.object_state == 0
+    assert client.get("/eoss/v1/object/tier-readable").data == data
+
+
+def test_migration_drops_stale_copy(client, monkeypatch):
+    data = os.urandom(4096)
+    assert client.put("/eoss/v1/object/tier-stale", data=data).status_code == 201
+
+    relock = migration.relock
+
+    def overriding_relock(eoss_object_client, shared):
+        relock(eoss_object_client, shared)
+        if not shared:
+            return
+        # object is overridden right after copy, before write lock is taken again
+        eoss_object_client.remove_lock()
+        assert client.put("/eoss/v1/object/tier-stale", data=b"override").status_code == 201
+        relock(eoss_object_client, shared)
+
+    monkeypatch.setattr(migration, "relock", overriding_relock)
+    assert move_to_cold("tier-stale") is False
+
+    eoss_object_client = get_record("tier-stale")
+    assert eoss_object_client.object_tier == storage.TIER_HOT
+    assert eoss_object_client.object_state == 0
+    assert client.get("/eoss/v1/object/tier-stale").data == b"override"
+    assert not os.path.exists(
+        storage.get_object_temp_path(eoss_object_client.object_name, storage.TIER_COLD, 0)
+    )
+
+
+def test_cold_object(client):
+    data = b"cold data " * 100
+    assert client.put("/eoss/v1/object/tier-cold", data=data).status_code == 201
+    assert move_to_cold("tier-cold", compression="gzip") == len(data)
+
+    # cold copy is compressed and read transparently
+    eoss_object_client = get_record("tier-cold")
+    assert (eoss_object_client.object_tier, eoss_object_client.object_compression) == (storage.TIER_COLD, "gzip")
+    with open(eoss_object_client.object_path, "rb") as f:
+        assert gzip.decompress(f.read()) == data
+    assert client.get("/eoss/v1/object/tier-cold").data == data
+
+    # new data is written into hot tier and cold copy is removed
+    cold_path = eoss_object_client.object_path
+    assert client.put("/eoss/v1/object/tier-cold", data=b"hot").status_code == 201
+    assert get_record("tier-cold").object_tier == storage.TIER_HOT
+    assert not os.path.exists(cold_path)
+    assert client.get("/eoss/v1/object/tier-cold").data == b"hot"
+
+
+def test_candidates_paged(client, load_script, monkeypatch):
+    tier_mover = load_script("tier-mover.py")
+    filenames = [f"tier-candidate-{i}" for i in range(5)]
+    for filename in filenames:
+        assert client.put(f"/eoss/v1/object/{filename}", data=b"data").status_code == 201
+
+    # numeric filename and version are kept as strings
+    response = client.put(
+        "/eoss/v1/object/0012", data=b"data", headers={"X-EOSS-Object-Version": "2"}
+    )
+    assert response.status_code == 201
+
+    monkeypatch.setattr(tier_mover, "TIER_MIGRATION_BATCH_SIZE", 2)
+    candidates = list(tier_mover.get_candidates(0, storage.TIER_HOT, int(time.time()) + 1))
+
+    assert len(candidates) == len(set(candidates))
+    assert set((filename, None) for filename in filenames) <= set(candidates)
+    assert ("0012", "2") in candidates
+    assert not set(tier_mover.get_candidates(0, storage.TIER_HOT, 0)) & set(candidates)
+
+
+def test_recover_migrations(client, load_script):
+    tier_mover = load_script("tier-mover.py")
+    assert client.put("/eoss/v1/object/tier-interrupted", data=b"data").status_code == 201
+
+    # migration is interrupted after its copy is renamed, before new tier is committed
+    eoss_object_client = object_client.ObjectClient("tier-interrupted")
+    eoss_object_client.init_mds()
+    eoss_object_client.check_object_exists()
+    eoss_object_client.set_object_state(4)
+    eoss_object_client.close_mds()
+    cold_path = storage.get_object_path(eoss_object_client.object_name, storage.TIER_COLD, 0)
+    with open(cold_path, "wb") as f:
+        f.write(b"data")
+
+    assert ("tier-interrupted", None) in list(tier_mover.get_candidates(4))
+    assert tier_mover.recover_migrations()
+
+    eoss_object_client = get_record("tier-interrupted")
+    assert (eoss_object_client.object_state, eoss_object_client.object_tier) == (0, storage.TIER_HOT)
+    assert not os.path.exists(cold_path)
+    assert client.get("/eoss/v1/object/tier-interrupted").data == b"data"
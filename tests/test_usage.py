@@ -0,0 +1,82 @@
+USAGE_URL = "/eoss/v1/usage"
+
+
+def get_usage(client, prefix):
+    response = client.get(f"{USAGE_URL}?prefix={prefix}")
+    assert response.status_code == 200
+    output = response.get_json()
+    assert list(output) == [prefix]
+    return (output[prefix]["objects"], output[prefix]["bytes"])
+
+
+def test_usage_accounting(client):
+    objects, size = get_usage(client, "usage-free__")
+
+    def assert_usage(added_objects, added_bytes):
+        assert get_usage(client, "usage-free__") == (objects + added_objects, size + added_bytes)
+
+    assert client.put("/eoss/v1/object/usage-free__a", data=b"x" * 10).status_code == 201
+    assert_usage(1, 10)
+
+    # overridden object is counted once by its new size
+    assert client.put("/eoss/v1/object/usage-free__a", data=b"x" * 20).status_code == 201
+    assert_usage(1, 20)
+
+    response = client.post(
+        "/eoss/v1/object/usage-free__a", data=b"x" * 5, headers={"X-EOSS-Append": "1"}
+    )
+    assert response.status_code == 200
+    assert_usage(1, 25)
+
+    # objects of other versions are counted as well
+    response = client.open(
+        "/eoss/v1/object/usage-free__a",
+        method="COPY",
+        headers={"X-EOSS-Destination": "usage-free__a", "X-EOSS-Destination-Version": "v2"},
+    )
+    assert response.status_code == 201
+    assert_usage(2, 50)
+
+    # object moved out of prefix
+    response = client.open(
+        "/eoss/v1/object/usage-free__a",
+        method="MOVE",
+        headers={"X-EOSS-Destination": "usage-moved-out"},
+    )
+    assert response.status_code == 201
+    assert_usage(1, 25)
+
+    response = client.delete(
+        "/eoss/v1/object/usage-free__a", headers={"X-EOSS-Object-Version": "v2"}
+    )
+    assert response.status_code == 200
+    assert_usage(0, 0)
+
+
+def test_quota(client):
+    output = client.get(USAGE_URL).get_json()
+    assert output["usage-quota__"]["quota"] == 100
+    assert output["usage-free__"]["quota"] is None
+
+    assert client.put("/eoss/v1/object/usage-quota__a", data=b"x" * 60).status_code == 201
+    assert client.put("/eoss/v1/object/usage-quota__b", data=b"x" * 50).status_code == 507
+    assert client.head("/eoss/v1/object/usage-quota__b").status_code == 404
+
+    # size of overridden object is freed
+    assert client.put("/eoss/v1/object/usage-quota__a", data=b"x" * 90).status_code == 201
+
+    response = client.post(
+        "/eoss/v1/object/usage-quota__a", data=b"x" * 20, headers={"X-EOSS-Append": "1"}
+    )
+    assert response.status_code == 507
+    assert client.head("/eoss/v1/object/usage-quota__a").headers["X-EOSS-Object-Size"] == "90"
+    assert get_usage(client, "usage-quota__") == (1, 90)
+
+    assert client.delete("/eoss/v1/object/usage-quota__a").status_code == 200
+    assert client.put("/eoss/v1/object/usage-quota__b", data=b"x" * 100).status_code == 201
+    assert get_usage(client, "usage-quota__") == (1, 100)
+
+
+def test_usage_unknown_prefix(client):
+    assert client.get(f"{USAGE_URL}?prefix=usage-unknown__").status_code == 404
+    assert client.post(USAGE_URL).status_code == 405
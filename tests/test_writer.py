@@ -0,0 +1,92 @@
+import hashlib
+import io
+import os
+import threading
+import pytest
+from eoss import writer
+from eoss.exceptions import EOSSInternalException
+
+
+class ReadOnlyStream:
+    """
+    stream without readinto(), like some WSGI input streams
+    """
+
+    def __init__(self, data):
+        self.stream = io.BytesIO(data)
+
+    def read(self, size):
+        return self.stream.read(min(size, 1000))
+
+
+@pytest.fixture
+def small_buffer(monkeypatch):
+    monkeypatch.setattr(writer, "_buffers", threading.local())
+    monkeypatch.setattr(writer, "LARGE_OBJECT_BUFFER_SIZE", 8192)
+    monkeypatch.setattr(writer, "LARGE_OBJECT_SYNC_SIZE", 16384)
+
+
+def test_write_stream(tmp_path, small_buffer):
+    data = os.urandom(8192 * 5 + 123)
+
+    for stream in (io.BytesIO(data), ReadOnlyStream(data)):
+        path = tmp_path / "object.temp"
+        assert writer.write_stream(stream, str(path), len(data)) == hashlib.sha256(data).hexdigest()
+        assert path.read_bytes() == data
+
+    # buffer is page aligned and reused by the thread
+    assert len(writer.get_buffer()) == 8192
+    assert writer.get_buffer() is writer.get_buffer()
+
+
+def test_write_stream_direct(tmp_path, small_buffer, monkeypatch):
+    monkeypatch.setattr(writer, "LARGE_OBJECT_DIRECT_SIZE", 0)
+    data = os.urandom(8192 * 2 + 100)
+
+    # last partial block is padded and truncated, O_DIRECT falls back to buffered IO where it's rejected
+    path = tmp_path / "object.temp"
+    assert writer.write_stream(io.BytesIO(data), str(path), len(data)) == hashlib.sha256(data).hexdigest()
+    assert path.read_bytes() == data
+
+    assert writer.write_stream(io.BytesIO(b""), str(path), 0) == hashlib.sha256(b"").hexdigest()
+    assert path.read_bytes() == b""
+
+
+def test_write_stream_short(tmp_path, small_buffer):
+    with pytest.raises(EOSSInternalException, match="expected"):
+        writer.write_stream(io.BytesIO(b"short"), str(tmp_path / "object.temp"), 100)
+
+
+def test_large_object_threshold(monkeypatch):
+    monkeypatch.setattr(writer, "LARGE_OBJECT_THRESHOLD", 1000)
+    assert writer.is_large_object(1000)
+    assert not writer.is_large_object(999)
+    assert not writer.is_large_object(None)
+
+    monkeypatch.setattr(writer, "LARGE_OBJECT_THRESHOLD", None)
+    assert not writer.is_large_object(10**12)
+
+
+def test_large_put(client, small_buffer, monkeypatch):
+    monkeypatch.setattr(writer, "LARGE_OBJECT_THRESHOLD", 10000)
+    data = os.urandom(50000)
+
+    response = client.put(
+        "/eoss/v1/object/writer-large",
+        data=data,
+        headers={"X-EOSS-Durability": "plain"},
+    )
+    assert response.status_code == 201
+    assert client.get("/eoss/v1/object/writer-large").data == data
+    response = client.head("/eoss/v1/object/writer-large")
+    assert response.headers["X-EOSS-Object-Digest"] == hashlib.sha256(data).hexdigest()
+
+    # upload ending before Content-Length is rolled back
+    response = client.put(
+        "/eoss/v1/object/writer-truncated",
+        input_stream=io.BytesIO(data[:20000]),
+        headers={"X-EOSS-Durability": "plain"},
+        environ_overrides={"CONTENT_LENGTH": "50000"},
+    )
+    assert response.status_code == 526
+    assert client.head("/eoss/v1/object/writer-truncated").status_code == 404